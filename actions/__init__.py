@@ -4,7 +4,7 @@ Re-exports all public action functions so that ``from actions import X``
 continues to work throughout the codebase.
 
 Submodules:
-    _helpers    — cross-module shared state (_last_depart_slot, _interruptible_sleep)
+    _helpers    — cross-module shared state (_last_depart_slot, _interruptible_sleep, _shows)
     quests      — quest system, tracking, tower quest
     rallies     — rally joining, war rallies, rally owner blacklist
     combat      — attack, phantom clash, reinforce, target, teleport
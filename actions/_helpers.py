@@ -4,11 +4,14 @@ Leaf module — no dependencies on other action submodules.
 
 Key exports:
     _interruptible_sleep — cooperative sleep with stop_check
+    _shows               — timed_wait frame condition: a template is on screen
     _last_depart_slot    — mutable dict tracking which troop slot just departed
 """
 
 import time
 
+from vision import on_frame, find_image
+
 
 # Troop slot tracking — which troop slot was last used to depart.
 # Written by rallies.join_rally, titans.rally_titan, evil_guard.rally_eg
@@ -28,3 +31,9 @@ def _interruptible_sleep(seconds, stop_check):
             return True
         time.sleep(min(0.5, max(0, end - time.time())))
     return False
+
+
+def _shows(image_name, threshold=0.7):
+    """Frame condition: ``image_name`` is on screen (at the threshold the
+    following tap_image / wait_for_image_and_tap uses)."""
+    return on_frame(lambda screen: find_image(screen, image_name, threshold=threshold) is not None)
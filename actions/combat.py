@@ -1,6 +1,6 @@
 """Basic combat actions: attack, phantom clash, reinforce, target, teleport.
 
-Dependencies: _helpers (for _interruptible_sleep)
+Dependencies: _helpers (for _interruptible_sleep, _shows)
 
 Key exports:
     attack              — basic attack sequence
@@ -25,13 +25,13 @@ import config
 from config import Screen
 from botlog import get_logger, timed_action
 from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image, get_template,
+                    on_settled, load_screenshot, find_image, get_template,
                     adb_tap, adb_swipe, logged_tap, clear_click_trail,
                     save_failure_screenshot)
 from navigation import navigate, check_screen
 from troops import troops_avail, all_troops_home, heal_all
 
-from actions._helpers import _interruptible_sleep
+from actions._helpers import _interruptible_sleep, _shows
 
 _log = get_logger("actions")
 
@@ -56,7 +56,7 @@ def attack(device):
     if troops > min_troops:
         logged_tap(device, 560, 675, "attack_selection")
         wait_for_image_and_tap("attack_button.png", device, timeout=5)
-        time.sleep(1)  # Wait for attack dialog
+        timed_wait(device, _shows("depart.png", threshold=0.8), 1, "attack_depart_dialog")
         if tap_image("depart.png", device):
             log.info("Attack departed with %d troops available", troops)
         else:
@@ -151,7 +151,7 @@ def phantom_clash_attack(device, stop_check=None):
             log.warning("Timed out waiting for esb_attack.png after 31s")
             return
 
-    time.sleep(1)  # Wait for attack dialog
+    timed_wait(device, _shows("depart.png", threshold=0.8), 1, "phantom_clash_depart_dialog")
     if tap_image("depart.png", device):
         log.info("Phantom Clash attack departed")
     else:
@@ -177,7 +177,7 @@ def reinforce_throne(device):
     if troops > min_troops:
         logged_tap(device, 560, 675, "throne_selection")
         wait_for_image_and_tap("throne_reinforce.png", device, timeout=5)
-        time.sleep(1)
+        timed_wait(device, _shows("depart.png", threshold=0.8), 1, "throne_depart_dialog")
         tap_image("depart.png", device)
     else:
         log.warning("Not enough troops available (have %d, need more than %d)", troops, min_troops)
@@ -202,21 +202,11 @@ def target(device):
     if not tap_image("target_menu.png", device):
         log.warning("Failed to find target_menu.png")
         return False
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "target_menu_open")
 
-    # Tap the Enemy tab
+    # Tap the Enemy tab, then check that a target marker exists
     logged_tap(device, 740, 330, "target_enemy_tab")
-    time.sleep(1)
-
-    # Check that a target marker exists (retry up to 3 seconds)
-    marker_found = False
-    start_time = time.time()
-    while time.time() - start_time < 3:
-        screen = load_screenshot(device)
-        if find_image(screen, "target_marker.png", threshold=0.7):
-            marker_found = True
-            break
-        time.sleep(0.5)
+    marker_found = timed_wait(device, _shows("target_marker.png"), 4, "target_marker")
 
     if not marker_found:
         log.warning("No target marker found!")
@@ -224,7 +214,7 @@ def target(device):
 
     # Tap the target coordinates
     logged_tap(device, 350, 476, "target_coords")
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "target_coords_tap")
 
     log.info("Target sequence complete!")
     return True
@@ -244,7 +234,7 @@ def _check_dead(screen, dead_img, device):
         log.warning("Found dead.png (confidence: %.1f%%), aborting teleport", max_val * 100)
         h, w = dead_img.shape[:2]
         logged_tap(device, max_loc[0] + w // 2, max_loc[1] + h // 2, "tp_dead_click")
-        time.sleep(1)
+        timed_wait(device, on_settled(device), 1, "tp_dead_dismiss")
         return True
     return False
 
@@ -275,13 +265,13 @@ def _check_green_at_current_position(device, dead_img, stop_check=None):
 
     # Long press to open context menu
     adb_swipe(device, 540, 1400, 540, 1400, 1000)
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_context_menu", stop_check=stop_check)
     if stop_check and stop_check():
         return False, None, time.time() - start
 
     # Tap the TELEPORT button on context menu
     logged_tap(device, 780, 1400, "tp_search_btn")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_teleport_mode", stop_check=stop_check)
     if stop_check and stop_check():
         return False, None, time.time() - start
 
@@ -321,7 +311,7 @@ def _check_green_at_current_position(device, dead_img, stop_check=None):
             logged_tap(device, max_loc[0] + w // 2, max_loc[1] + h // 2, "tp_cancel")
         else:
             log.debug("Cancel button not found, waiting for UI to clear...")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_cancel")
 
     return False, None, elapsed
 
@@ -389,7 +379,7 @@ def teleport(device, dry_run=False):
     # building (the dialog is dismissed next).  Future: make setup
     # context-aware.
     logged_tap(device, 540, 960, "tp_start")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_start_tap")
 
     # Load dead image once for reuse
     dead_img = get_template("elements/dead.png")
@@ -401,7 +391,7 @@ def teleport(device, dry_run=False):
 
     # Dismiss any dialog opened by the tap above
     logged_tap(device, 540, 500, "tp_dismiss_dialog")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_dismiss_dialog")
 
     log.debug("Starting teleport search loop (90 second timeout)...")
     start_time = time.time()
@@ -421,7 +411,7 @@ def teleport(device, dry_run=False):
                   attempt_count, max_attempts, end_x, end_y)
 
         adb_swipe(device, 540, 960, end_x, end_y, 300)
-        time.sleep(1)
+        timed_wait(device, on_settled(), 1, "tp_pan_settle")
 
         result, ss_path, elapsed = _check_green_at_current_position(
             device, dead_img)
@@ -442,7 +432,7 @@ def teleport(device, dry_run=False):
             log.info("Green circle found on attempt #%d (%.1fs). Confirming...",
                      attempt_count, total_elapsed)
             logged_tap(device, 760, 1700, "tp_confirm")
-            time.sleep(2)
+            timed_wait(device, on_settled(device), 2, "tp_confirm")
             log.info("Teleport confirmed after %d attempt(s), %.1fs total",
                      attempt_count, time.time() - start_time)
             return True
@@ -494,7 +484,7 @@ def _strategy_random_pan(device, attempt_num):
     end_x = max(100, min(980, 540 + distance * dir_x))
     end_y = max(500, min(1400, 960 + distance * dir_y))
     adb_swipe(device, 540, 960, end_x, end_y, 300)
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "tp_pan_settle")
 
 
 def _strategy_big_pan(device, attempt_num):
@@ -505,7 +495,7 @@ def _strategy_big_pan(device, attempt_num):
     end_x = max(100, min(980, 540 + distance * dir_x))
     end_y = max(300, min(1600, 960 + distance * dir_y))
     adb_swipe(device, 540, 960, end_x, end_y, 300)
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "tp_pan_settle")
 
 
 # 8 compass directions for edge_pan
@@ -527,7 +517,7 @@ def _strategy_edge_pan(device, attempt_num):
     end_x = max(100, min(980, 540 + distance * dx))
     end_y = max(300, min(1600, 960 + distance * dy))
     adb_swipe(device, 540, 960, end_x, end_y, 300)
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "tp_pan_settle")
 
 
 def _strategy_territory_guided(device, attempt_num):
@@ -559,13 +549,13 @@ def _strategy_territory_guided(device, attempt_num):
     log.debug("territory_guided: tapping square (%d, %d) at pixel (%d, %d)",
               row, col, sx, sy)
     adb_tap(device, sx, sy)
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_territory_square")
 
     # Return to MAP (the tap should have moved camera to tower area)
     if not navigate(Screen.MAP, device):
         log.warning("territory_guided: failed to return to MAP")
         return
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "tp_territory_map_settle")
 
 
 # Strategy registry
@@ -598,7 +588,7 @@ def _run_trial(device, strategy_name, strategy_fn, trial_num,
             timestamp=datetime.now().isoformat())
 
     logged_tap(device, 540, 960, "tp_start")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_start_tap")
 
     dead_img = get_template("elements/dead.png")
 
@@ -612,7 +602,7 @@ def _run_trial(device, strategy_name, strategy_fn, trial_num,
 
     # Dismiss any dialog
     logged_tap(device, 540, 500, "tp_dismiss_dialog")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tp_dismiss_dialog")
 
     start_time = time.time()
     attempts = []
@@ -663,7 +653,7 @@ def _run_trial(device, strategy_name, strategy_fn, trial_num,
                      trial_num, attempt_count, total_time)
             # Cancel — always dry run in benchmark
             tap_image("cancel.png", device)
-            time.sleep(1)
+            timed_wait(device, on_settled(device), 1, "tp_trial_cancel")
             return TeleportTrial(
                 strategy=strategy_name, trial_num=trial_num, success=True,
                 total_attempts=attempt_count,
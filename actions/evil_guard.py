@@ -16,8 +16,8 @@ import time
 import config
 from config import Screen
 from botlog import get_logger, timed_action, stats
-from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image, get_template,
+from vision import (tap_image, wait_for_image_and_tap, timed_wait, on_frame,
+                    on_settled, load_screenshot, find_image, get_template,
                     adb_tap, adb_swipe, logged_tap,
                     save_failure_screenshot, read_ap)
 from navigation import navigate, check_screen
@@ -31,6 +31,19 @@ from actions.combat import _detect_player_at_eg
 _log = get_logger("actions")
 
 
+def _dialog_box(screen, checked_tmpl, unchecked_tmpl):
+    """(name, score) of the checked/unchecked box in a priest attack
+    dialog on ``screen``, or None if neither clears 0.8."""
+    for name, tmpl in (("checked", checked_tmpl), ("unchecked", unchecked_tmpl)):
+        if tmpl is None:
+            continue
+        result = cv2.matchTemplate(screen, tmpl, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, _ = cv2.minMaxLoc(result)
+        if max_val > 0.8:
+            return name, max_val
+    return None
+
+
 def _handle_ap_popup(device, needed):
     """Detect and handle the game's AP Recovery popup that appears when
     departing with insufficient AP.
@@ -117,7 +130,7 @@ def _search_eg_center(device):
         log.warning("Failed to find Search button")
         tap_image("close_x.png", device)
         return False
-    timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+    timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                1, "eg_search_complete")
 
     return True
@@ -134,9 +147,9 @@ def search_eg_reset(device):
 
     # Close out — tap X twice (EG view + search menu)
     tap_image("close_x.png", device)
-    time.sleep(0.5)
+    timed_wait(device, on_settled(device), 0.5, "eg_reset_close_view")
     tap_image("close_x.png", device)
-    time.sleep(0.5)
+    timed_wait(device, on_settled(device), 0.5, "eg_reset_close_search")
 
     log.info("EG search complete — titan distances reset")
     return True
@@ -182,32 +195,19 @@ def _probe_priest(device, x, y, label):
     logged_tap(device, x, y, f"probe_{label}")
     timed_wait(device, _dialog_visible, 2.5, "probe_dialog_open")
 
-    start = time.time()
-    while time.time() - start < 3:
-        screen = load_screenshot(device)
-        if screen is None:
-            time.sleep(0.5)
-            continue
+    hit = {}
 
-        # Check for checked.png
-        if checked_tmpl is not None:
-            result = cv2.matchTemplate(screen, checked_tmpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            if max_val > 0.8:
-                log.info("PROBE HIT %s at (%d,%d) — checked %.0f%%", label, x, y, max_val * 100)
-                save_failure_screenshot(device, f"probe_{label}_HIT", screen)
-                return True
+    def _box_shown(screen):
+        box = _dialog_box(screen, checked_tmpl, unchecked_tmpl)
+        if box is not None:
+            hit.update(box=box, screen=screen)
+        return box is not None
 
-        # Check for unchecked.png
-        if unchecked_tmpl is not None:
-            result = cv2.matchTemplate(screen, unchecked_tmpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            if max_val > 0.8:
-                log.info("PROBE HIT %s at (%d,%d) — unchecked %.0f%%", label, x, y, max_val * 100)
-                save_failure_screenshot(device, f"probe_{label}_HIT", screen)
-                return True
-
-        time.sleep(0.5)
+    if timed_wait(device, on_frame(_box_shown), 3, "probe_dialog_confirm"):
+        name, max_val = hit["box"]
+        log.info("PROBE HIT %s at (%d,%d) — %s %.0f%%", label, x, y, name, max_val * 100)
+        save_failure_screenshot(device, f"probe_{label}_HIT", hit["screen"])
+        return True
 
     # MISS — no dialog appeared
     log.info("PROBE MISS %s at (%d,%d) — no dialog after 3s", label, x, y)
@@ -259,12 +259,12 @@ def rally_eg(device, stop_check=None):
         return False
 
     # Wait for search overlay to fully close and camera to settle
-    timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+    timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                1.5, "eg_search_overlay_close")
     # Verify we're back on map_screen (search overlay dismissed)
     if check_screen(device) != Screen.MAP:
         log.debug("EG: search overlay may still be open, waiting...")
-        timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                    1.5, "eg_search_overlay_close_retry")
         if check_screen(device) != Screen.MAP:
             log.warning("EG: not on map_screen after search — recovering")
@@ -339,29 +339,36 @@ def rally_eg(device, stop_check=None):
     def try_stationed_before_depart(priest_num):
         """Tap stationed.png if visible (within region constraint).
         Uses _STATIONED_REGION to avoid hero portrait false positives."""
-        start_time = time.time()
-        while time.time() - start_time < 3:
-            screen = load_screenshot(device)
-            if stationed_img is not None and screen is not None:
-                match = find_image(screen, "stationed.png", threshold=0.8, region=_STATIONED_REGION)
-                if match:
-                    max_val, max_loc, h, w = match
-                    cx = max_loc[0] + w // 2
-                    cy = max_loc[1] + h // 2
-                    log.debug("P%d: stationed found at (%d,%d) %.0f%%, tapping",
-                              priest_num, cx, cy, max_val * 100)
-                    logged_tap(device, cx, cy, f"eg_stationed_p{priest_num}")
-                    return True
-            time.sleep(0.5)
+        found = {}
+
+        def _stationed_shown(screen):
+            found["match"] = find_image(screen, "stationed.png", threshold=0.8,
+                                        region=_STATIONED_REGION)
+            return found["match"] is not None
+
+        if stationed_img is not None and timed_wait(
+                device, on_frame(_stationed_shown), 3, "eg_stationed_check"):
+            max_val, max_loc, h, w = found["match"]
+            cx = max_loc[0] + w // 2
+            cy = max_loc[1] + h // 2
+            log.debug("P%d: stationed found at (%d,%d) %.0f%%, tapping",
+                      priest_num, cx, cy, max_val * 100)
+            logged_tap(device, cx, cy, f"eg_stationed_p{priest_num}")
+            return True
         log.debug("P%d: stationed not found in 3s (normal — proceeding to depart)", priest_num)
         return False
 
+    def _depart_resolved(screen):
+        """The troop deployed (depart screen gone) or the AP popup opened."""
+        return (find_image(screen, "apwindow.png", threshold=0.8) is not None
+                or find_image(screen, "depart.png", threshold=0.75) is None)
+
     def _check_ap_popup_after_depart(priest_num):
         """After tapping depart, check if the game opened the AP Recovery
         popup instead of deploying.  If so, restore AP and retry depart.
         Returns True if troop deployed (or AP restored + re-depart succeeded),
         False if AP popup appeared and could not be resolved."""
-        time.sleep(1.0)  # brief wait for popup or deployment animation
+        timed_wait(device, on_frame(_depart_resolved), 1, "eg_depart_result")
         if not _handle_ap_popup(device, config.AP_COST_EVIL_GUARD):
             return True  # no popup — depart succeeded normally
 
@@ -371,7 +378,7 @@ def rally_eg(device, stop_check=None):
                    2, "eg_ap_restored_depart_wait")
         if tap_image("depart.png", device):
             log.info("P%d: depart tapped after AP restore", priest_num)
-            time.sleep(1.0)
+            timed_wait(device, on_frame(_depart_resolved), 1, "eg_ap_redepart_result")
             # Verify the popup didn't reappear (still not enough AP)
             screen = load_screenshot(device)
             if screen is not None and find_image(screen, "apwindow.png", threshold=0.8):
@@ -539,24 +546,9 @@ def rally_eg(device, stop_check=None):
     log.info("P1: probing EG boss at (%d,%d)", *EG_PRIEST_POSITIONS[0])
 
     # P1 was already tapped above (eg_boss_on_map) — verify dialog opened
-    p1_hit = False
-    start = time.time()
-    while time.time() - start < 3:
-        screen = load_screenshot(device)
-        if screen is not None and checked_img is not None:
-            result = cv2.matchTemplate(screen, checked_img, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            if max_val > 0.8:
-                p1_hit = True
-                break
-        unchecked_tmpl = get_template("elements/unchecked.png")
-        if screen is not None and unchecked_tmpl is not None:
-            result = cv2.matchTemplate(screen, unchecked_tmpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            if max_val > 0.8:
-                p1_hit = True
-                break
-        time.sleep(0.5)
+    p1_hit = timed_wait(
+        device, on_frame(lambda s: _dialog_box(s, checked_img, unchecked_img) is not None),
+        3, "eg_p1_dialog_confirm")
 
     attacks_completed = 0
     priests_dead = 0       # priests confirmed dead (attacked by us OR already dead)
@@ -606,7 +598,7 @@ def rally_eg(device, stop_check=None):
             if not click_depart_with_fallback(pnum):
                 log.warning("P%d: depart failed — skipping", pnum)
                 continue
-            timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+            timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                        1, "eg_depart_to_map")
             config.set_device_status(device, f"Killing Dark Priest ({pnum}/5)...")
             if not poll_troop_ready(60, pnum):
@@ -661,7 +653,7 @@ def rally_eg(device, stop_check=None):
             rev_end_x = max(50, min(1030, center_x - accumulated_nudge_dx))
             rev_end_y = max(50, min(1870, center_y - accumulated_nudge_dy))
             adb_swipe(device, center_x, center_y, rev_end_x, rev_end_y, 1000)
-            time.sleep(0.5)
+            timed_wait(device, on_settled(), 0.5, "eg_nudge_settle")
             accumulated_nudge_dx = 0
             accumulated_nudge_dy = 0
 
@@ -673,7 +665,7 @@ def rally_eg(device, stop_check=None):
 
         log.info("P%d retry: nudging camera by (%+d, %+d)", pnum, nudge_dx, nudge_dy)
         adb_swipe(device, center_x, center_y, end_x, end_y, 1000)
-        time.sleep(0.5)
+        timed_wait(device, on_settled(), 0.5, "eg_nudge_settle")
         accumulated_nudge_dx = nudge_dx
         accumulated_nudge_dy = nudge_dy
 
@@ -695,7 +687,7 @@ def rally_eg(device, stop_check=None):
                 log.warning("P%d retry: depart failed — skipping", pnum)
                 priests_dead += 1
                 continue
-            timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+            timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                        1, "eg_depart_to_map")
             config.set_device_status(device, f"Killing Dark Priest ({pnum}/5)...")
             if not poll_troop_ready(60, pnum):
@@ -748,7 +740,7 @@ def rally_eg(device, stop_check=None):
         rev_end_x = max(50, min(1030, center_x - accumulated_nudge_dx))
         rev_end_y = max(50, min(1870, center_y - accumulated_nudge_dy))
         adb_swipe(device, center_x, center_y, rev_end_x, rev_end_y, 1000)
-        time.sleep(0.5)
+        timed_wait(device, on_settled(), 0.5, "eg_nudge_settle")
 
     # Dismiss dialog from previous priest
     if not dismiss_and_verify_map(6):
@@ -795,39 +787,25 @@ def rally_eg(device, stop_check=None):
     # P6 uses a two-tap sequence: tap EG boss, then tap attack confirm.
     # Verify the dialog opened by checking for depart/checked/unchecked/defending.
     # Retry the sequence up to 3 times if the taps don't register.
+    def _p6_dialog_shown(s):
+        if find_image(s, "depart.png", threshold=0.75):
+            return True
+        if find_image(s, "defending.png", threshold=0.8):
+            log.debug("P6: dialog detected via defending.png")
+            return True
+        return _dialog_box(s, checked_img, unchecked_img) is not None
+
     p6_dialog_opened = False
     for p6_attempt in range(3):
         logged_tap(device, x6, y6, "eg_final_priest")
-        timed_wait(device, lambda: check_screen(device) != Screen.MAP,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) != Screen.MAP),
                    1, "eg_p6_boss_tap")
         logged_tap(device, 421, 1412, "eg_final_attack")
         timed_wait(device, _dialog_visible, 1, "eg_p6_attack_dialog")
 
         # Verify the attack dialog appeared
-        for _ in range(4):
-            s = load_screenshot(device)
-            if s is not None:
-                if find_image(s, "depart.png", threshold=0.75):
-                    p6_dialog_opened = True
-                    break
-                if find_image(s, "defending.png", threshold=0.8):
-                    p6_dialog_opened = True
-                    log.debug("P6: dialog detected via defending.png")
-                    break
-                if checked_img is not None:
-                    result = cv2.matchTemplate(s, checked_img, cv2.TM_CCOEFF_NORMED)
-                    _, max_val, _, _ = cv2.minMaxLoc(result)
-                    if max_val > 0.8:
-                        p6_dialog_opened = True
-                        break
-                unchecked_tmpl = get_template("elements/unchecked.png")
-                if unchecked_tmpl is not None:
-                    result = cv2.matchTemplate(s, unchecked_tmpl, cv2.TM_CCOEFF_NORMED)
-                    _, max_val, _, _ = cv2.minMaxLoc(result)
-                    if max_val > 0.8:
-                        p6_dialog_opened = True
-                        break
-            time.sleep(0.5)
+        p6_dialog_opened = timed_wait(device, on_frame(_p6_dialog_shown), 2,
+                                      "eg_p6_dialog_confirm")
 
         if p6_dialog_opened:
             log.debug("P6: attack dialog confirmed (attempt %d)", p6_attempt + 1)
@@ -886,32 +864,16 @@ def test_eg_positions(device):
     p1_x, p1_y = EG_PRIEST_POSITIONS[0]
     log.info("TEST: tapping EG boss at (%d,%d) to enter priest view", p1_x, p1_y)
     logged_tap(device, p1_x, p1_y, "test_eg_boss")
-    time.sleep(1.5)
 
     results = {}
 
     # Probe P1 — already tapped above, just check if dialog opened
     checked_tmpl = get_template("elements/checked.png")
     unchecked_tmpl = get_template("elements/unchecked.png")
-    p1_hit = False
     save_failure_screenshot(device, "test_probe_P1_BEFORE")
-    start = time.time()
-    while time.time() - start < 3:
-        screen = load_screenshot(device)
-        if screen is not None:
-            if checked_tmpl is not None:
-                result = cv2.matchTemplate(screen, checked_tmpl, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, _ = cv2.minMaxLoc(result)
-                if max_val > 0.8:
-                    p1_hit = True
-                    break
-            if unchecked_tmpl is not None:
-                result = cv2.matchTemplate(screen, unchecked_tmpl, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, _ = cv2.minMaxLoc(result)
-                if max_val > 0.8:
-                    p1_hit = True
-                    break
-        time.sleep(0.5)
+    p1_hit = timed_wait(
+        device, on_frame(lambda s: _dialog_box(s, checked_tmpl, unchecked_tmpl) is not None),
+        4.5, "test_eg_p1_dialog")
 
     results["P1"] = p1_hit
     status = "HIT" if p1_hit else "MISS"
@@ -921,7 +883,7 @@ def test_eg_positions(device):
     # Dismiss P1 dialog if hit
     if p1_hit:
         logged_tap(device, 75, 75, "test_dismiss_P1")
-        time.sleep(1)
+        timed_wait(device, on_settled(device), 1, "test_eg_dismiss")
 
     # Probe P2-P5
     for i in range(1, 5):
@@ -931,7 +893,7 @@ def test_eg_positions(device):
 
         # Dismiss any leftover dialog
         logged_tap(device, 75, 75, f"test_dismiss_before_{label}")
-        time.sleep(1)
+        timed_wait(device, on_settled(device), 1, "test_eg_dismiss")
 
         hit = _probe_priest(device, x, y, f"test_{label}")
         results[label] = hit
@@ -940,18 +902,18 @@ def test_eg_positions(device):
         # Dismiss dialog if hit (don't attack)
         if hit:
             logged_tap(device, 75, 75, f"test_dismiss_{label}")
-            time.sleep(1)
+            timed_wait(device, on_settled(device), 1, "test_eg_dismiss")
 
     # Probe P6
     p6_x, p6_y = EG_PRIEST_POSITIONS[5]
     logged_tap(device, 75, 75, "test_dismiss_before_P6")
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "test_eg_dismiss")
     hit = _probe_priest(device, p6_x, p6_y, "test_P6")
     results["P6"] = hit
     log.info("TEST P6 (%d,%d): %s", p6_x, p6_y, "HIT" if hit else "MISS")
     if hit:
         logged_tap(device, 75, 75, "test_dismiss_P6")
-        time.sleep(1)
+        timed_wait(device, on_settled(device), 1, "test_eg_dismiss")
 
     # Summary
     hits = sum(1 for v in results.values() if v)
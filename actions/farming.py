@@ -1,6 +1,6 @@
 """Gold mining and mithril gathering actions.
 
-Leaf module — no dependencies on other action submodules.
+Dependencies: _helpers (for _shows)
 
 Key exports:
     mine_mithril       — full mithril recall+redeploy cycle
@@ -16,13 +16,15 @@ import numpy as np
 import config
 from config import Screen
 from botlog import get_logger, timed_action
-from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image,
+from vision import (tap_image, wait_for_image_and_tap, timed_wait, on_frame,
+                    on_settled, load_screenshot, Regions,
                     adb_tap, adb_swipe, logged_tap,
                     save_failure_screenshot)
 from navigation import navigate, check_screen
 from troops import troops_avail, heal_all
 
+from actions._helpers import _shows
+
 _log = get_logger("actions")
 
 
@@ -49,22 +51,31 @@ _OCCUPIED_CHECK_OFFSET_Y = (-180, -60)   # y range relative to mine center
 _OCCUPIED_CHECK_OFFSET_X = (-80, 80)     # x range relative to mine center
 _OCCUPIED_RED_THRESHOLD = 500            # min red pixels to consider occupied
 
+
+def _occupied_check_box(mine_x, mine_y):
+    """(x1, y1, x2, y2) above a mine where the swords icon appears."""
+    return (max(0, mine_x + _OCCUPIED_CHECK_OFFSET_X[0]),
+            max(0, mine_y + _OCCUPIED_CHECK_OFFSET_Y[0]),
+            mine_x + _OCCUPIED_CHECK_OFFSET_X[1],
+            mine_y + _OCCUPIED_CHECK_OFFSET_Y[1])
+
+
+# The only pixels the mine scan reads — one box per mine, by index
+_MINES_ROI = Regions(**{f"mine{i}": _occupied_check_box(x, y)
+                        for i, (x, y) in enumerate(_MITHRIL_MINES)})
+
 _MITHRIL_SEARCH_BTN = (410, 1380)       # blue SEARCH button below mines
 _MAX_SEARCH_REFRESHES = 3               # max times to refresh for safe mines
 
 
-def _is_mine_occupied(screen, mine_x, mine_y):
+def _is_mine_occupied(region):
     """Check if a mine has the red crossed-swords icon indicating enemy occupation.
 
-    Scans a region above the mine center for bright red pixels (the swords icon
-    is a red circle with crossed swords).  Returns True if enough red pixels are
-    found, meaning the mine is occupied by an enemy and should be skipped.
+    ``region`` is the box above the mine center (_occupied_check_box, read
+    via _MINES_ROI).  The swords icon is a red circle with crossed swords;
+    returns True if enough bright red pixels are found, meaning the mine is
+    occupied by an enemy and should be skipped.
     """
-    y1 = max(0, mine_y + _OCCUPIED_CHECK_OFFSET_Y[0])
-    y2 = min(screen.shape[0], mine_y + _OCCUPIED_CHECK_OFFSET_Y[1])
-    x1 = max(0, mine_x + _OCCUPIED_CHECK_OFFSET_X[0])
-    x2 = min(screen.shape[1], mine_x + _OCCUPIED_CHECK_OFFSET_X[1])
-    region = screen[y1:y2, x1:x2]
     if region.size == 0:
         return False
     # Red swords icon: high R, low G, low B (OpenCV uses BGR)
@@ -97,8 +108,8 @@ def mine_mithril(device, stop_check=None):
     # Step 2: Scroll kingdom screen to bottom (multiple swipes for reliability)
     for _ in range(3):
         adb_swipe(device, 540, 960, 540, 400, duration_ms=300)
-        timed_wait(device, lambda: False, 0.5, "mithril_scroll_settle")
-    timed_wait(device, lambda: False, 1, "mithril_scroll_done")
+        timed_wait(device, on_settled(), 0.5, "mithril_scroll_settle")
+    timed_wait(device, on_settled(), 1, "mithril_scroll_done")
 
     if _stopped():
         log.info("Mithril mining aborted (stopped)")
@@ -107,11 +118,11 @@ def mine_mithril(device, stop_check=None):
 
     # Step 3: Tap Dimensional Tunnel
     logged_tap(device, 280, 880, "dimensional_tunnel")
-    timed_wait(device, lambda: False, 2, "mithril_tunnel_open")
+    timed_wait(device, on_settled(device), 2, "mithril_tunnel_open")
 
     # Step 4: Tap Advanced Mithril (center of screen)
     logged_tap(device, 540, 960, "advanced_mithril")
-    timed_wait(device, lambda: False, 2, "mithril_advanced_open")
+    timed_wait(device, on_settled(device), 2, "mithril_advanced_open")
 
     # Clear deploy timer — troops are about to be recalled
     config.MITHRIL_DEPLOY_TIME.pop(device, None)
@@ -130,17 +141,17 @@ def mine_mithril(device, stop_check=None):
         if _stopped():
             break
         adb_tap(device, slot_x, _MITHRIL_SLOT_Y)
-        timed_wait(device, lambda: False, 1, "mithril_slot_tap")
+        timed_wait(device, _shows("mithril_return.png"), 1, "mithril_slot_tap")
         if wait_for_image_and_tap("mithril_return.png", device, timeout=2, threshold=0.7):
             log.debug("Recall slot %d: RETURN found, recalled", 5 - i)
             recalled_count += 1
-            timed_wait(device, lambda: False, 1.5, "mithril_recall_anim")
+            timed_wait(device, on_settled(device), 1.5, "mithril_recall_anim")
         else:
             log.debug("Recall slot %d: empty or plundered, skipping", 5 - i)
 
     if recalled_count > 0:
         log.info("Recalled %d troops from mithril mines", recalled_count)
-        timed_wait(device, lambda: False, 1, "mithril_recall_settle")
+        timed_wait(device, on_settled(), 1, "mithril_recall_settle")
 
     if _stopped():
         log.info("Mithril mining aborted after recall (stopped)")
@@ -159,14 +170,14 @@ def mine_mithril(device, stop_check=None):
         if _stopped() or deployed_count >= max_deploys:
             break
 
-        # Screenshot and find safe (unoccupied) mines on this page
-        screen = load_screenshot(device)
-        if screen is None:
+        # Capture the icon boxes and find safe (unoccupied) mines on this page
+        crops = load_screenshot(device, regions=_MINES_ROI)
+        if crops is None:
             log.warning("Screenshot failed — skipping mine scan")
             break
         safe_mines = []
         for i, (mine_x, mine_y) in enumerate(_MITHRIL_MINES):
-            if _is_mine_occupied(screen, mine_x, mine_y):
+            if _is_mine_occupied(crops[f"mine{i}"]):
                 log.debug("Mine %d (%d, %d): enemy occupied — skipping",
                           i + 1, mine_x, mine_y)
             else:
@@ -182,7 +193,7 @@ def mine_mithril(device, stop_check=None):
             log.debug("Deploying to mine %d at (%d, %d)",
                       mine_idx + 1, mine_x, mine_y)
             adb_tap(device, mine_x, mine_y)
-            timed_wait(device, lambda: False, 3, "mithril_mine_popup")
+            timed_wait(device, _shows("mithril_attack.png"), 3, "mithril_mine_popup")
 
             # Look for ATTACK button in the mine popup
             if not wait_for_image_and_tap(
@@ -193,16 +204,16 @@ def mine_mithril(device, stop_check=None):
                     log.info("Mine %d: no ATTACK button, no troops available",
                              mine_idx + 1)
                     adb_tap(device, 900, 500)
-                    timed_wait(device, lambda: False, 1,
+                    timed_wait(device, on_settled(device), 1,
                                "mithril_dismiss_no_attack")
                     break
                 log.warning("Mine %d: no ATTACK button (missed tap?)",
                             mine_idx + 1)
                 adb_tap(device, 900, 500)
-                timed_wait(device, lambda: False, 1,
+                timed_wait(device, on_settled(device), 1,
                            "mithril_dismiss_occupied")
                 continue
-            timed_wait(device, lambda: False, 2, "mithril_attack_to_depart")
+            timed_wait(device, _shows("mithril_depart.png"), 2, "mithril_attack_to_depart")
 
             # Wait for troop selection screen and tap DEPART
             if wait_for_image_and_tap(
@@ -210,14 +221,14 @@ def mine_mithril(device, stop_check=None):
                 deployed_count += 1
                 if deployed_count == 1:
                     config.MITHRIL_DEPLOY_TIME[device] = time.time()
-                timed_wait(device, lambda: False, 2, "mithril_deploy_anim")
+                timed_wait(device, on_settled(device), 2, "mithril_deploy_anim")
             else:
                 log.warning("Mine %d: depart not found after ATTACK",
                             mine_idx + 1)
                 save_failure_screenshot(
                     device, f"mithril_depart_fail_mine{mine_idx+1}")
                 adb_tap(device, 900, 500)
-                timed_wait(device, lambda: False, 1,
+                timed_wait(device, on_settled(device), 1,
                            "mithril_dismiss_depart_fail")
 
         # If still more troops to deploy, SEARCH for a fresh page
@@ -227,7 +238,7 @@ def mine_mithril(device, stop_check=None):
             log.info("Deployed %d/%d so far — refreshing mines",
                      deployed_count, max_deploys)
             adb_tap(device, *_MITHRIL_SEARCH_BTN)
-            timed_wait(device, lambda: False, 3, "mithril_search_refresh")
+            timed_wait(device, on_settled(device), 3, "mithril_search_refresh")
 
     log.info("Deployed %d/%d troops to mithril mines",
              deployed_count, max_deploys)
@@ -314,11 +325,11 @@ def gather_gold(device, stop_check=None):
 
     # Step 1: Open search menu
     logged_tap(device, 900, 1800, "gather_search_btn")
-    timed_wait(device, lambda: False, 1.0, "gather_search_menu_open")
+    timed_wait(device, on_settled(device), 1.0, "gather_search_menu_open")
 
     # Step 2: Tap gather/resource tab
     logged_tap(device, 540, 570, "gather_tab")
-    timed_wait(device, lambda: False, 0.8, "gather_tab_load")
+    timed_wait(device, on_settled(device), 0.8, "gather_tab_load")
 
     # Step 3: Set mine level
     _set_gather_level(device, config.get_device_config(device, "gather_mine_level"))
@@ -330,7 +341,7 @@ def gather_gold(device, stop_check=None):
     logged_tap(device, 670, 1390, "gather_search_execute")
     timed_wait(
         device,
-        lambda: check_screen(device) == Screen.MAP,
+        on_frame(lambda s: check_screen(device, s) == Screen.MAP),
         3, "gather_search_complete")
 
     # Dismiss any popup
@@ -351,7 +362,7 @@ def gather_gold(device, stop_check=None):
 
         # Step 5: Tap the mine on the map (always centered after search)
         logged_tap(device, 540, 900, "gold_mine_on_map")
-        timed_wait(device, lambda: False, 3, "gold_mine_select")
+        timed_wait(device, _shows("gather.png", threshold=0.8), 3, "gold_mine_select")
 
         # Step 6: Tap Gather button (template match — position varies with popup)
         if not wait_for_image_and_tap("gather.png", device, timeout=5, threshold=0.8):
@@ -16,17 +16,18 @@ import os
 import re
 
 import config
+import state_store
 from config import QuestType, Screen
 from botlog import get_logger, timed_action, stats
-from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image, get_template,
+from vision import (tap_image, wait_for_image_and_tap, timed_wait, on_frame,
+                    on_settled, load_screenshot, find_image, get_template,
                     logged_tap, save_failure_screenshot,
                     tap_tower_until_attack_menu)
 from navigation import navigate, check_screen, DEBUG_DIR
 from troops import (troops_avail, heal_all, read_panel_statuses,
                     get_troop_status, TroopAction)
 
-from actions._helpers import _interruptible_sleep, _last_depart_slot
+from actions._helpers import _interruptible_sleep, _last_depart_slot, _shows
 
 _log = get_logger("actions")
 
@@ -60,6 +61,14 @@ _pvp_last_dispatch = {}   # {device: timestamp}
 _PVP_COOLDOWN_S = 600     # 10 minutes
 
 
+def _publish_quest_state(device):
+    """Push the device's quest tracking state to the dashboard state store."""
+    state_store.publish(("devices", device, "quests"),
+                        get_quest_tracking_state(device, with_age=False))
+    state_store.publish(("devices", device, "quest_checked_at"),
+                        _quest_last_checked.get(device))
+
+
 def _track_quest_progress(device, quest_type, current, target=None):
     """Update pending rally count based on OCR counter progress.
     When the counter advances, we know some pending rallies completed."""
@@ -97,6 +106,7 @@ def _track_quest_progress(device, quest_type, current, target=None):
             _log.warning("[%s] Pending rallies timed out after %.0fs — resetting", quest_type, elapsed)
             _quest_rallies_pending[key] = 0
             _quest_pending_since.pop(key, None)
+    _publish_quest_state(device)
 
 
 def _record_rally_started(device, quest_type):
@@ -112,6 +122,7 @@ def _record_rally_started(device, quest_type):
         _quest_pending_since[key] = time.time()
     _log.info("[%s] Rally started — %d pending (slot=%s)", quest_type,
               _quest_rallies_pending[key], slot_id)
+    _publish_quest_state(device)
 
 
 def _effective_remaining(device, quest_type, current, target):
@@ -122,13 +133,16 @@ def _effective_remaining(device, quest_type, current, target):
     return max(0, base_remaining - pending)
 
 
-def get_quest_tracking_state(device):
+def get_quest_tracking_state(device, with_age=True):
     """Return quest tracking info for a device (for web dashboard).
 
     Returns a list of dicts, one per tracked quest type::
 
         [{"quest_type": "titan", "last_seen": 5, "pending": 2,
           "pending_age": 45.2}, ...]
+
+    ``with_age=False`` leaves out ``pending_age`` so the rows only change
+    when tracking does (used for the dashboard state store).
     """
     result = []
     seen_types = set()
@@ -136,25 +150,29 @@ def get_quest_tracking_state(device):
         if dev != device:
             continue
         seen_types.add(qtype)
-        since = _quest_pending_since.get((dev, qtype))
-        result.append({
+        row = {
             "quest_type": str(qtype),
             "last_seen": _quest_last_seen.get((dev, qtype)),
             "target": _quest_target.get((dev, qtype)),
             "pending": count,
-            "pending_age": round(time.time() - since, 1) if since else None,
-        })
+        }
+        if with_age:
+            since = _quest_pending_since.get((dev, qtype))
+            row["pending_age"] = round(time.time() - since, 1) if since else None
+        result.append(row)
     # Include quest types with a last_seen but no pending
     for (dev, qtype), last in list(_quest_last_seen.items()):
         if dev != device or qtype in seen_types:
             continue
-        result.append({
+        row = {
             "quest_type": str(qtype),
             "last_seen": last,
             "target": _quest_target.get((dev, qtype)),
             "pending": 0,
-            "pending_age": None,
-        })
+        }
+        if with_age:
+            row["pending_age"] = None
+        result.append(row)
     return result
 
 
@@ -170,6 +188,8 @@ def reset_quest_tracking(device=None):
     """Clear rally tracking state. If device is given, clear only that device's state.
     If device is None, clear all state (backwards compatible)."""
     if device is None:
+        devices = ({key[0] for key in _quest_last_seen} | {key[0] for key in _quest_rallies_pending}
+                   | set(_quest_last_checked))
         _quest_rallies_pending.clear()
         _quest_last_seen.clear()
         _quest_target.clear()
@@ -179,6 +199,8 @@ def reset_quest_tracking(device=None):
         _tower_quest_state.clear()
         _pvp_last_dispatch.clear()
         _quest_last_checked.clear()
+        for d in devices:
+            _publish_quest_state(d)
     else:
         for d in list(_quest_rallies_pending):
             if d[0] == device:
@@ -199,6 +221,7 @@ def reset_quest_tracking(device=None):
         _tower_quest_state.pop(device, None)
         _pvp_last_dispatch.pop(device, None)
         _quest_last_checked.pop(device, None)
+        _publish_quest_state(device)
 
 
 # ---- Quest OCR helpers ----
@@ -240,7 +263,7 @@ def _ocr_quest_rows(device):
     cv2.imwrite(os.path.join(DEBUG_DIR, "aq_ocr_crop.png"), gray)
 
     from vision import ocr_read
-    results = ocr_read(gray, detail=0)
+    results = ocr_read(gray, detail=0, device=device)
     raw_text = " ".join(results)
     log.debug("Quest OCR raw: %s", raw_text)
 
@@ -384,7 +407,7 @@ def _claim_quest_rewards(device, stop_check=None):
         if stop_check and stop_check():
             return -1
         timed_wait(device,
-                   lambda: check_screen(device) == Screen.ALLIANCE_QUEST,
+                   on_frame(lambda s: check_screen(device, s) == Screen.ALLIANCE_QUEST),
                    1, "aq_claim_settle")
     if rewards_claimed:
         log.info("Claimed %d quest reward(s)", rewards_claimed)
@@ -598,6 +621,7 @@ def _wait_for_rallies(device, stop_check):
                     _quest_rally_slots.pop(key, None)
             elapsed = time.time() - wait_start
             log.warning("No rallying troops on panel — cleared %d phantom pending (%.1fs)", cleared, elapsed)
+            _publish_quest_state(device)
             stats.record_action(device, "rally_false_positive_cleared", True, elapsed)
         return
 
@@ -651,7 +675,7 @@ def _recall_stray_stationed(device, stop_check=None):
     if not tap_image("statuses/stationing.png", device):
         log.warning("Stationed recall: stationing icon not found on panel")
         return
-    time.sleep(1.5)
+    timed_wait(device, on_settled(device), 1.5, "stationed_recall_center")
 
     if stop_check and stop_check():
         return
@@ -661,7 +685,7 @@ def _recall_stray_stationed(device, stop_check=None):
         log.warning("Stationed recall: stationed.png not found on map")
         save_failure_screenshot(device, "stationed_recall_no_marker")
         return
-    time.sleep(1)
+    timed_wait(device, _shows("return.png", threshold=0.8), 1, "stationed_recall_menu")
 
     # Tap return button
     if wait_for_image_and_tap("return.png", device, timeout=3):
@@ -711,6 +735,7 @@ def check_quests(device, stop_check=None):
     # Try OCR-based quest detection
     quests = _ocr_quest_rows(device)
     _quest_last_checked[device] = time.time()
+    _publish_quest_state(device)
 
     if quests is not None:
         original_count = len(quests)
@@ -865,7 +890,9 @@ def _attack_pvp_tower(device, stop_check=None):
         return False
 
     # Wait for troop deployment panel to animate in after attack button tap
-    time.sleep(2)
+    timed_wait(device, on_frame(
+        lambda s: find_image(s, "depart_pvp.png") is not None
+        or find_image(s, "depart.png") is not None), 2, "pvp_depart_panel")
 
     # Depart — try PVP-specific template first, fall back to rally template.
     # Both panels show "DEPART" but render slightly differently.
@@ -875,7 +902,7 @@ def _attack_pvp_tower(device, stop_check=None):
         save_failure_screenshot(device, "pvp_depart_fail")
         return False
 
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "pvp_depart_anim")
     _pvp_last_dispatch[device] = time.time()
     log.info("PVP: troop dispatched to enemy tower")
     return True
@@ -929,21 +956,12 @@ def _navigate_to_tower(device):
     if not tap_image("target_menu.png", device):
         log.warning("Tower nav: target_menu.png not found")
         return False
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "tower_target_menu_open")
 
-    # Tap the Friend tab (tower marker is stored here)
+    # Tap the Friend tab (tower marker is stored here), then check that a
+    # friend marker exists
     logged_tap(device, 540, 330, "tower_target_friend_tab")
-    time.sleep(1)
-
-    # Check that a friend marker exists
-    marker_found = False
-    start_time = time.time()
-    while time.time() - start_time < 3:
-        screen = load_screenshot(device)
-        if screen is not None and find_image(screen, "friend_marker.png", threshold=0.7):
-            marker_found = True
-            break
-        time.sleep(0.5)
+    marker_found = timed_wait(device, _shows("friend_marker.png"), 4, "tower_friend_marker")
 
     if not marker_found:
         log.warning("Tower nav: no friend marker found — is the tower marked?")
@@ -951,7 +969,7 @@ def _navigate_to_tower(device):
 
     # Tap the target to center map on the tower
     logged_tap(device, 350, 476, "tower_target_select")
-    time.sleep(2)
+    timed_wait(device, on_settled(device), 2, "tower_target_center")
 
     log.info("Navigated to tower via target marker")
     return True
@@ -996,14 +1014,14 @@ def occupy_tower(device, stop_check=None):
     # Tap the tower
     config.set_device_status(device, "Tower Quest: Deploying...")
     logged_tap(device, 540, 900, "tower_tap")
-    time.sleep(1.5)
+    timed_wait(device, _shows("reinforce_button.png", threshold=0.8), 1.5, "tower_tap_menu")
 
     # Tap reinforce (template match — position varies by tower type)
     if not wait_for_image_and_tap("reinforce_button.png", device, timeout=5):
         log.warning("Reinforce button not found after tower tap")
         save_failure_screenshot(device, "tower_reinforce_missing")
         return False
-    time.sleep(1)
+    timed_wait(device, _shows("depart.png", threshold=0.8), 1, "tower_reinforce_depart")
 
     if stop_check and stop_check():
         return False
@@ -1027,7 +1045,7 @@ def _recall_tap_sequence(device, log, stop_check=None):
     """
     # Tap the tower (centered on screen after defending icon tap)
     logged_tap(device, 540, 900, "recall_tower_tap")
-    time.sleep(1.5)
+    timed_wait(device, _shows("detail_button.png", threshold=0.8), 1.5, "recall_tower_tap_menu")
 
     if stop_check and stop_check():
         return False
@@ -1037,24 +1055,24 @@ def _recall_tap_sequence(device, log, stop_check=None):
         log.warning("Tower recall: detail_button.png not found after tower tap")
         save_failure_screenshot(device, "recall_tower_no_detail")
         return False
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "recall_tower_detail")
 
     if stop_check and stop_check():
         return False
 
     # Recall troops button
     logged_tap(device, 180, 330, "recall_troops_btn")
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "recall_troops_dialog")
 
     # Red Confirm button
     logged_tap(device, 315, 1080, "recall_confirm")
-    time.sleep(0.5)
+    timed_wait(device, on_settled(device), 0.5, "recall_confirm")
 
     # Close dialogs
     tap_image("close_x.png", device)
-    time.sleep(0.5)
+    timed_wait(device, on_settled(device), 0.5, "recall_close")
     logged_tap(device, 540, 900, "recall_dismiss")
-    time.sleep(1)
+    timed_wait(device, on_settled(device), 1, "recall_dismiss")
     return True
 
 
@@ -1089,7 +1107,7 @@ def recall_tower_troop(device, stop_check=None):
         if not tap_image("statuses/defending.png", device):
             log.warning("Tower recall: no defending icon on panel")
             return False
-        time.sleep(2)  # wait for map centering animation
+        timed_wait(device, on_settled(device), 2, "recall_tower_center")
 
         _recall_tap_sequence(device, log, stop_check)
 
@@ -1109,7 +1127,7 @@ def recall_tower_troop(device, stop_check=None):
         return False
     log.info("Tower recall: trying friend marker navigation")
     if _navigate_to_tower(device):
-        time.sleep(1)
+        timed_wait(device, on_settled(), 1, "recall_tower_nav_settle")
         _recall_tap_sequence(device, log, stop_check)
 
         if navigate(Screen.MAP, device):
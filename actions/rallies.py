@@ -1,6 +1,6 @@
 """Rally joining, war rallies, and rally owner blacklist.
 
-Dependencies: _helpers (for _last_depart_slot)
+Dependencies: _helpers (for _last_depart_slot, _shows)
 
 Key exports:
     join_rally           — join a rally by type(s) on war screen
@@ -16,8 +16,8 @@ import re
 import config
 from config import QuestType, RallyType, Screen
 from botlog import get_logger, timed_action, stats
-from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image, get_last_best,
+from vision import (tap_image, wait_for_image_and_tap, timed_wait, on_frame,
+                    on_settled, load_screenshot, find_image, get_last_best,
                     find_all_matches, get_template,
                     adb_tap, adb_swipe, logged_tap,
                     save_failure_screenshot)
@@ -25,7 +25,7 @@ from navigation import navigate, check_screen, DEBUG_DIR
 from troops import (troops_avail, heal_all, read_panel_statuses,
                     TroopAction, capture_departing_portrait)
 
-from actions._helpers import _last_depart_slot
+from actions._helpers import _last_depart_slot, _shows
 
 _log = get_logger("actions")
 
@@ -134,7 +134,7 @@ def reset_rally_blacklist(device=None):
 # Known error patterns that indicate a permanent/zone-based failure:
 _RALLY_ERROR_KEYWORDS = ["cannot", "protected", "march", "zone"]
 
-def _ocr_error_banner(screen):
+def _ocr_error_banner(screen, device=None):
     """OCR the error banner area (upper-center of the map screen).
     Returns the error text if it matches known error patterns, else empty string."""
     if screen is None:
@@ -150,7 +150,7 @@ def _ocr_error_banner(screen):
     gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
 
     from vision import ocr_read
-    results = ocr_read(gray, detail=0)
+    results = ocr_read(gray, detail=0, device=device)
     text = " ".join(results).strip().lower()
     if not text:
         return ""
@@ -222,7 +222,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
         for attempt in range(3):
             # Try close button first
             tap_image("close_x.png", device)
-            timed_wait(device, lambda: check_screen(device) == Screen.WAR,
+            timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.WAR),
                        3.0, "jr_backout_close_x")
 
             # Check where we are before continuing
@@ -273,7 +273,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
         gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
 
         from vision import ocr_read
-        results = ocr_read(gray, detail=0)
+        results = ocr_read(gray, detail=0, device=device)
         return " ".join(results).lower()
 
     def _ocr_rally_owner(screen, join_y):
@@ -308,7 +308,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
         cv2.imwrite(os.path.join(_debug_dir, f"owner_thresh_y{join_y}.png"), upscaled)
 
         from vision import ocr_read
-        results = ocr_read(upscaled, detail=0)
+        results = ocr_read(upscaled, detail=0, device=device)
         raw = " ".join(results).strip()
 
         if raw:
@@ -422,27 +422,20 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
                     h, w = join_btn.shape[:2]
                     log.debug("Clicking join at (%d, %d)", join_x + w // 2, join_y + h // 2)
                     adb_tap(device, join_x + w // 2, join_y + h // 2)
-                    timed_wait(device, lambda: False, 1, "jr_detail_load")
+                    timed_wait(device,
+                               on_frame(lambda s: find_image(s, "depart.png", threshold=0.75) is not None),
+                               1, "jr_detail_load")
 
                     # Wait for rally detail screen to load — check for depart.png
                     # as the definitive signal, then look for slot or full indicators
-                    slot_found = False
-                    rally_full = False
-                    detail_loaded = False
-                    last_screen = None
-                    start_time = time.time()
-                    while time.time() - start_time < 6:
-                        if stop_check and stop_check():
-                            return False
-                        s = load_screenshot(device)
-                        if s is None:
-                            time.sleep(0.5)
-                            continue
-                        last_screen = s
+                    seen = {"slot": None, "full": False, "detail_loaded": False, "screen": None}
+
+                    def _slot_or_full(s):
+                        seen["screen"] = s
 
                         # Check for depart button — confirms detail screen loaded
-                        if not detail_loaded and find_image(s, "depart.png", threshold=0.75):
-                            detail_loaded = True
+                        if not seen["detail_loaded"] and find_image(s, "depart.png", threshold=0.75):
+                            seen["detail_loaded"] = True
 
                         # Check for empty slot BEFORE full_rally — a rally can
                         # show full_rally.png while still having an open slot
@@ -456,19 +449,27 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
                             if match:
                                 log.debug("slot.png matched at 0.5 threshold (%.0f%%)", get_last_best() * 100)
                         if match:
-                            max_val, max_loc, sh, sw = match
-                            cx = max_loc[0] + sw // 2
-                            cy = max_loc[1] + sh // 2
-                            log.debug("Found slot at (%d, %d), confidence %.0f%%", cx, cy, max_val * 100)
-                            adb_tap(device, cx, cy)
-                            slot_found = True
-                            break
+                            seen["slot"] = match
+                            return True
 
                         # Only check full_rally after confirming no open slot
-                        if find_image(s, "full_rally.png", threshold=0.8):
-                            rally_full = True
-                            break
-                        time.sleep(0.5)
+                        seen["full"] = find_image(s, "full_rally.png", threshold=0.8) is not None
+                        return seen["full"]
+
+                    timed_wait(device, on_frame(_slot_or_full), 6, "jr_slot_or_full",
+                               stop_check=stop_check)
+                    if stop_check and stop_check():
+                        return False
+                    slot_found = seen["slot"] is not None
+                    rally_full = seen["full"]
+                    detail_loaded = seen["detail_loaded"]
+                    last_screen = seen["screen"]
+                    if slot_found:
+                        max_val, max_loc, sh, sw = seen["slot"]
+                        cx = max_loc[0] + sw // 2
+                        cy = max_loc[1] + sh // 2
+                        log.debug("Found slot at (%d, %d), confidence %.0f%%", cx, cy, max_val * 100)
+                        adb_tap(device, cx, cy)
 
                     if rally_full:
                         log.warning("Rally is full — backing out to try others")
@@ -504,7 +505,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
                 if not slot_found:
                     continue  # No slot for this type → try next rally_type
 
-                timed_wait(device, lambda: False, 1, "jr_slot_to_depart")
+                timed_wait(device, on_settled(device), 1, "jr_slot_to_depart")
                 # Capture which troop is selected before depart for slot tracking
                 try:
                     portrait_result = capture_departing_portrait(device)
@@ -515,7 +516,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
                     log.debug("Portrait capture failed — proceeding without slot tracking")
                 if tap_image("depart.png", device):
                     # Verify join succeeded — game should transition to map screen
-                    timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+                    timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                                2, "jr_depart_to_map")
                     current_screen = check_screen(device)
                     if current_screen != Screen.MAP:
@@ -573,7 +574,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
                         # across protected zones"). These flash briefly after failed actions.
                         error_screen = load_screenshot(device)
                         if error_screen is not None and rally_owner:
-                            error_text = _ocr_error_banner(error_screen)
+                            error_text = _ocr_error_banner(error_screen, device)
                             if error_text:
                                 log.warning("In-game error detected: '%s' — blacklisting '%s' immediately",
                                             error_text, rally_owner)
@@ -625,7 +626,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
 
     # Scroll up to top (scroll position persists between visits)
     adb_swipe(device, 560, 300, 560, 1400, 500)
-    timed_wait(device, lambda: False, 1.5, "jr_scroll_up_settle")
+    timed_wait(device, on_settled(), 1.5, "jr_scroll_up_settle")
 
     # Scroll down and check 5 times
     for attempt in range(5):
@@ -634,7 +635,7 @@ def join_rally(rally_types, device, skip_heal=False, stop_check=None):
             return False
         log.debug("Scroll down attempt %d/5", attempt + 1)
         adb_swipe(device, 560, 948, 560, 245, 500)
-        timed_wait(device, lambda: False, 1.5, "jr_scroll_down_settle")
+        timed_wait(device, on_settled(), 1.5, "jr_scroll_down_settle")
 
         # If no join buttons in the bottom quarter of the screen, we've
         # scrolled past all rallies into the marches section — stop early
@@ -692,7 +693,7 @@ def join_war_rallies(device):
         """Back out with (1010,285), verify we're still on war screen, then retry."""
         log.warning("%s — backing out", reason)
         adb_tap(device, 1010, 285)
-        time.sleep(1)
+        timed_wait(device, on_settled(device), 1, "rally_backout")
         if not _on_war_screen(device):
             log.warning("No longer on war screen after backout — aborting")
             return False
@@ -704,7 +705,7 @@ def join_war_rallies(device):
                 log.warning("No longer on war screen — aborting")
                 return False
             adb_swipe(device, 560, 948, 560, 245, 500)
-            time.sleep(1)
+            timed_wait(device, on_settled(), 1, "rally_backout_scroll_settle")
         return check_all_rallies_on_screen()
 
     def check_all_rallies_on_screen():
@@ -736,43 +737,38 @@ def join_war_rallies(device):
                         adb_tap(device, join_x + w // 2, join_y + h // 2)
 
                         # Wait for an open slot, also check for titan error or full rally
-                        slot_found = False
-                        need_backout = False
-                        backout_reason = None
-                        last_screen = None
-                        start_time = time.time()
-                        while time.time() - start_time < 5:
-                            s = load_screenshot(device)
-                            if s is None:
-                                time.sleep(0.5)
-                                continue
-                            last_screen = s
+                        seen = {"slot": None, "backout": None, "screen": None}
+
+                        def _slot_or_backout(s):
+                            seen["screen"] = s
                             if find_image(s, "titanrally_error.png", threshold=0.8):
-                                need_backout = True
-                                backout_reason = "Titan rally detected"
-                                break
+                                seen["backout"] = "Titan rally detected"
+                                return True
                             if find_image(s, "full_rally.png", threshold=0.8):
-                                need_backout = True
-                                backout_reason = "Rally is full"
-                                break
+                                seen["backout"] = "Rally is full"
+                                return True
                             # Check for empty slot — try normal threshold, then lower
                             match = find_image(s, "slot.png", threshold=0.8)
                             if match is None:
                                 match = find_image(s, "slot.png", threshold=0.65)
                                 if match:
                                     log.debug("slot.png matched at lower threshold (%.0f%%)", get_last_best() * 100)
-                            if match:
-                                max_val, max_loc, sh, sw = match
-                                cx = max_loc[0] + sw // 2
-                                cy = max_loc[1] + sh // 2
-                                log.debug("Found slot at (%d, %d), confidence %.0f%%", cx, cy, max_val * 100)
-                                adb_tap(device, cx, cy)
-                                slot_found = True
-                                break
-                            time.sleep(0.5)
-
-                        if need_backout:
-                            return _backout_and_retry(backout_reason)
+                            seen["slot"] = match
+                            return match is not None
+
+                        timed_wait(device, on_frame(_slot_or_backout), 5, "rally_slot_or_full")
+                        last_screen = seen["screen"]
+
+                        if seen["backout"]:
+                            return _backout_and_retry(seen["backout"])
+
+                        slot_found = seen["slot"] is not None
+                        if slot_found:
+                            max_val, max_loc, sh, sw = seen["slot"]
+                            cx = max_loc[0] + sw // 2
+                            cy = max_loc[1] + sh // 2
+                            log.debug("Found slot at (%d, %d), confidence %.0f%%", cx, cy, max_val * 100)
+                            adb_tap(device, cx, cy)
 
                         if not slot_found:
                             # Save debug screenshot so we can see the rally detail screen
@@ -781,7 +777,7 @@ def join_war_rallies(device):
                                 _save_debug_screenshot(device, "slot_not_found", last_screen)
                             return _backout_and_retry("No open slot found, rally may be full")
 
-                        time.sleep(1)
+                        timed_wait(device, _shows("depart.png", threshold=0.8), 1, "rally_slot_to_depart")
                         if tap_image("depart.png", device):
                             log.info("Rally joined!")
                             return True
@@ -805,12 +801,12 @@ def join_war_rallies(device):
 
     if should_skip_scroll:
         navigate(Screen.MAP, device)
-        time.sleep(1)
+        timed_wait(device, on_settled(), 1, "rally_skip_scroll_settle")
         return
 
     # Scroll up to top
     adb_swipe(device, 560, 300, 560, 1400, 500)
-    time.sleep(1.5)  # Wait for scroll momentum to settle
+    timed_wait(device, on_settled(), 1.5, "rally_scroll_up_settle")  # scroll momentum
 
     if check_all_rallies_on_screen():
         return
@@ -821,7 +817,7 @@ def join_war_rallies(device):
             log.warning("No longer on war screen — aborting scroll loop")
             return
         adb_swipe(device, 560, 948, 560, 245, 500)
-        time.sleep(1.5)  # Wait for scroll momentum to settle
+        timed_wait(device, on_settled(), 1.5, "rally_scroll_down_settle")  # scroll momentum
 
         # If no join buttons in the bottom quarter of the screen, we've
         # scrolled past all rallies into the marches section — stop early
@@ -1,6 +1,6 @@
 """Titan rally and AP restoration.
 
-Dependencies: _helpers (for _last_depart_slot)
+Dependencies: _helpers (for _last_depart_slot, _shows)
 
 Key exports:
     restore_ap     — open AP Recovery menu and restore AP
@@ -15,15 +15,15 @@ import re
 import config
 from config import Screen
 from botlog import get_logger, timed_action, stats
-from vision import (tap_image, wait_for_image_and_tap, timed_wait,
-                    load_screenshot, find_image,
+from vision import (tap_image, wait_for_image_and_tap, timed_wait, on_frame,
+                    on_settled, load_screenshot, find_image,
                     adb_tap, logged_tap,
                     save_failure_screenshot, read_ap,
                     TAP_OFFSETS, _save_click_trail)
 from navigation import navigate, check_screen, DEBUG_DIR
 from troops import troops_avail, heal_all, capture_departing_portrait
 
-from actions._helpers import _last_depart_slot
+from actions._helpers import _last_depart_slot, _shows
 
 _log = get_logger("actions")
 
@@ -62,10 +62,10 @@ def _close_ap_menu(device, double_close=True):
     closes the search menu behind it (used when restore_ap opened via search).
     Pass double_close=False for game-opened popups with no search menu."""
     tap_image("close_x.png", device)  # Close AP Recovery modal
-    time.sleep(0.5)
+    timed_wait(device, on_settled(device), 0.5, "ap_menu_close")
     if double_close:
         tap_image("close_x.png", device)  # Close search menu
-        time.sleep(0.5)
+        timed_wait(device, on_settled(device), 0.5, "ap_search_close")
 
 def _read_ap_from_menu(device):
     """Read current/max AP from the AP Recovery menu bar via OCR.
@@ -90,8 +90,9 @@ def _read_ap_from_menu(device):
     cv2.imwrite(os.path.join(DEBUG_DIR, "ap_menu_crop.png"), thresh)
     log.debug("AP menu OCR: saved debug/ap_menu_crop.png (region %s)", _AP_MENU_REGION)
 
-    from vision import ocr_read
-    results = ocr_read(thresh, allowlist="0123456789/", detail=0)
+    from vision import read_digits
+    results = read_digits(thresh, "0123456789/", device=device, font="ap_menu",
+                          learn_pattern=r"\d+/\d+")
     raw = " ".join(results).strip()
     log.debug("AP menu OCR raw: '%s'", raw)
 
@@ -113,7 +114,7 @@ def _read_gem_cost(device):
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
     from vision import ocr_read
-    results = ocr_read(gray, detail=0)
+    results = ocr_read(gray, detail=0, device=device)
     raw = " ".join(results).strip()
     log.debug("Gem confirmation OCR: '%s'", raw)
     # Look for "Spend X Gem" pattern
@@ -155,7 +156,7 @@ def _restore_ap_from_open_menu(device, needed):
                 break
             log.debug("Trying free AP restore (attempt %d/2)...", free_attempt + 1)
             adb_tap(device, *_AP_FREE_OPEN)  # "OPEN" button
-            time.sleep(1.5)
+            timed_wait(device, on_settled(device), 1.5, "ap_free_restore")
 
             new_ap = _read_ap_from_menu(device)
             if new_ap is None:
@@ -183,7 +184,7 @@ def _restore_ap_from_open_menu(device, needed):
                     break
                 log.debug("Trying %s AP potion (use %d)...", potion_labels[i], use + 1)
                 adb_tap(device, px, py)
-                time.sleep(1.5)
+                timed_wait(device, on_settled(device), 1.5, "ap_potion_use")
 
                 new_ap = _read_ap_from_menu(device)
                 if new_ap is None:
@@ -196,7 +197,7 @@ def _restore_ap_from_open_menu(device, needed):
                     # Retry once — tap may not have registered due to lag
                     log.debug("%s AP potion: no change, retrying tap...", potion_labels[i])
                     adb_tap(device, px, py)
-                    time.sleep(1.5)
+                    timed_wait(device, on_settled(device), 1.5, "ap_potion_retry")
                     new_ap = _read_ap_from_menu(device)
                     if new_ap is not None and new_ap[0] > current:
                         log.info("Potion worked on retry: %d -> %d", current, new_ap[0])
@@ -214,7 +215,7 @@ def _restore_ap_from_open_menu(device, needed):
             gem_attempts += 1
             # Tap gem button — opens confirmation dialog (unless exhausted)
             adb_tap(device, *_AP_GEM_BUTTON)
-            time.sleep(1.5)
+            timed_wait(device, on_settled(device), 1.5, "ap_gem_dialog")
 
             # Read the gem cost from "Spend X Gem(s)?" dialog
             gem_cost = _read_gem_cost(device)
@@ -226,13 +227,13 @@ def _restore_ap_from_open_menu(device, needed):
                 log.warning("Gem cost %d would exceed limit (%d+%d > %d), cancelling",
                             gem_cost, gems_spent, gem_cost, config.get_device_config(device, "ap_gem_limit"))
                 tap_image("close_x.png", device)  # Close confirmation
-                time.sleep(0.5)
+                timed_wait(device, on_settled(device), 0.5, "ap_gem_cancel")
                 break
 
             # Confirm the purchase
             log.info("Confirming gem restore (%d gems)...", gem_cost)
             adb_tap(device, *_AP_GEM_CONFIRM)
-            time.sleep(1.5)
+            timed_wait(device, on_settled(device), 1.5, "ap_gem_confirm")
             gems_spent += gem_cost
 
             new_ap = _read_ap_from_menu(device)
@@ -271,13 +272,13 @@ def restore_ap(device, needed):
         if open_attempt > 0:
             log.debug("AP: retrying menu open sequence (attempt %d/2)", open_attempt + 1)
             _close_ap_menu(device)
-            time.sleep(0.5)
+            timed_wait(device, on_settled(), 0.5, "ap_menu_reopen_settle")
             if not navigate(Screen.MAP, device):
                 return False
 
         # Tap SEARCH button to open the search/rally menu
         adb_tap(device, 900, 1800)
-        time.sleep(1.5)
+        timed_wait(device, on_settled(device), 1.5, "ap_search_menu_open")
 
         # NOTE: Do NOT call check_screen() here — its popup auto-dismiss
         # detects close_x.png on the search menu and closes it before we
@@ -286,22 +287,12 @@ def restore_ap(device, needed):
 
         # Tap the blue lightning bolt button (AP Recovery button in search menu)
         adb_tap(device, 315, 1380)
-        time.sleep(1.5)
 
         # Wait for AP Recovery menu to appear (check for apwindow.png)
-        for attempt in range(5):
-            screen = load_screenshot(device)
-            if screen is not None:
-                match = find_image(screen, "apwindow.png", threshold=0.8)
-                if match:
-                    log.debug("AP Recovery menu detected (attempt %d)", attempt + 1)
-                    menu_opened = True
-                    break
-                else:
-                    log.debug("Waiting for AP Recovery menu... (attempt %d/5)", attempt + 1)
-            time.sleep(1)
-
+        menu_opened = timed_wait(device, _shows("apwindow.png", threshold=0.8),
+                                 6.5, "ap_menu_open")
         if menu_opened:
+            log.debug("AP Recovery menu detected (attempt %d/2)", open_attempt + 1)
             break
 
     if not menu_opened:
@@ -394,7 +385,7 @@ def rally_titan(device):
             return False
         timed_wait(
             device,
-            lambda: check_screen(device) == Screen.MAP,
+            on_frame(lambda s: check_screen(device, s) == Screen.MAP),
             2, "titan_search_complete")
 
         # Dismiss any popup that appeared during the search (e.g. Season Crystal Card)
@@ -406,20 +397,20 @@ def rally_titan(device):
 
         # Select titan on map and confirm
         logged_tap(device, 540, 900, "titan_on_map")
-        timed_wait(device, lambda: False, 1.5, "titan_on_map_select")
+        timed_wait(device, on_settled(device), 1.5, "titan_on_map_select")
         logged_tap(device, 420, 1400, "titan_confirm")
 
         # Wait for deployment panel — poll for depart button
-        depart_start = time.time()
-        while time.time() - depart_start < 8:
-            s = load_screenshot(device)
-            if s is not None:
-                match = find_image(s, "depart.png", threshold=0.6)
-                if match is not None:
-                    depart_match = match
-                    depart_screen = s
-                    break
-            time.sleep(0.4)
+        found = {}
+
+        def _depart_shown(s):
+            found["match"] = find_image(s, "depart.png", threshold=0.6)
+            found["screen"] = s
+            return found["match"] is not None
+
+        if timed_wait(device, on_frame(_depart_shown), 8, "titan_depart_panel"):
+            depart_match = found["match"]
+            depart_screen = found["screen"]
 
         if depart_match is not None:
             break  # found depart — proceed to tap it
@@ -429,7 +420,7 @@ def rally_titan(device):
 
     if depart_match is not None:
         # Let the deployment panel fully settle before interacting
-        timed_wait(device, lambda: False, 1, "titan_depart_settle")
+        timed_wait(device, on_settled(), 1, "titan_depart_settle")
         try:
             portrait_result = capture_departing_portrait(device, screen=depart_screen)
             if portrait_result:
@@ -0,0 +1,502 @@
+"""
+9Bot ADB Socket Client
+
+Speaks the adb server's socket protocol directly (127.0.0.1:5037 by
+default) instead of spawning the ``adb`` executable for every command,
+so a tap or screenshot costs a local TCP connect and two short
+round-trips rather than a process start, an adb client/server handshake
+and a stdout pipe copy.
+
+Selected with the ``adb_backend`` setting ("subprocess" = run adb,
+"socket" = this module).  vision, devices, adb_shell and capture call the
+helpers below when it is active; nothing else changes for callers.
+
+Protocol
+--------
+Every request is a 4-digit hex length followed by the ASCII service name.
+The server answers ``OKAY``, or ``FAIL`` + hex length + message.
+
+host:version, host:devices, host:connect:<addr>, host:disconnect:<addr>
+    Host services — the answer is hex length + payload.
+host:transport:<serial>
+    Binds the socket to one device; the next request names a device
+    service, and after its OKAY the socket carries that service's stream:
+exec:<cmd>   raw, binary-safe stdout (no pty); stdin is forwarded
+shell:<cmd>  the same through the device shell
+sync:        file transfer (STAT/RECV/SEND/DATA/DONE/QUIT, see pull/push)
+
+A socket carries exactly one device service and closes with it, so the
+long-lived, per-device connections are the services that stay open: the
+input shell (adb_shell runs ``exec:sh`` through ``open_process``) and the
+capture stream.  One-shot commands open a fresh socket to the local server.
+
+Public API
+----------
+devices() -> [(serial, state)]
+connect(addr) / disconnect(addr) -> server message
+exec_out(serial, cmd, timeout) / shell(serial, cmd, timeout) -> bytes
+open_process(serial, cmd) -> Popen-like ServiceProcess (long-lived exec:)
+pull(serial, path) -> bytes / push(serial, data, path)
+set_server(host, port)
+    Point the module at another server (e.g. a FakeAdbServer — tests/dev).
+FakeAdbServer
+    In-process adb server speaking the same protocol — no emulator needed.
+"""
+
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+
+import config
+from botlog import get_logger
+
+_log = get_logger("adb_client")
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+CONNECT_TIMEOUT_S = 2.0
+SYNC_CHUNK = 64 * 1024
+
+
+class AdbError(OSError):
+    """The adb server answered FAIL, or the connection to it broke."""
+
+
+# ============================================================
+# WIRE HELPERS
+# ============================================================
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise AdbError("connection closed by adb server")
+        buf += chunk
+    return bytes(buf)
+
+
+def _send_request(sock, service):
+    data = service.encode() if isinstance(service, str) else service
+    sock.sendall(b"%04x" % len(data) + data)
+
+
+def _read_block(sock):
+    return _recv_exact(sock, int(_recv_exact(sock, 4), 16))
+
+
+def _read_status(sock):
+    status = _recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        raise AdbError(_read_block(sock).decode("utf-8", "replace"))
+    raise AdbError(f"unexpected adb reply {status!r}")
+
+
+def _read_to_eof(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+class AdbClient:
+    """Connections to one adb server — see module docstring."""
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
+        self.host = host
+        self.port = port
+        self._start_lock = threading.Lock()
+        self._started_server = False
+
+    def _open(self, timeout=None):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT_S)
+        except ConnectionRefusedError:
+            if not self._start_server():
+                raise AdbError(f"no adb server on {self.host}:{self.port}") from None
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT_S)
+            except OSError as e:
+                raise AdbError(f"adb server unreachable: {e}") from None
+        sock.settimeout(timeout)
+        return sock
+
+    def _start_server(self):
+        """Start the adb server once (the socket protocol needs one running)."""
+        with self._start_lock:
+            if self._started_server:
+                return False
+            self._started_server = True
+            try:
+                subprocess.run([config.adb_path, "start-server"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=15)
+                return True
+            except (OSError, subprocess.TimeoutExpired) as e:
+                _log.warning("Could not start adb server: %s", e)
+                return False
+
+    # -- host services --
+
+    def host_query(self, service, timeout=CONNECT_TIMEOUT_S):
+        """Run a host service and return its length-prefixed answer."""
+        sock = self._open(timeout)
+        try:
+            _send_request(sock, service)
+            _read_status(sock)
+            return _read_block(sock)
+        finally:
+            sock.close()
+
+    def version(self):
+        return int(self.host_query("host:version"), 16)
+
+    def devices(self):
+        """[(serial, state)] as listed by ``adb devices``."""
+        out = []
+        for line in self.host_query("host:devices").decode().splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                out.append((parts[0], parts[1]))
+        return out
+
+    def connect(self, addr, timeout=3):
+        return self.host_query(f"host:connect:{addr}", timeout).decode("utf-8", "replace")
+
+    def disconnect(self, addr, timeout=3):
+        return self.host_query(f"host:disconnect:{addr}", timeout).decode("utf-8", "replace")
+
+    # -- device services --
+
+    def open_service(self, serial, service, timeout=None):
+        """Socket bound to ``serial`` running ``service`` (caller closes it)."""
+        sock = self._open(timeout)
+        try:
+            _send_request(sock, f"host:transport:{serial}")
+            _read_status(sock)
+            _send_request(sock, service)
+            _read_status(sock)
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def exec_out(self, serial, cmd, timeout=None):
+        """Run ``cmd`` with ``exec:`` and return its raw stdout."""
+        sock = self.open_service(serial, f"exec:{cmd}", timeout)
+        try:
+            return _read_to_eof(sock)
+        finally:
+            sock.close()
+
+    def shell(self, serial, cmd, timeout=None):
+        sock = self.open_service(serial, f"shell:{cmd}", timeout)
+        try:
+            return _read_to_eof(sock)
+        finally:
+            sock.close()
+
+    def open_process(self, serial, cmd):
+        return ServiceProcess(self.open_service(serial, f"exec:{cmd}"))
+
+    # -- sync --
+
+    def _sync(self, serial, timeout):
+        return self.open_service(serial, "sync:", timeout)
+
+    @staticmethod
+    def _sync_request(sock, ident, data=b""):
+        sock.sendall(ident + struct.pack("<I", len(data)) + data)
+
+    def pull(self, serial, path, timeout=None):
+        """Contents of ``path`` on the device (raises AdbError on FAIL)."""
+        sock = self._sync(serial, timeout)
+        try:
+            self._sync_request(sock, b"RECV", path.encode())
+            chunks = []
+            while True:
+                ident, length = struct.unpack("<4sI", _recv_exact(sock, 8))
+                if ident == b"DATA":
+                    chunks.append(_recv_exact(sock, length))
+                elif ident == b"DONE":
+                    break
+                elif ident == b"FAIL":
+                    raise AdbError(_recv_exact(sock, length).decode("utf-8", "replace"))
+                else:
+                    raise AdbError(f"unexpected sync reply {ident!r}")
+            self._sync_request(sock, b"QUIT")
+            return b"".join(chunks)
+        finally:
+            sock.close()
+
+    def push(self, serial, data, path, mode=0o644, timeout=None):
+        """Write ``data`` to ``path`` on the device."""
+        sock = self._sync(serial, timeout)
+        try:
+            self._sync_request(sock, b"SEND", f"{path},{mode}".encode())
+            for i in range(0, len(data), SYNC_CHUNK):
+                self._sync_request(sock, b"DATA", data[i:i + SYNC_CHUNK])
+            sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+            ident, length = struct.unpack("<4sI", _recv_exact(sock, 8))
+            if ident == b"FAIL":
+                raise AdbError(_recv_exact(sock, length).decode("utf-8", "replace"))
+            if ident != b"OKAY":
+                raise AdbError(f"unexpected sync reply {ident!r}")
+            self._sync_request(sock, b"QUIT")
+        finally:
+            sock.close()
+
+
+class _SocketWriter:
+    def __init__(self, sock):
+        self._sock = sock
+
+    def write(self, data):
+        self._sock.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ServiceProcess:
+    """Popen-like view of a long-lived device service socket.
+
+    Gives adb_shell and capture the ``stdin`` / ``stdout`` / ``poll`` /
+    ``kill`` / ``wait`` surface they already use for an adb process.
+    """
+
+    pid = None
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._closed = False
+        self.stdin = _SocketWriter(sock)
+        self.stdout = sock.makefile("rb")
+
+    def poll(self):
+        return 0 if self._closed else None
+
+    def kill(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    terminate = kill
+
+    def wait(self, timeout=None):
+        return 0
+
+
+# ============================================================
+# MODULE-LEVEL CLIENT
+# ============================================================
+
+_client = AdbClient()
+
+
+def set_server(host=SERVER_HOST, port=SERVER_PORT):
+    """Use the adb server at ``host:port`` from now on."""
+    global _client
+    _client = AdbClient(host, port)
+
+
+def devices():
+    return _client.devices()
+
+
+def connect(addr, timeout=3):
+    return _client.connect(addr, timeout)
+
+
+def disconnect(addr, timeout=3):
+    return _client.disconnect(addr, timeout)
+
+
+def exec_out(serial, cmd, timeout=None):
+    return _client.exec_out(serial, cmd, timeout)
+
+
+def shell(serial, cmd, timeout=None):
+    return _client.shell(serial, cmd, timeout)
+
+
+def open_process(serial, cmd):
+    return _client.open_process(serial, cmd)
+
+
+def pull(serial, path, timeout=None):
+    return _client.pull(serial, path, timeout)
+
+
+def push(serial, data, path, mode=0o644, timeout=None):
+    return _client.push(serial, data, path, mode, timeout)
+
+
+# ============================================================
+# FAKE SERVER (tests / dev)
+# ============================================================
+
+class FakeAdbServer:
+    """In-process adb server speaking the socket protocol — tests/dev.
+
+    devices      serial -> state ("device", "offline", ...)
+    connectable  addresses host:connect succeeds for (they become devices)
+    responses    command -> bytes, or callable(serial, cmd) returning bytes
+                 or an iterable of chunks, for exec:/shell: services
+    files        (serial, path) -> bytes, backing sync: RECV/SEND
+    commands     every device service run, as (serial, service, cmd)
+
+    ``exec:sh`` is an interactive line shell: each line is recorded as a
+    ("sh" ...) command and its ``echo`` segments are answered (``$?`` = 0),
+    which is all adb_shell's end markers need.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self.connectable = set()
+        self.responses = {}
+        self.files = {}
+        self.commands = []
+        self.requests = 0
+        self._server = None
+
+    def start(self):
+        """Listen on a free local port; returns (host, port)."""
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    fake._serve(self.request)
+                except (OSError, AdbError):
+                    pass
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True,
+                         name="fake-adb-server").start()
+        return self._server.server_address
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # -- protocol --
+
+    @staticmethod
+    def _okay(sock, payload=None):
+        if payload is None:
+            sock.sendall(b"OKAY")
+        else:
+            sock.sendall(b"OKAY" + b"%04x" % len(payload) + payload)
+
+    @staticmethod
+    def _fail(sock, msg):
+        data = msg.encode()
+        sock.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def _serve(self, sock):
+        serial = None
+        while True:
+            service = _read_block(sock).decode()
+            self.requests += 1
+            if service == "host:version":
+                return self._okay(sock, b"0029")
+            if service == "host:devices":
+                listing = "".join(f"{s}\t{st}\n" for s, st in self.devices.items())
+                return self._okay(sock, listing.encode())
+            if service.startswith("host:connect:"):
+                addr = service.split(":", 2)[2]
+                if addr in self.devices:
+                    return self._okay(sock, f"already connected to {addr}".encode())
+                if addr in self.connectable:
+                    self.devices[addr] = "device"
+                    return self._okay(sock, f"connected to {addr}".encode())
+                return self._okay(sock, f"failed to connect to {addr}".encode())
+            if service.startswith("host:disconnect:"):
+                addr = service.split(":", 2)[2]
+                self.devices.pop(addr, None)
+                return self._okay(sock, f"disconnected {addr}".encode())
+            if service.startswith("host:transport:"):
+                serial = service.split(":", 2)[2]
+                if self.devices.get(serial) != "device":
+                    return self._fail(sock, f"device '{serial}' not found")
+                self._okay(sock)
+                continue
+            if serial is None:
+                return self._fail(sock, f"unknown host service {service}")
+            if service == "sync:":
+                self._okay(sock)
+                return self._serve_sync(sock, serial)
+            kind, _, cmd = service.partition(":")
+            if kind not in ("exec", "shell"):
+                return self._fail(sock, f"unknown service {service}")
+            self.commands.append((serial, kind, cmd))
+            self._okay(sock)
+            if cmd == "sh":
+                return self._serve_sh(sock, serial)
+            out = self.responses.get(cmd, b"")
+            if callable(out):
+                out = out(serial, cmd)
+            for chunk in ([out] if isinstance(out, bytes) else out):
+                sock.sendall(chunk)
+            return
+
+    def _serve_sh(self, sock, serial):
+        for raw in sock.makefile("rb"):
+            line = raw.decode().strip()
+            self.commands.append((serial, "sh", line))
+            for segment in line.split(" ; "):
+                if segment.startswith("echo "):
+                    sock.sendall(segment[5:].replace("$?", "0").encode() + b"\n")
+
+    def _serve_sync(self, sock, serial):
+        while True:
+            ident, length = struct.unpack("<4sI", _recv_exact(sock, 8))
+            if ident == b"QUIT":
+                return
+            arg = _recv_exact(sock, length).decode()
+            if ident == b"RECV":
+                data = self.files.get((serial, arg))
+                if data is None:
+                    msg = b"No such file or directory"
+                    sock.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
+                    return
+                for i in range(0, len(data), SYNC_CHUNK):
+                    chunk = data[i:i + SYNC_CHUNK]
+                    sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                sock.sendall(b"DONE" + struct.pack("<I", 0))
+            elif ident == b"SEND":
+                path = arg.rsplit(",", 1)[0]
+                chunks = []
+                while True:
+                    sub, n = struct.unpack("<4sI", _recv_exact(sock, 8))
+                    if sub == b"DONE":
+                        break
+                    chunks.append(_recv_exact(sock, n))
+                self.files[(serial, path)] = b"".join(chunks)
+                sock.sendall(b"OKAY" + struct.pack("<I", 0))
+            else:
+                return
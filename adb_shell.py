@@ -0,0 +1,220 @@
+"""
+9Bot Persistent ADB Shell
+
+One long-lived ``adb -s <device> shell`` per device with its stdin kept
+open, so input commands are written down an existing pipe instead of
+spawning a new adb client (process start + server handshake + new shell
+channel) for every tap.
+
+How it works
+------------
+Each submitted script is written as one line followed by an end marker::
+
+    input tap 540 960 ; echo __9BOT_DONE__ 17 $?
+
+A reader thread watches stdout for markers and completes the Future for
+that sequence number with the exit status.  The device shell runs lines in
+order, so scripts submitted back-to-back (async) still execute in order.
+If the shell dies or a command times out, the session is discarded and
+the next call starts a fresh one; get_shell() backs off for
+RESTART_BACKOFF_S after a failed start so callers can fall back to the
+one-shot ``adb shell`` path.
+
+Public API
+----------
+get_shell(device) -> ShellSession or None
+ShellSession.run(script, timeout) -> exit status (raises on failure)
+ShellSession.submit(script) -> concurrent.futures.Future[int]
+close_shell(device) / close_all_shells()
+register_fake_shell(device, argv) / unregister_fake_shell(device)
+    Run ``argv`` (e.g. ["sh"]) instead of adb — tests/dev.
+"""
+
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import config
+from botlog import get_logger
+
+MARKER = "__9BOT_DONE__"
+RESTART_BACKOFF_S = 5.0       # don't retry a shell that failed to start for this long
+
+
+class ShellError(RuntimeError):
+    """The persistent shell died, failed to start, or didn't answer in time."""
+
+
+class ShellSession:
+    """Persistent shell for one device — see module docstring."""
+
+    def __init__(self, device, argv=None):
+        self.device = device
+        self._log = get_logger("adb_shell", device)
+        self._argv = argv              # None = adb (process or socket, per ADB_BACKEND)
+        self._lock = threading.Lock()
+        self._pending = {}            # seq -> Future
+        self._seq = 0
+        self._proc = None
+        self._eof = False
+        self._thread = None
+        self.started_at = None
+        self.commands = 0
+
+    @property
+    def alive(self):
+        return self._proc is not None and not self._eof and self._proc.poll() is None
+
+    def start(self):
+        """Start the shell. Raises OSError if it can't be spawned."""
+        if self._argv is None and config.ADB_BACKEND == "socket":
+            import adb_client
+            self._proc = adb_client.open_process(self.device, "sh")
+        else:
+            argv = self._argv or [config.adb_path, "-s", self.device, "shell"]
+            self._proc = subprocess.Popen(argv, stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                          bufsize=0)
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._reader_loop, args=(self._proc,),
+                                        daemon=True, name=f"adb-shell-{self.device}")
+        self._thread.start()
+        self._log.debug("Persistent shell started (%s)",
+                        f"pid {self._proc.pid}" if self._proc.pid else "socket")
+
+    def _reader_loop(self, proc):
+        for raw in iter(proc.stdout.readline, b""):
+            line = raw.decode("utf-8", "replace").strip()
+            if not line.startswith(MARKER):
+                if line:
+                    self._log.debug("shell: %s", line)
+                continue
+            try:
+                _, seq, status = line.split()
+                seq, status = int(seq), int(status)
+            except ValueError:
+                continue
+            with self._lock:
+                future = self._pending.pop(seq, None)
+            if future is not None:
+                future.set_result(status)
+        with self._lock:
+            self._eof = True
+        self._fail_pending(ShellError("shell exited"))
+
+    def _fail_pending(self, exc):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def submit(self, script):
+        """Queue ``script`` (one shell line) and return a Future for its exit status."""
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                future.set_exception(ShellError("shell is not running"))
+                return future
+            self._seq += 1
+            seq = self._seq
+            self._pending[seq] = future
+            self.commands += 1
+            try:
+                self._proc.stdin.write(f"{script} ; echo {MARKER} {seq} $?\n".encode())
+                self._proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                self._pending.pop(seq, None)
+                future.set_exception(ShellError(f"write failed: {e}"))
+        return future
+
+    def run(self, script, timeout=None):
+        """Run ``script`` and wait for it. Returns its exit status.
+
+        Raises ShellError if the shell is gone, or TimeoutError (after
+        closing the session) if no answer arrives within ``timeout``.
+        """
+        future = self.submit(script)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.close()
+            raise TimeoutError(f"no answer in {timeout}s") from None
+
+    def close(self):
+        with self._lock:   # submit() checks and writes _proc under the lock
+            proc, self._proc = self._proc, None
+        if proc is not None:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                proc.kill()
+                proc.wait(timeout=2)
+            except Exception:
+                pass
+        self._fail_pending(ShellError("shell closed"))
+
+
+_shells = {}
+_failed_at = {}
+_fake_shells = {}
+_shells_lock = threading.Lock()
+
+
+def get_shell(device):
+    """Running ShellSession for ``device``, starting one if needed.
+
+    Returns None if the shell could not be started recently (caller
+    should use the one-shot path).
+    """
+    with _shells_lock:
+        session = _shells.get(device)
+        if session is not None and session.alive:
+            return session
+        if time.time() - _failed_at.get(device, 0) < RESTART_BACKOFF_S:
+            return None
+        session = ShellSession(device, _fake_shells.get(device))
+        try:
+            session.start()
+        except OSError as e:
+            _failed_at[device] = time.time()
+            get_logger("adb_shell", device).warning("Persistent shell unavailable: %s", e)
+            return None
+        _failed_at.pop(device, None)
+        _shells[device] = session
+        return session
+
+
+def close_shell(device, backoff=False):
+    """Close the device's shell; with ``backoff``, don't restart it for a while."""
+    with _shells_lock:
+        session = _shells.pop(device, None)
+        if backoff:
+            _failed_at[device] = time.time()
+        else:
+            _failed_at.pop(device, None)
+    if session is not None:
+        session.close()
+
+
+def close_all_shells():
+    with _shells_lock:
+        sessions = list(_shells.values())
+        _shells.clear()
+        _failed_at.clear()
+    for session in sessions:
+        session.close()
+
+
+def register_fake_shell(device, argv):
+    """Run ``argv`` instead of ``adb shell`` for ``device``."""
+    close_shell(device)
+    _fake_shells[device] = argv
+
+
+def unregister_fake_shell(device):
+    close_shell(device)
+    _fake_shells.pop(device, None)
@@ -5,6 +5,7 @@ Single module for all observability infrastructure:
 - setup_logging()    — configure Python logging (call once at startup)
 - get_logger()       — get a logger with optional device context
 - StatsTracker       — thread-safe per-device metrics collection
+- history            — persistent stats history (stats_history.HistoryStore)
 - timed_action()     — decorator for automatic timing + stats + error screenshots
 - stats              — global StatsTracker instance
 """
@@ -15,14 +16,21 @@ import os
 import json
 import time
 import functools
+import math
+from array import array
+from collections import deque
 from datetime import datetime
 from threading import Lock
 
 import psutil
 
+import profiling
+from stats_history import HistoryStore
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
 STATS_DIR = os.path.join(SCRIPT_DIR, "stats")
+HISTORY_DB = os.path.join(STATS_DIR, "history.db")
 
 # Version info — read once at import time
 _VERSION_FILE = os.path.join(SCRIPT_DIR, "version.txt")
@@ -41,8 +49,10 @@ except Exception:
 
 MIN_ADAPTIVE_SAMPLES = 8            # successful samples before adapting
 MIN_ADAPTIVE_SUCCESS_RATE = 0.8     # condition-met rate to trust data
-ADAPTIVE_HEADROOM = 1.3             # safety multiplier above P90
+ADAPTIVE_PERCENTILE = 95            # percentile of successful samples
+ADAPTIVE_HEADROOM = 1.3             # safety multiplier above P95
 ADAPTIVE_FLOOR_FRACTION = 0.4       # never below 40% of original budget
+ADAPTIVE_CEILING_FRACTION = 1.5     # never above 150% (slow machines get headroom)
 ADAPTIVE_MIN_BUDGET_S = 0.3         # absolute floor in seconds
 
 # Reference to the console handler so set_console_verbose() can adjust it
@@ -178,34 +188,125 @@ def get_logger(module_name, device=None):
     return logging.LoggerAdapter(logger, {"device": "system"})
 
 
+# ============================================================
+# TIMING HISTOGRAMS
+# ============================================================
+# Timings are kept as fixed-size log-scale histograms: O(1) to record,
+# constant memory however long the session runs, and percentiles come
+# back to within one bucket (~20%).
+
+HISTOGRAM_MIN_S = 0.001             # bucket 0 holds everything faster
+HISTOGRAM_GROWTH = 1.2              # each bucket 20% wider than the last
+HISTOGRAM_BUCKETS = 64              # 1ms .. ~97s, the last bucket open-ended
+
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+
+class TimingHistogram:
+    """Fixed-size log-scale histogram of durations in seconds.
+
+    Bucket i (i >= 1) covers [MIN * GROWTH**(i-1), MIN * GROWTH**i).
+    """
+
+    __slots__ = ("counts", "count")
+
+    def __init__(self):
+        self.counts = array("I", [0]) * HISTOGRAM_BUCKETS
+        self.count = 0
+
+    def add(self, seconds):
+        if seconds < HISTOGRAM_MIN_S:
+            i = 0
+        else:
+            i = min(HISTOGRAM_BUCKETS - 1,
+                    int(math.log(seconds / HISTOGRAM_MIN_S) / _LOG_GROWTH) + 1)
+        self.counts[i] += 1
+        self.count += 1
+
+    def percentile(self, pct):
+        """Geometric middle of the bucket holding the ``pct`` percentile (0 if empty)."""
+        if not self.count:
+            return 0.0
+        rank = min(self.count - 1, int(self.count * pct / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen > rank:
+                break
+        if i == 0:
+            return HISTOGRAM_MIN_S
+        return HISTOGRAM_MIN_S * HISTOGRAM_GROWTH ** (i - 0.5)
+
+    def copy(self):
+        other = TimingHistogram()
+        other.counts = array("I", self.counts)
+        other.count = self.count
+        return other
+
+
+def _copy_stats(value):
+    """Copy a device's stats tree: dicts and lists copied, deques become
+    lists, histograms are copied — nothing shared with the live data."""
+    if isinstance(value, dict):
+        return {k: _copy_stats(v) for k, v in value.items()}
+    if isinstance(value, (list, deque)):
+        return [_copy_stats(v) for v in value]
+    if isinstance(value, TimingHistogram):
+        return value.copy()
+    return value
+
+
 # ============================================================
 # STATS TRACKER
 # ============================================================
 
+ERRORS_KEPT = 50                    # recent errors per device
+TEMPLATE_HITS_KEPT = 20             # recent hit positions per template
+TRANSITION_SAMPLES_KEPT = 20        # successful waits per label (adaptive window)
+
+
 class StatsTracker:
     """Thread-safe per-device metrics for post-session analysis.
 
     Tracks action success/failure/timing, template match failures,
-    navigation failures, and recent errors. Saves to JSON on shutdown.
+    navigation failures, and recent errors. Saves a session summary to
+    JSON periodically and on shutdown.  With a ``history`` store, every
+    action, ADB timing, template hit/miss and transition is also appended
+    to it as it happens (see stats_history).
+
+    Each device's data has its own lock, so device threads never contend
+    with each other; ``_lock`` only guards adding a device.  ``save()`` and
+    ``summary()`` copy one device at a time and format the copy unlocked.
     """
 
     AUTO_SAVE_INTERVAL = 300  # seconds (5 minutes)
 
-    def __init__(self):
+    def __init__(self, history=None):
         self._lock = Lock()
+        self._device_locks = {}
         self._session_start = datetime.now()
         self._data = {}
+        self._history = history
         self._load_previous_session()
         self._start_auto_save()
 
     def _load_previous_session(self):
-        """Seed transition_times from the most recent session file.
+        """Seed transition_times from earlier sessions.
 
         Enables adaptive budgets to work immediately on session 2+
-        using timing data accumulated in prior sessions.  Only loads
+        using timing data accumulated in prior sessions: the latest
+        samples per label from the history store, or — before the store
+        has any — the most recent session file.  Only loads
         transition_times — other metrics start fresh each session.
         """
         _log = logging.getLogger("botlog")
+        if self._history is not None:
+            seed = self._history.recent_transitions()
+            if seed:
+                self._seed_transitions(seed)
+                _log.info("Loaded transition data from stats history (%d devices)",
+                          len(seed))
+                return
         try:
             if not os.path.isdir(STATS_DIR):
                 return
@@ -220,26 +321,31 @@ class StatsTracker:
             filepath = os.path.join(STATS_DIR, files[0])
             with open(filepath, "r") as f:
                 prev = json.load(f)
-            with self._lock:
-                for device, device_data in prev.get("devices", {}).items():
-                    prev_tt = device_data.get("transition_times", {})
-                    if not prev_tt:
-                        continue
-                    self._ensure_device(device)
-                    transitions = self._data[device]["transition_times"]
-                    for label, info in prev_tt.items():
-                        if label in transitions:
-                            continue  # current session already has data
-                        transitions[label] = {
-                            "count": info.get("count", 0),
-                            "met_count": info.get("met_count", 0),
-                            "budgeted_s": info.get("budgeted_s", 0),
-                            "samples": list(info.get("samples", [])),
-                        }
+            self._seed_transitions({
+                device: device_data.get("transition_times", {})
+                for device, device_data in prev.get("devices", {}).items()
+            })
             _log.info("Loaded transition data from previous session: %s", files[0])
         except Exception as e:
             _log.debug("Could not load previous session data: %s", e)
 
+    def _seed_transitions(self, seed):
+        """Add {device: {label: info}} transition entries the session lacks."""
+        for device, labels in seed.items():
+            if not labels:
+                continue
+            lock, data = self._shard(device)
+            with lock:
+                transitions = data["transition_times"]
+                for label, info in labels.items():
+                    if label in transitions:
+                        continue  # current session already has data
+                    entry = _new_transition(info.get("budgeted_s", 0))
+                    entry["count"] = info.get("count", 0)
+                    entry["met_count"] = info.get("met_count", 0)
+                    entry["samples"].extend(info.get("samples", []))
+                    transitions[label] = entry
+
     def _start_auto_save(self):
         """Periodically save stats to disk so data isn't lost on crash/kill."""
         from threading import Timer
@@ -263,21 +369,43 @@ class StatsTracker:
 
     def _ensure_device(self, device):
         if device not in self._data:
+            # Lock first: a device visible in _data always has one
+            self._device_locks.setdefault(device, Lock())
             self._data[device] = {
                 "actions": {},
                 "template_misses": {},
                 "template_hits": {},
                 "transition_times": {},
                 "nav_failures": {},
-                "errors": [],
+                "errors": deque(maxlen=ERRORS_KEPT),
                 "adb_timing": {},
+                "frame_cache": {"hits": 0, "misses": 0, "hourly": {}},
+                "ocr": _new_ocr_stats(),
             }
 
+    def _shard(self, device):
+        """Return (lock, data) for ``device``, creating its entry on first use."""
+        data = self._data.get(device)
+        if data is None:
+            with self._lock:
+                self._ensure_device(device)
+                data = self._data[device]
+        return self._device_locks[device], data
+
+    def _snapshot(self):
+        """Copy of every device's data, taking one device lock at a time."""
+        out = {}
+        for device in list(self._data):
+            lock, data = self._shard(device)
+            with lock:
+                out[device] = _copy_stats(data)
+        return out
+
     def record_action(self, device, action_name, success, duration_s, error_msg=None):
         """Record an action attempt with outcome and timing."""
-        with self._lock:
-            self._ensure_device(device)
-            actions = self._data[device]["actions"]
+        lock, data = self._shard(device)
+        with lock:
+            actions = data["actions"]
             if action_name not in actions:
                 actions[action_name] = {
                     "attempts": 0, "successes": 0, "failures": 0,
@@ -291,30 +419,33 @@ class StatsTracker:
             else:
                 entry["failures"] += 1
                 entry["last_failure"] = error_msg or "unknown"
-                # Keep last 50 errors across all actions
-                errors = self._data[device]["errors"]
-                errors.append({
+                # Keep the last ERRORS_KEPT errors across all actions
+                data["errors"].append({
                     "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "action": action_name,
                     "error": error_msg or "unknown",
                     "duration_s": round(duration_s, 1)
                 })
-                if len(errors) > 50:
-                    errors[:] = errors[-50:]
+        if self._history is not None:
+            self._history.record("action", device, action_name, duration_s,
+                                 success, None if success else (error_msg or "unknown"))
 
     def record_template_miss(self, device, template_name, best_score=0.0):
         """Record a template match failure with the best score achieved."""
-        with self._lock:
-            self._ensure_device(device)
-            misses = self._data[device]["template_misses"]
+        lock, data = self._shard(device)
+        with lock:
+            misses = data["template_misses"]
             if template_name not in misses:
                 misses[template_name] = {"count": 0, "best_scores": []}
             entry = misses[template_name]
             entry["count"] += 1
             # Keep last 10 best scores for trend analysis
-            entry["best_scores"].append(round(best_score, 3))
-            if len(entry["best_scores"]) > 10:
-                entry["best_scores"] = entry["best_scores"][-10:]
+            scores = entry["best_scores"]
+            scores.append(round(best_score, 3))
+            if len(scores) > 10:
+                del scores[0]
+        if self._history is not None:
+            self._history.record("template_miss", device, template_name, best_score, False)
 
     def record_template_hit(self, device, template_name, x, y, confidence):
         """Record a successful template match with its position.
@@ -322,25 +453,30 @@ class StatsTracker:
         Tracks min/max bounding box per template so regions can be
         tightened with real data from live sessions.
         """
-        with self._lock:
-            self._ensure_device(device)
-            hits = self._data[device]["template_hits"]
+        lock, data = self._shard(device)
+        with lock:
+            hits = data["template_hits"]
             if template_name not in hits:
                 hits[template_name] = {
                     "count": 0,
                     "min_x": x, "max_x": x,
                     "min_y": y, "max_y": y,
-                    "recent": [],
+                    "recent": deque(maxlen=TEMPLATE_HITS_KEPT),
                 }
             entry = hits[template_name]
             entry["count"] += 1
-            entry["min_x"] = min(entry["min_x"], x)
-            entry["max_x"] = max(entry["max_x"], x)
-            entry["min_y"] = min(entry["min_y"], y)
-            entry["max_y"] = max(entry["max_y"], y)
+            if x < entry["min_x"]:
+                entry["min_x"] = x
+            elif x > entry["max_x"]:
+                entry["max_x"] = x
+            if y < entry["min_y"]:
+                entry["min_y"] = y
+            elif y > entry["max_y"]:
+                entry["max_y"] = y
             entry["recent"].append([x, y, round(confidence, 3)])
-            if len(entry["recent"]) > 20:
-                entry["recent"] = entry["recent"][-20:]
+        if self._history is not None:
+            self._history.record("template_hit", device, template_name, confidence,
+                                 True, f"{x},{y}")
 
     def get_template_hit_bounds(self, device, template_name):
         """Return the observed bounding box for a template on a device.
@@ -348,10 +484,11 @@ class StatsTracker:
         Returns (min_x, min_y, max_x, max_y, count) or None if no data.
         Coordinates are template center positions (not top-left).
         """
-        with self._lock:
-            if device not in self._data:
-                return None
-            entry = self._data[device]["template_hits"].get(template_name)
+        if device not in self._data:
+            return None
+        lock, data = self._shard(device)
+        with lock:
+            entry = data["template_hits"].get(template_name)
             if entry is None:
                 return None
             return (entry["min_x"], entry["min_y"],
@@ -359,134 +496,244 @@ class StatsTracker:
 
     def record_nav_failure(self, device, from_screen, to_screen):
         """Record a navigation failure."""
-        with self._lock:
-            self._ensure_device(device)
+        lock, data = self._shard(device)
+        with lock:
             key = f"{from_screen}->{to_screen}"
-            nav = self._data[device]["nav_failures"]
+            nav = data["nav_failures"]
             nav[key] = nav.get(key, 0) + 1
 
     def record_adb_timing(self, device, command, elapsed_s, success=True):
         """Record ADB command timing for latency tracking."""
-        with self._lock:
-            self._ensure_device(device)
-            timings = self._data[device]["adb_timing"]
-            if command not in timings:
-                timings[command] = {
+        lock, data = self._shard(device)
+        with lock:
+            timings = data["adb_timing"]
+            entry = timings.get(command)
+            if entry is None:
+                entry = timings[command] = {
                     "count": 0, "total_s": 0.0, "max_s": 0.0,
-                    "slow_count": 0, "failures": 0,
+                    "slow_count": 0, "failures": 0, "hist": TimingHistogram(),
                 }
-            entry = timings[command]
             entry["count"] += 1
-            entry["total_s"] = round(entry["total_s"] + elapsed_s, 2)
-            entry["max_s"] = round(max(entry["max_s"], elapsed_s), 2)
+            entry["total_s"] += elapsed_s
+            if elapsed_s > entry["max_s"]:
+                entry["max_s"] = elapsed_s
+            entry["hist"].add(elapsed_s)
             if elapsed_s > 3.0:
                 entry["slow_count"] += 1
             if not success:
                 entry["failures"] += 1
+        if self._history is not None:
+            self._history.record("adb", device, command, elapsed_s, success)
+
+    def record_frame_cache(self, device, hit):
+        """Record a load_screenshot frame-cache hit (capture saved) or miss.
+
+        Counts are also bucketed per wall-clock hour so the saving rate
+        can be compared across the session.
+        """
+        lock, data = self._shard(device)
+        with lock:
+            cache = data["frame_cache"]
+            hour = datetime.now().strftime("%Y-%m-%d %H:00")
+            bucket = cache["hourly"].get(hour)
+            if bucket is None:
+                bucket = cache["hourly"][hour] = {"hits": 0, "misses": 0}
+                # Keep the last 48 hours of buckets
+                if len(cache["hourly"]) > 48:
+                    for old in sorted(cache["hourly"])[:-48]:
+                        del cache["hourly"][old]
+            key = "hits" if hit else "misses"
+            cache[key] += 1
+            bucket[key] += 1
+
+    def get_frame_cache_stats(self, device):
+        """Return {"hits", "misses", "hit_rate", "saved_per_hour"} for a device."""
+        if device not in self._data:
+            return {"hits": 0, "misses": 0, "hit_rate": 0.0, "saved_per_hour": 0.0}
+        lock, data = self._shard(device)
+        with lock:
+            return self._frame_cache_summary(data["frame_cache"])
+
+    def _frame_cache_summary(self, cache):
+        total = cache["hits"] + cache["misses"]
+        hours = max((datetime.now() - self._session_start).total_seconds() / 3600.0,
+                    1 / 60.0)
+        return {
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "hit_rate": round(cache["hits"] / total, 3) if total else 0.0,
+            "saved_per_hour": round(cache["hits"] / hours, 1),
+        }
+
+    def record_ocr(self, device, wait_s=0.0, batch_size=1, cache_hit=False):
+        """Record one ocr_read call.
+
+        wait_s:     time spent queued behind other devices' OCR
+        batch_size: number of crops recognized in the same inference call
+        cache_hit:  result came from the OCR cache (no inference)
+        """
+        lock, data = self._shard(device)
+        with lock:
+            ocr = data["ocr"]
+            ocr["calls"] += 1
+            if cache_hit:
+                ocr["cache_hits"] += 1
+                return
+            ocr["inferences"] += 1
+            ocr["batch_total"] += batch_size
+            ocr["batch_max"] = max(ocr["batch_max"], batch_size)
+            ocr["wait_total_s"] = round(ocr["wait_total_s"] + wait_s, 3)
+            ocr["wait_max_s"] = round(max(ocr["wait_max_s"], wait_s), 3)
+
+    def get_ocr_stats(self, device):
+        """Return {"calls", "cache_hits", "hit_rate", "avg_wait_ms", "max_wait_ms",
+        "avg_batch", "max_batch"} for a device."""
+        if device not in self._data:
+            return _ocr_summary(_new_ocr_stats())
+        lock, data = self._shard(device)
+        with lock:
+            return _ocr_summary(data["ocr"])
 
     def record_transition_time(self, device, label, actual_s, budgeted_s, condition_met):
         """Record how long a UI transition actually took vs its sleep budget.
-        Used by timed_wait() to gather data on which sleeps can be shortened."""
-        with self._lock:
-            self._ensure_device(device)
-            transitions = self._data[device].setdefault("transition_times", {})
-            if label not in transitions:
-                transitions[label] = {
-                    "count": 0,
-                    "met_count": 0,
-                    "budgeted_s": budgeted_s,
-                    "samples": [],
-                }
-            entry = transitions[label]
+        Used by timed_wait() to gather data on which sleeps can be shortened.
+        ``budgeted_s`` is the hard-coded budget; whatever of it wasn't spent
+        adds up in the label's ``saved_s``."""
+        lock, data = self._shard(device)
+        with lock:
+            transitions = data["transition_times"]
+            entry = transitions.get(label)
+            if entry is None:
+                entry = transitions[label] = _new_transition(budgeted_s)
             entry["count"] += 1
+            if actual_s < budgeted_s:
+                entry["saved_s"] += budgeted_s - actual_s
+            entry["hist"].add(actual_s)
             if condition_met:
                 entry["met_count"] += 1
                 entry["samples"].append(round(actual_s, 3))
-                if len(entry["samples"]) > 20:
-                    entry["samples"] = entry["samples"][-20:]
-
-    def _check_template_trends_unlocked(self, device, template_name):
-        """Check if a template's best scores are trending toward failure (no lock).
-        Returns a warning string if scores are drifting down, or None."""
-        misses = self._data.get(device, {}).get("template_misses", {})
-        entry = misses.get(template_name)
-        if entry is None or len(entry["best_scores"]) < 5:
-            return None
-        scores = entry["best_scores"]
-        # Compare recent half vs older half
-        mid = len(scores) // 2
-        old_avg = sum(scores[:mid]) / mid
-        new_avg = sum(scores[mid:]) / (len(scores) - mid)
-        if new_avg < old_avg - 0.05 and new_avg < 0.75:
-            return (f"{template_name}: score trending down "
-                    f"({old_avg:.0%} -> {new_avg:.0%}, {entry['count']} misses)")
-        return None
+        if self._history is not None:
+            self._history.record("transition", device, label, actual_s,
+                                 condition_met, str(budgeted_s))
+
+    def get_adaptive_budget(self, device, label, budget_s):
+        """Return the wait budget to use for ``label`` on ``device``.
+
+        ``budget_s`` until the label has MIN_ADAPTIVE_SAMPLES successful
+        samples and a MIN_ADAPTIVE_SUCCESS_RATE met rate; then the
+        ADAPTIVE_PERCENTILE of those samples times ADAPTIVE_HEADROOM,
+        between the ADAPTIVE_FLOOR_FRACTION / ADAPTIVE_MIN_BUDGET_S floor
+        and the ADAPTIVE_CEILING_FRACTION ceiling.  A tightened budget that
+        starts missing drags the met rate down and falls back to ``budget_s``.
+        """
+        if device not in self._data:
+            return budget_s
+        lock, data = self._shard(device)
+        with lock:
+            entry = data["transition_times"].get(label)
+            if entry is None:
+                return budget_s
+            samples = sorted(entry["samples"])
+            count, met = entry["count"], entry["met_count"]
+        if len(samples) < MIN_ADAPTIVE_SAMPLES or met < MIN_ADAPTIVE_SUCCESS_RATE * count:
+            return budget_s
+        idx = min(len(samples) - 1, int(len(samples) * ADAPTIVE_PERCENTILE / 100))
+        floor = max(budget_s * ADAPTIVE_FLOOR_FRACTION, ADAPTIVE_MIN_BUDGET_S)
+        ceiling = budget_s * ADAPTIVE_CEILING_FRACTION
+        return min(ceiling, max(floor, samples[idx] * ADAPTIVE_HEADROOM))
 
     def check_template_trends(self, device, template_name):
         """Check if a template's best scores are trending toward failure.
         Returns a warning string if scores are drifting down, or None."""
-        with self._lock:
-            return self._check_template_trends_unlocked(device, template_name)
+        if device not in self._data:
+            return None
+        lock, data = self._shard(device)
+        with lock:
+            entry = data["template_misses"].get(template_name)
+            return _template_trend(template_name, entry)
 
     def save(self):
-        """Save stats to a timestamped JSON file. Auto-cleans old sessions."""
+        """Save stats to a timestamped JSON file. Auto-cleans old sessions.
+
+        Serializes a snapshot, so recorders only ever wait for their own
+        device's copy.  Also flushes the history store, so a save on
+        shutdown leaves every recorded row on disk.
+        """
+        if self._history is not None:
+            self._history.flush()
         os.makedirs(STATS_DIR, exist_ok=True)
-        with self._lock:
-            now = datetime.now()
-            duration = (now - self._session_start).total_seconds() / 60.0
-
-            # Compute avg_time_s for each action
-            output_devices = {}
-            for device, data in self._data.items():
-                device_copy = {
-                    "actions": {},
-                    "template_misses": data["template_misses"],
-                    "template_hits": data.get("template_hits", {}),
-                    "transition_times": {},
-                    "nav_failures": data["nav_failures"],
-                    "errors": data["errors"],
-                    "adb_timing": {},
-                }
-                for cmd, info in data.get("adb_timing", {}).items():
-                    entry = dict(info)
-                    entry["avg_s"] = round(
-                        entry["total_s"] / max(1, entry["count"]), 3
-                    )
-                    device_copy["adb_timing"][cmd] = entry
-                for action_name, info in data["actions"].items():
-                    entry = dict(info)
-                    entry["avg_time_s"] = round(
-                        entry["total_time_s"] / max(1, entry["attempts"]), 1
-                    )
-                    device_copy["actions"][action_name] = entry
-                for label, info in data.get("transition_times", {}).items():
-                    entry = dict(info)
-                    samples = info["samples"]
-                    if samples:
-                        entry["min_s"] = min(samples)
-                        entry["max_s"] = max(samples)
-                        entry["avg_s"] = round(sum(samples) / len(samples), 3)
-                    device_copy["transition_times"][label] = entry
-                output_devices[device] = device_copy
-
-            output = {
-                "version": BOT_VERSION,
-                "session_start": self._session_start.strftime("%Y-%m-%d %H:%M:%S"),
-                "session_end": now.strftime("%Y-%m-%d %H:%M:%S"),
-                "duration_minutes": round(duration, 1),
-                "memory_mb": round(get_memory_mb(), 1),
-                "peak_memory_mb": round(_peak_memory_mb, 1),
-                "devices": output_devices,
+        snapshot = self._snapshot()
+        now = datetime.now()
+        duration = (now - self._session_start).total_seconds() / 60.0
+
+        # Compute averages / percentiles for each device
+        output_devices = {}
+        for device, data in snapshot.items():
+            device_copy = {
+                "actions": {},
+                "template_misses": data["template_misses"],
+                "template_hits": data["template_hits"],
+                "transition_times": {},
+                "nav_failures": data["nav_failures"],
+                "errors": data["errors"],
+                "adb_timing": {},
             }
-
-            filename = f"session_{self._session_start.strftime('%Y%m%d_%H%M%S')}.json"
-            filepath = os.path.join(STATS_DIR, filename)
-            try:
-                with open(filepath, "w") as f:
-                    json.dump(output, f, indent=2)
-            except Exception as e:
-                _log = logging.getLogger("botlog")
-                _log.warning("Failed to save session stats: %s", e)
+            for cmd, info in data["adb_timing"].items():
+                entry = dict(info)
+                hist = entry.pop("hist")
+                entry["total_s"] = round(entry["total_s"], 2)
+                entry["max_s"] = round(entry["max_s"], 2)
+                entry["avg_s"] = round(
+                    entry["total_s"] / max(1, entry["count"]), 3
+                )
+                entry["p50_s"] = round(hist.percentile(50), 3)
+                entry["p95_s"] = round(hist.percentile(95), 3)
+                device_copy["adb_timing"][cmd] = entry
+            for action_name, info in data["actions"].items():
+                entry = dict(info)
+                entry["avg_time_s"] = round(
+                    entry["total_time_s"] / max(1, entry["attempts"]), 1
+                )
+                device_copy["actions"][action_name] = entry
+            for label, info in data["transition_times"].items():
+                entry = dict(info)
+                hist = entry.pop("hist")
+                entry["saved_s"] = round(entry["saved_s"], 3)
+                samples = info["samples"]
+                if samples:
+                    entry["min_s"] = min(samples)
+                    entry["max_s"] = max(samples)
+                    entry["avg_s"] = round(sum(samples) / len(samples), 3)
+                if hist.count:
+                    entry["p95_s"] = round(hist.percentile(95), 3)
+                device_copy["transition_times"][label] = entry
+            cache = data["frame_cache"]
+            if cache["hits"] or cache["misses"]:
+                entry = self._frame_cache_summary(cache)
+                entry["hourly"] = cache["hourly"]
+                device_copy["frame_cache"] = entry
+            if data["ocr"]["calls"]:
+                device_copy["ocr"] = _ocr_summary(data["ocr"])
+            output_devices[device] = device_copy
+
+        output = {
+            "version": BOT_VERSION,
+            "session_start": self._session_start.strftime("%Y-%m-%d %H:%M:%S"),
+            "session_end": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_minutes": round(duration, 1),
+            "memory_mb": round(get_memory_mb(), 1),
+            "peak_memory_mb": round(_peak_memory_mb, 1),
+            "devices": output_devices,
+        }
+
+        filename = f"session_{self._session_start.strftime('%Y%m%d_%H%M%S')}.json"
+        filepath = os.path.join(STATS_DIR, filename)
+        try:
+            with open(filepath, "w") as f:
+                json.dump(output, f, indent=2)
+        except Exception as e:
+            _log = logging.getLogger("botlog")
+            _log.warning("Failed to save session stats: %s", e)
 
         # Clean old session files (keep last 30)
         try:
@@ -503,94 +750,150 @@ class StatsTracker:
 
     def summary(self):
         """Return a human/AI-readable summary of the session."""
-        with self._lock:
-            if not self._data:
-                return "No activity recorded this session."
-
-            lines = []
-            duration = (datetime.now() - self._session_start).total_seconds() / 60.0
-            lines.append(f"Session duration: {duration:.0f} minutes")
-            lines.append(f"Memory: {get_memory_mb():.0f} MB (peak: {_peak_memory_mb:.0f} MB)")
-
-            for device, data in self._data.items():
-                lines.append(f"\n=== {device} ===")
-
-                if data["actions"]:
-                    for action, info in sorted(data["actions"].items()):
-                        avg = info["total_time_s"] / max(1, info["attempts"])
-                        rate = info["successes"] / max(1, info["attempts"]) * 100
+        snapshot = self._snapshot()
+        if not snapshot:
+            return "No activity recorded this session."
+
+        lines = []
+        duration = (datetime.now() - self._session_start).total_seconds() / 60.0
+        lines.append(f"Session duration: {duration:.0f} minutes")
+        lines.append(f"Memory: {get_memory_mb():.0f} MB (peak: {_peak_memory_mb:.0f} MB)")
+
+        for device, data in snapshot.items():
+            lines.append(f"\n=== {device} ===")
+
+            if data["actions"]:
+                for action, info in sorted(data["actions"].items()):
+                    avg = info["total_time_s"] / max(1, info["attempts"])
+                    rate = info["successes"] / max(1, info["attempts"]) * 100
+                    lines.append(
+                        f"  {action}: {info['successes']}/{info['attempts']} "
+                        f"({rate:.0f}% success, avg {avg:.1f}s"
+                        f"{', ' + str(info['failures']) + ' failed' if info['failures'] else ''})"
+                    )
+
+            if data["template_misses"]:
+                top = sorted(data["template_misses"].items(),
+                             key=lambda x: x[1]["count"], reverse=True)[:5]
+                miss_parts = []
+                for name, info in top:
+                    avg_score = sum(info["best_scores"]) / max(1, len(info["best_scores"]))
+                    miss_parts.append(f"{name}({info['count']}x, avg best {avg_score:.0%})")
+                lines.append(f"  Top template misses: {', '.join(miss_parts)}")
+
+            if data["template_hits"]:
+                top_hits = sorted(data["template_hits"].items(),
+                                  key=lambda x: x[1]["count"], reverse=True)[:10]
+                hit_parts = []
+                for name, info in top_hits:
+                    hit_parts.append(
+                        f"{name}({info['count']}x, "
+                        f"x:{info['min_x']}-{info['max_x']} "
+                        f"y:{info['min_y']}-{info['max_y']})"
+                    )
+                lines.append(f"  Template hit regions: {', '.join(hit_parts)}")
+
+            if data["transition_times"]:
+                lines.append("  Transition times (actual vs budget):")
+                for label, info in sorted(data["transition_times"].items()):
+                    samples = info["samples"]
+                    if samples:
+                        avg = sum(samples) / len(samples)
+                        waste = info["budgeted_s"] - avg
+                        lines.append(
+                            f"    {label}: {info['met_count']}/{info['count']} met, "
+                            f"avg {avg:.2f}s / budget {info['budgeted_s']}s "
+                            f"(~{waste:.2f}s wasted per call, "
+                            f"{info['saved_s']:.1f}s saved)")
+                    else:
                         lines.append(
-                            f"  {action}: {info['successes']}/{info['attempts']} "
-                            f"({rate:.0f}% success, avg {avg:.1f}s"
-                            f"{', ' + str(info['failures']) + ' failed' if info['failures'] else ''})"
-                        )
-
-                if data["template_misses"]:
-                    top = sorted(data["template_misses"].items(),
-                                 key=lambda x: x[1]["count"], reverse=True)[:5]
-                    miss_parts = []
-                    for name, info in top:
-                        avg_score = sum(info["best_scores"]) / max(1, len(info["best_scores"]))
-                        miss_parts.append(f"{name}({info['count']}x, avg best {avg_score:.0%})")
-                    lines.append(f"  Top template misses: {', '.join(miss_parts)}")
-
-                if data.get("template_hits"):
-                    top_hits = sorted(data["template_hits"].items(),
-                                      key=lambda x: x[1]["count"], reverse=True)[:10]
-                    hit_parts = []
-                    for name, info in top_hits:
-                        hit_parts.append(
-                            f"{name}({info['count']}x, "
-                            f"x:{info['min_x']}-{info['max_x']} "
-                            f"y:{info['min_y']}-{info['max_y']})"
-                        )
-                    lines.append(f"  Template hit regions: {', '.join(hit_parts)}")
-
-                if data.get("transition_times"):
-                    lines.append("  Transition times (actual vs budget):")
-                    for label, info in sorted(data["transition_times"].items()):
-                        samples = info["samples"]
-                        if samples:
-                            avg = sum(samples) / len(samples)
-                            waste = info["budgeted_s"] - avg
-                            lines.append(
-                                f"    {label}: {info['met_count']}/{info['count']} met, "
-                                f"avg {avg:.2f}s / budget {info['budgeted_s']}s "
-                                f"(~{waste:.2f}s wasted per call)")
-                        else:
-                            lines.append(
-                                f"    {label}: 0/{info['count']} met "
-                                f"(budget {info['budgeted_s']}s)")
-
-                if data["nav_failures"]:
-                    nav_parts = [f"{k}({v})" for k, v in
-                                 sorted(data["nav_failures"].items(),
-                                        key=lambda x: x[1], reverse=True)[:3]]
-                    lines.append(f"  Nav failures: {', '.join(nav_parts)}")
-
-                if data.get("adb_timing"):
-                    adb_parts = []
-                    for cmd, info in sorted(data["adb_timing"].items()):
-                        avg = info["total_s"] / max(1, info["count"])
-                        part = f"{cmd}: {info['count']}x, avg {avg:.2f}s, max {info['max_s']:.2f}s"
-                        if info["slow_count"]:
-                            part += f", {info['slow_count']} slow"
-                        if info["failures"]:
-                            part += f", {info['failures']} failed"
-                        adb_parts.append(part)
-                    lines.append(f"  ADB timing: {'; '.join(adb_parts)}")
-
-                # Template score trend warnings
-                for tpl_name in list(data.get("template_misses", {})):
-                    warning = self._check_template_trends_unlocked(device, tpl_name)
-                    if warning:
-                        lines.append(f"  TREND WARNING: {warning}")
-
-            return "\n".join(lines)
-
-
-# Global instance
-stats = StatsTracker()
+                            f"    {label}: 0/{info['count']} met "
+                            f"(budget {info['budgeted_s']}s)")
+
+            if data["nav_failures"]:
+                nav_parts = [f"{k}({v})" for k, v in
+                             sorted(data["nav_failures"].items(),
+                                    key=lambda x: x[1], reverse=True)[:3]]
+                lines.append(f"  Nav failures: {', '.join(nav_parts)}")
+
+            if data["adb_timing"]:
+                adb_parts = []
+                for cmd, info in sorted(data["adb_timing"].items()):
+                    avg = info["total_s"] / max(1, info["count"])
+                    part = (f"{cmd}: {info['count']}x, avg {avg:.2f}s, "
+                            f"p95 {info['hist'].percentile(95):.2f}s, max {info['max_s']:.2f}s")
+                    if info["slow_count"]:
+                        part += f", {info['slow_count']} slow"
+                    if info["failures"]:
+                        part += f", {info['failures']} failed"
+                    adb_parts.append(part)
+                lines.append(f"  ADB timing: {'; '.join(adb_parts)}")
+
+            cache = data["frame_cache"]
+            if cache["hits"] or cache["misses"]:
+                fc = self._frame_cache_summary(cache)
+                lines.append(
+                    f"  Frame cache: {fc['hits']} hits / {fc['misses']} misses "
+                    f"({fc['hit_rate']:.0%} of screenshots reused, "
+                    f"~{fc['saved_per_hour']:.0f} captures saved/hour)")
+
+            if data["ocr"]["calls"]:
+                oc = _ocr_summary(data["ocr"])
+                lines.append(
+                    f"  OCR: {oc['calls']} reads, {oc['hit_rate']:.0%} cached, "
+                    f"avg wait {oc['avg_wait_ms']:.0f}ms (max {oc['max_wait_ms']:.0f}ms), "
+                    f"avg batch {oc['avg_batch']:.1f}")
+
+            # Template score trend warnings
+            for tpl_name, entry in data["template_misses"].items():
+                warning = _template_trend(tpl_name, entry)
+                if warning:
+                    lines.append(f"  TREND WARNING: {warning}")
+
+        return "\n".join(lines)
+
+
+def _new_transition(budgeted_s):
+    return {"count": 0, "met_count": 0, "budgeted_s": budgeted_s, "saved_s": 0.0,
+            "samples": deque(maxlen=TRANSITION_SAMPLES_KEPT), "hist": TimingHistogram()}
+
+
+def _template_trend(template_name, entry):
+    """Warning string if a template's best miss scores are drifting down, else None."""
+    if entry is None or len(entry["best_scores"]) < 5:
+        return None
+    scores = entry["best_scores"]
+    # Compare recent half vs older half
+    mid = len(scores) // 2
+    old_avg = sum(scores[:mid]) / mid
+    new_avg = sum(scores[mid:]) / (len(scores) - mid)
+    if new_avg < old_avg - 0.05 and new_avg < 0.75:
+        return (f"{template_name}: score trending down "
+                f"({old_avg:.0%} -> {new_avg:.0%}, {entry['count']} misses)")
+    return None
+
+
+def _ocr_summary(ocr):
+    inferences = max(1, ocr["inferences"])
+    return {
+        "calls": ocr["calls"],
+        "cache_hits": ocr["cache_hits"],
+        "hit_rate": round(ocr["cache_hits"] / ocr["calls"], 3) if ocr["calls"] else 0.0,
+        "avg_wait_ms": round(ocr["wait_total_s"] * 1000 / inferences, 1),
+        "max_wait_ms": round(ocr["wait_max_s"] * 1000, 1),
+        "avg_batch": round(ocr["batch_total"] / inferences, 2),
+        "max_batch": ocr["batch_max"],
+    }
+
+
+def _new_ocr_stats():
+    return {"calls": 0, "cache_hits": 0, "inferences": 0, "batch_total": 0,
+            "batch_max": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+
+
+# Global instances
+history = HistoryStore(HISTORY_DB)
+stats = StatsTracker(history=history)
 
 
 # ============================================================
@@ -617,7 +920,8 @@ def timed_action(action_name):
             mem_before = get_memory_mb()
             start = time.time()
             try:
-                result = func(device, *args, **kwargs)
+                with profiling.action(device, action_name):
+                    result = func(device, *args, **kwargs)
                 elapsed = time.time() - start
                 success = result is not False and result is not None
                 mem_after = _update_peak()
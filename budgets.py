@@ -0,0 +1,97 @@
+"""
+9Bot Transition Budgets
+
+Per-device, per-label wait budgets for ``vision.timed_wait``, learned from
+the ``transition_times`` samples StatsTracker keeps (seeded from the
+previous session file at startup, so a known machine is fast from the
+first cycle).  The learned budget is the p95 of successful waits plus
+headroom, clamped between a floor and a ceiling relative to the
+hard-coded budget (see botlog's ADAPTIVE BUDGET CONFIGURATION) — fast
+emulators get shorter waits, slow ones a little more room.
+
+Modes (``budget_mode`` setting):
+    observe   wait the hard-coded budget, but log every wait that ran
+              past the learned optimum — what adaptive would have saved
+              (default)
+    fixed     always wait the hard-coded budget
+    adaptive  wait the learned budget (opt-in: a learned budget only
+              sees successful waits, so check the observe log first)
+
+Only waits whose condition was met teach a budget.  A label that never
+sees its condition met (a wait that can only time out) keeps the
+hard-coded budget in every mode, and its learned optimum is the full
+wait — so every timed_wait needs a condition that can be met
+(vision.on_settled() when there is no template to look for).
+
+Every wait's wall time is tallied per device and label against the
+learned optimum; ``report()`` feeds the dashboard debug page.
+
+Public API
+----------
+budget_for(device, label, default_s) -> seconds to wait
+record_use(device, label, consumed_s, default_s)
+report(device=None) -> list of per-label dicts, biggest excess first
+reset()
+"""
+
+import threading
+
+import config
+from botlog import get_logger, stats
+
+OBSERVE_LOG_MIN_S = 0.1   # observe mode: don't log waits closer than this to optimum
+
+_usage = {}               # {(device, label): {"calls", "consumed_s", "optimum_s"}}
+_usage_lock = threading.Lock()
+
+
+def budget_for(device, label, default_s):
+    """Return how long a wait labelled ``label`` should last on ``device``."""
+    if config.BUDGET_MODE != "adaptive":
+        return default_s
+    return stats.get_adaptive_budget(device, label, default_s)
+
+
+def record_use(device, label, consumed_s, default_s):
+    """Tally the wall time a wait consumed against the learned optimum.
+
+    The optimum is the time the wait would have taken under the learned
+    budget: ``consumed_s`` if it ended sooner, else the learned budget.
+    """
+    learned = stats.get_adaptive_budget(device, label, default_s)
+    optimum = min(consumed_s, learned)
+    with _usage_lock:
+        entry = _usage.setdefault((device, label),
+                                  {"calls": 0, "consumed_s": 0.0, "optimum_s": 0.0})
+        entry["calls"] += 1
+        entry["consumed_s"] += consumed_s
+        entry["optimum_s"] += optimum
+    if config.BUDGET_MODE == "observe" and consumed_s - optimum >= OBSERVE_LOG_MIN_S:
+        get_logger("budgets", device).info(
+            "%s: waited %.2fs, learned optimum %.2fs (+%.2fs)",
+            label, consumed_s, optimum, consumed_s - optimum)
+
+
+def report(device=None):
+    """Per-label wall time vs learned optimum, biggest excess first."""
+    with _usage_lock:
+        items = [(key, dict(entry)) for key, entry in _usage.items()
+                 if device is None or key[0] == device]
+    rows = []
+    for (dev, label), entry in items:
+        rows.append({
+            "device": dev,
+            "label": label,
+            "calls": entry["calls"],
+            "consumed_s": round(entry["consumed_s"], 2),
+            "optimum_s": round(entry["optimum_s"], 2),
+            "excess_s": round(entry["consumed_s"] - entry["optimum_s"], 2),
+        })
+    rows.sort(key=lambda r: (-r["excess_s"], -r["consumed_s"]))
+    return rows
+
+
+def reset():
+    """Forget the wall-time tally (tests)."""
+    with _usage_lock:
+        _usage.clear()
@@ -0,0 +1,585 @@
+"""
+9Bot Streaming Screen Capture
+
+Keeps one long-lived ``adb exec-out`` process per device that runs
+``screencap`` (raw, no ``-p``) back-to-back and streams the frames to us.
+A reader thread parses each raw frame (header + RGBA bytes) into a numpy
+array and pushes it onto a small ring buffer, so ``load_screenshot`` can
+hand back the freshest frame in a few milliseconds instead of paying
+process startup + PNG encode/decode on every call.
+
+Selected with the ``capture_backend`` setting ("screencap" = legacy
+one-shot PNG, "raw" = one-shot raw screencap decoded by
+``decode_raw_screencap``, "stream" = this module).
+``vision.load_screenshot`` falls back to the one-shot path whenever a
+session has no usable frame.
+
+Public API
+----------
+get_session(device) -> CaptureSession
+    Return the running capture session for a device, starting it if needed.
+stop_session(device) / stop_all_sessions()
+    Terminate capture processes (called on shutdown / backend switch).
+register_fake_device(device, fake) / unregister_fake_device(device)
+    Route a device's session to a FakeDevice instead of adb (tests/dev).
+decode_raw_screencap(data, region=None) -> BGR image or None
+    Decode a single raw screencap output (used by the "raw" backend).
+raw_view(data) / crop_raw_to_bgr(frame, fmt, region)
+    Zero-copy view of a raw output, and per-region conversion of it.
+FakeDevice
+    Replays recorded frames as a raw screencap stream — no emulator needed.
+"""
+
+import os
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import config
+from botlog import get_logger, stats
+
+_log = get_logger("capture")
+
+# ============================================================
+# RAW SCREENCAP FORMAT
+# ============================================================
+#
+# ``screencap`` without ``-p`` writes a little-endian header followed by
+# width*height*4 pixel bytes:
+#   Android < 9:  width(u32) height(u32) format(u32)                 — 12 bytes
+#   Android >= 9: width(u32) height(u32) format(u32) colorspace(u32) — 16 bytes
+# The header size can't be told apart from the pixel data inside a
+# continuous stream, so it is probed once per session from a single frame.
+
+RAW_HEADER_SIZES = (16, 12)
+
+# android.graphics.PixelFormat values we can consume (all 4 bytes/pixel)
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_BGRA_8888 = 5
+_SUPPORTED_FORMATS = {PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888,
+                      PIXEL_FORMAT_BGRA_8888}
+
+RING_SIZE = 3                 # frames kept per device
+RESTART_BACKOFF_S = 5.0       # wait before restarting a dead session
+FIRST_FRAME_TIMEOUT_S = 5.0   # how long load_screenshot waits on a cold session
+
+
+def parse_raw_header(data):
+    """Parse the fixed part of a raw screencap header.
+
+    Returns (width, height, pixel_format), or None if the bytes don't look
+    like a raw screencap header.
+    """
+    if data is None or len(data) < 12:
+        return None
+    width, height, fmt = struct.unpack_from("<III", data, 0)
+    if not (0 < width <= 8192 and 0 < height <= 8192):
+        return None
+    if fmt not in _SUPPORTED_FORMATS:
+        return None
+    return width, height, fmt
+
+
+def detect_header_size(data):
+    """Work out the header size of a complete single raw screencap output.
+
+    Returns 12 or 16, or None if ``data`` isn't a supported raw frame.
+    """
+    header = parse_raw_header(data)
+    if header is None:
+        return None
+    width, height, _ = header
+    extra = len(data) - width * height * 4
+    return extra if extra in RAW_HEADER_SIZES else None
+
+
+def encode_raw_frame(image, header_size=16):
+    """Encode a BGR/BGRA image as raw screencap bytes (RGBA_8888).
+
+    Used by FakeDevice to produce the same byte stream a real device sends.
+    """
+    if image.ndim == 2:
+        rgba = cv2.cvtColor(image, cv2.COLOR_GRAY2RGBA)
+    elif image.shape[2] == 4:
+        rgba = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+    else:
+        rgba = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    h, w = rgba.shape[:2]
+    header = struct.pack("<III", w, h, PIXEL_FORMAT_RGBA_8888)
+    if header_size == 16:
+        header += struct.pack("<I", 0)
+    return header + np.ascontiguousarray(rgba).tobytes()
+
+
+def raw_to_bgr(frame, fmt=PIXEL_FORMAT_RGBA_8888):
+    """Convert a (h, w, 4) raw frame to the BGR image the rest of the bot uses."""
+    if fmt == PIXEL_FORMAT_BGRA_8888:
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+
+
+def raw_view(data):
+    """View one complete raw ``screencap`` output as a (h, w, 4) array.
+
+    Returns (frame, pixel_format) — the frame is an ``np.frombuffer`` view of
+    ``data``, no copy — or None if the header or the length is unexpected.
+    """
+    header_size = detect_header_size(data)
+    if header_size is None:
+        return None
+    width, height, fmt = parse_raw_header(data)
+    frame = np.frombuffer(data, dtype=np.uint8, count=width * height * 4,
+                          offset=header_size).reshape(height, width, 4)
+    return frame, fmt
+
+
+def crop_raw_to_bgr(frame, fmt, region):
+    """Convert only ``region`` = (x1, y1, x2, y2) of a raw frame to BGR.
+
+    The crop is a view, so the colour conversion is the single copy made.
+    Returns None if the region lies outside the frame.
+    """
+    x1, y1, x2, y2 = region
+    height, width = frame.shape[:2]
+    crop = frame[max(0, y1):min(height, y2), max(0, x1):min(width, x2)]
+    if crop.size == 0:
+        return None
+    return raw_to_bgr(crop, fmt)
+
+
+def decode_raw_screencap(data, region=None):
+    """Decode one complete raw ``screencap`` output to a BGR image, or only
+    ``region`` of it.  Returns None if the header or the length is
+    unexpected — the caller falls back to ``screencap -p``.
+    """
+    view = raw_view(data)
+    if view is None:
+        return None
+    frame, fmt = view
+    if region is not None:
+        return crop_raw_to_bgr(frame, fmt, region)
+    return raw_to_bgr(frame, fmt)
+
+
+def _read_exact(stream, n):
+    """Read exactly n bytes from a binary stream. Returns None on EOF."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        chunk = stream.readinto(view[got:])
+        if not chunk:
+            return None
+        got += chunk
+    return buf
+
+
+# ============================================================
+# FAKE DEVICE (replays recorded frames — no emulator needed)
+# ============================================================
+
+class _ReplayStream:
+    """File-like object that serves FakeDevice frames as a raw byte stream."""
+
+    def __init__(self, fake):
+        self._fake = fake
+        self._buf = b""
+        self._pos = 0
+        self._index = 0
+        self._closed = False
+
+    def _next_frame(self):
+        frames = self._fake.frames
+        if self._index >= len(frames):
+            if not self._fake.loop or not frames:
+                return False
+            self._index = 0
+        if self._fake.frame_interval_s:
+            time.sleep(self._fake.frame_interval_s)
+        self._buf = self._fake.encoded(self._index)
+        self._pos = 0
+        self._index += 1
+        return True
+
+    def readinto(self, view):
+        if self._closed:
+            return 0
+        if self._pos >= len(self._buf) and not self._next_frame():
+            return 0
+        n = min(len(view), len(self._buf) - self._pos)
+        view[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            out = bytearray()
+            chunk = bytearray(65536)
+            while True:
+                got = self.readinto(memoryview(chunk))
+                if not got:
+                    return bytes(out)
+                out += chunk[:got]
+        buf = bytearray(n)
+        got = self.readinto(memoryview(buf))
+        return bytes(buf[:got])
+
+    def close(self):
+        self._closed = True
+
+
+class FakeDevice:
+    """Stand-in for an emulator that replays recorded frames.
+
+    frames: list of BGR numpy arrays and/or image file paths (e.g. PNGs
+            from debug/failures).  Frames are served in order as a raw
+            screencap stream, looping forever unless ``loop=False``.
+    fps:    optional playback rate; None streams as fast as it's read.
+    """
+
+    def __init__(self, frames, fps=None, loop=True, header_size=16):
+        self.frames = [cv2.imread(f) if isinstance(f, str) else f for f in frames]
+        self.frames = [f for f in self.frames if f is not None]
+        self.loop = loop
+        self.header_size = header_size
+        self.frame_interval_s = (1.0 / fps) if fps else 0.0
+        self._encoded = {}
+
+    @classmethod
+    def from_dir(cls, path, **kwargs):
+        """Build a FakeDevice from every .png in a directory (sorted by name)."""
+        files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                       if f.endswith(".png"))
+        return cls(files, **kwargs)
+
+    def encoded(self, index):
+        """Raw screencap bytes for frame ``index`` (encoded once, then cached)."""
+        if index not in self._encoded:
+            self._encoded[index] = encode_raw_frame(self.frames[index], self.header_size)
+        return self._encoded[index]
+
+    def screencap(self):
+        """One-shot raw capture of the first frame (used for header probing)."""
+        return self.encoded(0) if self.frames else b""
+
+    def open_stream(self):
+        return _ReplayStream(self)
+
+
+_fake_devices = {}
+
+
+def register_fake_device(device, fake):
+    """Route capture sessions for ``device`` to a FakeDevice."""
+    stop_session(device)
+    _fake_devices[device] = fake
+
+
+def unregister_fake_device(device):
+    stop_session(device)
+    _fake_devices.pop(device, None)
+
+
+# ============================================================
+# CAPTURE SESSION
+# ============================================================
+
+class CaptureSession:
+    """Long-lived raw frame stream for one device.
+
+    A daemon reader thread parses frames off the stream and keeps the last
+    RING_SIZE of them as (timestamp, header_time, rgba_array).  The device
+    grabs the screen before it writes the header, so a header that arrives
+    just after a tap may belong to a pre-tap frame.  What we do know is
+    that ``screencap`` only starts once the previous one has been written
+    out, so the timestamp is the previous frame's header arrival (the
+    stream start for the first frame): the frame was grabbed no earlier
+    than that.  ``newer_than`` compares against it; ``max_age_s`` against
+    the header time.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self._log = get_logger("capture", device)
+        self._ring = deque(maxlen=RING_SIZE)
+        self._cond = threading.Condition()
+        self._proc = None
+        self._stream = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.header_size = None
+        self.pixel_format = PIXEL_FORMAT_RGBA_8888
+        self.frame_count = 0
+        self.started_at = None
+        self.last_error = None
+
+    # -- lifecycle --
+
+    def _probe_header_size(self):
+        fake = _fake_devices.get(self.device)
+        if fake is not None:
+            return detect_header_size(fake.screencap())
+        if config.ADB_BACKEND == "socket":
+            import adb_client
+            try:
+                return detect_header_size(adb_client.exec_out(
+                    self.device, "screencap", timeout=config.ADB_COMMAND_TIMEOUT))
+            except OSError:
+                return None
+        try:
+            result = subprocess.run(
+                [config.adb_path, "-s", self.device, "exec-out", "screencap"],
+                capture_output=True, timeout=config.ADB_COMMAND_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return None
+        if result.returncode != 0:
+            return None
+        return detect_header_size(result.stdout)
+
+    def _open_stream(self):
+        fake = _fake_devices.get(self.device)
+        if fake is not None:
+            return None, fake.open_stream()
+        if config.ADB_BACKEND == "socket":
+            import adb_client
+            proc = adb_client.open_process(self.device, "while true; do screencap; done")
+            return proc, proc.stdout
+        proc = subprocess.Popen(
+            [config.adb_path, "-s", self.device, "exec-out",
+             "while true; do screencap; done"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        return proc, proc.stdout
+
+    def start(self):
+        """Probe the header format and start the reader thread.
+
+        Returns True if streaming started, False if the device can't
+        produce raw frames (caller should use the one-shot path).
+        """
+        self.header_size = self._probe_header_size()
+        if self.header_size is None:
+            self.last_error = "raw screencap header not recognized"
+            self._log.warning("Capture stream unavailable: %s", self.last_error)
+            return False
+        self.started_at = time.time()   # no frame can be grabbed before this
+        try:
+            self._proc, self._stream = self._open_stream()
+        except OSError as e:
+            self.last_error = str(e)
+            self._log.warning("Capture stream failed to start: %s", e)
+            return False
+        self._thread = threading.Thread(target=self._reader_loop, daemon=True,
+                                        name=f"capture-{self.device}")
+        self._thread.start()
+        self._log.info("Capture stream started (header=%d bytes)", self.header_size)
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+            except Exception:
+                pass
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    # -- reader --
+
+    def _reader_loop(self):
+        hsize = self.header_size
+        grabbed_after = self.started_at
+        try:
+            while not self._stop.is_set():
+                header = _read_exact(self._stream, hsize)
+                if header is None:
+                    break
+                t_header = time.time()
+                parsed = parse_raw_header(header)
+                if parsed is None:
+                    self.last_error = "unexpected frame header"
+                    self._log.warning("Capture stream out of sync — stopping")
+                    break
+                width, height, fmt = parsed
+                pixels = _read_exact(self._stream, width * height * 4)
+                if pixels is None:
+                    break
+                frame = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+                elapsed = time.time() - t_header
+                with self._cond:
+                    self.pixel_format = fmt
+                    self._ring.append((grabbed_after, t_header, frame))
+                    self.frame_count += 1
+                    self._cond.notify_all()
+                grabbed_after = t_header
+                stats.record_adb_timing(self.device, "stream_frame", elapsed)
+        except Exception as e:
+            self.last_error = str(e)
+            self._log.warning("Capture stream error: %s", e)
+        finally:
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+            if self._proc is not None:
+                try:
+                    self._proc.kill()
+                except Exception:
+                    pass
+            self._log.debug("Capture stream ended after %d frames", self.frame_count)
+
+    # -- readers --
+
+    def latest(self):
+        """Return (timestamp, rgba_frame) of the newest frame, or (None, None)."""
+        with self._cond:
+            if not self._ring:
+                return None, None
+            ts, _, frame = self._ring[-1]
+            return ts, frame
+
+    def wait_for_frame(self, newer_than=0.0, timeout=FIRST_FRAME_TIMEOUT_S):
+        """Block until a frame grabbed after ``newer_than`` arrives.
+
+        Returns (timestamp, rgba_frame), or (None, None) on timeout or when
+        the stream dies.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                if self._ring and self._ring[-1][0] > newer_than:
+                    ts, _, frame = self._ring[-1]
+                    return ts, frame
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stop.is_set():
+                    return None, None
+                self._cond.wait(remaining)
+
+    def get_raw(self, max_age_s=None, newer_than=0.0):
+        """Return (rgba_frame, pixel_format) of the freshest frame, waiting
+        for a new one if the newest arrived more than ``max_age_s`` ago or
+        may have been grabbed before ``newer_than``.  (None, None) if
+        nothing arrives.
+        """
+        with self._cond:
+            newest = self._ring[-1] if self._ring else None
+        if newest is not None and newest[0] > newer_than and (
+                max_age_s is None or newest[1] >= time.time() - max_age_s):
+            return newest[2], self.pixel_format
+        if newest is not None:
+            newer_than = max(newer_than, newest[0])
+        ts, frame = self.wait_for_frame(newer_than=newer_than)
+        if frame is None:
+            return None, None
+        return frame, self.pixel_format
+
+    def get_bgr(self, max_age_s=None, newer_than=0.0):
+        """Like get_raw, converted to BGR. None if nothing arrives."""
+        frame, fmt = self.get_raw(max_age_s, newer_than)
+        if frame is None:
+            return None
+        return raw_to_bgr(frame, fmt)
+
+
+# ============================================================
+# SESSION REGISTRY
+# ============================================================
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_last_failure = {}   # {device: time of last failed start} — restart backoff
+_starting = set()    # devices whose session is being started (outside the lock)
+
+
+def get_session(device):
+    """Return a live CaptureSession for ``device``, starting one if needed.
+
+    Returns None if the stream can't be started (recently failed, or the
+    device doesn't support raw screencap) or another thread is starting
+    it right now.  The start itself (a blocking header probe) runs outside
+    ``_sessions_lock``, so a hung device never holds up the others.
+    """
+    with _sessions_lock:
+        session = _sessions.get(device)
+        if session is not None and session.alive:
+            return session
+        if session is not None:
+            get_logger("capture", device).info(
+                "Capture stream died (%s) — restarting", session.last_error or "EOF")
+            _sessions.pop(device, None)
+            _last_failure[device] = time.time()
+        if device in _starting:
+            return None
+        if time.time() - _last_failure.get(device, 0) < RESTART_BACKOFF_S:
+            return None
+        _starting.add(device)
+
+    session = CaptureSession(device)
+    started = False
+    try:
+        started = session.start()
+    finally:
+        with _sessions_lock:
+            # stop_session / stop_all_sessions during the start cancel it
+            cancelled = device not in _starting
+            _starting.discard(device)
+            if started and not cancelled:
+                _sessions[device] = session
+                _last_failure.pop(device, None)
+            elif not started:
+                _last_failure[device] = time.time()
+    if not started:
+        return None
+    if cancelled:
+        session.stop()
+        return None
+    return session
+
+
+def stop_session(device):
+    with _sessions_lock:
+        session = _sessions.pop(device, None)
+        _last_failure.pop(device, None)
+        _starting.discard(device)
+    if session is not None:
+        session.stop()
+
+
+def stop_all_sessions():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+        _last_failure.clear()
+        _starting.clear()
+    for session in sessions:
+        session.stop()
+
+
+def session_info():
+    """Return {device: {...}} describing running sessions (for status/debug)."""
+    with _sessions_lock:
+        items = list(_sessions.items())
+    info = {}
+    for device, session in items:
+        ts, _ = session.latest()
+        info[device] = {
+            "alive": session.alive,
+            "frames": session.frame_count,
+            "last_frame_age_s": round(time.time() - ts, 3) if ts else None,
+            "error": session.last_error,
+        }
+    return info
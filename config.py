@@ -4,6 +4,9 @@ import os
 import glob
 from enum import Enum
 
+import profiling
+import state_store
+
 # ============================================================
 # ENUMS — quest types, rally types, screen names
 # ============================================================
@@ -168,7 +171,21 @@ CLICK_TRAIL_ENABLED = True
 
 # ADB & vision constants
 ADB_COMMAND_TIMEOUT = 10         # seconds — timeout for adb tap/swipe/screenshot
+ADB_PERSISTENT_SHELL = True      # send input through one long-lived adb shell per device (adb_shell.py)
+ADB_BACKEND = "subprocess"       # "subprocess" (run adb) or "socket" (adb server protocol, adb_client.py)
+CAPTURE_BACKEND = "screencap"    # "screencap" (one-shot PNG), "raw" (one-shot raw framebuffer) or "stream" (capture.py)
+CAPTURE_MAX_AGE_S = 0.5          # stream frames older than this are not handed out
+FRAME_CACHE_MAX_AGE_S = 0.15     # reuse a screenshot this young (0 = cache disabled)
+PYRAMID_MATCHING = False         # coarse-to-fine template search in find_image / find_all_matches; "pyramid_matching" setting
+PYRAMID_CHECK_SCREEN = False     # check_screen via the pyramid ScreenClassifier (False = full match per template); "pyramid_check_screen" setting
 SCREEN_MATCH_THRESHOLD = 0.8    # confidence required to identify a screen
+OCR_CACHE_SIZE = 256             # recognized crops remembered by ocr_read (0 = cache disabled)
+OCR_WORKERS = 0                  # EasyOCR worker subprocesses (0 = run OCR in the bot process)
+OCR_WORKER_MAX_MB = 1500         # a worker above this RSS is restarted after its request
+BUDGET_MODE = "observe"          # timed_wait budgets: "observe", "fixed" or opt-in "adaptive" (budgets.py)
+PROFILING = False                # time hot-path spans per device and action (profiling.py)
+DIGIT_READER_ENABLED = True      # try the glyph-template digit reader before OCR for numeric HUD text
+DIGIT_MIN_CONFIDENCE = 0.75      # worst-glyph score required to skip the OCR fallback
 
 # Debug screenshot limits (rolling cleanup)
 DEBUG_SCREENSHOT_MAX = 50        # max debug screenshots before cleanup
@@ -217,10 +234,12 @@ DEVICE_STATUS = {}   # {device_id: "status message"} — shown in GUI
 def set_device_status(device, msg):
     """Set the current status message for a device (shown in GUI)."""
     DEVICE_STATUS[device] = msg
+    state_store.publish(("devices", device, "status"), msg)
 
 def clear_device_status(device):
     """Clear status for a device (e.g. when task stops)."""
     DEVICE_STATUS.pop(device, None)
+    state_store.publish(("devices", device, "status"), "Idle")
 
 auto_occupy_running = False
 auto_occupy_thread = None
@@ -271,7 +290,11 @@ SETTINGS_RULES = {
     "gather_enabled":        {"type": bool},
     "tower_quest_enabled":   {"type": bool},
     "remote_access":         {"type": bool},
+    "adb_persistent_shell":  {"type": bool},
     "auto_upload_logs":      {"type": bool},
+    "profiling":             {"type": bool},
+    "pyramid_check_screen":  {"type": bool},
+    "pyramid_matching":      {"type": bool},
     # Ints — type + optional min/max
     "ap_gem_limit":          {"type": int, "min": 0, "max": 3500},
     "min_troops":            {"type": int, "min": 0, "max": 5},
@@ -284,11 +307,17 @@ SETTINGS_RULES = {
     "gather_mine_level":     {"type": int, "min": 4, "max": 6},
     "gather_max_troops":     {"type": int, "min": 1, "max": 5},
     "upload_interval_hours": {"type": int, "min": 1, "max": 168},
+    "frame_cache_ms":        {"type": int, "min": 0, "max": 2000},
+    "ocr_workers":           {"type": int, "min": 0, "max": 4},
+    "ocr_worker_max_mb":     {"type": int, "min": 300, "max": 8000},
     # Strings — type + allowed values
     "pass_mode":             {"type": str, "choices": ["Rally Joiner", "Rally Starter"]},
     "my_team":               {"type": str, "choices": ["yellow", "red", "blue", "green"]},
     "enemy_team":            {"type": str, "choices": ["yellow", "red", "blue", "green"]},  # legacy — ignored, enemies auto-derived from my_team
     "mode":                  {"type": str, "choices": ["bl", "rw"]},
+    "capture_backend":       {"type": str, "choices": ["screencap", "raw", "stream"]},
+    "adb_backend":           {"type": str, "choices": ["subprocess", "socket"]},
+    "budget_mode":           {"type": str, "choices": ["adaptive", "fixed", "observe"]},
 }
 
 
@@ -538,6 +567,62 @@ def set_gather_options(enabled, mine_level, max_troops):
     _log.info("Gather config: enabled=%s, mine_level=%d, max_troops=%d",
               GATHER_ENABLED, GATHER_MINE_LEVEL, GATHER_MAX_TROOPS)
 
+def set_capture_backend(backend):
+    """Select how screenshots are captured ("screencap", "raw" or "stream")."""
+    global CAPTURE_BACKEND
+    CAPTURE_BACKEND = backend
+    _log.info("Capture backend: %s", backend)
+
+def set_adb_backend(backend):
+    """Select how adb commands are sent ("subprocess" or "socket")."""
+    global ADB_BACKEND
+    ADB_BACKEND = backend
+    _log.info("ADB backend: %s", backend)
+
+def set_budget_mode(mode):
+    """Select how timed_wait budgets are chosen ("adaptive", "fixed" or "observe")."""
+    global BUDGET_MODE
+    BUDGET_MODE = mode
+    _log.info("Wait budgets: %s", mode)
+
+def set_profiling(enabled):
+    """Record hot-path spans (screenshots, matching, OCR, taps, waits) for the debug page."""
+    global PROFILING
+    PROFILING = enabled
+    profiling.set_enabled(enabled)
+    _log.info("Profiling: %s", "enabled" if enabled else "disabled")
+
+def set_adb_persistent_shell(enabled):
+    """Send taps/swipes/keys through a persistent adb shell (False = one adb process per command)."""
+    global ADB_PERSISTENT_SHELL
+    ADB_PERSISTENT_SHELL = enabled
+    _log.info("Persistent ADB shell: %s", "enabled" if enabled else "disabled")
+
+def set_pyramid_matching(enabled):
+    """Run find_image / find_all_matches through the coarse-to-fine pyramid (vision.PYRAMID_MIN_SCALE)."""
+    global PYRAMID_MATCHING
+    PYRAMID_MATCHING = enabled
+    _log.info("Pyramid template matching: %s", "enabled" if enabled else "disabled")
+
+def set_pyramid_check_screen(enabled):
+    """Identify screens with the pyramid ScreenClassifier (False = full match per template)."""
+    global PYRAMID_CHECK_SCREEN
+    PYRAMID_CHECK_SCREEN = enabled
+    _log.info("Pyramid check_screen: %s", "enabled" if enabled else "disabled")
+
+def set_frame_cache_max_age(ms):
+    """Set how long (ms) a screenshot may be reused by load_screenshot (0 = off)."""
+    global FRAME_CACHE_MAX_AGE_S
+    FRAME_CACHE_MAX_AGE_S = max(0, ms) / 1000.0
+    _log.info("Frame cache max age: %d ms", ms)
+
+def set_ocr_workers(count, max_mb):
+    """Set the OCR worker pool size (0 = in-process OCR) and per-worker RSS ceiling."""
+    global OCR_WORKERS, OCR_WORKER_MAX_MB
+    OCR_WORKERS = max(0, count)
+    OCR_WORKER_MAX_MB = max_mb
+    _log.info("OCR workers: %d (restart above %d MB)", OCR_WORKERS, OCR_WORKER_MAX_MB)
+
 def set_territory_config(my_team):
     """Set which team you are; all other teams become enemies automatically."""
     global MY_TEAM_COLOR, ENEMY_TEAMS
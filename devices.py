@@ -1,11 +1,21 @@
 import subprocess
 import platform
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import adb_client
+import config
 from config import adb_path, EMULATOR_PORTS
 from botlog import get_logger
 
 _log = get_logger("devices")
 
+PROBE_TIMEOUT_S = 0.3        # raw TCP pre-check before running adb connect
+CONNECT_WORKERS = 8          # concurrent port probes / adb connects
+DEVICE_CACHE_TTL = 15        # seconds before DeviceCache.get() rescans
+
 # ============================================================
 # DEVICE DETECTION (cross-platform, multi-emulator)
 # ============================================================
@@ -78,32 +88,63 @@ def _auto_connect_windows():
 
 
 def _auto_connect_by_ports():
-    """macOS/Linux: probe well-known emulator ports from EMULATOR_PORTS."""
+    """macOS/Linux: probe well-known emulator ports from EMULATOR_PORTS.
+
+    Most of those ports are closed, so a concurrent raw TCP check runs
+    first and only listening ports get an ``adb connect``.
+    """
     all_ports = set()
     for ports in EMULATOR_PORTS.values():
         all_ports.update(ports)
-    return _connect_ports(all_ports)
+    all_ports = sorted(all_ports)
+    if not all_ports:
+        return _connect_ports(all_ports)
+    with ThreadPoolExecutor(max_workers=min(CONNECT_WORKERS, len(all_ports))) as pool:
+        listening = [p for p, ok in zip(all_ports, pool.map(_port_open, all_ports)) if ok]
+    _log.debug("Port probe: %d/%d listening", len(listening), len(all_ports))
+    return _connect_ports(listening)
 
 
-def _connect_ports(ports):
-    """Try ``adb connect`` on each port, return list of successfully connected addresses."""
-    connected = []
-    for port in sorted(ports):
-        addr = f"127.0.0.1:{port}"
-        try:
+def _port_open(port):
+    """True if something accepts TCP connections on 127.0.0.1:port."""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=PROBE_TIMEOUT_S):
+            return True
+    except OSError:
+        return False
+
+
+def _adb_connect(port):
+    """Run ``adb connect`` for one port; returns the address or None."""
+    addr = f"127.0.0.1:{port}"
+    try:
+        if config.ADB_BACKEND == "socket":
+            output = adb_client.connect(addr, timeout=3)
+        else:
             result = subprocess.run(
                 [adb_path, "connect", addr],
                 capture_output=True, text=True, timeout=3
             )
             output = result.stdout.strip()
-            if "connected" in output.lower():
-                connected.append(addr)
-                _log.debug("Connected: %s", addr)
-        except (subprocess.TimeoutExpired, Exception):
-            pass
+        if "connected" in output.lower() and "failed" not in output.lower():
+            _log.debug("Connected: %s", addr)
+            return addr
+    except (subprocess.TimeoutExpired, Exception):
+        pass
+    return None
+
+
+def _connect_ports(ports):
+    """Try ``adb connect`` on each port (concurrently), return list of successfully connected addresses."""
+    ports = sorted(ports)
+    connected = []
+    if ports:
+        with ThreadPoolExecutor(max_workers=min(CONNECT_WORKERS, len(ports))) as pool:
+            connected = [addr for addr in pool.map(_adb_connect, ports) if addr]
 
     if connected:
         _log.info("Auto-connect found %d emulator(s)", len(connected))
+        device_cache.invalidate()
     else:
         _log.info("Auto-connect: no emulators found on probed ports")
     return connected
@@ -117,9 +158,12 @@ def get_devices():
     entry whose port matches an existing ``emulator-<port-1>`` entry.
     """
     try:
-        result = subprocess.run([adb_path, "devices"], capture_output=True, text=True, timeout=10)
-        lines = result.stdout.strip().split('\n')[1:]  # Skip "List of devices attached"
-        raw = [line.split()[0] for line in lines if line.strip() and 'device' in line]
+        if config.ADB_BACKEND == "socket":
+            raw = [serial for serial, state in adb_client.devices() if state == "device"]
+        else:
+            result = subprocess.run([adb_path, "devices"], capture_output=True, text=True, timeout=10)
+            lines = result.stdout.strip().split('\n')[1:]  # Skip "List of devices attached"
+            raw = [line.split()[0] for line in lines if line.strip() and 'device' in line]
 
         # Build set of ADB ports claimed by emulator-N entries (port = N+1)
         emulator_ports = set()
@@ -149,14 +193,18 @@ def get_devices():
         _log.error("Failed to get devices: %s", e)
         return []
 
-def get_emulator_instances():
+def get_emulator_instances(devices=None):
     """Get mapping of device IDs to friendly display names.
 
     On Windows: tries to map ADB devices to emulator window titles
                 (supports BlueStacks and MuMu Player).
     On macOS/Linux: uses ADB device IDs as display names.
+
+    Pass ``devices`` when you already have the list to skip another
+    ``adb devices`` call.
     """
-    devices = get_devices()
+    if devices is None:
+        devices = get_devices()
 
     if platform.system() == "Windows":
         return _get_emulator_instances_windows(devices)
@@ -165,6 +213,81 @@ def get_emulator_instances():
     _log.debug("Found devices: %s", devices)
     return {device: device for device in devices}
 
+# ============================================================
+# DEVICE CACHE (shared by the dashboard and the GUI)
+# ============================================================
+
+class DeviceCache:
+    """Cached ``(devices, instances)`` with change notifications.
+
+    ``get()`` returns the cached lists, rescanning only when they are older
+    than ``max_age``; concurrent callers share one scan.  Subscribers are
+    called with ``(devices, instances)`` from the scanning thread whenever
+    a scan finds a different list or different names.
+    """
+
+    def __init__(self, ttl=DEVICE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._devices = []
+        self._instances = {}
+        self._scanned_at = 0.0
+        self._subscribers = []
+
+    def get(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if time.time() - self._scanned_at <= max_age:
+                return list(self._devices), dict(self._instances)
+            started = time.time()
+        with self._scan_lock:
+            with self._lock:
+                if self._scanned_at >= started:  # another caller just scanned
+                    return list(self._devices), dict(self._instances)
+            return self.refresh()
+
+    def refresh(self):
+        """Rescan now; notify subscribers if anything changed."""
+        devices = get_devices()
+        instances = get_emulator_instances(devices)
+        with self._lock:
+            changed = devices != self._devices or instances != self._instances
+            self._devices, self._instances = devices, instances
+            self._scanned_at = time.time()
+            subscribers = list(self._subscribers)
+        if changed:
+            _log.debug("Device list changed: %s", ", ".join(devices) or "(none)")
+            for callback in subscribers:
+                try:
+                    callback(list(devices), dict(instances))
+                except Exception as e:
+                    _log.warning("Device subscriber failed: %s", e)
+        return list(devices), dict(instances)
+
+    def invalidate(self):
+        """Force the next ``get()`` to rescan."""
+        with self._lock:
+            self._scanned_at = 0.0
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def clear(self):
+        with self._lock:
+            self._devices, self._instances = [], {}
+            self._scanned_at = 0.0
+            self._subscribers.clear()
+
+
+device_cache = DeviceCache()
+
 # ============================================================
 # WINDOWS-ONLY: emulator window name mapping
 # ============================================================
@@ -0,0 +1,377 @@
+"""
+9Bot Digit Recognizer
+
+Fast reader for numeric HUD text (AP "101/400", timers "12:34", counts
+"1,234") in the game's fixed font — no neural network, no _ocr_infer_lock.
+
+How it works
+------------
+1. Binarize the crop (Otsu unless already binary; text made white).
+2. Segment glyphs with connected components.  Components that overlap
+   horizontally are merged, so ':' (two dots) becomes one glyph.
+3. Normalize each glyph to GLYPH_W x GLYPH_H and score it against every
+   stored template with one matrix product (zero-mean, unit-norm pixels =
+   normalized correlation).  Glyph height and vertical position relative
+   to the line separate '.', ',' and ':' from digits.
+4. A read is only trusted when every character it could produce has at
+   least MIN_SAMPLES_PER_CHAR templates, and each glyph's best character
+   beats the runner-up character by MIN_MARGIN; otherwise the confidence
+   is 0 and callers fall back to OCR.
+
+Templates are learned from captured samples: vision.read_digits() falls back
+to ocr_read() when this engine is unsure, and once two fallback reads of
+*different* crops agree (and line up one-to-one with the segmented glyphs)
+it feeds both crops back through DigitReader.learn_confirmed().  Crops are
+told apart by key (vision passes its OCR cache key), so an unchanged HUD
+whose cached OCR text repeats can't confirm itself, and a crop that was
+already learned is never added again.  Libraries persist per
+font under data/digits/.
+
+Public API
+----------
+DigitReader(font, directory=None)
+    .read(image, allowlist=None) -> (text, confidence); text is None if unreadable
+    .learn(image, text)   -> True if the crop's glyphs were added
+    .learn_confirmed(image, text, key=None) -> learn once a different crop
+                          reads the same
+    .save() / .load()
+get_reader(font)          -> shared DigitReader for a font name
+evaluate(reader, samples) -> accuracy / timing over [(image, text), ...]
+evaluate_dir(reader, directory) -> same, over saved sample crops
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from botlog import get_logger
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DIGITS_DIR = os.path.join(SCRIPT_DIR, "data", "digits")
+
+GLYPH_W, GLYPH_H = 12, 20
+MIN_CONFIDENCE = 0.75          # below this, callers should fall back to OCR
+TEMPLATES_PER_CHAR = 8         # newest samples kept per character
+MIN_SAMPLES_PER_CHAR = 3       # templates every possible character needs before reads are trusted
+MIN_MARGIN = 0.1               # best character must beat the runner-up by this much
+MIN_COMPONENT_AREA = 3         # px — smaller blobs are noise
+WORD_GAP = 0.6                 # gap > WORD_GAP * line height starts a new word
+MAX_SAVED_SAMPLES = 200        # labelled crops kept per font for evaluate_dir
+LEARNED_KEYS_KEPT = 512        # keys of learned crops remembered (and saved) for dedupe
+
+# Filename-safe encoding for labelled sample crops.
+_CHAR_CODES = {"/": "s", ":": "c", ",": "m", ".": "p", " ": "_"}
+_CODE_CHARS = {v: k for k, v in _CHAR_CODES.items()}
+
+
+def _encode_label(text):
+    return "".join(_CHAR_CODES.get(ch, ch) for ch in text)
+
+
+def _decode_label(name):
+    return "".join(_CODE_CHARS.get(ch, ch) for ch in name)
+
+
+# ============================================================
+# SEGMENTATION
+# ============================================================
+
+def _binarize(image):
+    """Return a uint8 0/255 image with white text on black."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    values = np.unique(gray)
+    if len(values) <= 2:
+        binary = np.where(gray > 127, 255, 0).astype(np.uint8)
+    else:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Text is the minority colour
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def segment(image):
+    """Split a crop into glyphs.
+
+    Returns (binary, glyphs, line_top, line_height) where glyphs is a list of
+    (x1, y1, x2, y2) boxes sorted left to right.
+    """
+    binary = _binarize(image)
+    n, _, boxes, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    comps = [tuple(b) for b in boxes[1:n] if b[4] >= MIN_COMPONENT_AREA]
+    comps.sort(key=lambda b: b[0])
+
+    # Merge horizontally overlapping components (':' and stray fragments)
+    glyphs = []
+    for x, y, w, h, _ in comps:
+        box = [x, y, x + w, y + h]
+        if glyphs:
+            last = glyphs[-1]
+            overlap = min(last[2], box[2]) - max(last[0], box[0])
+            if overlap > 0.5 * min(last[2] - last[0], box[2] - box[0]):
+                glyphs[-1] = [min(last[0], box[0]), min(last[1], box[1]),
+                              max(last[2], box[2]), max(last[3], box[3])]
+                continue
+        glyphs.append(box)
+
+    if not glyphs:
+        return binary, [], 0, 0
+    tallest = max(g[3] - g[1] for g in glyphs)
+    full = [g for g in glyphs if g[3] - g[1] >= 0.7 * tallest]
+    line_top = min(g[1] for g in full)
+    line_height = max(g[3] for g in full) - line_top
+    return binary, [tuple(g) for g in glyphs], line_top, max(1, line_height)
+
+
+def _glyph_features(binary, glyphs, line_top, line_height):
+    """Normalized pixel vectors (N, GLYPH_W*GLYPH_H) and geometry (N, 2)."""
+    feats = np.zeros((len(glyphs), GLYPH_W * GLYPH_H), dtype=np.float32)
+    geom = np.zeros((len(glyphs), 2), dtype=np.float32)
+    for i, (x1, y1, x2, y2) in enumerate(glyphs):
+        crop = binary[y1:y2, x1:x2]
+        patch = cv2.resize(crop, (GLYPH_W, GLYPH_H), interpolation=cv2.INTER_AREA)
+        feats[i] = patch.reshape(-1)
+        geom[i] = ((y2 - y1) / line_height,
+                   ((y1 + y2) / 2 - line_top) / line_height)
+    feats -= feats.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(feats, axis=1, keepdims=True)
+    feats /= np.maximum(norms, 1e-6)
+    return feats, geom
+
+
+# ============================================================
+# READER
+# ============================================================
+
+class DigitReader:
+    """Template-matching reader for one font (see module docstring)."""
+
+    def __init__(self, font, directory=None):
+        self.font = font
+        self.directory = os.path.join(directory or DIGITS_DIR, font)
+        self._lock = threading.Lock()
+        self._chars = []                                    # label per template
+        self._feats = np.zeros((0, GLYPH_W * GLYPH_H), np.float32)
+        self._geom = np.zeros((0, 2), np.float32)
+        self._unconfirmed = None                            # (text, image, key) awaiting a second read
+        self._learned_keys = OrderedDict()                  # keys of crops already learned
+
+    @property
+    def charset(self):
+        return set(self._chars)
+
+    def read(self, image, allowlist=None):
+        """Read a crop. Returns (text, confidence); text is None when no
+        glyphs were found, no templates are known, or a glyph is not in
+        ``allowlist``.  Words separated by a wide gap are joined with a space.
+
+        Confidence is the worst glyph's score, or 0 when some character of
+        ``allowlist`` (or of the text read, without one) has fewer than
+        MIN_SAMPLES_PER_CHAR templates, or a glyph's best character is
+        within MIN_MARGIN of another character.
+        """
+        binary, glyphs, line_top, line_height = segment(image)
+        with self._lock:
+            chars, feats, geom = self._chars, self._feats, self._geom
+        if not glyphs or not chars:
+            return None, 0.0
+        g_feats, g_geom = _glyph_features(binary, glyphs, line_top, line_height)
+
+        scores = g_feats @ feats.T                           # (N, M) correlation
+        scores -= 0.5 * np.abs(g_geom[:, None, :] - geom[None, :, :]).sum(axis=2)
+        classes = sorted(set(chars))
+        labels = np.array([classes.index(ch) for ch in chars])
+        # Best score per character class: (N, C)
+        by_class = np.stack([scores[:, labels == c].max(axis=1)
+                             for c in range(len(classes))], axis=1)
+        best = by_class.argmax(axis=1)
+        best_score = by_class[np.arange(len(glyphs)), best]
+        confidence = float(best_score.min())
+        if len(classes) > 1:
+            runner_up = np.partition(by_class, -2, axis=1)[:, -2]
+            if float((best_score - runner_up).min()) < MIN_MARGIN:
+                confidence = 0.0
+
+        text = []
+        for i, c in enumerate(best):
+            ch = classes[c]
+            if allowlist and ch not in allowlist:
+                return None, 0.0
+            if i and glyphs[i][0] - glyphs[i - 1][2] > WORD_GAP * line_height:
+                text.append(" ")
+            text.append(ch)
+        needed = set(allowlist) if allowlist else set(text)
+        if any(chars.count(ch) < MIN_SAMPLES_PER_CHAR
+               for ch in needed if not ch.isspace()):
+            confidence = 0.0
+        return "".join(text), max(0.0, confidence)
+
+    def learn(self, image, text):
+        """Add the glyphs of a crop whose text is known.
+
+        Spaces in ``text`` are ignored; the crop is only used when the
+        number of segmented glyphs equals the number of characters.
+        """
+        chars = [ch for ch in text if not ch.isspace()]
+        binary, glyphs, line_top, line_height = segment(image)
+        if not chars or len(glyphs) != len(chars):
+            return False
+        feats, geom = _glyph_features(binary, glyphs, line_top, line_height)
+        with self._lock:
+            all_chars = self._chars + chars
+            all_feats = np.vstack([self._feats, feats])
+            all_geom = np.vstack([self._geom, geom])
+            # Keep the newest TEMPLATES_PER_CHAR samples of each character
+            keep, seen = [], {}
+            for i in range(len(all_chars) - 1, -1, -1):
+                ch = all_chars[i]
+                if seen.get(ch, 0) < TEMPLATES_PER_CHAR:
+                    seen[ch] = seen.get(ch, 0) + 1
+                    keep.append(i)
+            keep.reverse()
+            self._chars = [all_chars[i] for i in keep]
+            self._feats = all_feats[keep]
+            self._geom = all_geom[keep]
+        return True
+
+    def learn_confirmed(self, image, text, key=None):
+        """learn() from an unverified (OCR) read only once it is confirmed.
+
+        The first crop is held back; when a call with a *different* ``key``
+        reads the same ``text``, both crops are learned.  The same key again
+        is not a second opinion (the OCR answer may come from a cache) and
+        is ignored; a different text replaces the held crop.  Crops whose
+        key was learned before are skipped.  ``key`` defaults to a hash of
+        the crop's pixels.  Returns True if glyphs were added.
+        """
+        if key is None:
+            key = hashlib.blake2b(np.ascontiguousarray(image).tobytes(),
+                                  digest_size=16).hexdigest()
+        with self._lock:
+            if key in self._learned_keys:
+                return False
+            held = self._unconfirmed
+            if held is not None and held[2] == key:
+                return False
+            if held is None or held[0] != text:
+                self._unconfirmed = (text, image.copy(), key)
+                return False
+            self._unconfirmed = None
+        learned = False
+        for crop, crop_key in ((held[1], held[2]), (image, key)):
+            if self.learn(crop, text):
+                learned = True
+                with self._lock:
+                    self._learned_keys[crop_key] = None
+                    while len(self._learned_keys) > LEARNED_KEYS_KEPT:
+                        self._learned_keys.popitem(last=False)
+        return learned
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            np.savez(os.path.join(self.directory, "glyphs.npz"),
+                     chars=np.array(self._chars), feats=self._feats, geom=self._geom,
+                     keys=np.array(list(self._learned_keys), dtype=str))
+
+    def load(self):
+        """Load the saved glyph library, if any. Returns True if loaded."""
+        path = os.path.join(self.directory, "glyphs.npz")
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self._chars = [str(c) for c in data["chars"]]
+            self._feats = data["feats"].astype(np.float32)
+            self._geom = data["geom"].astype(np.float32)
+            keys = data["keys"] if "keys" in data.files else []
+            self._learned_keys = OrderedDict((str(k), None) for k in keys)
+        return True
+
+    def save_sample(self, image, text):
+        """Keep a labelled crop under <directory>/samples/ for evaluate_dir()."""
+        sample_dir = os.path.join(self.directory, "samples")
+        try:
+            os.makedirs(sample_dir, exist_ok=True)
+            files = sorted(os.listdir(sample_dir))
+            if len(files) >= MAX_SAVED_SAMPLES:
+                return
+            name = f"{_encode_label(text)}__{int(time.time() * 1000)}.png"
+            cv2.imwrite(os.path.join(sample_dir, name), image)
+        except OSError as e:
+            get_logger("digits").debug("Could not save digit sample: %s", e)
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_reader(font):
+    """Shared DigitReader for ``font``, loading its saved library on first use."""
+    with _readers_lock:
+        reader = _readers.get(font)
+        if reader is None:
+            reader = _readers[font] = DigitReader(font)
+            if reader.load():
+                get_logger("digits").debug("Loaded digit glyphs for '%s': %s",
+                                           font, "".join(sorted(reader.charset)))
+        return reader
+
+
+def clear_readers():
+    """Forget all shared readers (tests)."""
+    with _readers_lock:
+        _readers.clear()
+
+
+# ============================================================
+# EVALUATION
+# ============================================================
+
+def evaluate(reader, samples, min_confidence=MIN_CONFIDENCE):
+    """Score ``reader`` on [(image, expected_text), ...].
+
+    Returns {"samples", "correct", "accuracy", "confident", "confident_correct",
+    "avg_ms", "max_ms"} — "confident" counts reads at or above min_confidence,
+    i.e. those that would not fall back to OCR.
+    """
+    correct = confident = confident_correct = 0
+    times = []
+    for image, expected in samples:
+        t0 = time.perf_counter()
+        text, conf = reader.read(image)
+        times.append((time.perf_counter() - t0) * 1000)
+        ok = text is not None and text.replace(" ", "") == expected.replace(" ", "")
+        correct += ok
+        if conf >= min_confidence:
+            confident += 1
+            confident_correct += ok
+    n = len(samples)
+    return {
+        "samples": n,
+        "correct": correct,
+        "accuracy": round(correct / n, 3) if n else 0.0,
+        "confident": confident,
+        "confident_correct": confident_correct,
+        "avg_ms": round(sum(times) / n, 3) if n else 0.0,
+        "max_ms": round(max(times), 3) if n else 0.0,
+    }
+
+
+def evaluate_dir(reader, directory=None, min_confidence=MIN_CONFIDENCE):
+    """evaluate() over labelled crops saved by DigitReader.save_sample()."""
+    directory = directory or os.path.join(reader.directory, "samples")
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".png"):
+            continue
+        image = cv2.imread(os.path.join(directory, name), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            samples.append((image, _decode_label(name.split("__")[0])))
+    return evaluate(reader, samples, min_confidence)
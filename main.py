@@ -18,7 +18,7 @@ from config import (set_min_troops, set_auto_heal, set_auto_restore_ap,
                      set_ap_restore_options, set_territory_config, set_eg_rally_own,
                      set_titan_rally_own, set_gather_options, set_tower_quest_enabled,
                      running_tasks, QuestType, RallyType, Screen)
-from devices import get_devices, get_emulator_instances, auto_connect_emulators
+from devices import device_cache, auto_connect_emulators
 from navigation import check_screen
 from vision import adb_tap, tap_image, load_screenshot, find_image, wait_for_image_and_tap, read_ap
 from troops import troops_avail, heal_all, read_panel_statuses, get_troop_status, TroopAction
@@ -263,10 +263,15 @@ def create_gui():
             except ValueError:
                 config.DEVICE_TOTAL_TROOPS[dev_id] = 5
 
+    # Set when anyone's scan (dashboard, Refresh button) sees a new device
+    # list.  Subscribers run on the scanning thread, so they only flag it and
+    # update_device_cards redraws on the Tk thread.
+    _devices_changed = threading.Event()
+
     def refresh_device_list():
         global devices
-        devices = get_devices()
-        instance_map = get_emulator_instances()
+        _devices_changed.clear()
+        devices, instance_map = device_cache.get()
 
         for widget in device_card_widgets:
             widget.destroy()
@@ -349,12 +354,14 @@ def create_gui():
 
     auto_connect_emulators()
     refresh_device_list()
+    device_cache.subscribe(lambda _devs, _names: _devices_changed.set())
 
     refresh_row = tk.Frame(devices_container, bg=THEME["bg_deep"])
     refresh_row.pack()
     device_card_widgets_static = []  # not cleared on refresh
     ctk.CTkButton(refresh_row, text="Refresh Devices",
-                  command=lambda: (auto_connect_emulators(), refresh_device_list()),
+                  command=lambda: (auto_connect_emulators(), device_cache.refresh(),
+                                   refresh_device_list()),
                   font=ctk.CTkFont(family=_FONT_FAMILY, size=10),
                   fg_color=THEME["btn_default"], hover_color=THEME["bg_hover"],
                   corner_radius=8, height=26, width=120).pack(padx=4)
@@ -1579,6 +1586,8 @@ def create_gui():
 
     def update_device_cards():
         """Update per-device status text, troop pills, and quest pills."""
+        if _devices_changed.is_set():
+            refresh_device_list()
         for dev_id, refs in device_display.items():
             # ── Status text ──
             msg = config.DEVICE_STATUS.get(dev_id, "Idle")
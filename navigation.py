@@ -4,10 +4,12 @@ import time
 from datetime import datetime
 
 from vision import (tap_image, tap, load_screenshot, adb_tap, adb_keyevent,
-                    get_template, timed_wait)
+                    get_template, timed_wait, on_frame)
 import config
 from config import Screen
 from botlog import get_logger, stats
+from profiling import span
+from screen_classifier import ScreenClassifier
 
 # ============================================================
 # DEBUG DIRECTORY
@@ -96,97 +98,116 @@ _POPUP_SOFT = [
     ("elements/close_x.png", "POPUP (red X)", 0.85),
 ]
 
-def check_screen(device):
-    """Takes a screenshot and figures out what screen we're on.
-    Checks ALL templates and picks the one with the highest confidence
-    to avoid false positives from partial matches.
-    Logs ALL match scores for debugging."""
+_ATTENTION = ("elements/attention.png", "ATTENTION", 0.8)
+
+# One ScreenClassifier shared by all devices, rebuilt if get_template()
+# hands back different template objects (e.g. after a cache reset) or
+# config.PYRAMID_CHECK_SCREEN changes (off: full-resolution search
+# per template, the original check_screen matching).
+_classifier = None
+_classifier_key = None
+
+
+def _get_classifier():
+    """Return the ScreenClassifier for screen templates + popups, building
+    it on first use.  Missing templates are left out."""
+    global _classifier, _classifier_key
+    entries = []
+    for tpl_path, name, threshold in [_ATTENTION] + _POPUP_CRITICAL + _POPUP_SOFT:
+        tpl = get_template(tpl_path)
+        if tpl is not None:
+            entries.append((tpl_path, tpl, None, threshold, "popup"))
+    for screen_name in SCREEN_TEMPLATES:
+        tpl = get_template(f"elements/{screen_name}.png")
+        if tpl is not None:
+            entries.append((screen_name, tpl, SCREEN_REGIONS.get(screen_name),
+                            config.SCREEN_MATCH_THRESHOLD, "screen"))
+    full_search = not config.PYRAMID_CHECK_SCREEN
+    key = tuple((e[0], id(e[1])) for e in entries) + (config.SCREEN_MATCH_THRESHOLD, full_search)
+    if _classifier is None or key != _classifier_key:
+        _classifier = ScreenClassifier(entries, full_search=full_search)
+        _classifier_key = key
+    return _classifier
+
+
+def _wait_popup_gone(device, classifier, tpl_path, threshold, budget_s, label):
+    """After tapping a popup's dismiss button, wait until it's gone.
+    ``label`` names the timed_wait budget for this call site."""
+    def gone(screen):
+        result = classifier.classify(screen, names=[tpl_path])
+        return not (tpl_path in result.refined and result.score(tpl_path) > threshold)
+    timed_wait(device, on_frame(gone), budget_s, label)
+
+
+def _identify_screen(result):
+    """Best full-resolution screen match from a ClassifyResult.
+    Returns (name, score) or (None, 0.0) if nothing clears the threshold."""
+    name, val = result.best(SCREEN_TEMPLATES, refined_only=True)
+    if name is not None and val > config.SCREEN_MATCH_THRESHOLD:
+        return name, val
+    return None, 0.0
+
+
+@span("check_screen")
+def check_screen(device, screen=None):
+    """Takes a screenshot (or classifies ``screen``) and figures out what
+    screen we're on.
+    Scores ALL templates in one ScreenClassifier pass and picks the one
+    with the highest confidence to avoid false positives from partial
+    matches.  Logs ALL match scores for debugging."""
     log = get_logger("navigation", device)
     try:
-        screen = load_screenshot(device)
+        if screen is None:
+            screen = load_screenshot(device)
         if screen is None:
             log.warning("Failed to load screenshot")
             return Screen.UNKNOWN
 
+        classifier = _get_classifier()
+        result = classifier.classify(screen)
+
         # Check for logout/disconnection popup first
-        attention_template = get_template("elements/attention.png")
-        if attention_template is not None:
-            result = cv2.matchTemplate(screen, attention_template, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-            if max_val > 0.8:
-                log.error("LOGGED OUT — 'ATTENTION' popup detected")
-                log.info("Stopping all tasks...")
-                # Stop all running tasks by setting their stop events
-                for key, info in list(config.running_tasks.items()):
-                    if isinstance(info, dict) and "stop_event" in info:
-                        info["stop_event"].set()
-                return Screen.LOGGED_OUT
+        if result.score(_ATTENTION[0]) > _ATTENTION[2] and _ATTENTION[0] in result.refined:
+            log.error("LOGGED OUT — 'ATTENTION' popup detected")
+            log.info("Stopping all tasks...")
+            # Stop all running tasks by setting their stop events
+            for key, info in list(config.running_tasks.items()):
+                if isinstance(info, dict) and "stop_event" in info:
+                    info["stop_event"].set()
+            return Screen.LOGGED_OUT
 
         # Check for critical popups that block everything (dismiss immediately).
         for tpl_path, popup_name, threshold in _POPUP_CRITICAL:
-            tpl = get_template(tpl_path)
-            if tpl is None:
-                continue
-            result = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
-            _, tpl_val, _, tpl_loc = cv2.minMaxLoc(result)
-            if tpl_val > threshold:
-                h, w = tpl.shape[:2]
-                cx = tpl_loc[0] + w // 2
-                cy = tpl_loc[1] + h // 2
+            tpl_val = result.score(tpl_path)
+            if tpl_path in result.refined and tpl_val > threshold:
+                cx, cy = result.center(tpl_path)
                 log.info("*** %s detected (%.0f%%) — auto-dismissing ***", popup_name, tpl_val * 100)
                 adb_tap(device, cx, cy)
-                time.sleep(1.5)
+                _wait_popup_gone(device, classifier, tpl_path, threshold, 1.5,
+                                 "critical_popup_dismiss")
                 screen = load_screenshot(device)
                 if screen is None:
                     log.warning("Screenshot failed after popup dismiss")
                     return Screen.UNKNOWN
                 log.debug("Popup dismissed, re-scanning screen...")
+                result = classifier.classify(screen)
                 break  # Only dismiss one popup per check cycle
 
-        scores = {}
-        best_name = None
-        best_val = 0.0
-
-        for screen_name in SCREEN_TEMPLATES:
-            element = get_template(f"elements/{screen_name}.png")
-            if element is None:
-                continue
-
-            region = SCREEN_REGIONS.get(screen_name)
-            if region:
-                rx1, ry1, rx2, ry2 = region
-                search_area = screen[ry1:ry2, rx1:rx2]
-            else:
-                search_area = screen
-
-            result = cv2.matchTemplate(search_area, element, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(result)
-            scores[screen_name] = max_val
-
-            if max_val > best_val:
-                best_val = max_val
-                best_name = screen_name
-                best_loc = max_loc
-                best_region = region
-                best_hw = element.shape[:2]
-
         # Log scores sorted by confidence
+        scores = {sn: result.scores[sn] for sn in SCREEN_TEMPLATES if sn in result.scores}
         score_str = " | ".join(f"{name}: {val*100:.0f}%" for name, val in
                                sorted(scores.items(), key=lambda x: x[1], reverse=True))
         log.debug("Screen scores: %s", score_str)
 
-        identified = None
-        if best_val > config.SCREEN_MATCH_THRESHOLD and best_name is not None:
+        identified, best_val = _identify_screen(result)
+        if identified is not None:
             # Record hit position for region analysis
-            h, w = best_hw
-            cx, cy = best_loc[0] + w // 2, best_loc[1] + h // 2
-            if best_region:
-                cx += best_region[0]
-                cy += best_region[1]
+            cx, cy = result.center(identified)
             stats.record_template_hit(
-                device, f"{best_name}.png", cx, cy, best_val)
-            log.debug("Screen identified: %s (%.0f%%)", best_name, best_val * 100)
-            identified = best_name
+                device, f"{identified}.png", cx, cy, best_val)
+            log.debug("Screen identified: %s (%.0f%%)", identified, best_val * 100)
+            if result.fell_back:
+                log.debug("Pyramid missed %s — identified by full search", identified)
 
         # Soft popup dismiss (close_x) — try on any screen EXCEPT map_screen.
         # On MAP, close_x appears as part of normal flows (rally dialog, AP
@@ -194,34 +215,24 @@ def check_screen(device):
         # On other screens (td_screen overlays, unknown popups) it's safe.
         if identified != Screen.MAP:
             for tpl_path, popup_name, threshold in _POPUP_SOFT:
-                tpl = get_template(tpl_path)
-                if tpl is None:
-                    continue
-                result = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
-                _, tpl_val, _, tpl_loc = cv2.minMaxLoc(result)
-                if tpl_val > threshold:
-                    h, w = tpl.shape[:2]
-                    cx = tpl_loc[0] + w // 2
-                    cy = tpl_loc[1] + h // 2
+                tpl_val = result.score(tpl_path)
+                if tpl_path in result.refined and tpl_val > threshold:
+                    cx, cy = result.center(tpl_path)
                     log.info("*** %s detected (%.0f%%) on %s — dismissing ***",
                              popup_name, tpl_val * 100,
                              identified or "unknown screen")
                     adb_tap(device, cx, cy)
-                    time.sleep(1.5)
+                    _wait_popup_gone(device, classifier, tpl_path, threshold, 1.5,
+                                     "soft_popup_dismiss")
                     # Re-check screen after dismissal
                     screen = load_screenshot(device)
                     if screen is None:
                         return identified or Screen.UNKNOWN
                     # Re-run screen identification on the new screenshot
+                    rescan = classifier.classify(screen, names=SCREEN_TEMPLATES)
                     for sn in SCREEN_TEMPLATES:
-                        el = get_template(f"elements/{sn}.png")
-                        if el is None:
-                            continue
-                        region = SCREEN_REGIONS.get(sn)
-                        sa = screen[region[1]:region[3], region[0]:region[2]] if region else screen
-                        res = cv2.matchTemplate(sa, el, cv2.TM_CCOEFF_NORMED)
-                        _, mv, _, _ = cv2.minMaxLoc(res)
-                        if mv > config.SCREEN_MATCH_THRESHOLD:
+                        mv = rescan.score(sn)
+                        if sn in rescan.refined and mv > config.SCREEN_MATCH_THRESHOLD:
                             log.info("After popup dismiss: now on %s (%.0f%%)", sn, mv * 100)
                             return sn
                     break  # Only try one soft popup per cycle
@@ -229,6 +240,7 @@ def check_screen(device):
         if identified:
             return identified
 
+        best_name, best_val = result.best(SCREEN_TEMPLATES)
         log.warning("Unknown screen detected (best: %s at %.0f%%)", best_name, best_val * 100)
         _last_unknown_info[device] = {"best_name": best_name, "best_val": best_val}
         _save_debug_screenshot(device, "unknown_screen", screen)
@@ -245,7 +257,7 @@ def check_screen(device):
 def _verify_screen(target_screen, device, wait_time=1.5, retries=2):
     """Verify we arrived at the target screen, with retries."""
     log = get_logger("navigation", device)
-    timed_wait(device, lambda: check_screen(device) == target_screen,
+    timed_wait(device, on_frame(lambda s: check_screen(device, s) == target_screen),
                wait_time, f"verify_{target_screen}")
     current = Screen.UNKNOWN
     for attempt in range(1 + retries):
@@ -273,20 +285,17 @@ def _try_clear_map_popup(device):
     screen = load_screenshot(device)
     if screen is None:
         return False
+    result = _get_classifier().classify(
+        screen, names=[tpl_path for tpl_path, _, _ in _POPUP_SOFT])
     for tpl_path, popup_name, threshold in _POPUP_SOFT:
-        tpl = get_template(tpl_path)
-        if tpl is None:
-            continue
-        result = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
-        _, tpl_val, _, tpl_loc = cv2.minMaxLoc(result)
-        if tpl_val > threshold:
-            h, w = tpl.shape[:2]
-            cx = tpl_loc[0] + w // 2
-            cy = tpl_loc[1] + h // 2
+        tpl_val = result.score(tpl_path)
+        if tpl_path in result.refined and tpl_val > threshold:
+            cx, cy = result.center(tpl_path)
             log.info("MAP popup (%s, %.0f%%) — dismissing to unblock navigation",
                      popup_name, tpl_val * 100)
             adb_tap(device, cx, cy)
-            time.sleep(1.0)
+            _wait_popup_gone(device, _get_classifier(), tpl_path, threshold, 1.0,
+                             "map_popup_dismiss")
             return True
     return False
 
@@ -323,7 +332,7 @@ def _recover_to_known_screen(device):
 
     for name, action in strategies:
         action()
-        timed_wait(device, lambda: check_screen(device) != Screen.UNKNOWN,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) != Screen.UNKNOWN),
                    1.5, f"recover_{name}")
         current = check_screen(device)
         if current != Screen.UNKNOWN:
@@ -339,7 +348,7 @@ def _recover_to_known_screen(device):
     else:
         log.info("Recovery phase 2: Android BACK key")
         adb_keyevent(device, 4)  # KEYCODE_BACK
-        timed_wait(device, lambda: check_screen(device) != Screen.UNKNOWN,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) != Screen.UNKNOWN),
                    2, "recover_android_back")
         current = check_screen(device)
         if current != Screen.UNKNOWN:
@@ -349,7 +358,8 @@ def _recover_to_known_screen(device):
     # Phase 3: Tap screen center (dismiss transparent/click-through overlays)
     log.info("Recovery phase 3: center tap to dismiss overlays")
     adb_tap(device, 540, 960)
-    time.sleep(1.0)
+    timed_wait(device, on_frame(lambda s: check_screen(device, s) != Screen.UNKNOWN),
+               1.0, "recover_center_tap")
     current = check_screen(device)
     if current != Screen.UNKNOWN:
         log.info("Recovery via center tap: now on %s", current)
@@ -365,7 +375,8 @@ def _recover_to_known_screen(device):
             adb_keyevent(device, 4)  # KEYCODE_BACK
             time.sleep(0.5)
     adb_tap(device, 540, 960)
-    time.sleep(5)
+    timed_wait(device, on_frame(lambda s: check_screen(device, s) != Screen.UNKNOWN),
+               5, "recover_nuclear")
     current = check_screen(device)
     if current != Screen.UNKNOWN:
         log.info("Recovery via %s: now on %s",
@@ -425,7 +436,7 @@ def navigate(target_screen, device, _depth=0):
     if current == Screen.TROOP_DETAIL and target_screen != Screen.MAP:
         log.debug("On td_screen, going to map_screen first...")
         adb_tap(device, 990, 1850)
-        timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                    2, "nav_td_to_map")
         current = check_screen(device)
     elif current == Screen.ALLIANCE and target_screen != Screen.MAP and target_screen != Screen.WAR:
@@ -437,7 +448,7 @@ def navigate(target_screen, device, _depth=0):
     if target_screen == Screen.MAP:
         if current == Screen.TROOP_DETAIL:
             adb_tap(device, 990, 1850)
-            timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+            timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                        2, "nav_td_exit_to_map")
             current = check_screen(device)
         elif current == Screen.ALLIANCE:
@@ -446,7 +457,7 @@ def navigate(target_screen, device, _depth=0):
         elif current == Screen.KINGDOM:
             # Bottom-right globe icon takes us back to map
             adb_tap(device, 970, 1880)
-            timed_wait(device, lambda: check_screen(device) == Screen.MAP,
+            timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
                        1, "nav_kingdom_to_map")
             current = check_screen(device)
         elif current in [Screen.BATTLE_LIST, Screen.ALLIANCE_QUEST, Screen.WAR, Screen.TERRITORY, Screen.PROFILE]:
@@ -509,10 +520,10 @@ def navigate(target_screen, device, _depth=0):
             if not navigate(Screen.MAP, device, _depth=_depth + 1):
                 return False
         adb_tap(device, 640, 1865)
-        timed_wait(device, lambda: check_screen(device) == Screen.ALLIANCE,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.ALLIANCE),
                    2, "nav_map_to_alliance")
         adb_tap(device, 200, 1200)
-        timed_wait(device, lambda: check_screen(device) == Screen.ALLIANCE,
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.ALLIANCE),
                    1, "nav_alliance_menu_load")
         adb_tap(device, 550, 170)
         return _verify_screen(Screen.WAR, device)
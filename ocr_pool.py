@@ -0,0 +1,240 @@
+"""
+9Bot OCR Worker Pool
+
+Runs EasyOCR in N subprocesses instead of inside the bot process.  OCR for
+one device then no longer holds the GIL / _ocr_infer_lock while other
+devices template-match, and PyTorch's memory (model weights, MKLDNN kernel
+caches) lives in processes that can be thrown away.
+
+How it works
+------------
+Each worker owns one reader and one duplex Pipe.  The parent owns a
+SharedMemory block per worker (grown on demand) — a request copies the crop
+into that block and sends only (block name, shape, dtype, allowlist, detail)
+down the pipe; the worker reads the pixels in place and sends back the
+result plus its own RSS.  A worker whose RSS exceeds ``max_worker_mb``
+after a request is stopped and replaced; a worker that dies or times out is
+replaced and the request fails.
+
+Workers are started with the "spawn" method (the Windows default, and safe
+with the bot's threads on every platform).
+
+Public API
+----------
+OcrPool(size, max_worker_mb, reader_factory=create_easyocr_reader)
+    .read(image, allowlist=None, detail=0) -> same as reader.readtext()
+    .status()  -> [{"pid", "rss_mb", "requests", "restarts"}, ...]
+    .close()
+create_easyocr_reader() -> configured easyocr.Reader (also used in-process)
+"""
+
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import psutil
+
+from botlog import get_logger
+
+REQUEST_TIMEOUT_S = 120        # max time one recognition may take before the worker is replaced
+STOP_TIMEOUT_S = 3             # grace period for a worker to exit before it is killed
+MIN_BUFFER_BYTES = 1 << 20     # smallest shared buffer allocated per worker
+
+
+def create_easyocr_reader():
+    """Build an EasyOCR reader with the bot's memory/threading caps."""
+    import os
+    # Cap oneDNN/MKLDNN primitive cache BEFORE importing torch.
+    # Default is 1024 entries — each unique input shape compiles a
+    # new kernel (~MB each). EasyOCR feeds variable-size crops, so
+    # the cache fills with stale kernels and bloats to multi-GB.
+    os.environ.setdefault("ONEDNN_PRIMITIVE_CACHE_CAPACITY", "8")
+    # Legacy name (PyTorch < 1.8)
+    os.environ.setdefault("LRU_CACHE_CAPACITY", "8")
+
+    import warnings
+    warnings.filterwarnings("ignore", message=".*pin_memory.*")
+    warnings.filterwarnings("ignore", message=".*GPU.*")
+    import torch
+    import easyocr
+
+    # Limit PyTorch intra-op parallelism. Multiple device threads
+    # already provide inter-op parallelism; letting each also spawn
+    # N_cores intra-op threads causes oversubscription and bloat.
+    torch.set_num_threads(2)
+    return easyocr.Reader(['en'], gpu=False, verbose=False)
+
+
+# ============================================================
+# WORKER PROCESS
+# ============================================================
+
+def _worker_main(conn, reader_factory):
+    """Subprocess loop: recognize crops from shared memory until told to stop."""
+    reader = reader_factory()
+    proc = psutil.Process()
+    shm = None
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg is None:
+                break
+            name, shape, dtype, allowlist, detail = msg
+            try:
+                if shm is None or shm.name != name:
+                    if shm is not None:
+                        shm.close()
+                    shm = shared_memory.SharedMemory(name=name)
+                image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy()
+                result = reader.readtext(image, allowlist=allowlist, detail=detail)
+                reply = ("ok", result)
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            conn.send(reply + (proc.memory_info().rss / (1024 * 1024),))
+    finally:
+        if shm is not None:
+            shm.close()
+
+
+# ============================================================
+# CLIENT
+# ============================================================
+
+class _Worker:
+    """Parent-side handle for one worker process and its shared buffer."""
+
+    def __init__(self, index, reader_factory, ctx):
+        self.index = index
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, reader_factory),
+                                   name=f"ocr-worker-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.shm = None
+        self.rss_mb = 0.0
+        self.requests = 0
+
+    def buffer_for(self, nbytes):
+        if self.shm is None or self.shm.size < nbytes:
+            self._release_buffer()
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=max(nbytes, MIN_BUFFER_BYTES))
+        return self.shm
+
+    def _release_buffer(self):
+        if self.shm is not None:
+            self.shm.close()
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT_S)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(STOP_TIMEOUT_S)
+        self.conn.close()
+        self._release_buffer()
+
+
+class OcrPool:
+    """Fixed-size pool of OCR subprocesses — see module docstring."""
+
+    def __init__(self, size, max_worker_mb, reader_factory=create_easyocr_reader):
+        self.size = size
+        self.max_worker_mb = max_worker_mb
+        self._factory = reader_factory
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._restarts = [0] * size
+        self._lock = threading.Lock()
+        self._closed = False
+        for i in range(size):
+            worker = _Worker(i, reader_factory, self._ctx)
+            self._workers.append(worker)
+            self._idle.put(worker)
+        get_logger("ocr_pool").info("OCR worker pool started: %d worker(s), %d MB ceiling",
+                                    size, max_worker_mb)
+
+    def _replace(self, worker, reason):
+        """Stop ``worker`` and return a fresh one in its slot."""
+        log = get_logger("ocr_pool")
+        log.info("Restarting OCR worker %d (pid %s): %s",
+                 worker.index, worker.process.pid, reason)
+        worker.stop()
+        fresh = _Worker(worker.index, self._factory, self._ctx)
+        with self._lock:
+            self._workers[worker.index] = fresh
+            self._restarts[worker.index] += 1
+        return fresh
+
+    def _release(self, worker):
+        if self._closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def read(self, image, allowlist=None, detail=0, timeout=REQUEST_TIMEOUT_S):
+        """Recognize ``image`` on the next free worker.
+
+        Returns what reader.readtext() returned.  Raises RuntimeError if the
+        worker failed, died or timed out, or the pool is closed.
+        """
+        if self._closed:
+            raise RuntimeError("OCR pool is closed")
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"no OCR worker free in {timeout}s") from None
+        try:
+            image = np.ascontiguousarray(image)
+            shm = worker.buffer_for(image.nbytes)
+            np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+            try:
+                worker.conn.send((shm.name, image.shape, image.dtype.str, allowlist, detail))
+                if not worker.conn.poll(timeout):
+                    raise TimeoutError(f"no reply in {timeout}s")
+                status, payload, rss_mb = worker.conn.recv()
+            except (OSError, EOFError, TimeoutError) as e:
+                worker = self._replace(worker, f"{type(e).__name__}: {e}")
+                raise RuntimeError(f"OCR worker failed: {e}") from e
+
+            worker.requests += 1
+            worker.rss_mb = rss_mb
+            if rss_mb > self.max_worker_mb:
+                worker = self._replace(worker, f"RSS {rss_mb:.0f} MB > {self.max_worker_mb} MB")
+            if status != "ok":
+                raise RuntimeError(f"OCR worker error: {payload}")
+            return payload
+        finally:
+            self._release(worker)
+
+    def status(self):
+        """Per-worker pid, last reported RSS, request count and restart count."""
+        with self._lock:
+            return [{"pid": w.process.pid, "rss_mb": round(w.rss_mb, 1),
+                     "requests": w.requests, "restarts": self._restarts[w.index]}
+                    for w in self._workers]
+
+    def close(self):
+        """Stop idle workers now; busy workers stop when their request returns."""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+        get_logger("ocr_pool").info("OCR worker pool stopped")
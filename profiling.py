@@ -0,0 +1,265 @@
+"""
+9Bot Hot-Path Profiling
+
+Opt-in span timing for the calls an action spends its time in:
+load_screenshot (capture + decode), find_image (matchTemplate),
+check_screen, ocr_read (OCR + queue wait), adb_tap (input) and
+timed_wait (waiting between frames).  Each is wrapped with ``@span``;
+``timed_action`` opens an action frame, so every span is tagged with its
+device and enclosing action.  Time is split into self time (the span
+minus the spans inside it), so an action's breakdown adds up.
+
+Enabled with the ``profiling`` setting.  Disabled, a wrapped call costs
+one flag check on top of the call itself.
+
+Exports:
+    Chrome trace-event JSON   chrome://tracing, Perfetto, speedscope —
+                              one process lane per device, one row per thread
+    collapsed stacks          "device;action;span;span <self µs>" lines for
+                              flamegraph.pl / speedscope
+
+Public API
+----------
+span(name, detail=None)        decorator; ``detail`` names an argument to tag
+action(device, name)           context manager (used by botlog.timed_action)
+set_enabled(on) / is_enabled()
+breakdown(device=None) -> per-action self-time rows, slowest action first
+chrome_trace(device=None) -> trace-event dict
+collapsed_stacks(device=None) -> text
+reset()
+"""
+
+import contextlib
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+
+TRACE_EVENTS_KEPT = 50000        # newest spans kept for the Chrome trace
+NO_ACTION = "(no action)"
+
+_enabled = False
+_local = threading.local()
+_lock = threading.Lock()
+_epoch = time.perf_counter()
+
+_events = deque(maxlen=TRACE_EVENTS_KEPT)  # (name, cat, device, action, tid, start_s, dur_s, detail)
+_actions = {}                    # (device, action) -> [count, total_s, self_s]
+_spans = {}                      # (device, action, span) -> [count, total_s, self_s]
+_stacks = {}                     # (device, (frame names...)) -> self_s
+
+
+def set_enabled(on):
+    """Turn span recording on or off (recorded data is kept)."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def is_enabled():
+    return _enabled
+
+
+# ============================================================
+# RECORDING
+# ============================================================
+
+class _Frame:
+    __slots__ = ("name", "cat", "device", "action", "detail", "start", "child_s")
+
+    def __init__(self, name, cat, device, action, detail):
+        self.name = name
+        self.cat = cat
+        self.device = device
+        self.action = action
+        self.detail = detail
+        self.child_s = 0.0
+        self.start = time.perf_counter()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _push(name, cat, device, detail=None):
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    if device is None:
+        device = parent.device if parent else "system"
+    if cat == "action":
+        action = name
+    else:
+        action = parent.action if parent else NO_ACTION
+    frame = _Frame(name, cat, device, action, detail)
+    stack.append(frame)
+    return frame
+
+
+def _pop(frame):
+    dur = time.perf_counter() - frame.start
+    stack = _stack()
+    path = tuple(f.name for f in stack)
+    stack.pop()
+    if stack:
+        stack[-1].child_s += dur
+    self_s = max(0.0, dur - frame.child_s)
+    _events.append((frame.name, frame.cat, frame.device, frame.action,
+                    threading.get_ident(), frame.start - _epoch, dur, frame.detail))
+    if frame.cat == "action":
+        key, table = (frame.device, frame.name), _actions
+    else:
+        key, table = (frame.device, frame.action, frame.name), _spans
+    with _lock:
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += dur
+        entry[2] += self_s
+        stack_key = (frame.device, path)
+        _stacks[stack_key] = _stacks.get(stack_key, 0.0) + self_s
+
+
+def _arg_getter(func, param):
+    """Return f(args, kwargs) -> the value of ``func``'s ``param`` argument, or None."""
+    try:
+        params = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        params = []
+    if param not in params:
+        return lambda args, kwargs: None
+    pos = params.index(param)
+
+    def get(args, kwargs):
+        if pos < len(args):
+            return args[pos]
+        return kwargs.get(param)
+    return get
+
+
+def span(name, detail=None):
+    """Decorator timing every call of a hot-path function as span ``name``.
+
+    The device comes from the function's ``device`` argument (else the
+    enclosing frame's); ``detail`` names another argument to show in the
+    trace, e.g. the template of a find_image call.
+    """
+    def decorator(func):
+        get_device = _arg_getter(func, "device")
+        get_detail = _arg_getter(func, detail) if detail else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            frame = _push(name, "span", get_device(args, kwargs),
+                          get_detail(args, kwargs) if get_detail else None)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _pop(frame)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def action(device, name):
+    """Frame for one action run — spans inside it are attributed to ``name``."""
+    if not _enabled:
+        yield
+        return
+    frame = _push(name, "action", device)
+    try:
+        yield
+    finally:
+        _pop(frame)
+
+
+def reset():
+    """Forget everything recorded (the enabled flag is unchanged)."""
+    with _lock:
+        _events.clear()
+        _actions.clear()
+        _spans.clear()
+        _stacks.clear()
+
+
+# ============================================================
+# REPORTS & EXPORTS
+# ============================================================
+
+def breakdown(device=None):
+    """Where each action's time went, slowest action first.
+
+    [{"device", "action", "count", "total_s", "spans": [{"name", "count",
+    "self_s", "pct"}, ...]}] — ``pct`` is the share of the action's total;
+    the action's own self time is listed as "other".  Spans recorded
+    outside any action are grouped under "(no action)".
+    """
+    with _lock:
+        actions = {k: list(v) for k, v in _actions.items()}
+        spans = {k: list(v) for k, v in _spans.items()}
+    rows = {}
+    for (dev, name), (count, total_s, self_s) in actions.items():
+        if device is None or dev == device:
+            rows[(dev, name)] = {"device": dev, "action": name, "count": count,
+                                 "total_s": total_s, "spans": [("other", count, self_s)]}
+    for (dev, act, name), (count, total_s, self_s) in spans.items():
+        if device is not None and dev != device:
+            continue
+        row = rows.get((dev, act))
+        if row is None:
+            row = rows[(dev, act)] = {"device": dev, "action": act, "count": 0,
+                                      "total_s": 0.0, "spans": []}
+        row["spans"].append((name, count, self_s))
+        if act == NO_ACTION:
+            row["total_s"] += self_s
+    out = []
+    for row in rows.values():
+        total = row["total_s"]
+        row["spans"] = sorted(
+            ({"name": name, "count": count, "self_s": round(self_s, 3),
+              "pct": round(100 * self_s / total, 1) if total else 0.0}
+             for name, count, self_s in row["spans"]),
+            key=lambda s: -s["self_s"])
+        row["total_s"] = round(total, 3)
+        out.append(row)
+    out.sort(key=lambda r: -r["total_s"])
+    return out
+
+
+def chrome_trace(device=None):
+    """Trace-event JSON (as a dict) of the newest TRACE_EVENTS_KEPT spans."""
+    events = [e for e in list(_events) if device is None or e[2] == device]
+    pids = {}
+    trace = []
+    for name, cat, dev, act, tid, start_s, dur_s, detail in events:
+        pid = pids.get(dev)
+        if pid is None:
+            pid = pids[dev] = len(pids) + 1
+            trace.append({"name": "process_name", "ph": "M", "pid": pid,
+                          "args": {"name": dev}})
+        args = {"action": act}
+        if detail is not None:
+            args["detail"] = str(detail)
+        trace.append({"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                      "ts": round(start_s * 1e6, 1), "dur": round(dur_s * 1e6, 1),
+                      "args": args})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def collapsed_stacks(device=None):
+    """Collapsed-stack text: one "device;frame;frame <self µs>" line per stack."""
+    with _lock:
+        items = list(_stacks.items())
+    lines = []
+    for (dev, path), self_s in sorted(items):
+        if device is not None and dev != device:
+            continue
+        us = round(self_s * 1e6)
+        if us > 0:
+            lines.append(f"{';'.join((dev,) + path)} {us}")
+    return "\n".join(lines) + ("\n" if lines else "")
@@ -6,7 +6,18 @@ Accepts WebSocket connections from 9Bot instances and proxies HTTP requests
 from browsers to the appropriate bot.
 
 Supports streaming responses (MJPEG) via stream_start/stream_chunk/stream_end
-protocol messages.
+protocol messages.  Bots that offer the "9bot-tunnel.v1" WebSocket subprotocol
+exchange binary frames (raw bodies); older bots use JSON with base64 bodies.
+
+Static dashboard assets (/static/...) are cached per bot and bot version and
+served with ETags without a tunnel round trip.  Compression per hop:
+  - bot -> relay, binary frames: text bodies of 1 KB or more are
+    zlib-deflated per frame (FLAG_DEFLATE); JPEG/MJPEG bodies go as-is
+    (permessage-deflate is off on these connections)
+  - bot -> relay, legacy JSON: whole messages use permessage-deflate,
+    negotiated when the bot offers it (websockets clients do by default)
+  - relay -> browser: text responses are compressed here (brotli when
+    installed, else gzip); static assets once per cached version
 
 Bug report uploads are accepted via POST /_upload and stored on disk.
 Admin interface at GET /_admin for browsing/downloading/deleting uploads.
@@ -23,14 +34,23 @@ Environment variables:
 
 import asyncio
 import base64
+import gzip
+import hashlib
 import json
 import logging
 import os
+import struct
 import uuid
+import zlib
 from datetime import datetime, timezone
 
 from aiohttp import web, WSMsgType
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -45,6 +65,73 @@ REQUEST_TIMEOUT = 30  # seconds
 STREAM_CHUNK_TIMEOUT = 10  # seconds between stream chunks before giving up
 MAX_UPLOAD_SIZE = 150 * 1024 * 1024  # 150 MB
 MAX_UPLOADS_PER_BOT = 10  # keep last N per bot
+STATIC_PREFIX = "/static/"  # bot paths cached by the relay
+STATIC_MAX_ASSET = 2 * 1024 * 1024  # don't cache larger assets
+STATIC_MAX_PER_BOT = 20 * 1024 * 1024  # cache budget per bot
+STATIC_MAX_AGE = 3600  # browser cache lifetime for static assets (seconds)
+COMPRESS_MIN_SIZE = 1024  # don't compress smaller text bodies
+
+# ---------------------------------------------------------------------------
+# Binary tunnel protocol — keep in sync with tunnel.py in the bot
+# ---------------------------------------------------------------------------
+# Frame (network byte order):
+#   version u8 | type u8 | flags u8 | id_len u8 | meta_len u32
+#   | request id (utf-8) | meta (JSON, may be empty) | body (raw bytes)
+BINARY_SUBPROTOCOL = "9bot-tunnel.v1"
+TUNNEL_PROTOCOLS = (BINARY_SUBPROTOCOL,)   # subprotocols offered to bots
+FRAME_VERSION = 1
+FRAME_REQUEST = 1
+FRAME_RESPONSE = 2
+FRAME_STREAM_START = 3
+FRAME_STREAM_CHUNK = 4
+FRAME_STREAM_END = 5
+FRAME_CANCEL = 6
+FLAG_DEFLATE = 0x01  # body is zlib-compressed
+_FRAME_HEADER = struct.Struct("!BBBBI")
+_STREAM_TYPES = {"start": FRAME_STREAM_START, "chunk": FRAME_STREAM_CHUNK,
+                 "end": FRAME_STREAM_END}
+
+
+def encode_frame(ftype: int, req_id: str, meta: dict | None = None,
+                 body: bytes = b"") -> bytes:
+    rid = req_id.encode()
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode() if meta else b""
+    header = _FRAME_HEADER.pack(FRAME_VERSION, ftype, 0, len(rid), len(meta_bytes))
+    return b"".join((header, rid, meta_bytes, body))
+
+
+def decode_frame(data: bytes) -> tuple[int, str, dict, bytes]:
+    """Unpack a binary frame, inflating FLAG_DEFLATE bodies.
+
+    Raises ValueError if truncated, corrupt or an unknown version.
+    """
+    if len(data) < _FRAME_HEADER.size:
+        raise ValueError("truncated frame")
+    version, ftype, flags, id_len, meta_len = _FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    pos = _FRAME_HEADER.size
+    if len(data) < pos + id_len + meta_len:
+        raise ValueError("truncated frame")
+    view = memoryview(data)
+    req_id = bytes(view[pos:pos + id_len]).decode()
+    pos += id_len
+    meta = json.loads(bytes(view[pos:pos + meta_len])) if meta_len else {}
+    pos += meta_len
+    if flags & FLAG_DEFLATE:
+        try:
+            return ftype, req_id, meta, zlib.decompress(view[pos:])
+        except zlib.error as e:
+            raise ValueError(f"corrupt body: {e}") from None
+    return ftype, req_id, meta, bytes(view[pos:])
+
+
+def _parse_legacy(data: dict) -> tuple[int, str, dict, bytes]:
+    """Normalize a JSON bot message to the binary frame tuple."""
+    body_b64 = data.pop("body_b64", "")
+    body = base64.b64decode(body_b64) if body_b64 else b""
+    ftype = _STREAM_TYPES.get(data.pop("stream", None), FRAME_RESPONSE)
+    return ftype, data.pop("id", None), data, body
 
 # ---------------------------------------------------------------------------
 # State
@@ -55,6 +142,13 @@ _bots: dict[str, web.WebSocketResponse] = {}
 _pending: dict[str, dict[str, asyncio.Future]] = {}
 # {bot_name: {request_id: asyncio.Queue}}  — per-bot active streams
 _streams: dict[str, dict[str, asyncio.Queue]] = {}
+# Bots connected with the binary frame protocol
+_binary_bots: set[str] = set()
+# {bot_name: version reported at connect}
+_bot_versions: dict[str, str] = {}
+# {bot_name: {path: asset dict}}  — static assets for the bot's current version
+_static_cache: dict[str, dict[str, dict]] = {}
+_static_stats = {"hits": 0, "misses": 0, "not_modified": 0}
 
 # ---------------------------------------------------------------------------
 # HTML pages (inline, no external files needed)
@@ -127,8 +221,10 @@ async def handle_ws(request: web.Request) -> web.WebSocketResponse:
         log.warning("Rejected connection: no bot name")
         raise web.HTTPBadRequest(text="Missing 'bot' query parameter")
 
-    ws = web.WebSocketResponse(max_msg_size=16 * 1024 * 1024)
+    ws = web.WebSocketResponse(max_msg_size=16 * 1024 * 1024,
+                               protocols=TUNNEL_PROTOCOLS)
     await ws.prepare(request)
+    binary = ws.ws_protocol == BINARY_SUBPROTOCOL
 
     # Close old connection for this bot name if any
     old_ws = _bots.get(bot_name)
@@ -138,50 +234,58 @@ async def handle_ws(request: web.Request) -> web.WebSocketResponse:
     _cancel_pending(bot_name, "Bot reconnected")
     _cancel_all_streams(bot_name)
 
+    version = request.query.get("version", "").strip()
+    if _bot_versions.get(bot_name) != version:
+        _static_cache.pop(bot_name, None)
+    _bot_versions[bot_name] = version
+
     _bots[bot_name] = ws
     _pending[bot_name] = {}
     _streams[bot_name] = {}
-    log.info("Bot '%s' connected from %s", bot_name, request.remote)
+    if binary:
+        _binary_bots.add(bot_name)
+    else:
+        _binary_bots.discard(bot_name)
+    log.info("Bot '%s' v%s connected from %s (%s frames)", bot_name,
+             version or "?", request.remote, "binary" if binary else "JSON")
 
     try:
         async for msg in ws:
-            if msg.type == WSMsgType.TEXT:
+            if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
                 try:
-                    data = json.loads(msg.data)
-                except json.JSONDecodeError:
-                    log.warning("Malformed JSON from bot '%s'", bot_name)
+                    if msg.type == WSMsgType.BINARY:
+                        ftype, req_id, meta, body = decode_frame(msg.data)
+                    else:
+                        ftype, req_id, meta, body = _parse_legacy(json.loads(msg.data))
+                except ValueError:  # includes JSONDecodeError
+                    log.warning("Malformed message from bot '%s'", bot_name)
                     continue
 
-                req_id = data.get("id")
-                stream_type = data.get("stream")
-
-                if stream_type:
-                    # Streaming protocol message
-                    if stream_type == "start":
-                        # Create stream queue and resolve pending future
-                        queue: asyncio.Queue = asyncio.Queue()
-                        _streams.setdefault(bot_name, {})[req_id] = queue
-                        fut = _pending.get(bot_name, {}).get(req_id)
-                        if fut and not fut.done():
-                            fut.set_result(data)
-                    elif stream_type == "chunk":
-                        queue = _streams.get(bot_name, {}).get(req_id)
-                        if queue:
-                            body = base64.b64decode(data.get("body_b64", ""))
-                            await queue.put(body)
-                    elif stream_type == "end":
-                        queue = _streams.get(bot_name, {}).get(req_id)
-                        if queue:
-                            await queue.put(None)  # sentinel
-                        _streams.get(bot_name, {}).pop(req_id, None)
+                if ftype == FRAME_STREAM_START:
+                    # Create stream queue and resolve pending future
+                    queue: asyncio.Queue = asyncio.Queue()
+                    _streams.setdefault(bot_name, {})[req_id] = queue
+                    fut = _pending.get(bot_name, {}).get(req_id)
+                    if fut and not fut.done():
+                        fut.set_result((ftype, meta, body))
+                elif ftype == FRAME_STREAM_CHUNK:
+                    queue = _streams.get(bot_name, {}).get(req_id)
+                    if queue:
+                        await queue.put(body)
+                elif ftype == FRAME_STREAM_END:
+                    queue = _streams.get(bot_name, {}).get(req_id)
+                    if queue:
+                        await queue.put(None)  # sentinel
+                    _streams.get(bot_name, {}).pop(req_id, None)
                 elif req_id and req_id in _pending.get(bot_name, {}):
                     # Normal request-response
-                    _pending[bot_name][req_id].set_result(data)
+                    _pending[bot_name][req_id].set_result((ftype, meta, body))
             elif msg.type in (WSMsgType.ERROR, WSMsgType.CLOSE):
                 break
     finally:
         if _bots.get(bot_name) is ws:
             del _bots[bot_name]
+            _binary_bots.discard(bot_name)
         _cancel_pending(bot_name, "Bot disconnected")
         _cancel_all_streams(bot_name)
         log.info("Bot '%s' disconnected", bot_name)
@@ -193,11 +297,9 @@ def _cancel_pending(bot_name: str, reason: str) -> None:
     pending = _pending.pop(bot_name, {})
     for fut in pending.values():
         if not fut.done():
-            fut.set_result({
-                "status": 502,
-                "headers": {"Content-Type": "text/plain"},
-                "body_b64": base64.b64encode(reason.encode()).decode("ascii"),
-            })
+            fut.set_result((FRAME_RESPONSE,
+                            {"status": 502, "headers": {"Content-Type": "text/plain"}},
+                            reason.encode()))
 
 
 def _cancel_all_streams(bot_name: str) -> None:
@@ -215,7 +317,10 @@ async def _send_cancel_stream(bot_name: str, req_id: str) -> None:
     ws = _bots.get(bot_name)
     if ws and not ws.closed:
         try:
-            await ws.send_json({"cancel_stream": req_id})
+            if bot_name in _binary_bots:
+                await ws.send_bytes(encode_frame(FRAME_CANCEL, req_id))
+            else:
+                await ws.send_json({"cancel_stream": req_id})
         except Exception:
             pass
     # Clean up stream queue
@@ -226,6 +331,88 @@ async def _send_cancel_stream(bot_name: str, req_id: str) -> None:
         except Exception:
             pass
 
+# ---------------------------------------------------------------------------
+# Compression + static asset cache
+# ---------------------------------------------------------------------------
+
+def _is_text(content_type: str) -> bool:
+    ctype = content_type.split(";")[0].strip().lower()
+    return (ctype.startswith("text/") or ctype.endswith(("json", "javascript", "xml"))
+            or ctype == "image/svg+xml")
+
+
+def _accepted_encoding(request: web.Request) -> str | None:
+    """Best encoding the browser accepts: "br", "gzip" or None."""
+    accept = request.headers.get("Accept-Encoding", "").lower()
+    offered = {part.split(";")[0].strip() for part in accept.split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=9 if static else 5)
+    return gzip.compress(body, compresslevel=9 if static else 6)
+
+
+def _compressed_response(request: web.Request, body: bytes, status: int,
+                         headers: dict) -> web.Response:
+    """Response with the body compressed for the browser when worthwhile."""
+    content_type = headers.get("Content-Type", headers.get("content-type", ""))
+    if len(body) >= COMPRESS_MIN_SIZE and _is_text(content_type):
+        encoding = _accepted_encoding(request)
+        if encoding:
+            body = _compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return web.Response(body=body, status=status, headers=headers)
+
+
+def _is_static_request(request: web.Request, sub_path: str) -> bool:
+    return request.method == "GET" and sub_path.startswith(STATIC_PREFIX)
+
+
+def _cache_asset(bot_name: str, path: str, headers: dict, body: bytes) -> dict:
+    """Build (and, if it fits the budget, store) a cache entry for an asset."""
+    headers = {k: v for k, v in headers.items()
+               if k.lower() not in ("etag", "last-modified", "cache-control",
+                                    "expires", "date", "set-cookie")}
+    asset = {"etag": '"%s"' % hashlib.sha1(body).hexdigest()[:20],
+             "headers": headers, "body": body, "encoded": {}}
+    content_type = headers.get("Content-Type", headers.get("content-type", ""))
+    if len(body) >= COMPRESS_MIN_SIZE and _is_text(content_type):
+        asset["encoded"]["gzip"] = _compress(body, "gzip", static=True)
+        if brotli is not None:
+            asset["encoded"]["br"] = _compress(body, "br", static=True)
+    if len(body) <= STATIC_MAX_ASSET:
+        cache = _static_cache.setdefault(bot_name, {})
+        used = sum(len(a["body"]) for a in cache.values())
+        if used + len(body) <= STATIC_MAX_PER_BOT:
+            cache[path] = asset
+    return asset
+
+
+def _asset_response(request: web.Request, asset: dict) -> web.Response:
+    """Serve a cached asset: 304 on a matching If-None-Match, else the best encoding."""
+    headers = {"ETag": asset["etag"],
+               "Cache-Control": f"public, max-age={STATIC_MAX_AGE}"}
+    if asset["encoded"]:
+        headers["Vary"] = "Accept-Encoding"
+    inm = request.headers.get("If-None-Match", "")
+    if asset["etag"] in [tag.strip() for tag in inm.split(",")] or inm.strip() == "*":
+        _static_stats["not_modified"] += 1
+        return web.Response(status=304, headers=headers)
+    headers.update(asset["headers"])
+    body = asset["body"]
+    encoding = _accepted_encoding(request)
+    if encoding in asset["encoded"]:
+        body = asset["encoded"][encoding]
+        headers["Content-Encoding"] = encoding
+    return web.Response(body=body, headers=headers)
+
 # ---------------------------------------------------------------------------
 # HTTP handler (browser requests)
 # ---------------------------------------------------------------------------
@@ -258,13 +445,25 @@ async def handle_http(request: web.Request) -> web.StreamResponse:
     if query:
         forward_path += "?" + query
 
-    envelope = {
-        "id": req_id,
+    # Static assets for this bot version come from the cache; only bots that
+    # report a version are cached, so an update can't serve stale files.
+    static = _is_static_request(request, sub_path) and bool(_bot_versions.get(bot_name))
+    if static:
+        asset = _static_cache.get(bot_name, {}).get(forward_path)
+        if asset is not None:
+            _static_stats["hits"] += 1
+            return _asset_response(request, asset)
+        _static_stats["misses"] += 1
+
+    # The bot's conditional headers would be checked against its own
+    # validators, not the relay's ETag — fetch the full asset instead.
+    skip = ("host", "transfer-encoding") + (
+        ("if-none-match", "if-modified-since") if static else ())
+    meta = {
         "method": request.method,
         "path": forward_path,
         "headers": {k: v for k, v in request.headers.items()
-                    if k.lower() not in ("host", "transfer-encoding")},
-        "body_b64": base64.b64encode(body).decode("ascii") if body else "",
+                    if k.lower() not in skip},
     }
 
     # Send to bot and wait for response
@@ -272,14 +471,18 @@ async def handle_http(request: web.Request) -> web.StreamResponse:
     _pending.setdefault(bot_name, {})[req_id] = future
 
     try:
-        await ws.send_json(envelope)
+        if bot_name in _binary_bots:
+            await ws.send_bytes(encode_frame(FRAME_REQUEST, req_id, meta, body))
+        else:
+            await ws.send_json({"id": req_id, **meta,
+                                "body_b64": base64.b64encode(body).decode("ascii") if body else ""})
     except Exception as e:
         _pending.get(bot_name, {}).pop(req_id, None)
         log.warning("Failed to send to bot '%s': %s", bot_name, e)
         return web.Response(text=_offline_page(bot_name), content_type="text/html")
 
     try:
-        result = await asyncio.wait_for(future, timeout=REQUEST_TIMEOUT)
+        ftype, result, resp_body = await asyncio.wait_for(future, timeout=REQUEST_TIMEOUT)
     except asyncio.TimeoutError:
         _pending.get(bot_name, {}).pop(req_id, None)
         return web.Response(text="Gateway Timeout", status=504)
@@ -287,11 +490,10 @@ async def handle_http(request: web.Request) -> web.StreamResponse:
         _pending.get(bot_name, {}).pop(req_id, None)
 
     # Check if this is a streaming response
-    if result.get("stream") == "start":
+    if ftype == FRAME_STREAM_START:
         return await _handle_stream_response(request, bot_name, req_id, result)
 
     # Build normal response
-    resp_body = base64.b64decode(result.get("body_b64", ""))
     resp_headers = result.get("headers", {})
     # Filter headers that aiohttp manages itself
     for h in ("Transfer-Encoding", "Content-Length", "Content-Encoding"):
@@ -329,11 +531,11 @@ async def handle_http(request: web.Request) -> web.StreamResponse:
     if location and location.startswith("/") and not location.startswith(f"/{bot_name}/"):
         resp_headers["Location"] = f"/{bot_name}{location}"
 
-    return web.Response(
-        body=resp_body,
-        status=result.get("status", 200),
-        headers=resp_headers,
-    )
+    status = result.get("status", 200)
+    if static and status == 200:
+        return _asset_response(request, _cache_asset(bot_name, forward_path,
+                                                     resp_headers, resp_body))
+    return _compressed_response(request, resp_body, status, resp_headers)
 
 
 async def _handle_stream_response(
@@ -541,6 +743,8 @@ async def handle_admin(request: web.Request) -> web.Response:
     html = (
         f'<ul class="bot-list">{"".join(f"<li>{r}</li>" for r in rows)}</ul>'
         f'<p class="total">Total: {_format_size(total_size)}</p>'
+        f'<p class="total">Static cache: {_static_stats["hits"]} hits, '
+        f'{_static_stats["not_modified"]} not modified, {_static_stats["misses"]} misses</p>'
     )
     return web.Response(text=_admin_page(html), content_type="text/html")
 
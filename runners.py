@@ -28,6 +28,7 @@ import time
 import random
 
 import config
+import state_store
 from config import running_tasks, Screen, RallyType
 from botlog import get_logger
 from navigation import check_screen, navigate
@@ -483,11 +484,21 @@ def run_once(device, task_name, function):
 
 def launch_task(device, task_name, target_func, stop_event, args=()):
     """Launch a task as a daemon thread."""
-    thread = threading.Thread(target=target_func, args=args, daemon=True)
-    thread.start()
-
     task_key = f"{device}_{task_name}"
+
+    def _run():
+        try:
+            target_func(*args)
+        finally:
+            # Tell the dashboard the task ended, unless a newer task took the key
+            info = running_tasks.get(task_key)
+            if not isinstance(info, dict) or info.get("thread") is threading.current_thread():
+                state_store.remove(("tasks", task_key))
+
+    thread = threading.Thread(target=_run, daemon=True)
     running_tasks[task_key] = {"thread": thread, "stop_event": stop_event}
+    state_store.publish(("tasks", task_key), True)
+    thread.start()
     get_logger("runner", device).info("Started %s", task_name)
 
 
@@ -554,8 +565,11 @@ def force_stop_all():
             _force_kill_thread(thread)
     # Give threads a moment to actually die, then clean up
     time.sleep(0.1)
+    for key in list(running_tasks):
+        state_store.remove(("tasks", key))
     running_tasks.clear()
-    config.DEVICE_STATUS.clear()
+    for device in list(config.DEVICE_STATUS):
+        config.clear_device_status(device)
     _log.info("=== ALL TASKS FORCE-KILLED ===")
 
 
@@ -0,0 +1,445 @@
+"""
+9Bot Screen Classifier
+
+Scores every screen and popup template against one screenshot in a single
+pass, replacing check_screen's per-template full-resolution matchTemplate
+loop.
+
+How it works
+------------
+Each template is preprocessed once: converted to grayscale and reduced
+with ``cv2.pyrDown`` to the coarsest pyramid level (1/4, 1/2 or full) at
+which it still has at least MIN_COARSE_SIDE pixels on its short side.
+Per frame, the screenshot is converted to grayscale and pyrDown'ed once
+per level that any template needs.
+
+1. Coarse pass — every template is matched on its pyramid level (inside
+   its search region, scaled), giving a cheap score and the top-k peak
+   locations.  This is the full score table.
+2. Fine pass — templates whose coarse score is within COARSE_SLACK of
+   their threshold have each coarse peak walked up the pyramid (grayscale
+   at intermediate levels, colour at full resolution), matching only a
+   REFINE_MARGIN window around the projected location.  The fine score
+   is the same number the old full-screen match produced.  Screens are refined
+   best-first and refinement stops early once one clears its threshold by
+   EARLY_EXIT_MARGIN; popups are always refined since check_screen acts
+   on each of them.
+
+If no screen template clears its threshold after the fine pass, classify()
+falls back to the full search below, so the pyramid can only make a frame
+cheaper to identify, never leave a known screen UNKNOWN.
+
+With ``full_search=True`` classify() skips the pyramid and runs one
+full-resolution matchTemplate per template in its region — the original
+check_screen loop.  That is the default; the pyramid is switched on with
+the "pyramid_check_screen" setting (config.PYRAMID_CHECK_SCREEN).
+
+Tuning
+------
+Run the bot with the setting on and compare the check_screen span on the
+debug page with the setting off.  check_screen logs "identified by full
+search" at debug level whenever the pyramid missed a screen that the
+fallback found; such frames cost a pyramid pass plus a full search.  If one
+screen keeps showing up there, raise COARSE_SLACK (refine more coarse
+candidates) or MIN_COARSE_SIDE (keep more templates at a finer level).
+
+Public API
+----------
+ScreenClassifier(entries, full_search=False)
+    entries: iterable of (name, template_bgr, region_or_None, threshold, kind)
+    where kind is "screen" or "popup".
+ScreenClassifier.classify(frame) -> ClassifyResult
+"""
+
+import cv2
+import numpy as np
+
+# Pyramid scales available to templates, coarsest first.
+PYRAMID_SCALES = (0.25, 0.5, 1.0)
+MIN_COARSE_SIDE = 10       # template short side (px) required at a coarse level
+COARSE_SLACK = 0.25        # refine when coarse score >= threshold - slack
+EARLY_EXIT_MARGIN = 0.08   # stop refining once a score clears threshold + margin
+TOP_K = 3                  # coarse peaks kept per template
+REFINE_MARGIN = 3          # search margin (px at each level) when stepping up a level
+PYRAMID_QUALITY = 0.9      # min self-correlation of a template after a round trip to a coarse level
+
+
+def _downscale(img, scale):
+    """Reduce an image to ``scale`` with repeated pyrDown (same path as frames)."""
+    steps = {1.0: 0, 0.5: 1, 0.25: 2}[scale]
+    for _ in range(steps):
+        img = cv2.pyrDown(img)
+    return img
+
+
+def _top_peaks(result, k, suppress_h, suppress_w):
+    """Return up to k (score, (x, y)) peaks from a matchTemplate result,
+    suppressing a template-sized neighbourhood around each pick."""
+    peaks = []
+    res = result
+    for i in range(k):
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if peaks and max_val < peaks[0][0] - COARSE_SLACK:
+            break
+        peaks.append((float(max_val), max_loc))
+        if i == k - 1:
+            break
+        if res is result:
+            res = result.copy()
+        x, y = max_loc
+        res[max(0, y - suppress_h):y + suppress_h + 1,
+            max(0, x - suppress_w):x + suppress_w + 1] = -1.0
+    return peaks
+
+
+def _match_window(img, tpl, x, y, margin, bounds):
+    """matchTemplate of ``tpl`` around top-left (x, y) ± margin, clipped to
+    bounds (x1, y1, x2, y2).  Returns (score, (x, y)) or (-1.0, (x, y))."""
+    th, tw = tpl.shape[:2]
+    bx1, by1, bx2, by2 = bounds
+    wx1 = max(bx1, x - margin)
+    wy1 = max(by1, y - margin)
+    wx2 = min(bx2, x + tw + margin)
+    wy2 = min(by2, y + th + margin)
+    window = img[wy1:wy2, wx1:wx2]
+    if window.shape[0] < th or window.shape[1] < tw:
+        return -1.0, (x, y)
+    result = cv2.matchTemplate(window, tpl, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return float(max_val), (max_loc[0] + wx1, max_loc[1] + wy1)
+
+
+def _detail_kept(gray, scale):
+    """True if ``gray`` reduced to ``scale`` still carries its structure —
+    the reduced template, blown back up, correlates with the original at
+    PYRAMID_QUALITY or better."""
+    small = _downscale(gray, scale)
+    up = cv2.resize(small, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_LINEAR)
+    score = cv2.matchTemplate(up, gray, cv2.TM_CCOEFF_NORMED)[0, 0]
+    return bool(np.isfinite(score) and score >= PYRAMID_QUALITY)
+
+
+def build_pyramid(frame, scales=PYRAMID_SCALES):
+    """Grayscale frame pyramid {scale: image} for the requested scales."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    pyramid = {1.0: gray}
+    if 0.5 in scales or 0.25 in scales:
+        pyramid[0.5] = cv2.pyrDown(gray)
+    if 0.25 in scales:
+        pyramid[0.25] = cv2.pyrDown(pyramid[0.5])
+    return pyramid
+
+
+class PyramidTemplate:
+    """One template prepared for coarse-to-fine matching.
+
+    ``scale`` is the coarsest pyramid level at which the template keeps at
+    least MIN_COARSE_SIDE pixels on its short side and passes the
+    _detail_kept() check, unless ``min_scale`` pins it (tuned per template
+    with tune_min_scale()).  Scale 1.0 means the template is matched
+    directly at full resolution.
+    """
+
+    def __init__(self, template, min_scale=None):
+        self.template = template
+        self.h, self.w = template.shape[:2]
+        gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY) if template.ndim == 3 else template
+        self.scale = 1.0
+        for scale in PYRAMID_SCALES:
+            if scale == 1.0 or (min_scale is not None and scale < min_scale):
+                continue
+            if min(self.h, self.w) * scale < MIN_COARSE_SIDE:
+                continue
+            if min_scale is None and not _detail_kept(gray, scale):
+                continue
+            self.scale = scale
+            break
+        # Grayscale template at every level from the coarse one up to 1/2;
+        # full resolution is matched in colour against self.template.
+        self.gray = {s: _downscale(gray, s) for s in PYRAMID_SCALES
+                     if self.scale <= s < 1.0}
+        if self.scale == 1.0:
+            self.gray[1.0] = gray
+
+    def bounds(self, scale, frame_shape, region=None):
+        """Search bounds (x1, y1, x2, y2) at ``scale`` for a frame of frame_shape."""
+        fh, fw = frame_shape[:2]
+        if region:
+            x1, y1, x2, y2 = region
+        else:
+            x1, y1, x2, y2 = 0, 0, fw, fh
+        x2, y2 = min(x2, fw), min(y2, fh)
+        return (int(x1 * scale), int(y1 * scale),
+                int(np.ceil(x2 * scale)), int(np.ceil(y2 * scale)))
+
+    def coarse(self, pyramid, region=None, k=TOP_K):
+        """Coarse match on the template's pyramid level.
+
+        Returns list of (score, (x, y)) with coordinates at the coarse level.
+        """
+        img = pyramid[self.scale]
+        x1, y1, x2, y2 = self.bounds(self.scale, pyramid[1.0].shape, region)
+        img = img[y1:y2, x1:x2]
+        tpl = self.gray[self.scale]
+        th, tw = tpl.shape[:2]
+        if img.shape[0] < th or img.shape[1] < tw:
+            return [(0.0, (0, 0))]
+        result = cv2.matchTemplate(img, tpl, cv2.TM_CCOEFF_NORMED)
+        np.nan_to_num(result, copy=False)
+        peaks = _top_peaks(result, k, th // 2, tw // 2)
+        return [(val, (px + x1, py + y1)) for val, (px, py) in peaks]
+
+    def refine(self, frame, pyramid, peaks, threshold, region=None, early_exit=True):
+        """Walk each coarse peak up the pyramid to full resolution.
+
+        Intermediate levels are matched in grayscale within REFINE_MARGIN of
+        the projected location; the last step is a colour match at full
+        resolution, giving the same score a full-screen match would.
+        Peaks below ``threshold - COARSE_SLACK`` are skipped; with
+        ``early_exit`` refinement stops once a peak clears threshold +
+        EARLY_EXIT_MARGIN.  Returns (score, (x, y)) at full resolution, or
+        (-1.0, ...) if no window could be matched.
+        """
+        best_val, best_loc = -1.0, (0, 0)
+        for coarse_val, (x, y) in peaks:
+            if coarse_val < threshold - COARSE_SLACK:
+                break
+            scale = self.scale
+            while scale < 1.0:
+                next_scale = scale * 2
+                x, y = x * 2, y * 2
+                if next_scale < 1.0:
+                    _, (x, y) = _match_window(
+                        pyramid[next_scale], self.gray[next_scale], x, y,
+                        REFINE_MARGIN, self.bounds(next_scale, frame.shape, region))
+                scale = next_scale
+            val, loc = _match_window(frame, self.template, x, y, REFINE_MARGIN,
+                                     self.bounds(1.0, frame.shape, region))
+            if val > best_val:
+                best_val, best_loc = val, loc
+            if early_exit and best_val >= threshold + EARLY_EXIT_MARGIN:
+                break
+        return best_val, best_loc
+
+    def match(self, frame, threshold, region=None, pyramid=None):
+        """Best full-resolution (score, (x, y)) of the template in ``region``.
+
+        The score is the one a full matchTemplate over the region gives
+        whenever the best location is among the TOP_K coarse peaks; if no
+        coarse peak comes within COARSE_SLACK of ``threshold`` the best
+        coarse score is returned instead (the template is not there).
+        """
+        if self.scale == 1.0:
+            x1, y1, x2, y2 = self.bounds(1.0, frame.shape, region)
+            area = frame[y1:y2, x1:x2]
+            if area.shape[0] < self.h or area.shape[1] < self.w:
+                return 0.0, (0, 0)
+            result = cv2.matchTemplate(area, self.template, cv2.TM_CCOEFF_NORMED)
+            _, val, _, loc = cv2.minMaxLoc(result)
+            return float(val), (loc[0] + x1, loc[1] + y1)
+        pyramid = pyramid or build_pyramid(frame)
+        peaks = self.coarse(pyramid, region)
+        val, loc = self.refine(frame, pyramid, peaks, threshold, region, early_exit=False)
+        if val < 0:
+            coarse_val, (x, y) = peaks[0]
+            return coarse_val, (int(x / self.scale), int(y / self.scale))
+        return val, loc
+
+    def find_all(self, frame, threshold, region=None, pyramid=None, max_candidates=64):
+        """All full-resolution (x, y) top-left points scoring >= threshold.
+
+        Coarse-level points within COARSE_SLACK of ``threshold`` are
+        clustered; each cluster is re-matched at full resolution in a
+        window around it, and every point clearing ``threshold`` there is
+        returned — the same set a full-frame matchTemplate + threshold
+        gives, in the same row-major order.
+        """
+        pyramid = pyramid or build_pyramid(frame)
+        if self.scale == 1.0:
+            x1, y1, x2, y2 = self.bounds(1.0, frame.shape, region)
+            windows = [(x1, y1, x2, y2)]
+        else:
+            img = pyramid[self.scale]
+            bx1, by1, bx2, by2 = self.bounds(self.scale, frame.shape, region)
+            tpl = self.gray[self.scale]
+            th, tw = tpl.shape[:2]
+            img = img[by1:by2, bx1:bx2]
+            if img.shape[0] < th or img.shape[1] < tw:
+                return []
+            result = cv2.matchTemplate(img, tpl, cv2.TM_CCOEFF_NORMED)
+            np.nan_to_num(result, copy=False)
+            ys, xs = np.where(result >= threshold - COARSE_SLACK)
+            order = np.argsort(-result[ys, xs])[:max_candidates * 8]
+            picked = []
+            for i in order:
+                x, y = int(xs[i]), int(ys[i])
+                if all(abs(x - px) > tw // 2 or abs(y - py) > th // 2 for px, py in picked):
+                    picked.append((x, y))
+                    if len(picked) >= max_candidates:
+                        break
+            fx1, fy1, fx2, fy2 = self.bounds(1.0, frame.shape, region)
+            pad = int(1 / self.scale) + REFINE_MARGIN
+            windows = []
+            for x, y in picked:
+                wx, wy = int((x + bx1) / self.scale), int((y + by1) / self.scale)
+                windows.append((max(fx1, wx - pad), max(fy1, wy - pad),
+                                min(fx2, wx + self.w + pad), min(fy2, wy + self.h + pad)))
+
+        points = set()
+        for wx1, wy1, wx2, wy2 in windows:
+            window = frame[wy1:wy2, wx1:wx2]
+            if window.shape[0] < self.h or window.shape[1] < self.w:
+                continue
+            result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+            ys, xs = np.where(result >= threshold)
+            points.update(zip((xs + wx1).tolist(), (ys + wy1).tolist()))
+        return sorted(points, key=lambda p: (p[1], p[0]))
+
+
+def tune_min_scale(template, screens, threshold=0.8, region=None):
+    """Coarsest pyramid scale at which matching ``template`` on every frame in
+    ``screens`` agrees with a full-resolution search (same hit/miss, same
+    location within 2 px).  Use it to fill per-template overrides."""
+    full = PyramidTemplate(template, min_scale=1.0)
+    expected = []
+    for screen in screens:
+        val, loc = full.match(screen, threshold, region)
+        expected.append((val > threshold, loc))
+    for scale in PYRAMID_SCALES:
+        pt = PyramidTemplate(template, min_scale=scale)
+        if pt.scale != scale:
+            continue
+        ok = True
+        for screen, (hit, loc) in zip(screens, expected):
+            val, got = pt.match(screen, threshold, region)
+            if (val > threshold) != hit or (hit and max(abs(got[0] - loc[0]),
+                                                        abs(got[1] - loc[1])) > 2):
+                ok = False
+                break
+        if ok:
+            return scale
+    return 1.0
+
+
+class _Entry(PyramidTemplate):
+    def __init__(self, name, template, region, threshold, kind):
+        super().__init__(template)
+        self.name = name
+        self.region = region
+        self.threshold = threshold
+        self.kind = kind
+
+
+class ClassifyResult:
+    """Score table from one classify() call.
+
+    scores:  {name: best score} — fine score if refined, else coarse score
+    locs:    {name: (x, y)} full-resolution top-left of the best match
+    sizes:   {name: (h, w)} template size
+    refined: set of names whose score came from the full-resolution pass
+    fell_back: True if the pyramid found no screen and the full search ran
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self.locs = {}
+        self.sizes = {}
+        self.refined = set()
+        self.fell_back = False
+
+    def score(self, name):
+        return self.scores.get(name, 0.0)
+
+    def center(self, name):
+        """Full-screen center of the best match for ``name``."""
+        x, y = self.locs.get(name, (0, 0))
+        h, w = self.sizes.get(name, (0, 0))
+        return x + w // 2, y + h // 2
+
+    def best(self, names, refined_only=False):
+        """Return (name, score) of the highest-scoring entry among ``names``.
+
+        With ``refined_only``, unrefined (coarse-only) scores are ignored —
+        use this when the result decides an action.
+        """
+        best_name, best_val = None, 0.0
+        for name in names:
+            if refined_only and name not in self.refined:
+                continue
+            val = self.scores.get(name)
+            if val is not None and val > best_val:
+                best_name, best_val = name, val
+        return best_name, best_val
+
+
+class ScreenClassifier:
+    """Precomputed multi-template matcher — see module docstring."""
+
+    def __init__(self, entries, full_search=False):
+        self.entries = [_Entry(*e) for e in entries]
+        self.full_search = full_search
+        self._levels = sorted({e.scale for e in self.entries})
+
+    def classify(self, frame, names=None):
+        """Score all templates (or just ``names``) against one BGR frame."""
+        out = ClassifyResult()
+        entries = self.entries if names is None else [e for e in self.entries if e.name in names]
+        if self.full_search:
+            return self._classify_full(frame, entries, out)
+        pyramid = build_pyramid(frame, self._levels)
+
+        coarse = {}
+        for entry in entries:
+            peaks = entry.coarse(pyramid, entry.region)
+            coarse[entry.name] = peaks
+            val, (x, y) = peaks[0]
+            out.scores[entry.name] = val
+            out.locs[entry.name] = (int(x / entry.scale), int(y / entry.scale))
+            out.sizes[entry.name] = (entry.h, entry.w)
+
+        def refine(entry):
+            val, loc = entry.refine(frame, pyramid, coarse[entry.name],
+                                    entry.threshold, entry.region)
+            if val < 0:
+                return val  # no full-resolution window: keep the coarse score, unrefined
+            out.scores[entry.name] = val
+            out.locs[entry.name] = loc
+            out.refined.add(entry.name)
+            return val
+
+        for entry in entries:
+            if entry.kind == "popup" and out.scores[entry.name] >= entry.threshold - COARSE_SLACK:
+                refine(entry)
+
+        screens = sorted((e for e in entries if e.kind == "screen"),
+                         key=lambda e: out.scores[e.name], reverse=True)
+        for entry in screens:
+            if out.scores[entry.name] < entry.threshold - COARSE_SLACK:
+                break
+            if refine(entry) >= entry.threshold + EARLY_EXIT_MARGIN:
+                break
+        if screens and not any(e.name in out.refined and out.scores[e.name] > e.threshold
+                               for e in screens):
+            # No screen identified through the pyramid: fall back to the full
+            # search so a coarse miss can't turn a known screen into UNKNOWN.
+            out = self._classify_full(frame, entries, ClassifyResult())
+            out.fell_back = True
+        return out
+
+    @staticmethod
+    def _classify_full(frame, entries, out):
+        """One full-resolution colour match per template; every score is refined."""
+        for entry in entries:
+            x1, y1, x2, y2 = entry.bounds(1.0, frame.shape, entry.region)
+            area = frame[y1:y2, x1:x2]
+            out.sizes[entry.name] = (entry.h, entry.w)
+            if area.shape[0] < entry.h or area.shape[1] < entry.w:
+                out.scores[entry.name] = 0.0
+                out.locs[entry.name] = (0, 0)
+                continue
+            result = cv2.matchTemplate(area, entry.template, cv2.TM_CCOEFF_NORMED)
+            _, val, _, loc = cv2.minMaxLoc(result)
+            out.scores[entry.name] = float(val)
+            out.locs[entry.name] = (loc[0] + x1, loc[1] + y1)
+            out.refined.add(entry.name)
+        return out
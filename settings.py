@@ -5,7 +5,7 @@ Used by both main.py (GUI) and web/dashboard.py (Flask).
 
 Key exports:
     SETTINGS_FILE — absolute path to settings.json
-    DEFAULTS      — default settings dict (23 keys)
+    DEFAULTS      — default settings dict
     load_settings — load + validate + merge with defaults
     save_settings — write settings dict to JSON
 """
@@ -56,6 +56,16 @@ DEFAULTS = {
     "remote_access": True,
     "auto_upload_logs": False,
     "upload_interval_hours": 24,
+    "capture_backend": "screencap",
+    "frame_cache_ms": 150,
+    "adb_persistent_shell": True,
+    "adb_backend": "subprocess",
+    "budget_mode": "observe",
+    "profiling": False,
+    "pyramid_check_screen": False,
+    "pyramid_matching": False,
+    "ocr_workers": 0,
+    "ocr_worker_max_mb": 1500,
 }
 
 
@@ -18,7 +18,11 @@ import config
 from config import (running_tasks, set_min_troops, set_auto_heal,
                     set_auto_restore_ap, set_ap_restore_options,
                     set_territory_config, set_eg_rally_own, set_titan_rally_own,
-                    set_gather_options, set_tower_quest_enabled)
+                    set_gather_options, set_tower_quest_enabled,
+                    set_capture_backend, set_frame_cache_max_age,
+                    set_ocr_workers, set_adb_persistent_shell, set_adb_backend,
+                    set_budget_mode, set_profiling,
+                    set_pyramid_check_screen, set_pyramid_matching)
 from settings import load_settings, save_settings
 
 # Relay server connection details (obfuscated, not plaintext in source)
@@ -126,6 +130,30 @@ def apply_settings(settings):
         settings.get("gather_max_troops", 3),
     )
     set_tower_quest_enabled(settings.get("tower_quest_enabled", False))
+    set_capture_backend(settings.get("capture_backend", "screencap"))
+    set_frame_cache_max_age(settings.get("frame_cache_ms", 150))
+    set_budget_mode(settings.get("budget_mode", "observe"))
+    set_profiling(settings.get("profiling", False))
+    set_pyramid_check_screen(settings.get("pyramid_check_screen", False))
+    set_pyramid_matching(settings.get("pyramid_matching", False))
+    set_ocr_workers(settings.get("ocr_workers", 0), settings.get("ocr_worker_max_mb", 1500))
+    previous_backend = config.ADB_BACKEND
+    set_adb_backend(settings.get("adb_backend", "subprocess"))
+    set_adb_persistent_shell(settings.get("adb_persistent_shell", True))
+    if not config.ADB_PERSISTENT_SHELL or config.ADB_BACKEND != previous_backend:
+        from adb_shell import close_all_shells
+        close_all_shells()
+    if config.ADB_BACKEND != previous_backend:
+        from capture import stop_all_sessions
+        from vision import clear_capture_modes
+        stop_all_sessions()
+        clear_capture_modes()   # raw vs PNG costs differ per transport
+    if config.OCR_WORKERS == 0:
+        from vision import stop_ocr_pool
+        stop_ocr_pool()
+    if config.CAPTURE_BACKEND != "stream":
+        from capture import stop_all_sessions
+        stop_all_sessions()
     for dev_id, count in settings.get("device_troops", {}).items():
         try:
             config.DEVICE_TOTAL_TROOPS[dev_id] = int(count)
@@ -235,6 +263,27 @@ def shutdown():
     except Exception:
         pass
 
+    # Stop screen capture streams
+    try:
+        from capture import stop_all_sessions
+        stop_all_sessions()
+    except Exception:
+        pass
+
+    # Close persistent ADB shells
+    try:
+        from adb_shell import close_all_shells
+        close_all_shells()
+    except Exception:
+        pass
+
+    # Stop OCR worker processes
+    try:
+        from vision import stop_ocr_pool
+        stop_ocr_pool()
+    except Exception:
+        pass
+
     # Save session stats
     try:
         from botlog import stats
@@ -305,6 +354,13 @@ def create_bug_report_zip(clear_debug=True, notes=None):
                 if f.endswith(".json"):
                     zf.write(os.path.join(STATS_DIR, f), f"stats/{f}")
 
+        # Hot-path profile (only recorded with the profiling setting on)
+        import profiling
+        trace = profiling.chrome_trace()
+        if trace["traceEvents"]:
+            zf.writestr("profile/trace.json", json.dumps(trace))
+            zf.writestr("profile/stacks.txt", profiling.collapsed_stacks())
+
         # Settings (redact secrets)
         settings_path = os.path.join(SCRIPT_DIR, "settings.json")
         if os.path.isfile(settings_path):
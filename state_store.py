@@ -0,0 +1,109 @@
+"""
+9Bot State Store
+
+Versioned in-process copy of the state the dashboard shows (device status,
+troop snapshots, quest tracking, running tasks).  The code that changes that
+state publishes here; the dashboard's Server-Sent Events endpoint waits on
+the store and pushes only the fields that changed since the version a
+client last saw, instead of the client re-polling everything.
+
+Keys are tuples, e.g. ``("devices", "127.0.0.1:5555", "status")`` or
+``("tasks", "127.0.0.1:5555_auto_quest")``.  Every change bumps the global
+version and stamps the key with it; a deleted key keeps its stamp so
+``changes_since`` reports it as None.
+
+Public API
+----------
+publish(path, value) / remove(path)
+changes_since(version, include=None) -> (version, nested dict of changes)
+wait_for_change(version, timeout) -> current version
+current_version()
+"""
+
+import threading
+
+
+class StateStore:
+    """Thread-safe versioned key/value store — see module docstring."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._values = {}         # path -> value
+        self._versions = {}       # path -> version of last change (kept after delete)
+        self.version = 0
+
+    def _bump(self, path):
+        self.version += 1
+        self._versions[path] = self.version
+        self._cond.notify_all()
+
+    def set(self, path, value):
+        """Store ``value`` at ``path``. Returns False if it was already equal."""
+        with self._cond:
+            if path in self._values and self._values[path] == value:
+                return False
+            self._values[path] = value
+            self._bump(path)
+            return True
+
+    def delete(self, path):
+        with self._cond:
+            if path not in self._values:
+                return False
+            del self._values[path]
+            self._bump(path)
+            return True
+
+    def get(self, path, default=None):
+        with self._cond:
+            return self._values.get(path, default)
+
+    def changes_since(self, since=0, include=None):
+        """Return (version, changes) — a nested dict of every key changed after
+        ``since`` (deleted keys map to None).  ``include(path)`` filters keys.
+        """
+        with self._cond:
+            out = {}
+            for path, ver in self._versions.items():
+                if ver <= since or (include is not None and not include(path)):
+                    continue
+                node = out
+                for part in path[:-1]:
+                    node = node.setdefault(part, {})
+                node[path[-1]] = self._values.get(path)
+            return self.version, out
+
+    def wait(self, since, timeout):
+        """Block until the version passes ``since`` or ``timeout`` elapses."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since, timeout)
+            return self.version
+
+    def clear(self):
+        with self._cond:
+            self._values.clear()
+            self._versions.clear()
+            self._cond.notify_all()
+
+
+store = StateStore()
+
+
+def publish(path, value):
+    return store.set(path, value)
+
+
+def remove(path):
+    return store.delete(path)
+
+
+def changes_since(version, include=None):
+    return store.changes_since(version, include)
+
+
+def wait_for_change(version, timeout):
+    return store.wait(version, timeout)
+
+
+def current_version():
+    return store.version
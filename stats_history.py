@@ -0,0 +1,278 @@
+"""
+9Bot Stats History
+
+Append-only SQLite store (WAL journal) of the actions, ADB command timings,
+template hits/misses and timed_wait transitions StatsTracker records,
+kept across sessions in ``stats/history.db``.  Recording only enqueues a
+row; a single background writer thread drains the queue in batches, so
+no device thread ever waits on disk.  Rows are indexed by
+(kind, device, label, ts) and (kind, label, ts), so the dashboard can ask
+"p95 screenshot latency per device over the last 7 days" and SQLite
+touches only the matching rows.
+
+Rows older than RETENTION_DAYS are pruned by the writer.
+
+Row kinds (label / value / ok / detail):
+    action          action name / duration s / success / error message
+    adb             command / elapsed s / success / -
+    template_hit    template / confidence / 1 / "x,y"
+    template_miss   template / best score / 0 / -
+    transition      timed_wait label / actual s / condition met / budget s
+
+Public API
+----------
+HistoryStore(path)
+    .record(kind, device, label, value, ok=True, detail=None)  (non-blocking)
+    .flush(timeout=5.0) -> True once queued rows are on disk
+    .latency(kind, label, pct=95, days=7, device=None) -> {device: stats}
+    .summary(kind, days=7, device=None, pct=95) -> [per-label stats]
+    .recent_transitions(per_label=20, days=7) -> StatsTracker seed
+    .open(path) / .close()
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+RETENTION_DAYS = 30
+QUEUE_MAX = 20000          # rows; recorders drop (and count) beyond this
+BATCH_MAX = 500            # rows per transaction
+BATCH_WINDOW_S = 0.5       # gather rows this long before writing a batch
+PRUNE_INTERVAL_S = 3600
+
+_log = logging.getLogger("stats_history")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    ts     REAL NOT NULL,
+    device TEXT NOT NULL,
+    kind   TEXT NOT NULL,
+    label  TEXT NOT NULL,
+    value  REAL NOT NULL,
+    ok     INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_device ON events (kind, device, label, ts);
+CREATE INDEX IF NOT EXISTS events_by_label ON events (kind, label, ts);
+CREATE INDEX IF NOT EXISTS events_by_ts ON events (ts);
+"""
+
+# Per-(device, label) count / ok count / mean / max / percentile in one
+# pass: the percentile row is picked by rank inside each partition, with
+# the same index StatsTracker.get_adaptive_budget uses.
+_STATS_SQL = """
+WITH sel AS (
+    SELECT device, label, value,
+           ROW_NUMBER() OVER (PARTITION BY device, label ORDER BY value) AS rn,
+           COUNT(*)   OVER (PARTITION BY device, label) AS n,
+           SUM(ok)    OVER (PARTITION BY device, label) AS ok_n,
+           AVG(value) OVER (PARTITION BY device, label) AS mean,
+           MAX(value) OVER (PARTITION BY device, label) AS top
+    FROM events
+    WHERE kind = ? AND ts >= ? {filters}
+)
+SELECT device, label, n, ok_n, mean, value, top FROM sel
+WHERE rn = MIN(n, CAST(n * ? / 100.0 AS INTEGER) + 1)
+ORDER BY device, label
+"""
+
+_RECENT_TRANSITIONS_SQL = """
+SELECT device, label, value, ok, detail FROM (
+    SELECT device, label, value, ok, detail, ts,
+           ROW_NUMBER() OVER (PARTITION BY device, label ORDER BY ts DESC) AS rn
+    FROM events
+    WHERE kind = 'transition' AND ts >= ?
+)
+WHERE rn <= ?
+ORDER BY device, label, ts
+"""
+
+_STOP = object()
+
+
+class HistoryStore:
+    """SQLite stats history with a background writer — see module docstring."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_MAX)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def record(self, kind, device, label, value, ok=True, detail=None):
+        """Queue one row for the writer thread (never blocks)."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((time.time(), device, kind, label, float(value),
+                                    1 if ok else 0, detail))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until every row queued so far is written."""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def open(self, path):
+        """Write to (and read from) ``path`` from now on."""
+        self.close()
+        self.path = path
+
+    def close(self):
+        """Write out queued rows and stop the writer thread."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join(timeout=10)
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, daemon=True,
+                                                name="stats-history")
+                self._writer.start()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _next_batch(self):
+        """Block for one item, then gather more for up to BATCH_WINDOW_S."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW_S
+        while len(batch) < BATCH_MAX and isinstance(batch[-1], tuple):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = None
+        last_prune = 0.0
+        while True:
+            batch = self._next_batch()
+            rows = [item for item in batch if isinstance(item, tuple)]
+            if rows:
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO events (ts, device, kind, label, value, ok, detail)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                        if time.time() - last_prune >= PRUNE_INTERVAL_S:
+                            last_prune = time.time()
+                            conn.execute("DELETE FROM events WHERE ts < ?",
+                                         (last_prune - RETENTION_DAYS * 86400,))
+                except sqlite3.Error as e:
+                    _log.warning("Failed to write %d stats history rows: %s", len(rows), e)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if batch[-1] is _STOP:
+                break
+        if conn is not None:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _query(self, sql, params):
+        """Run a read query on a short-lived connection ([] if no history yet)."""
+        if not os.path.isfile(self.path):
+            return []
+        try:
+            conn = sqlite3.connect(self.path, timeout=10)
+            try:
+                conn.execute("PRAGMA query_only=1")
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            _log.warning("Stats history query failed: %s", e)
+            return []
+
+    def _stats(self, kind, days, pct, label=None, device=None):
+        filters, params = "", [kind, time.time() - days * 86400]
+        if label is not None:
+            filters += " AND label = ?"
+            params.append(label)
+        if device is not None:
+            filters += " AND device = ?"
+            params.append(device)
+        params.append(pct)
+        rows = self._query(_STATS_SQL.format(filters=filters), params)
+        return [{
+            "device": dev,
+            "label": lbl,
+            "count": n,
+            "ok_count": ok_n,
+            "avg": round(mean, 3),
+            f"p{pct}": round(value, 3),
+            "max": round(top, 3),
+        } for dev, lbl, n, ok_n, mean, value, top in rows]
+
+    def latency(self, kind, label, pct=95, days=7, device=None):
+        """{device: {"count", "ok_count", "avg", "p<pct>", "max"}} for one label.
+
+        e.g. ``latency("adb", "screenshot")`` — p95 screenshot time per
+        device over the last 7 days.
+        """
+        out = {}
+        for row in self._stats(kind, days, pct, label=label, device=device):
+            row.pop("label")
+            out[row.pop("device")] = row
+        return out
+
+    def summary(self, kind, days=7, device=None, pct=95):
+        """Per-(device, label) stats for every label of ``kind``, busiest first."""
+        rows = self._stats(kind, days, pct, device=device)
+        rows.sort(key=lambda r: -r["count"])
+        return rows
+
+    def recent_transitions(self, per_label=20, days=7):
+        """The last ``per_label`` transitions of each device/label, shaped like
+        StatsTracker's ``transition_times`` entries (count, met_count,
+        budgeted_s, samples) so adaptive budgets resume where they left off.
+        """
+        seed = {}
+        rows = self._query(_RECENT_TRANSITIONS_SQL,
+                           (time.time() - days * 86400, per_label))
+        for device, label, value, ok, detail in rows:
+            entry = seed.setdefault(device, {}).setdefault(label, {
+                "count": 0, "met_count": 0, "budgeted_s": 0, "samples": []})
+            entry["count"] += 1
+            try:
+                entry["budgeted_s"] = float(detail)
+            except (TypeError, ValueError):
+                pass
+            if ok:
+                entry["met_count"] += 1
+                entry["samples"].append(round(value, 3))
+        return seed
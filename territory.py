@@ -1,16 +1,20 @@
 import cv2
 import numpy as np
 import os
+import threading
 import time
 import random
+from collections import deque
 
 import config
 from config import (SQUARE_SIZE, GRID_OFFSET_X, GRID_OFFSET_Y,
                     GRID_WIDTH, GRID_HEIGHT, THRONE_SQUARES, BORDER_COLORS, Screen)
-from vision import load_screenshot, tap_image, adb_tap, tap_tower_until_attack_menu, get_template, save_failure_screenshot
-from navigation import navigate
+from vision import (load_screenshot, tap_image, adb_tap, tap_tower_until_attack_menu, get_template,
+                    save_failure_screenshot, timed_wait, on_frame, on_settled)
+from navigation import navigate, check_screen
 from troops import troops_avail, all_troops_home, heal_all
 from actions import teleport
+from actions._helpers import _shows
 from botlog import get_logger, timed_action
 
 _log = get_logger("territory")
@@ -156,6 +160,432 @@ def _is_adjacent_to_my_territory(image, row, col, device=None):
     return False
 
 
+# ============================================================
+# VECTORIZED GRID ANALYSIS
+# ============================================================
+#
+# Same decisions as the per-square helpers above, computed for all 576
+# squares at once: one fancy-index gather for border samples, one broadcast
+# distance matrix against BORDER_COLORS, array shifts for adjacency, and one
+# inRange + integral-image block sum for flags.
+
+GRID_TEAMS = tuple(BORDER_COLORS)  # team order used by team_idx / distances
+TEAM_UNKNOWN = -1
+TEAM_THRONE = -2
+
+_THRONE_MASK = np.zeros((GRID_HEIGHT, GRID_WIDTH), dtype=bool)
+for _r, _c in THRONE_SQUARES:
+    _THRONE_MASK[_r, _c] = True
+
+_sample_index_cache = {}  # (img_h, img_w) -> (ys, xs, weights, counts)
+
+
+def _border_sample_offsets(row):
+    """(dy, dx) sample offsets used by _get_border_color for a given row."""
+    if row == 0:
+        return [(dy, dx) for dy in range(2, int(SQUARE_SIZE / 4), 3)
+                for dx in (5, 10, 15, 20, 25, 30, 35)]
+    if row == 1:
+        bottom = int(SQUARE_SIZE - 1)
+        return ([(o, 0) for o in (5, 10, 15, 20, 25, 30, 35)] +
+                [(bottom, o) for o in (5, 10, 15, 20, 25, 30)])
+    return [(0, o) for o in (8, 15, 22, 30)] + [(o, 0) for o in (8, 15, 22, 30)]
+
+
+def _border_sample_index(img_h, img_w):
+    """Gather indices for every square's border samples, cached per image size.
+
+    Returns (ys, xs, weights, counts): ys/xs/weights are (H, W, K) arrays padded
+    to the longest sample list; padded and out-of-image samples get weight 0.
+    """
+    key = (img_h, img_w)
+    cached = _sample_index_cache.get(key)
+    if cached is not None:
+        return cached
+    k = max(len(_border_sample_offsets(r)) for r in range(min(GRID_HEIGHT, 3)))
+    ys = np.zeros((GRID_HEIGHT, GRID_WIDTH, k), dtype=np.intp)
+    xs = np.zeros((GRID_HEIGHT, GRID_WIDTH, k), dtype=np.intp)
+    valid = np.zeros((GRID_HEIGHT, GRID_WIDTH, k), dtype=bool)
+    for row in range(GRID_HEIGHT):
+        offsets = _border_sample_offsets(row)
+        y0 = int(GRID_OFFSET_Y + row * SQUARE_SIZE)
+        for col in range(GRID_WIDTH):
+            x0 = int(GRID_OFFSET_X + col * SQUARE_SIZE)
+            for i, (dy, dx) in enumerate(offsets):
+                y, x = y0 + dy, x0 + dx
+                if y < img_h and x < img_w:
+                    ys[row, col, i], xs[row, col, i] = y, x
+                    valid[row, col, i] = True
+    counts = valid.sum(axis=2)
+    weights = valid / np.maximum(counts, 1)[..., None]
+    _sample_index_cache[key] = (ys, xs, weights, counts)
+    return ys, xs, weights, counts
+
+
+def _gather_border_samples(image):
+    """Raw border samples of every square — (H, W, K, 3) int16, plus weights."""
+    ys, xs, weights, _ = _border_sample_index(image.shape[0], image.shape[1])
+    return image[ys, xs].astype(np.int16), weights
+
+
+def grid_border_colors(image):
+    """Average border BGR of every square — (GRID_HEIGHT, GRID_WIDTH, 3) float64.
+
+    Vectorized equivalent of calling _get_border_color for each square.
+    """
+    samples, weights = _gather_border_samples(image)
+    return _average_samples(samples, weights)
+
+
+def _average_samples(samples, weights):
+    """Weighted mean of (..., K, 3) samples -> (..., 3) float64."""
+    return np.einsum("...k,...kc->...c", weights, samples.astype(np.float64))
+
+
+def _square_bounds():
+    """Pixel rectangles (y1, y2, x1, x2) of every square as (H, W) int arrays."""
+    rows = np.arange(GRID_HEIGHT)[:, None]
+    cols = np.arange(GRID_WIDTH)[None, :]
+    y1 = (GRID_OFFSET_Y + rows * SQUARE_SIZE).astype(int) + 0 * cols
+    x1 = (GRID_OFFSET_X + cols * SQUARE_SIZE).astype(int) + 0 * rows
+    return y1, y1 + int(SQUARE_SIZE), x1, x1 + int(SQUARE_SIZE)
+
+
+def grid_flags(image):
+    """Flag presence for every square — (GRID_HEIGHT, GRID_WIDTH) bool.
+
+    Vectorized equivalent of _has_flag: one inRange over the grid area and an
+    integral-image sum per square.
+    """
+    img_h, img_w = image.shape[:2]
+    y1, y2, x1, x2 = _square_bounds()
+    y1, y2 = np.clip(y1, 0, img_h), np.clip(y2, 0, img_h)
+    x1, x2 = np.clip(x1, 0, img_w), np.clip(x2, 0, img_w)
+    # Only the grid's bounding box needs masking
+    oy, ox = int(y1.min()), int(x1.min())
+    grid = image[oy:int(y2.max()), ox:int(x2.max())]
+    mask = cv2.inRange(grid, (75, 80, 240), (105, 110, 255))
+    integral = cv2.integral(mask // 255)                 # (h+1, w+1)
+    y1, y2, x1, x2 = y1 - oy, y2 - oy, x1 - ox, x2 - ox
+    counts = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    return counts > 15
+
+
+def classify_grid_colors(colors, device=None):
+    """Classify an (H, W, 3) array of border colors into team indices.
+
+    Applies the _classify_square_team thresholds to every square at once.
+    Returns (team_idx, distances) where team_idx indexes GRID_TEAMS (or is
+    TEAM_UNKNOWN) and distances is (H, W, len(GRID_TEAMS)).
+    """
+    my_team = config.get_device_config(device, "my_team") if device else config.MY_TEAM_COLOR
+    enemy_teams = config.get_device_enemy_teams(device) if device else config.ENEMY_TEAMS
+
+    palette = np.array([BORDER_COLORS[t] for t in GRID_TEAMS], dtype=np.float64)
+    diff = colors[..., None, :] - palette                 # (..., T, 3)
+    distances = np.sqrt((diff * diff).sum(axis=-1))
+    best = distances.argmin(axis=-1)
+    min_dist = np.take_along_axis(distances, best[..., None], axis=-1)[..., 0]
+
+    # Most lenient threshold that applies to each team as nearest match
+    limit = np.full(len(GRID_TEAMS), 55.0)
+    for i, team in enumerate(GRID_TEAMS):
+        if team == "green" or team in enemy_teams:
+            limit[i] = max(limit[i], 70.0)
+        if team == my_team:
+            limit[i] = max(limit[i], 90.0)
+    team_idx = np.where(min_dist <= limit[best], best, TEAM_UNKNOWN).astype(np.int8)
+    return team_idx, distances
+
+
+class TerritoryGrid:
+    """Team / flag / adjacency matrices for one territory screenshot.
+
+    Built by analyze_grid().  All matrices are (GRID_HEIGHT, GRID_WIDTH):
+      colors    — float64 (.., 3) average border BGR
+      team_idx  — int8 index into GRID_TEAMS, TEAM_UNKNOWN or TEAM_THRONE
+      distances — float64 (.., len(GRID_TEAMS)) distance to each team color
+      flags     — bool, flag planted
+      mine      — bool, own team
+      enemy     — bool, an enemy team
+      adjacent  — bool, 4-neighbour of a square in `mine`
+    """
+
+    def __init__(self, colors, team_idx, distances, flags, my_team, enemy_teams):
+        self.colors = colors
+        self.team_idx = team_idx
+        self.distances = distances
+        self.flags = flags
+        self.my_team = my_team
+        self.enemy_teams = list(enemy_teams)
+
+        self.mine = team_idx == GRID_TEAMS.index(my_team) if my_team in GRID_TEAMS \
+            else np.zeros_like(flags)
+        enemy_ids = [GRID_TEAMS.index(t) for t in self.enemy_teams if t in GRID_TEAMS]
+        self.enemy = np.isin(team_idx, enemy_ids)
+
+        adj = np.zeros_like(self.mine)
+        adj[1:, :] |= self.mine[:-1, :]
+        adj[:-1, :] |= self.mine[1:, :]
+        adj[:, 1:] |= self.mine[:, :-1]
+        adj[:, :-1] |= self.mine[:, 1:]
+        self.adjacent = adj
+
+    def team(self, row, col):
+        """Team name at (row, col): a BORDER_COLORS key, "unknown" or "throne"."""
+        idx = int(self.team_idx[row, col])
+        if idx == TEAM_THRONE:
+            return "throne"
+        if idx == TEAM_UNKNOWN:
+            return "unknown"
+        return GRID_TEAMS[idx]
+
+    @staticmethod
+    def squares(mask):
+        """List of (row, col) where mask is True, in row-major order."""
+        return [(int(r), int(c)) for r, c in zip(*np.nonzero(mask))]
+
+    def enemy_adjacent(self):
+        return self.enemy & self.adjacent
+
+    def targets(self):
+        """Auto-detected attack targets: adjacent enemy squares without a flag."""
+        return self.squares(self.enemy & self.adjacent & ~self.flags)
+
+
+def analyze_grid(image, device=None):
+    """Analyze every square of a territory screenshot at once -> TerritoryGrid."""
+    my_team = config.get_device_config(device, "my_team") if device else config.MY_TEAM_COLOR
+    enemy_teams = config.get_device_enemy_teams(device) if device else config.ENEMY_TEAMS
+    colors = grid_border_colors(image)
+    team_idx, distances = classify_grid_colors(colors, device=device)
+    team_idx[_THRONE_MASK] = TEAM_THRONE
+    flags = grid_flags(image) & ~_THRONE_MASK
+    return TerritoryGrid(colors, team_idx, distances, flags, my_team, enemy_teams)
+
+
+# ============================================================
+# INCREMENTAL TERRITORY STATE
+# ============================================================
+#
+# Per-device territory map kept across scans.  Each new frame's border
+# samples are diffed against the samples the square was last classified
+# from, and a strided subsample of the grid (which catches flags planted
+# mid-square) against the previous frame; only squares that moved by more
+# than SAMPLE_TOLERANCE are reclassified and flag-checked.  Team and flag transitions are appended to
+# a change log that the dashboard polls via get_territory_changes().
+
+SAMPLE_TOLERANCE = 12      # max per-channel delta before a square is re-read
+SIGNATURE_STRIDE = 3       # px between signature samples (smaller than a flag)
+FULL_RESCAN_SQUARES = 96   # above this many moved squares, re-run analyze_grid
+CHANGE_LOG_SIZE = 500      # change events kept in memory (all devices)
+
+_territory_states = {}     # device -> TerritoryState
+_territory_changes = deque(maxlen=CHANGE_LOG_SIZE)
+_territory_seq = 0
+_territory_lock = threading.Lock()
+
+
+def _grid_signature(image):
+    """Every SIGNATURE_STRIDE-th pixel of the grid area (uint8).
+
+    A cheap whole-square change signature — border samples alone miss flags
+    planted mid-square.  Returns (signature, (origin_y, origin_x)).
+    """
+    img_h, img_w = image.shape[:2]
+    y1, y2, x1, x2 = _square_bounds()
+    oy, ox = int(y1.min()), int(x1.min())
+    n = SIGNATURE_STRIDE
+    h = (min(img_h, int(y2.max())) - oy) // n
+    w = (min(img_w, int(x2.max())) - ox) // n
+    grid = image[oy:oy + h * n, ox:ox + w * n]
+    # Nearest-neighbour resize by an integer factor == strided subsample, but
+    # several times faster than copying a strided numpy view.
+    return cv2.resize(grid, (w, h), interpolation=cv2.INTER_NEAREST), (oy, ox)
+
+
+def _signature_moved(sig, prev, origin):
+    """(H, W) bool of squares containing a signature pixel that changed."""
+    moved = np.zeros((GRID_HEIGHT, GRID_WIDTH), dtype=bool)
+    diff = cv2.absdiff(sig, prev).reshape(sig.shape[0], -1)   # channels interleaved
+    _, mask = cv2.threshold(diff, SAMPLE_TOLERANCE, 255, cv2.THRESH_BINARY)
+    if not cv2.countNonZero(mask):
+        return moved
+    points = cv2.findNonZero(mask).reshape(-1, 2)              # (x * 3 + ch, y)
+    ys = origin[0] + points[:, 1] * SIGNATURE_STRIDE
+    xs = origin[1] + (points[:, 0] // sig.shape[2]) * SIGNATURE_STRIDE
+    rows = ((ys - GRID_OFFSET_Y) / SQUARE_SIZE).astype(int)
+    cols = ((xs - GRID_OFFSET_X) / SQUARE_SIZE).astype(int)
+    moved[np.clip(rows, 0, GRID_HEIGHT - 1), np.clip(cols, 0, GRID_WIDTH - 1)] = True
+    return moved
+
+
+class TerritoryState:
+    """Territory map for one device, updated incrementally by update().
+
+    grid        — current TerritoryGrid
+    changed_at  — (H, W) float, time.time() of each square's last team/flag change
+    known_team  — (H, W) int8, last non-unknown team index (for change events)
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.grid = None
+        self.samples = None
+        self.signature = None
+        self.known_team = None
+        self.changed_at = np.zeros((GRID_HEIGHT, GRID_WIDTH))
+        self.updated_at = 0.0
+        self.last_reclassified = 0
+        self._team_config = None
+
+    def _team_config_now(self):
+        device = self.device
+        my_team = config.get_device_config(device, "my_team") if device else config.MY_TEAM_COLOR
+        enemy_teams = config.get_device_enemy_teams(device) if device else config.ENEMY_TEAMS
+        return my_team, tuple(enemy_teams)
+
+    def update(self, image):
+        """Fold a new territory screenshot into the map.
+
+        Returns the list of change events produced (empty on the first scan,
+        which only establishes the baseline).
+        """
+        now = time.time()
+        samples, weights = _gather_border_samples(image)
+        signature, origin = _grid_signature(image)
+        team_config = self._team_config_now()
+
+        if (self.grid is None or team_config != self._team_config
+                or signature.shape != self.signature.shape):
+            self.grid = analyze_grid(image, device=self.device)
+            self.samples, self.signature = samples, signature
+            self.known_team = self.grid.team_idx.copy()
+            self._team_config = team_config
+            self.updated_at = now
+            self.last_reclassified = GRID_HEIGHT * GRID_WIDTH - len(THRONE_SQUARES)
+            return []
+
+        valid = (weights > 0)[..., None]
+        moved = ((np.abs(samples - self.samples) * valid).max(axis=(2, 3)) > SAMPLE_TOLERANCE)
+        moved |= _signature_moved(signature, self.signature, origin)
+        moved &= ~_THRONE_MASK
+        self.signature = signature
+        self.updated_at = now
+        self.last_reclassified = int(moved.sum())
+        if not self.last_reclassified:
+            return []
+
+        old = self.grid
+        if self.last_reclassified > FULL_RESCAN_SQUARES:
+            # Whole screen changed (e.g. scrolled or popup) — one vectorized
+            # pass beats per-square flag checks.
+            self.grid = analyze_grid(image, device=self.device)
+        else:
+            colors = old.colors.copy()
+            team_idx = old.team_idx.copy()
+            distances = old.distances.copy()
+            flags = old.flags.copy()
+            colors[moved] = _average_samples(samples[moved], weights[moved])
+            team_idx[moved], distances[moved] = classify_grid_colors(
+                colors[moved], device=self.device)
+            flags[moved] = [_has_flag(image, r, c) for r, c in zip(*np.nonzero(moved))]
+            self.grid = TerritoryGrid(colors, team_idx, distances, flags,
+                                      old.my_team, old.enemy_teams)
+        self.samples[moved] = samples[moved]
+        rows, cols = np.nonzero(moved)
+
+        events = []
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            events.extend(self._square_events(r, c, old.flags[r, c], now))
+        return events
+
+    def _square_events(self, row, col, had_flag, now):
+        """Change events for one reclassified square."""
+        events = []
+        grid = self.grid
+        new_idx = int(grid.team_idx[row, col])
+        prev_idx = int(self.known_team[row, col])
+        if new_idx != TEAM_UNKNOWN and new_idx != prev_idx:
+            new_team = GRID_TEAMS[new_idx]
+            prev_team = GRID_TEAMS[prev_idx] if prev_idx >= 0 else "unknown"
+            if new_team == grid.my_team:
+                kind = "captured"
+            elif prev_team == grid.my_team:
+                kind = "lost"
+            else:
+                kind = "team_changed"
+            events.append({"event": kind, "row": row, "col": col,
+                           "team": new_team, "prev_team": prev_team})
+            self.known_team[row, col] = new_idx
+        has_flag = bool(grid.flags[row, col])
+        if has_flag != bool(had_flag):
+            events.append({"event": "flag_planted" if has_flag else "flag_removed",
+                           "row": row, "col": col, "team": grid.team(row, col)})
+        if events:
+            self.changed_at[row, col] = now
+        for e in events:
+            e["ts"] = now
+            e["device"] = self.device
+        return events
+
+
+def update_territory_state(device, image):
+    """Update ``device``'s territory map from a territory screenshot.
+
+    Returns (TerritoryGrid, change events).  Events are also appended to the
+    shared change log read by get_territory_changes().
+    """
+    global _territory_seq
+    log = get_logger("territory", device)
+    with _territory_lock:
+        state = _territory_states.get(device)
+        if state is None:
+            state = _territory_states[device] = TerritoryState(device)
+    events = state.update(image)
+    with _territory_lock:
+        for e in events:
+            _territory_seq += 1
+            e["seq"] = _territory_seq
+            _territory_changes.append(e)
+    log.debug("Territory map: %d squares reclassified, %d changes",
+              state.last_reclassified, len(events))
+    for e in events:
+        if e["event"] in ("captured", "lost"):
+            log.info("Square (%d, %d) %s (%s -> %s)", e["row"], e["col"],
+                     e["event"], e["prev_team"], e["team"])
+    return state.grid, events
+
+
+def get_territory_state(device):
+    """Current TerritoryState for ``device``, or None before the first scan."""
+    with _territory_lock:
+        return _territory_states.get(device)
+
+
+def get_territory_changes(since=0, device=None):
+    """Change events with seq > ``since`` (optionally for one device), oldest first.
+
+    Returns (events, latest_seq) — pass latest_seq back as ``since`` to poll.
+    """
+    with _territory_lock:
+        events = [dict(e) for e in _territory_changes
+                  if e["seq"] > since and (device is None or e["device"] == device)]
+        return events, _territory_seq
+
+
+def clear_territory_state(device=None):
+    """Forget the territory map (one device, or all) and the change log."""
+    global _territory_seq
+    with _territory_lock:
+        if device is None:
+            _territory_states.clear()
+            _territory_changes.clear()
+            _territory_seq = 0
+        else:
+            _territory_states.pop(device, None)
+
+
 # ============================================================
 # TERRITORY SQUARE MANAGER GUI
 # ============================================================
@@ -173,13 +603,16 @@ def open_territory_manager(device):
         log.warning("Failed to navigate to territory screen")
         return
 
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "territory_screen_settle")
     full_image = load_screenshot(device)
 
     if full_image is None:
         log.error("Failed to load screenshot")
         return
 
+    # Squares attack_territory would pick on its own (outlined in the overlay)
+    auto_targets = set(analyze_grid(full_image, device=device).targets())
+
     # Crop to just the grid area with small padding
     grid_pixel_width = int(GRID_WIDTH * SQUARE_SIZE)
     grid_pixel_height = int(GRID_HEIGHT * SQUARE_SIZE)
@@ -204,7 +637,7 @@ def open_territory_manager(device):
     # Instructions
     ctk.CTkLabel(
         manager,
-        text="Click squares: GREEN = Force Attack | RED = Ignore | None = Auto",
+        text="Click squares: GREEN = Force Attack | RED = Ignore | None = Auto (yellow outline = auto target)",
         font=ctk.CTkFont(family="Segoe UI", size=11),
         text_color="#e0e0f0", fg_color="#14142a",
         corner_radius=6, height=30
@@ -284,6 +717,10 @@ def open_territory_manager(device):
                         stipple="gray50"
                     )
                     overlay_items.append(rect_id)
+                elif (row, col) in auto_targets:
+                    rect_id = canvas.create_rectangle(
+                        x, y, x + w, y + h, outline="yellow", width=2)
+                    overlay_items.append(rect_id)
 
     def on_canvas_click(event):
         """Handle clicks on the canvas"""
@@ -378,7 +815,7 @@ def attack_territory(device, debug=False):
     # Step 2: Heal all troops
     log.info("Healing troops...")
     heal_all(device)
-    time.sleep(2)
+    timed_wait(device, on_settled(), 2, "territory_heal_settle")
 
     # Step 3: Verify all troops are home
     log.info("Checking if all troops are home...")
@@ -393,7 +830,7 @@ def attack_territory(device, debug=False):
         log.warning("Failed to navigate to territory screen")
         return False
 
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "territory_screen_settle")
 
     # Step 5: Take screenshot and analyze grid
     image = load_screenshot(device)
@@ -411,29 +848,11 @@ def attack_territory(device, debug=False):
     enemy_teams = config.get_device_enemy_teams(device)
     log.debug("My team: %s, Attacking: %s", my_team, enemy_teams)
 
-    targets = []
-    enemy_squares = []
-    adjacent_enemies = []
-    flagged_squares = []
-
-    for row in range(GRID_HEIGHT):
-        for col in range(GRID_WIDTH):
-            if (row, col) in THRONE_SQUARES:
-                continue
-
-            border_color = _get_border_color(image, row, col)
-            team = _classify_square_team(border_color, device=device)
-
-            if team in enemy_teams:
-                enemy_squares.append((row, col))
-
-                if _is_adjacent_to_my_territory(image, row, col, device=device):
-                    adjacent_enemies.append((row, col))
-
-                    if not _has_flag(image, row, col):
-                        targets.append((row, col))
-                    else:
-                        flagged_squares.append((row, col))
+    grid, _ = update_territory_state(device, image)
+    enemy_squares = grid.squares(grid.enemy)
+    adjacent_enemies = grid.squares(grid.enemy_adjacent())
+    flagged_squares = grid.squares(grid.enemy_adjacent() & grid.flags)
+    targets = grid.targets()
 
     log.debug("Enemy squares detected: %d", len(enemy_squares))
     log.debug("Enemy squares adjacent to my territory: %d", len(adjacent_enemies))
@@ -521,7 +940,7 @@ def auto_occupy_loop(device):
             log.debug("Checking for dead.png...")
             if tap_image("dead.png", device):
                 log.info("Found and clicked dead.png")
-                time.sleep(2)
+                timed_wait(device, on_settled(device), 2, "occupy_dead_dismiss")
 
             if _occupy_stopped(device):
                 break
@@ -545,7 +964,8 @@ def auto_occupy_loop(device):
 
             if _occupy_stopped(device):
                 break
-            time.sleep(2)
+            timed_wait(device, on_settled(), 2, "occupy_attack_settle",
+                       stop_check=lambda: not config.auto_occupy_running)
 
             # Double-check troops are home before teleporting
             log.info("Double-checking troops are home before teleport...")
@@ -568,7 +988,8 @@ def auto_occupy_loop(device):
 
             if _occupy_stopped(device):
                 break
-            time.sleep(2)
+            timed_wait(device, on_settled(), 2, "occupy_teleport_settle",
+                       stop_check=lambda: not config.auto_occupy_running)
 
             # Step 3: Navigate back to territory screen and click the square we attacked
             if device in config.LAST_ATTACKED_SQUARE:
@@ -583,7 +1004,7 @@ def auto_occupy_loop(device):
 
                 if _occupy_stopped(device):
                     break
-                time.sleep(1)
+                timed_wait(device, on_settled(), 1, "territory_screen_settle")
 
                 # Calculate click position for the last attacked square
                 click_x = int(GRID_OFFSET_X + target_col * SQUARE_SIZE + SQUARE_SIZE / 2)
@@ -600,7 +1021,8 @@ def auto_occupy_loop(device):
                 break
 
             # Step 4: Attack
-            time.sleep(1)
+            timed_wait(device, _shows("depart.png", threshold=0.8), 1,
+                       "occupy_attack_dialog")
             log.info("Step 4: Attacking...")
 
             if config.get_device_config(device, "auto_heal"):
@@ -611,12 +1033,12 @@ def auto_occupy_loop(device):
 
             if troops > min_troops:
                 tap_image("depart.png", device)
-                time.sleep(1)
+                timed_wait(device, on_settled(device), 1, "occupy_depart_tap")
                 tap_image("depart.png", device)
             else:
                 log.warning("Not enough troops available (have %d, need more than %d)", troops, min_troops)
 
-            time.sleep(2)
+            timed_wait(device, on_settled(device), 2, "occupy_depart_anim")
 
             log.info("Cycle complete, waiting 10 seconds...")
 
@@ -652,7 +1074,7 @@ def diagnose_grid(device):
         log.warning("diagnose_grid: failed to navigate to territory screen")
         return
 
-    time.sleep(1)
+    timed_wait(device, on_settled(), 1, "territory_screen_settle")
     image = load_screenshot(device)
     if image is None:
         log.error("diagnose_grid: failed to load screenshot")
@@ -675,6 +1097,8 @@ def diagnose_grid(device):
     }
     TEAM_CHAR = {"yellow": "Y", "green": "G", "red": "R", "blue": "B", "unknown": "?"}
 
+    grid = analyze_grid(image, device=device)
+
     for row in range(GRID_HEIGHT):
         row_chars = []
         for col in range(GRID_WIDTH):
@@ -682,23 +1106,17 @@ def diagnose_grid(device):
                 row_chars.append("T")
                 continue
 
-            bgr = _get_border_color(image, row, col)
-            team = _classify_square_team(bgr, device=device)
+            team = grid.team(row, col)
             team_counts[team] = team_counts.get(team, 0) + 1
             row_chars.append(TEAM_CHAR.get(team, "?"))
 
             # Collect unknown details for threshold tuning
             if team == "unknown":
-                # Compute closest known color distance
-                best_team = "unknown"
-                best_dist = float("inf")
-                for t, (tb, tg, tr) in BORDER_COLORS.items():
-                    d = ((bgr[0]-tb)**2 + (bgr[1]-tg)**2 + (bgr[2]-tr)**2)**0.5
-                    if d < best_dist:
-                        best_dist = d
-                        best_team = t
-                unknown_details.append((row, col, tuple(int(v) for v in bgr),
-                                        best_team, round(best_dist, 1)))
+                nearest = int(grid.distances[row, col].argmin())
+                unknown_details.append((row, col,
+                                        tuple(int(v) for v in grid.colors[row, col]),
+                                        GRID_TEAMS[nearest],
+                                        round(float(grid.distances[row, col, nearest]), 1)))
 
             # Draw colored dot on debug image
             cx, cy = _get_square_center(row, col)
@@ -709,33 +1127,20 @@ def diagnose_grid(device):
         grid_map.append("".join(row_chars))
 
     # --- Flag & adjacency stats (enemy squares only) -----------------------------
-    enemy_teams = set(config.get_device_enemy_teams(device))
-    enemy_count = sum(v for k, v in team_counts.items() if k in enemy_teams)
-    flagged = 0
-    adjacent = 0
-    valid_targets = 0
-    for row in range(GRID_HEIGHT):
-        for col in range(GRID_WIDTH):
-            if (row, col) in THRONE_SQUARES:
-                continue
-            bgr = _get_border_color(image, row, col)
-            team = _classify_square_team(bgr, device=device)
-            if team in enemy_teams:
-                is_adj = _is_adjacent_to_my_territory(image, row, col, device=device)
-                has_flg = _has_flag(image, row, col)
-                if is_adj:
-                    adjacent += 1
-                    if has_flg:
-                        flagged += 1
-                        # Mark flagged on debug image
-                        cx, cy = _get_square_center(row, col)
-                        cv2.line(debug_img, (cx-7, cy-7), (cx+7, cy+7), (0, 0, 200), 2)
-                        cv2.line(debug_img, (cx-7, cy+7), (cx+7, cy-7), (0, 0, 200), 2)
-                    else:
-                        valid_targets += 1
-                        # Mark valid targets on debug image
-                        cx, cy = _get_square_center(row, col)
-                        cv2.circle(debug_img, (cx, cy), 9, (0, 255, 0), 2)
+    enemy_count = int(grid.enemy.sum())
+    adjacent_mask = grid.enemy_adjacent()
+    adjacent = int(adjacent_mask.sum())
+    flagged = int((adjacent_mask & grid.flags).sum())
+    valid_targets = adjacent - flagged
+    for row, col in grid.squares(adjacent_mask & grid.flags):
+        # Mark flagged on debug image
+        cx, cy = _get_square_center(row, col)
+        cv2.line(debug_img, (cx-7, cy-7), (cx+7, cy+7), (0, 0, 200), 2)
+        cv2.line(debug_img, (cx-7, cy+7), (cx+7, cy-7), (0, 0, 200), 2)
+    for row, col in grid.targets():
+        # Mark valid targets on debug image
+        cx, cy = _get_square_center(row, col)
+        cv2.circle(debug_img, (cx, cy), 9, (0, 255, 0), 2)
 
     # --- Save debug image --------------------------------------------------------
     safe_device = device.replace(":", "_").replace(".", "_")
@@ -840,7 +1245,7 @@ def scan_territory_coordinates(device, squares=None, save_screenshots=True):
             log.warning("Failed to navigate to territory, aborting scan")
             break
 
-        time.sleep(0.5)
+        timed_wait(device, on_settled(), 0.5, "territory_scan_screen_settle")
 
         # Click the square
         cx, cy = _get_square_center(row, col)
@@ -848,7 +1253,8 @@ def scan_territory_coordinates(device, squares=None, save_screenshots=True):
         adb_tap(device, cx, cy)
 
         # Wait for MAP transition
-        time.sleep(2)
+        timed_wait(device, on_frame(lambda: check_screen(device) == Screen.MAP), 2,
+                   "territory_scan_to_map")
 
         # Take screenshot
         screen = load_screenshot(device)
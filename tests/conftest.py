@@ -6,6 +6,22 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", default=False,
+                     help="also run the wall-clock benchmark tests")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip @pytest.mark.benchmark tests unless --benchmark is given —
+    their timings depend on the machine and what else it is running."""
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark: run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture
 def mock_device():
     """A fake ADB device ID for tests."""
@@ -28,3 +44,79 @@ def reset_quest_state():
     yield
     reset_quest_tracking()
     reset_rally_blacklist()
+
+
+@pytest.fixture(autouse=True)
+def reset_frame_cache():
+    """Clear the per-device screenshot cache (and benchmarked raw/PNG
+    capture modes) so tests never share frames."""
+    from vision import clear_frame_cache, clear_capture_modes
+    clear_frame_cache()
+    clear_capture_modes()
+    yield
+    clear_frame_cache()
+    clear_capture_modes()
+
+
+@pytest.fixture(autouse=True)
+def reset_ocr_cache():
+    """Clear cached OCR results so tests never see another test's reads."""
+    from vision import clear_ocr_cache
+    clear_ocr_cache()
+    yield
+    clear_ocr_cache()
+
+
+@pytest.fixture(autouse=True)
+def reset_digit_readers(tmp_path, monkeypatch):
+    """Keep learned digit glyphs out of data/digits and away from other tests."""
+    import digits
+    monkeypatch.setattr(digits, "DIGITS_DIR", str(tmp_path / "digits"))
+    digits.clear_readers()
+    yield
+    digits.clear_readers()
+
+
+@pytest.fixture(autouse=True)
+def reset_adb_shells():
+    """Close persistent ADB shells so no test inherits another's session."""
+    from adb_shell import close_all_shells
+    close_all_shells()
+    yield
+    close_all_shells()
+
+
+@pytest.fixture(autouse=True)
+def reset_state_store():
+    """Start each test with an empty dashboard state store."""
+    import state_store
+    state_store.store.clear()
+    yield
+    state_store.store.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_device_cache():
+    """Drop the cached device list so every test scans its own mocks."""
+    from devices import device_cache
+    device_cache.clear()
+    yield
+    device_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_budget_usage():
+    """Forget per-label wait tallies so budget reports start empty."""
+    import budgets
+    budgets.reset()
+    yield
+    budgets.reset()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolate_stats_history(tmp_path_factory):
+    """Point the global stats history at a scratch database, never stats/."""
+    from botlog import history
+    history.open(str(tmp_path_factory.mktemp("stats") / "history.db"))
+    yield
+    history.close()
@@ -0,0 +1,166 @@
+"""Tests for the ADB socket client (adb_client.py) against FakeAdbServer.
+
+The fake server speaks the real adb server protocol on a local port, so
+the vision / devices / adb_shell / capture paths run exactly as they would
+with ``adb_backend = "socket"`` — no emulator or adb binary involved.
+"""
+
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import adb_client
+import adb_shell
+import config
+from adb_client import AdbError, FakeAdbServer
+
+DEV = "127.0.0.1:5555"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeAdbServer()
+    fake.devices[DEV] = "device"
+    host, port = fake.start()
+    adb_client.set_server(host, port)
+    monkeypatch.setattr(config, "ADB_BACKEND", "socket")
+    yield fake
+    adb_shell.close_all_shells()
+    adb_client.set_server()
+    fake.stop()
+
+
+def _png(value=90):
+    ok, buf = cv2.imencode(".png", np.full((40, 30, 3), value, np.uint8))
+    return buf.tobytes()
+
+
+def _wait_for(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestProtocol:
+    def test_version_and_devices(self, server):
+        server.devices["emulator-5554"] = "offline"
+        assert adb_client._client.version() == 0x29
+        assert adb_client.devices() == [(DEV, "device"), ("emulator-5554", "offline")]
+
+    def test_exec_out_is_binary_safe(self, server):
+        payload = bytes(range(256)) * 100
+        server.responses["cat blob"] = payload
+        assert adb_client.exec_out(DEV, "cat blob") == payload
+        assert server.commands[-1] == (DEV, "exec", "cat blob")
+
+    def test_streamed_response_chunks(self, server):
+        server.responses["stream"] = lambda serial, cmd: (b"%d," % i for i in range(5))
+        assert adb_client.exec_out(DEV, "stream") == b"0,1,2,3,4,"
+
+    def test_unknown_device_fails(self, server):
+        with pytest.raises(AdbError, match="not found"):
+            adb_client.exec_out("nope:1", "true")
+
+    def test_pull_push_roundtrip(self, server):
+        adb_client.push(DEV, b"x" * 200_000, "/sdcard/a.bin")
+        assert server.files[(DEV, "/sdcard/a.bin")] == b"x" * 200_000
+        assert adb_client.pull(DEV, "/sdcard/a.bin") == b"x" * 200_000
+        with pytest.raises(AdbError, match="No such file"):
+            adb_client.pull(DEV, "/sdcard/missing")
+
+    def test_no_server(self, monkeypatch):
+        import socket
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+        client = adb_client.AdbClient("127.0.0.1", port)
+        monkeypatch.setattr(client, "_start_server", lambda: False)
+        with pytest.raises(AdbError, match="no adb server"):
+            client.devices()
+
+
+class TestBackendIntegration:
+    def test_get_devices(self, server):
+        from devices import get_devices
+        server.devices["emulator-5554"] = "device"
+        server.devices["127.0.0.1:5556"] = "offline"
+        # 127.0.0.1:5555 is the same emulator as emulator-5554
+        assert get_devices() == ["emulator-5554"]
+
+    def test_connect(self, server):
+        from devices import _adb_connect
+        server.connectable.add("127.0.0.1:7555")
+        assert _adb_connect(7555) == "127.0.0.1:7555"
+        assert server.devices["127.0.0.1:7555"] == "device"
+        assert _adb_connect(7556) is None
+
+    def test_screenshot(self, server):
+        from vision import _capture_screenshot
+        server.responses["screencap -p"] = _png()
+        image = _capture_screenshot(DEV)
+        assert image.shape == (40, 30, 3)
+        assert server.commands == [(DEV, "exec", "screencap -p")]
+
+    def test_screenshot_failure_returns_none(self, server):
+        from vision import _capture_screenshot
+        assert _capture_screenshot("gone:1") is None
+
+    def test_tap_through_persistent_socket_shell(self, server, monkeypatch):
+        from vision import adb_tap, adb_swipe
+        monkeypatch.setattr(config, "ADB_PERSISTENT_SHELL", True)
+        adb_tap(DEV, 10, 20)
+        adb_swipe(DEV, 1, 2, 3, 4, 100)
+        sh = [cmd for serial, kind, cmd in server.commands if kind == "sh"]
+        assert sh[0].startswith("input tap 10 20 ; echo ")
+        assert sh[1].startswith("input swipe 1 2 3 4 100 ; echo ")
+        # One socket for the shell, however many taps
+        assert [c for c in server.commands if c[1] == "exec"] == [(DEV, "exec", "sh")]
+
+    def test_tap_one_shot(self, server, monkeypatch):
+        from vision import adb_tap
+        monkeypatch.setattr(config, "ADB_PERSISTENT_SHELL", False)
+        adb_tap(DEV, 5, 6)
+        assert server.commands == [(DEV, "shell", "input tap 5 6")]
+
+    def test_capture_stream(self, server):
+        import capture
+        from capture import CaptureSession, FakeDevice
+        frame = np.full((8, 6, 3), 50, np.uint8)
+        fake = FakeDevice([frame])
+        server.responses["screencap"] = fake.screencap()
+        server.responses["while true; do screencap; done"] = \
+            lambda serial, cmd: (fake.encoded(0) for _ in range(50))
+        session = CaptureSession(DEV)
+        try:
+            assert session.start()
+            assert _wait_for(lambda: session.frame_count > 0)
+            assert session.header_size == 16
+        finally:
+            session.stop()
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_socket_beats_process_per_command(self, server):
+        server.responses["true"] = b""
+        n = 30
+        t0 = time.perf_counter()
+        for _ in range(n):
+            subprocess.run([sys.executable, "-c", "pass"])
+        process_ms = (time.perf_counter() - t0) * 1000 / n
+
+        t0 = time.perf_counter()
+        for _ in range(n):
+            adb_client.exec_out(DEV, "true")
+        socket_ms = (time.perf_counter() - t0) * 1000 / n
+
+        print(f"\ncommand dispatch: process {process_ms:.2f} ms, socket {socket_ms:.2f} ms")
+        assert socket_ms < process_ms
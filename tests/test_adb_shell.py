@@ -0,0 +1,174 @@
+"""Tests for the persistent ADB shell (adb_shell.py) and the vision input API.
+
+A local ``sh`` stands in for ``adb shell``; ``input`` is defined as a shell
+function that appends its arguments to a log file, so tests can check what
+reached the "device" and in which order.
+"""
+
+import shutil
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import adb_shell
+from adb_shell import ShellSession, ShellError, get_shell, register_fake_shell, unregister_fake_shell
+from vision import adb_tap, adb_swipe, adb_keyevent, adb_input_batch, adb_input_async
+
+pytestmark = pytest.mark.skipif(shutil.which("sh") is None, reason="needs a POSIX sh")
+
+DEV = "fake:5555"
+
+
+@pytest.fixture
+def device_log(tmp_path):
+    """Register a fake shell for DEV; yields the path its input log goes to."""
+    log = tmp_path / "input.log"
+    register_fake_shell(DEV, ["sh"])
+    get_shell(DEV).run(f'input() {{ echo "$*" >> "{log}"; }}', timeout=5)
+    yield log
+    unregister_fake_shell(DEV)
+
+
+def _lines(log):
+    return log.read_text().splitlines() if log.exists() else []
+
+
+class TestShellSession:
+    def test_run_returns_exit_status(self):
+        session = ShellSession("x", ["sh"])
+        session.start()
+        try:
+            assert session.run("true", timeout=5) == 0
+            assert session.run("false", timeout=5) == 1
+        finally:
+            session.close()
+
+    def test_submitted_scripts_run_in_order(self, tmp_path):
+        out = tmp_path / "order"
+        session = ShellSession("x", ["sh"])
+        session.start()
+        try:
+            futures = [session.submit(f"echo {i} >> {out}") for i in range(20)]
+            assert [f.result(5) for f in futures] == [0] * 20
+            assert out.read_text().split() == [str(i) for i in range(20)]
+        finally:
+            session.close()
+
+    def test_timeout_closes_session(self):
+        session = ShellSession("x", ["sh"])
+        session.start()
+        with pytest.raises(TimeoutError):
+            session.run("sleep 5", timeout=0.2)
+        assert not session.alive
+
+    def test_dead_shell_fails_pending(self):
+        session = ShellSession("x", ["sh"])
+        session.start()
+        future = session.submit("exit 3")
+        with pytest.raises(ShellError):
+            future.result(5)
+        with pytest.raises(ShellError):
+            session.run("true", timeout=1)
+
+    def test_close_races_submit(self):
+        """Closing while other threads submit fails their futures, never raises."""
+        session = ShellSession("x", ["sh"])
+        session.start()
+        errors = []
+
+        def submitter():
+            try:
+                for _ in range(200):
+                    session.submit("true")
+            except Exception as e:   # e.g. AttributeError on a half-closed _proc
+                errors.append(e)
+
+        threads = [threading.Thread(target=submitter) for _ in range(4)]
+        for t in threads:
+            t.start()
+        session.close()
+        for t in threads:
+            t.join(5)
+        assert errors == []
+        assert not session.alive
+
+    def test_get_shell_backs_off_after_failed_start(self):
+        register_fake_shell(DEV, ["/nonexistent/adb"])
+        try:
+            assert get_shell(DEV) is None
+            register_fake_shell(DEV, ["sh"])   # clears the backoff
+            assert get_shell(DEV) is not None
+        finally:
+            unregister_fake_shell(DEV)
+
+
+class TestVisionInput:
+    @patch("vision.subprocess.run")
+    def test_tap_swipe_key_use_persistent_shell(self, mock_run, device_log):
+        adb_tap(DEV, 500, 1000)
+        adb_swipe(DEV, 1, 2, 3, 4, duration_ms=250)
+        adb_keyevent(DEV, 4)
+        assert _lines(device_log) == ["tap 500 1000", "swipe 1 2 3 4 250", "keyevent 4"]
+        mock_run.assert_not_called()
+
+    @patch("vision.stats")
+    def test_timing_recorded(self, mock_stats, device_log):
+        adb_tap(DEV, 1, 2)
+        name, elapsed = mock_stats.record_adb_timing.call_args[0][1:3]
+        assert name == "tap"
+        assert elapsed < 3.0
+
+    def test_batch_runs_in_one_round_trip(self, device_log):
+        session = get_shell(DEV)
+        before = session.commands
+        adb_input_batch(DEV, [("tap", 10, 20), ("keyevent", 4), ("tap", 30, 40)],
+                        interval_s=0.01)
+        assert session.commands == before + 1
+        assert _lines(device_log) == ["tap 10 20", "keyevent 4", "tap 30 40"]
+
+    @patch("vision.stats")
+    def test_async_batch_resolves_later(self, mock_stats, device_log):
+        future = adb_input_async(DEV, [("tap", 1, 1), ("tap", 2, 2)])
+        assert future.result(5) == 0
+        adb_tap(DEV, 3, 3)
+        assert _lines(device_log) == ["tap 1 1", "tap 2 2", "tap 3 3"]
+        names = [c[0][1] for c in mock_stats.record_adb_timing.call_args_list]
+        assert names == ["input_batch", "tap"]
+
+    @patch("vision.subprocess.run")
+    def test_falls_back_to_one_shot_when_shell_dies(self, mock_run, device_log):
+        get_shell(DEV).run("input() { exit 1; }", timeout=5)
+        adb_tap(DEV, 7, 8)
+        args = mock_run.call_args[0][0]
+        assert args[-4:] == ["input", "tap", "7", "8"]
+        # The dead shell is not restarted straight away
+        assert get_shell(DEV) is None
+
+    @patch("vision.subprocess.run")
+    def test_disabled_uses_one_shot(self, mock_run, device_log):
+        with patch("vision.config.ADB_PERSISTENT_SHELL", False):
+            adb_tap(DEV, 5, 6)
+        mock_run.assert_called_once()
+        assert _lines(device_log) == []
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_persistent_shell_beats_process_per_command(self, device_log):
+        n = 30
+        t0 = time.perf_counter()
+        for i in range(n):
+            adb_shell.subprocess.run(["sh", "-c", f'echo "tap {i} {i}" >> "{device_log}"'])
+        oneshot_ms = (time.perf_counter() - t0) * 1000 / n
+
+        t0 = time.perf_counter()
+        for i in range(n):
+            adb_tap(DEV, i, i)
+        shell_ms = (time.perf_counter() - t0) * 1000 / n
+
+        print(f"\ninput dispatch: process per command {oneshot_ms:.2f} ms, "
+              f"persistent shell {shell_ms:.2f} ms")
+        assert len(_lines(device_log)) == 2 * n
+        assert shell_ms < oneshot_ms
@@ -1,10 +1,12 @@
 """Tests for StatsTracker, timed_action, and get_logger (botlog.py)."""
 
 import logging
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 
-from botlog import StatsTracker, timed_action, get_logger, stats
+from botlog import StatsTracker, TimingHistogram, timed_action, get_logger, stats
 
 
 # ============================================================
@@ -75,6 +77,60 @@ class TestStatsTrackerTemplateMiss:
         assert len(entry["best_scores"]) == 10
 
 
+class TestStatsTrackerFrameCache:
+    def setup_method(self):
+        self.tracker = StatsTracker()
+
+    def test_counts_hits_and_misses(self):
+        self.tracker.record_frame_cache("dev1", hit=False)
+        self.tracker.record_frame_cache("dev1", hit=True)
+        self.tracker.record_frame_cache("dev1", hit=True)
+        fc = self.tracker.get_frame_cache_stats("dev1")
+        assert fc["hits"] == 2
+        assert fc["misses"] == 1
+        assert fc["hit_rate"] == pytest.approx(0.667, abs=0.001)
+        assert fc["saved_per_hour"] > 0
+
+    def test_hourly_buckets(self):
+        self.tracker.record_frame_cache("dev1", hit=True)
+        hourly = self.tracker._data["dev1"]["frame_cache"]["hourly"]
+        assert len(hourly) == 1
+        assert list(hourly.values())[0] == {"hits": 1, "misses": 0}
+
+    def test_unknown_device(self):
+        assert self.tracker.get_frame_cache_stats("nope")["hits"] == 0
+
+    def test_in_summary(self):
+        self.tracker.record_frame_cache("dev1", hit=True)
+        assert "Frame cache: 1 hits / 0 misses" in self.tracker.summary()
+
+
+class TestStatsTrackerOcr:
+    def setup_method(self):
+        self.tracker = StatsTracker()
+
+    def test_hit_rate_wait_and_batch(self):
+        self.tracker.record_ocr("dev1", wait_s=0.2, batch_size=1)
+        self.tracker.record_ocr("dev1", wait_s=0.4, batch_size=3)
+        self.tracker.record_ocr("dev1", cache_hit=True)
+        oc = self.tracker.get_ocr_stats("dev1")
+        assert oc["calls"] == 3
+        assert oc["cache_hits"] == 1
+        assert oc["hit_rate"] == pytest.approx(0.333, abs=0.001)
+        assert oc["avg_wait_ms"] == pytest.approx(300.0)
+        assert oc["max_wait_ms"] == pytest.approx(400.0)
+        assert oc["avg_batch"] == 2.0
+        assert oc["max_batch"] == 3
+
+    def test_unknown_device(self):
+        assert self.tracker.get_ocr_stats("nope")["calls"] == 0
+        assert "nope" not in self.tracker._data
+
+    def test_in_summary(self):
+        self.tracker.record_ocr("dev1", cache_hit=True)
+        assert "OCR: 1 reads, 100% cached" in self.tracker.summary()
+
+
 class TestStatsTrackerNavFailure:
     def setup_method(self):
         self.tracker = StatsTracker()
@@ -89,6 +145,47 @@ class TestStatsTrackerNavFailure:
         assert self.tracker._data["dev1"]["nav_failures"]["map_screen->war_screen"] == 2
 
 
+class TestStatsTrackerTransitions:
+    def setup_method(self):
+        self.tracker = StatsTracker()
+        self.tracker._data.clear()
+
+    def _record(self, samples, misses=0, budget=2.0):
+        for actual in samples:
+            self.tracker.record_transition_time("dev1", "open", actual, budget, True)
+        for _ in range(misses):
+            self.tracker.record_transition_time("dev1", "open", budget, budget, False)
+
+    def test_full_budget_until_enough_samples(self):
+        self._record([0.5] * 7)
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == 2.0
+        assert self.tracker.get_adaptive_budget("dev1", "other", 2.0) == 2.0
+
+    def test_budget_from_p95_with_headroom(self):
+        self._record([0.9] * 19 + [1.2])
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == pytest.approx(1.2 * 1.3)
+
+    def test_floor_and_ceiling(self):
+        self._record([0.1] * 10)
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == pytest.approx(0.8)
+        self.tracker._data.clear()
+        self._record([1.9] * 10)
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == pytest.approx(1.9 * 1.3)
+        self._record([2.8] * 10, budget=3.0)
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == pytest.approx(3.0)
+
+    def test_low_met_rate_falls_back(self):
+        self._record([0.5] * 10, misses=3)
+        assert self.tracker.get_adaptive_budget("dev1", "open", 2.0) == 2.0
+
+    def test_saved_time_accumulates(self):
+        self._record([0.5, 1.5])
+        self.tracker.record_transition_time("dev1", "open", 1.2, 2.0, False)
+        entry = self.tracker._data["dev1"]["transition_times"]["open"]
+        assert entry["saved_s"] == pytest.approx(1.5 + 0.5 + 0.8)
+        assert "2.8s saved" in self.tracker.summary()
+
+
 class TestStatsTrackerSummary:
     def test_empty(self):
         tracker = StatsTracker()
@@ -127,6 +224,117 @@ class TestStatsTrackerSave:
         assert rally["avg_time_s"] == 5.0
 
 
+    def test_save_reports_adb_percentiles(self, tmp_path):
+        tracker = StatsTracker()
+        for ms in range(1, 101):
+            tracker.record_adb_timing("dev1", "screenshot", ms / 1000)
+
+        with patch("botlog.STATS_DIR", str(tmp_path)):
+            tracker.save()
+
+        import json
+        data = json.loads(next(tmp_path.glob("session_*.json")).read_text())
+        entry = data["devices"]["dev1"]["adb_timing"]["screenshot"]
+        assert entry["count"] == 100 and entry["max_s"] == 0.1
+        assert entry["p95_s"] == pytest.approx(0.095, rel=0.2)
+        assert "hist" not in entry
+
+
+class TestTimingHistogram:
+    def test_percentiles_within_a_bucket(self):
+        hist = TimingHistogram()
+        values = [i / 1000 for i in range(1, 1001)]  # 1ms .. 1s
+        for v in values:
+            hist.add(v)
+        assert hist.count == 1000
+        for pct in (50, 90, 95, 99):
+            assert hist.percentile(pct) == pytest.approx(values[pct * 10], rel=0.2)
+
+    def test_extremes_clamp(self):
+        hist = TimingHistogram()
+        hist.add(0.0)
+        hist.add(10_000.0)
+        assert hist.percentile(0) == pytest.approx(0.001)
+        assert hist.percentile(100) > 60
+
+    def test_empty(self):
+        assert TimingHistogram().percentile(95) == 0.0
+
+
+class TestShardedRecording:
+    def test_concurrent_devices_count_exactly(self):
+        tracker = StatsTracker()
+        n = 2000
+
+        def worker(device):
+            for i in range(n):
+                tracker.record_adb_timing(device, "tap", 0.01)
+                tracker.record_transition_time(device, "open", 0.5, 1.0, True)
+
+        threads = [threading.Thread(target=worker, args=(f"dev{d}",)) for d in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for d in range(8):
+            data = tracker._data[f"dev{d}"]
+            assert data["adb_timing"]["tap"]["count"] == n
+            assert data["adb_timing"]["tap"]["hist"].count == n
+            assert data["transition_times"]["open"]["met_count"] == n
+            assert len(data["transition_times"]["open"]["samples"]) == 20
+
+    @pytest.mark.benchmark
+    def test_save_never_blocks_recorders(self, tmp_path):
+        tracker = StatsTracker()
+        tracker.record_adb_timing("dev1", "screenshot", 0.2)
+        dumping = threading.Event()
+
+        def slow_dump(obj, f, **kwargs):
+            dumping.set()
+            time.sleep(0.5)
+
+        with patch("botlog.STATS_DIR", str(tmp_path)), patch("botlog.json.dump", slow_dump):
+            saver = threading.Thread(target=tracker.save)
+            saver.start()
+            assert dumping.wait(2)
+            t0 = time.perf_counter()
+            tracker.record_adb_timing("dev1", "screenshot", 0.3)
+            tracker.record_action("dev1", "rally", True, 1.0)
+            elapsed = time.perf_counter() - t0
+            saver.join()
+        assert elapsed < 0.1
+        assert tracker._data["dev1"]["adb_timing"]["screenshot"]["count"] == 2
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_recording_overhead_with_8_device_threads(self):
+        tracker = StatsTracker()
+        devices, n = 8, 3000
+        start = threading.Barrier(devices)
+        per_call = []
+
+        def worker(device):
+            start.wait()
+            t0 = time.perf_counter()
+            for i in range(n):
+                tracker.record_adb_timing(device, "screenshot", 0.05)
+                tracker.record_template_hit(device, "join.png", 100 + i % 7, 200, 0.9)
+                tracker.record_transition_time(device, "open", 0.4, 1.0, True)
+            per_call.append((time.perf_counter() - t0) / (3 * n))
+
+        threads = [threading.Thread(target=worker, args=(f"dev{d}",)) for d in range(devices)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        avg_us = sum(per_call) / len(per_call) * 1e6
+        print(f"\nstats recording, {devices} device threads: "
+              f"{avg_us:.1f} us/call avg, {max(per_call) * 1e6:.1f} us/call slowest thread")
+        assert avg_us < 500
+
+
 # ============================================================
 # timed_action decorator
 # ============================================================
@@ -0,0 +1,83 @@
+"""Tests for learned wait budgets (budgets.py)."""
+
+import logging
+from unittest.mock import patch
+
+import pytest
+
+import budgets
+import config
+from botlog import StatsTracker
+
+
+@pytest.fixture
+def tracker():
+    tracker = StatsTracker()
+    tracker._data.clear()
+    with patch("budgets.stats", tracker):
+        yield tracker
+
+
+def _learn(tracker, label, actual, n=10, budget=2.0):
+    for _ in range(n):
+        tracker.record_transition_time("dev1", label, actual, budget, True)
+
+
+class TestBudgetFor:
+    def test_observe_is_default(self, tracker):
+        assert config.BUDGET_MODE == "observe"
+        _learn(tracker, "open", 0.5)
+        assert budgets.budget_for("dev1", "open", 2.0) == 2.0
+
+    @patch.object(config, "BUDGET_MODE", "adaptive")
+    def test_adaptive_uses_learned_budget(self, tracker):
+        _learn(tracker, "open", 0.5)
+        assert budgets.budget_for("dev1", "open", 2.0) == pytest.approx(0.8)   # floor
+        assert budgets.budget_for("dev2", "open", 2.0) == 2.0
+
+    @pytest.mark.parametrize("mode", ["fixed", "observe"])
+    def test_fixed_modes_keep_default(self, tracker, mode):
+        _learn(tracker, "open", 0.5)
+        with patch.object(config, "BUDGET_MODE", mode):
+            assert budgets.budget_for("dev1", "open", 2.0) == 2.0
+
+    @patch.object(config, "BUDGET_MODE", "adaptive")
+    def test_slow_device_gets_more_room(self, tracker):
+        _learn(tracker, "open", 1.9)
+        assert budgets.budget_for("dev1", "open", 2.0) == pytest.approx(1.9 * 1.3)
+
+
+class TestUnmetOnlyLabels:
+    @patch.object(config, "BUDGET_MODE", "adaptive")
+    def test_keeps_default_budget(self, tracker):
+        for _ in range(20):
+            tracker.record_transition_time("dev1", "timeout", 2.0, 2.0, False)
+        assert budgets.budget_for("dev1", "timeout", 2.0) == 2.0
+
+    def test_optimum_is_the_full_wait(self, tracker):
+        for _ in range(20):
+            tracker.record_transition_time("dev1", "timeout", 2.0, 2.0, False)
+        budgets.record_use("dev1", "timeout", 2.0, 2.0)
+        assert budgets.report()[0]["excess_s"] == 0.0
+
+
+class TestReport:
+    def test_consumed_vs_optimum(self, tracker):
+        _learn(tracker, "settle", 0.7)            # learned budget 0.91s
+        budgets.record_use("dev1", "settle", 2.0, 2.0)   # a fixed 2s sleep
+        budgets.record_use("dev1", "settle", 0.5, 2.0)   # ended early
+        budgets.record_use("dev1", "quick", 0.2, 1.0)
+        rows = budgets.report()
+        assert [r["label"] for r in rows] == ["settle", "quick"]
+        assert rows[0] == {"device": "dev1", "label": "settle", "calls": 2,
+                           "consumed_s": 2.5, "optimum_s": 1.41, "excess_s": 1.09}
+        assert budgets.report("dev2") == []
+
+    def test_observe_mode_logs_excess(self, tracker, caplog):
+        _learn(tracker, "settle", 0.7)
+        with patch.object(config, "BUDGET_MODE", "observe"), \
+             caplog.at_level(logging.INFO):
+            budgets.record_use("dev1", "settle", 2.0, 2.0)
+            budgets.record_use("dev1", "settle", 0.5, 2.0)
+        lines = [r.getMessage() for r in caplog.records if "settle" in r.getMessage()]
+        assert lines == ["settle: waited 2.00s, learned optimum 0.91s (+1.09s)"]
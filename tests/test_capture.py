@@ -0,0 +1,354 @@
+"""Tests for the streaming screen-capture backend (capture.py)."""
+
+import time
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import pytest
+
+import capture
+import config
+from capture import (FakeDevice, CaptureSession, parse_raw_header, detect_header_size,
+                     encode_raw_frame, raw_to_bgr, decode_raw_screencap, get_session,
+                     stop_all_sessions, register_fake_device, unregister_fake_device)
+from vision import load_screenshot, get_capture_modes, Regions
+
+
+def _frame(value, h=40, w=30):
+    """Distinct BGR test frame filled with a per-channel pattern."""
+    img = np.zeros((h, w, 3), dtype=np.uint8)
+    img[:, :, 0] = value
+    img[:, :, 1] = (value + 50) % 256
+    img[:, :, 2] = (value + 100) % 256
+    return img
+
+
+@pytest.fixture(autouse=True)
+def _clean_sessions():
+    stop_all_sessions()
+    capture._fake_devices.clear()
+    yield
+    stop_all_sessions()
+    capture._fake_devices.clear()
+
+
+# ============================================================
+# Raw header parsing
+# ============================================================
+
+class TestRawFormat:
+    @pytest.mark.parametrize("header_size", [12, 16])
+    def test_detect_header_size(self, header_size):
+        data = encode_raw_frame(_frame(10), header_size=header_size)
+        assert detect_header_size(data) == header_size
+
+    def test_parse_header(self):
+        data = encode_raw_frame(_frame(10, h=40, w=30))
+        assert parse_raw_header(data) == (30, 40, capture.PIXEL_FORMAT_RGBA_8888)
+
+    def test_png_is_not_raw(self):
+        import cv2
+        _, png = cv2.imencode(".png", _frame(10))
+        assert detect_header_size(png.tobytes()) is None
+
+    def test_truncated_frame_rejected(self):
+        data = encode_raw_frame(_frame(10))
+        assert detect_header_size(data[:-7]) is None
+
+    def test_roundtrip_to_bgr(self):
+        src = _frame(77)
+        data = encode_raw_frame(src, header_size=16)
+        rgba = np.frombuffer(data[16:], dtype=np.uint8).reshape(40, 30, 4)
+        assert np.array_equal(raw_to_bgr(rgba), src)
+
+    @pytest.mark.parametrize("header_size", [12, 16])
+    def test_decode_raw_screencap(self, header_size):
+        src = _frame(33)
+        assert np.array_equal(decode_raw_screencap(encode_raw_frame(src, header_size)), src)
+
+    def test_decode_crops_before_conversion(self):
+        src = _frame(0)
+        src[10:20, 5:15] = (1, 2, 3)
+        crop = decode_raw_screencap(encode_raw_frame(src), region=(5, 10, 15, 20))
+        assert crop.shape == (10, 10, 3)
+        assert (crop == (1, 2, 3)).all()
+
+    def test_decode_rejects_png(self):
+        import cv2
+        _, png = cv2.imencode(".png", _frame(10))
+        assert decode_raw_screencap(png.tobytes()) is None
+
+
+# ============================================================
+# CaptureSession with a FakeDevice
+# ============================================================
+
+class TestCaptureSession:
+    def test_streams_recorded_frames(self, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(1), _frame(2)]))
+        session = get_session(mock_device)
+        assert session is not None
+        ts, frame = session.wait_for_frame(timeout=2)
+        assert frame is not None
+        assert frame.shape == (40, 30, 4)
+        bgr = session.get_bgr()
+        assert any(np.array_equal(bgr, _frame(v)) for v in (1, 2))
+
+    def test_ring_buffer_bounded(self, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(v) for v in range(10)]))
+        session = get_session(mock_device)
+        deadline = time.time() + 2
+        while session.frame_count < 10 and time.time() < deadline:
+            time.sleep(0.01)
+        assert session.frame_count >= 10
+        assert len(session._ring) <= capture.RING_SIZE
+
+    def test_wait_for_newer_frame(self, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(1), _frame(2)], fps=50))
+        session = get_session(mock_device)
+        ts1, _ = session.wait_for_frame(timeout=2)
+        ts2, _ = session.wait_for_frame(newer_than=ts1, timeout=2)
+        assert ts2 is not None and ts2 > ts1
+
+    def test_first_frame_after_input_is_skipped(self, mock_device):
+        # The device grabs a frame before writing its header, so the first
+        # header to land after a tap may still show the pre-tap screen.
+        register_fake_device(mock_device, FakeDevice([_frame(v) for v in range(5)], fps=20))
+        session = get_session(mock_device)
+        session.wait_for_frame(timeout=2)
+        t_input = time.time()
+        with session._cond:
+            count_at_input = session.frame_count
+        ts, frame = session.wait_for_frame(newer_than=t_input, timeout=2)
+        assert frame is not None and ts > t_input
+        with session._cond:
+            headers_after = [t for _, t, _ in session._ring if t > t_input]
+        assert len(headers_after) >= 2
+        assert session.frame_count >= count_at_input + 2
+        frame, _ = session.get_raw(newer_than=t_input)
+        assert frame is not None
+
+    def test_records_frame_latency(self, mock_device):
+        with patch("capture.stats") as mock_stats:
+            register_fake_device(mock_device, FakeDevice([_frame(1)], loop=False))
+            session = get_session(mock_device)
+            session.wait_for_frame(timeout=2)
+            session._thread.join(timeout=2)
+        commands = [c[0][1] for c in mock_stats.record_adb_timing.call_args_list]
+        assert "stream_frame" in commands
+
+    def test_eof_marks_session_dead(self, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(1)], loop=False))
+        session = get_session(mock_device)
+        session._thread.join(timeout=2)
+        assert not session.alive
+        # Dead session is dropped and restart is throttled by backoff
+        assert get_session(mock_device) is None
+
+    def test_unsupported_device_returns_none(self, mock_device):
+        fake = FakeDevice([_frame(1)])
+        fake.screencap = lambda: b"\x89PNG not raw"
+        register_fake_device(mock_device, fake)
+        assert get_session(mock_device) is None
+
+    def test_hung_start_does_not_block_other_devices(self, mock_device, mock_device_b):
+        import threading
+        register_fake_device(mock_device_b, FakeDevice([_frame(1)]))
+        release = threading.Event()
+        real_start = CaptureSession.start
+
+        def start(session):
+            if session.device == mock_device:
+                release.wait(5)   # header probe hanging on a stuck device
+                return False
+            return real_start(session)
+
+        with patch.object(CaptureSession, "start", start):
+            stuck = threading.Thread(target=get_session, args=(mock_device,))
+            stuck.start()
+            time.sleep(0.05)
+            t0 = time.monotonic()
+            assert get_session(mock_device_b) is not None
+            assert get_session(mock_device) is None      # already being started
+            assert time.monotonic() - t0 < 1.0
+            release.set()
+            stuck.join()
+
+    def test_unregister_stops_session(self, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(1)]))
+        session = get_session(mock_device)
+        unregister_fake_device(mock_device)
+        assert not session.alive
+
+
+# ============================================================
+# load_screenshot integration
+# ============================================================
+
+class TestLoadScreenshotStream:
+    @patch("vision.subprocess.run")
+    def test_stream_backend_skips_subprocess(self, mock_run, mock_device):
+        register_fake_device(mock_device, FakeDevice([_frame(42)]))
+        with patch.object(config, "CAPTURE_BACKEND", "stream"):
+            img = load_screenshot(mock_device)
+        assert np.array_equal(img, _frame(42))
+        mock_run.assert_not_called()
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_falls_back_when_stream_unavailable(self, mock_run, mock_stats, mock_device):
+        import cv2
+        _, buf = cv2.imencode(".png", _frame(9))
+        mock_run.return_value = MagicMock(returncode=0, stdout=buf.tobytes())
+        with patch.object(config, "CAPTURE_BACKEND", "stream"), \
+             patch("vision.capture.get_session", return_value=None):
+            img = load_screenshot(mock_device)
+        assert np.array_equal(img, _frame(9))
+        mock_run.assert_called_once()
+
+    @patch("vision.capture.get_session")
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_screencap_backend_never_starts_stream(self, mock_run, mock_stats,
+                                                   mock_get_session, mock_device):
+        mock_run.return_value = MagicMock(returncode=0, stdout=b"")
+        load_screenshot(mock_device)
+        mock_get_session.assert_not_called()
+
+
+# ============================================================
+# One-shot raw capture (capture_backend == "raw")
+# ============================================================
+
+def _screencap_run(raw, png, png_delay=0.0):
+    """subprocess.run stand-in answering ``screencap`` / ``screencap -p``."""
+    def run(argv, **kwargs):
+        if argv[-1] == "-p":
+            time.sleep(png_delay)
+            return MagicMock(returncode=0, stdout=png)
+        return MagicMock(returncode=0, stdout=raw)
+    return run
+
+
+def _png(img):
+    import cv2
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+@pytest.fixture
+def raw_backend():
+    with patch.object(config, "CAPTURE_BACKEND", "raw"), \
+         patch.object(config, "FRAME_CACHE_MAX_AGE_S", 0):
+        yield
+
+
+class TestLoadScreenshotRaw:
+    @patch("vision.subprocess.run")
+    def test_benchmark_picks_raw_then_skips_png(self, mock_run, raw_backend, mock_device):
+        src = _frame(60)
+        mock_run.side_effect = _screencap_run(encode_raw_frame(src), _png(src), png_delay=0.01)
+        assert np.array_equal(load_screenshot(mock_device), src)
+        assert get_capture_modes() == {mock_device: "raw"}
+        mock_run.reset_mock()
+        assert np.array_equal(load_screenshot(mock_device), src)
+        assert [c.args[0][-1] for c in mock_run.call_args_list] == ["screencap"]
+
+    @patch("vision.subprocess.run")
+    def test_benchmark_can_pick_png(self, mock_run, raw_backend, mock_device):
+        src = _frame(61)
+        raw = encode_raw_frame(src)
+
+        def slow_raw(argv, **kwargs):
+            if argv[-1] != "-p":
+                time.sleep(0.01)
+            return _screencap_run(raw, _png(src))(argv)
+        mock_run.side_effect = slow_raw
+        load_screenshot(mock_device)
+        assert get_capture_modes() == {mock_device: "png"}
+
+    @patch("vision.subprocess.run")
+    def test_unexpected_header_falls_back_to_png(self, mock_run, raw_backend, mock_device):
+        src = _frame(62)
+        mock_run.side_effect = _screencap_run(b"\x00" * 64, _png(src))
+        assert np.array_equal(load_screenshot(mock_device), src)
+        assert get_capture_modes() == {mock_device: "png"}
+        mock_run.reset_mock()
+        load_screenshot(mock_device)
+        assert [c.args[0][-1] for c in mock_run.call_args_list] == ["-p"]
+
+    @patch("vision.subprocess.run")
+    def test_failed_capture_does_not_decide_mode(self, mock_run, raw_backend, mock_device):
+        mock_run.return_value = MagicMock(returncode=1, stdout=b"")
+        assert load_screenshot(mock_device) is None
+        assert get_capture_modes() == {}
+
+
+# ============================================================
+# Region-of-interest capture (load_screenshot regions=...)
+# ============================================================
+
+_ROI = Regions(top=(0, 0, 10, 5), side=(20, 30, 30, 40))
+
+
+def _marked_frame():
+    img = _frame(5)
+    img[0:5, 0:10] = (1, 2, 3)
+    img[30:40, 20:30] = (7, 8, 9)
+    return img
+
+
+def _assert_marked(crops):
+    assert set(crops) == {"top", "side"}
+    assert crops["top"].shape == (5, 10, 3) and (crops["top"] == (1, 2, 3)).all()
+    assert crops["side"].shape == (10, 10, 3) and (crops["side"] == (7, 8, 9)).all()
+
+
+class TestLoadRegions:
+    @patch("vision.subprocess.run")
+    def test_cached_frame_gives_views(self, mock_run, mock_device):
+        src = _marked_frame()
+        mock_run.return_value = MagicMock(returncode=0, stdout=_png(src))
+        full = load_screenshot(mock_device)
+        crops = load_screenshot(mock_device, regions=_ROI)
+        _assert_marked(crops)
+        assert np.shares_memory(crops["side"], full)
+        mock_run.assert_called_once()
+
+    @patch("vision.subprocess.run")
+    def test_png_path_decodes_and_caches_full_frame(self, mock_run, mock_device):
+        src = _marked_frame()
+        mock_run.return_value = MagicMock(returncode=0, stdout=_png(src))
+        _assert_marked(load_screenshot(mock_device, regions={"top": (0, 0, 10, 5),
+                                                             "side": (20, 30, 30, 40)}))
+        assert np.array_equal(load_screenshot(mock_device), src)
+        mock_run.assert_called_once()
+
+    @patch("vision.subprocess.run")
+    def test_raw_mode_converts_only_crops(self, mock_run, raw_backend, mock_device):
+        import vision
+        src = _marked_frame()
+        mock_run.side_effect = _screencap_run(encode_raw_frame(src), _png(src))
+        vision._set_one_shot_mode(mock_device, "raw")
+        with patch("vision.capture.raw_to_bgr", wraps=capture.raw_to_bgr) as conv:
+            _assert_marked(load_screenshot(mock_device, regions=_ROI))
+        assert sorted(c.args[0].shape for c in conv.call_args_list) == [(5, 10, 4), (10, 10, 4)]
+        assert [c.args[0][-1] for c in mock_run.call_args_list] == ["screencap"]
+
+    @patch("vision.subprocess.run")
+    def test_raw_mode_undecided_benchmarks_first(self, mock_run, raw_backend, mock_device):
+        src = _marked_frame()
+        mock_run.side_effect = _screencap_run(encode_raw_frame(src), _png(src))
+        _assert_marked(load_screenshot(mock_device, regions=_ROI))
+        assert mock_device in get_capture_modes()
+
+    @patch("vision.subprocess.run")
+    def test_stream_backend(self, mock_run, mock_device):
+        register_fake_device(mock_device, FakeDevice([_marked_frame()]))
+        with patch.object(config, "CAPTURE_BACKEND", "stream"):
+            _assert_marked(load_screenshot(mock_device, regions=_ROI))
+        mock_run.assert_not_called()
+
+    @patch("vision.subprocess.run")
+    def test_capture_failure_returns_none(self, mock_run, mock_device):
+        mock_run.return_value = MagicMock(returncode=1, stdout=b"")
+        assert load_screenshot(mock_device, regions=_ROI) is None
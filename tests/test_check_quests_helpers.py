@@ -341,7 +341,8 @@ class TestAttackPvpTower:
         """Happy path: target succeeds, attack menu opens, depart found."""
         mock_config.set_device_status = MagicMock()
         with patch("actions.combat.target", return_value=True), \
-             patch("actions.quests.time.sleep"):
+             patch("actions.quests.time.sleep"), \
+             patch("actions.quests.timed_wait", return_value=True):
             result = _attack_pvp_tower(mock_device)
             assert result is True
             assert mock_device in _pvp_last_dispatch
@@ -411,7 +412,8 @@ class TestAttackPvpTower:
         """Depart button not found — save screenshot."""
         mock_config.set_device_status = MagicMock()
         with patch("actions.combat.target", return_value=True), \
-             patch("actions.quests.time.sleep"):
+             patch("actions.quests.time.sleep"), \
+             patch("actions.quests.timed_wait", return_value=True):
             result = _attack_pvp_tower(mock_device)
             assert result is False
             mock_save.assert_called_once_with(mock_device, "pvp_depart_fail")
@@ -655,7 +657,8 @@ class TestRecallStrayStationed:
         with patch("actions.quests.get_troop_status", return_value=snapshot), \
              patch("actions.quests.tap_image", return_value=True) as mock_tap, \
              patch("actions.quests.wait_for_image_and_tap", return_value=True) as mock_wait_tap, \
-             patch("time.sleep"):
+             patch("time.sleep"), \
+             patch("actions.quests.timed_wait", return_value=True):
             _recall_stray_stationed(mock_device)
             # Should tap stationing icon on panel
             mock_tap.assert_called_once_with("statuses/stationing.png", mock_device)
@@ -688,7 +691,8 @@ class TestRecallStrayStationed:
              patch("actions.quests.tap_image", return_value=True), \
              patch("actions.quests.wait_for_image_and_tap", return_value=False) as mock_wait_tap, \
              patch("actions.quests.save_failure_screenshot"), \
-             patch("time.sleep"):
+             patch("time.sleep"), \
+             patch("actions.quests.timed_wait", return_value=True):
             _recall_stray_stationed(mock_device)
             # Only tried stationed.png, never got to return.png
             mock_wait_tap.assert_called_once_with("stationed.png", mock_device, timeout=3)
@@ -703,6 +707,7 @@ class TestRecallStrayStationed:
         with patch("actions.quests.get_troop_status", return_value=snapshot), \
              patch("actions.quests.tap_image", return_value=True), \
              patch("actions.quests.wait_for_image_and_tap") as mock_wait_tap, \
-             patch("time.sleep"):
+             patch("time.sleep"), \
+             patch("actions.quests.timed_wait", return_value=True):
             _recall_stray_stationed(mock_device, stop_check=lambda: True)
             mock_wait_tap.assert_not_called()
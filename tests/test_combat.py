@@ -8,6 +8,7 @@ import json
 import os
 import time
 import numpy as np
+import pytest
 from unittest.mock import patch, MagicMock, call
 
 import config
@@ -23,6 +24,13 @@ from actions.combat import (
 )
 
 
+@pytest.fixture(autouse=True)
+def no_transition_waits():
+    """Transition waits end at once — these tests mock every frame."""
+    with patch("actions.combat.timed_wait", return_value=True) as mock_wait:
+        yield mock_wait
+
+
 # ============================================================
 # _check_dead
 # ============================================================
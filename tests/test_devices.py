@@ -1,11 +1,15 @@
 """Tests for device detection (devices.py)."""
 
+import socket
 import subprocess
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 
 from devices import (auto_connect_emulators, get_devices, get_emulator_instances,
-                     _auto_connect_by_ports, _connect_ports)
+                     _auto_connect_by_ports, _connect_ports, _port_open,
+                     DeviceCache)
 
 
 # ============================================================
@@ -37,21 +41,63 @@ class TestConnectPorts:
 class TestAutoConnectByPorts:
     """Tests for _auto_connect_by_ports (macOS/Linux path)."""
 
+    @patch("devices._port_open", return_value=True)
     @patch("devices.EMULATOR_PORTS", {"mumu": [7555, 7556]})
     @patch("devices.subprocess.run")
-    def test_probes_known_ports(self, mock_run):
+    def test_probes_known_ports(self, mock_run, _open):
         mock_run.return_value = MagicMock(stdout="connected to 127.0.0.1:7555")
         result = _auto_connect_by_ports()
         assert "127.0.0.1:7555" in result
 
+    @patch("devices._port_open", side_effect=lambda port: port == 7556)
+    @patch("devices.EMULATOR_PORTS", {"mumu": [7555, 7556], "bluestacks": [5555]})
+    @patch("devices.subprocess.run")
+    def test_closed_ports_skip_adb(self, mock_run, _open):
+        """Only ports that accept a TCP connection get an adb connect."""
+        mock_run.return_value = MagicMock(stdout="connected to 127.0.0.1:7556")
+        assert _auto_connect_by_ports() == ["127.0.0.1:7556"]
+        mock_run.assert_called_once()
+        assert mock_run.call_args[0][0][-1] == "127.0.0.1:7556"
+
+    @patch("devices.subprocess.run")
+    def test_connects_concurrently(self, mock_run):
+        """Slow adb connects overlap instead of adding up."""
+        def slow(*args, **kwargs):
+            time.sleep(0.2)
+            return MagicMock(stdout="connected")
+        mock_run.side_effect = slow
+        t0 = time.monotonic()
+        result = _connect_ports({7555, 7556, 7557, 7558})
+        assert time.monotonic() - t0 < 0.6
+        assert result == [f"127.0.0.1:{p}" for p in (7555, 7556, 7557, 7558)]
+
+
+class TestPortOpen:
+    def test_listening_port(self):
+        srv = socket.socket()
+        srv.bind(("127.0.0.1", 0))
+        srv.listen(1)
+        try:
+            assert _port_open(srv.getsockname()[1]) is True
+        finally:
+            srv.close()
+
+    def test_closed_port(self):
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+        assert _port_open(port) is False
+
 
 class TestAutoConnectEmulators:
     """Tests for auto_connect_emulators dispatch logic."""
 
+    @patch("devices._port_open", return_value=True)
     @patch("devices.platform.system", return_value="Linux")
     @patch("devices.EMULATOR_PORTS", {"mumu": [7555]})
     @patch("devices.subprocess.run")
-    def test_non_windows_probes_ports(self, mock_run, _mock_sys):
+    def test_non_windows_probes_ports(self, mock_run, _mock_sys, _open):
         """On non-Windows, probes known emulator ports."""
         mock_run.return_value = MagicMock(stdout="connected to 127.0.0.1:7555")
         result = auto_connect_emulators()
@@ -155,3 +201,63 @@ class TestGetEmulatorInstances:
         result = get_emulator_instances()
         assert result == {"127.0.0.1:7555": "MuMu Player 1"}
         mock_win_func.assert_called_once_with(["127.0.0.1:7555"])
+
+
+# ============================================================
+# DeviceCache
+# ============================================================
+
+class TestDeviceCache:
+    @patch("devices.get_emulator_instances", side_effect=lambda devs: {d: d for d in devs})
+    @patch("devices.get_devices", return_value=["127.0.0.1:5555"])
+    def test_get_scans_once_within_ttl(self, mock_devs, mock_inst):
+        cache = DeviceCache(ttl=60)
+        assert cache.get() == (["127.0.0.1:5555"], {"127.0.0.1:5555": "127.0.0.1:5555"})
+        cache.get()
+        assert mock_devs.call_count == 1
+        # Instances reuse the scanned list instead of another adb devices
+        mock_inst.assert_called_once_with(["127.0.0.1:5555"])
+
+    @patch("devices.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    def test_invalidate_forces_rescan(self, mock_devs, _inst):
+        cache = DeviceCache(ttl=60)
+        cache.get()
+        cache.invalidate()
+        cache.get()
+        assert mock_devs.call_count == 2
+
+    @patch("devices.get_emulator_instances", return_value={})
+    @patch("devices.get_devices")
+    def test_concurrent_callers_share_scan(self, mock_devs, _inst):
+        def slow():
+            time.sleep(0.1)
+            return ["127.0.0.1:5555"]
+        mock_devs.side_effect = slow
+        cache = DeviceCache(ttl=60)
+        threads = [threading.Thread(target=cache.get) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert mock_devs.call_count == 1
+
+    @patch("devices.get_emulator_instances", return_value={})
+    @patch("devices.get_devices")
+    def test_subscribers_notified_on_change_only(self, mock_devs, _inst):
+        cache = DeviceCache()
+        seen = []
+        cache.subscribe(lambda devs, names: seen.append(devs))
+        mock_devs.return_value = ["127.0.0.1:5555"]
+        cache.refresh()
+        cache.refresh()
+        mock_devs.return_value = ["127.0.0.1:5555", "127.0.0.1:5565"]
+        cache.refresh()
+        assert seen == [["127.0.0.1:5555"], ["127.0.0.1:5555", "127.0.0.1:5565"]]
+
+    @patch("devices.device_cache")
+    @patch("devices.subprocess.run")
+    def test_successful_connect_invalidates_shared_cache(self, mock_run, mock_cache):
+        mock_run.return_value = MagicMock(stdout="connected to 127.0.0.1:7555")
+        _connect_ports({7555})
+        mock_cache.invalidate.assert_called_once()
@@ -0,0 +1,255 @@
+"""Tests for the glyph-template digit reader (digits.py) and vision.read_digits.
+
+Crops are rendered with a Hershey font at a fixed size (the game's HUD font
+is fixed too), with per-crop jitter in position, brightness and noise so
+train and test crops are never pixel-identical.
+"""
+
+import os
+import random
+import time
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+
+import digits
+from digits import DigitReader, segment, evaluate, evaluate_dir
+from vision import read_digits
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _render(text, seed=0, scale=1.2, invert=False):
+    """Render ``text`` as a grayscale HUD-style crop (white text, dark bg)."""
+    rng = np.random.default_rng(seed)
+    (tw, th), base = cv2.getTextSize(text, FONT, scale, 2)
+    pad_x, pad_y = int(rng.integers(6, 16)), int(rng.integers(6, 12))
+    img = np.full((th + base + 2 * pad_y, tw + 2 * pad_x), int(rng.integers(20, 70)), np.uint8)
+    cv2.putText(img, text, (pad_x, pad_y + th), FONT, scale,
+                int(rng.integers(200, 256)), 2, cv2.LINE_AA)
+    noise = rng.normal(0, 6, img.shape)
+    img = np.clip(img + noise, 0, 255).astype(np.uint8)
+    return 255 - img if invert else img
+
+
+def _random_text(rng):
+    kind = rng.choice(["ap", "timer", "count", "plain"])
+    if kind == "ap":
+        return f"{rng.randint(0, 400)}/{rng.choice([400, 450, 500])}"
+    if kind == "timer":
+        return f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+    if kind == "count":
+        return f"{rng.randint(1, 999)},{rng.randint(0, 999):03d}"
+    return str(rng.randint(0, 99999))
+
+
+def _samples(n, seed):
+    rng = random.Random(seed)
+    return [(_render(text, seed=seed * 1000 + i), text)
+            for i, text in ((i, _random_text(rng)) for i in range(n))]
+
+
+@pytest.fixture(scope="module")
+def trained():
+    reader = DigitReader("test", directory="unused")
+    learned = sum(reader.learn(img, text) for img, text in _samples(60, seed=1))
+    assert learned >= 55
+    return reader
+
+
+# ============================================================
+# Segmentation
+# ============================================================
+
+class TestSegment:
+    def test_one_box_per_glyph(self):
+        for text in ("101/400", "12:34", "1,234", "9.5"):
+            _, glyphs, _, _ = segment(_render(text))
+            assert len(glyphs) == len(text), text
+
+    def test_dark_text_on_light(self):
+        _, glyphs, _, _ = segment(_render("123", invert=True))
+        assert len(glyphs) == 3
+
+    def test_blank_crop(self):
+        _, glyphs, _, _ = segment(np.zeros((30, 80), np.uint8))
+        assert glyphs == []
+
+
+# ============================================================
+# DigitReader
+# ============================================================
+
+class TestDigitReader:
+    def test_no_templates_reads_nothing(self):
+        assert DigitReader("empty", directory="unused").read(_render("42")) == (None, 0.0)
+
+    def test_learn_rejects_glyph_count_mismatch(self):
+        reader = DigitReader("test", directory="unused")
+        assert reader.learn(_render("123"), "12") is False
+        assert reader.charset == set()
+
+    def test_reads_trained_glyphs(self, trained):
+        text, conf = trained.read(_render("207/400", seed=99))
+        assert text == "207/400"
+        assert conf >= digits.MIN_CONFIDENCE
+
+    def test_allowlist_rejects_other_glyphs(self, trained):
+        assert trained.read(_render("12:34", seed=5), allowlist="0123456789/") == (None, 0.0)
+
+    def test_unsampled_allowlist_chars_are_not_trusted(self):
+        reader = DigitReader("test", directory="unused")
+        for seed in range(3):
+            reader.learn(_render("12", seed=seed), "12")
+        text, conf = reader.read(_render("21", seed=9), allowlist="12")
+        assert text == "21" and conf >= digits.MIN_CONFIDENCE
+        # '3' could appear but has never been seen: the read can't be trusted
+        assert reader.read(_render("21", seed=9), allowlist="123") == ("21", 0.0)
+
+    def test_ambiguous_glyph_is_not_trusted(self):
+        reader = DigitReader("test", directory="unused")
+        for seed in range(3):
+            reader.learn(_render("1", seed=seed), "1")
+            reader.learn(_render("1", seed=seed + 10), "7")   # same glyph, other label
+        _, conf = reader.read(_render("1", seed=20))
+        assert conf == 0.0
+
+    def test_learn_confirmed_needs_two_matching_reads(self):
+        reader = DigitReader("test", directory="unused")
+        assert reader.learn_confirmed(_render("42", seed=1), "42") is False
+        assert reader.charset == set()
+        assert reader.learn_confirmed(_render("43", seed=2), "43") is False   # disagrees
+        assert reader.charset == set()
+        assert reader.learn_confirmed(_render("43", seed=3), "43") is True
+        assert reader._chars == list("4343")
+
+    def test_same_crop_twice_does_not_confirm(self):
+        reader = DigitReader("test", directory="unused")
+        crop = _render("42", seed=1)
+        assert reader.learn_confirmed(crop, "47") is False
+        assert reader.learn_confirmed(crop.copy(), "47") is False
+        assert reader.charset == set()
+
+    def test_learned_crop_is_not_added_again(self, tmp_path):
+        reader = DigitReader("test", directory=str(tmp_path))
+        a, b = _render("43", seed=2), _render("43", seed=3)
+        reader.learn_confirmed(a, "43")
+        assert reader.learn_confirmed(b, "43") is True
+        reader.save()
+        fresh = DigitReader("test", directory=str(tmp_path))
+        fresh.load()
+        assert fresh.learn_confirmed(a, "43") is False
+        assert fresh.learn_confirmed(b, "43") is False
+        assert fresh._chars == list("4343")
+
+    def test_templates_capped_per_char(self, trained):
+        assert all(trained._chars.count(ch) <= digits.TEMPLATES_PER_CHAR
+                   for ch in trained.charset)
+
+    def test_save_load_round_trip(self, trained, tmp_path):
+        trained.directory = str(tmp_path / "test")
+        trained.save()
+        fresh = DigitReader("test", directory=str(tmp_path))
+        assert fresh.load()
+        assert fresh.read(_render("55", seed=3)) == trained.read(_render("55", seed=3))
+
+    def test_load_missing_library(self, tmp_path):
+        assert DigitReader("none", directory=str(tmp_path)).load() is False
+
+
+# ============================================================
+# Accuracy / speed benchmark
+# ============================================================
+
+class TestAccuracy:
+    def test_held_out_accuracy(self, trained):
+        result = evaluate(trained, _samples(200, seed=2))
+        assert result["accuracy"] >= 0.95
+        # Confident reads skip OCR, so they must essentially never be wrong
+        assert result["confident_correct"] >= result["confident"] - 1
+
+    def test_evaluate_dir_over_saved_crops(self, trained, tmp_path):
+        trained.directory = str(tmp_path / "test")
+        for img, text in _samples(10, seed=3):
+            trained.save_sample(img, text)
+        result = evaluate_dir(trained)
+        assert result["samples"] == 10
+        assert result["accuracy"] >= 0.9
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_read_speed(self, trained):
+        result = evaluate(trained, _samples(200, seed=2))
+        print(f"\ndigit reader: {result['accuracy']:.1%} accurate, "
+              f"{result['confident']}/{result['samples']} confident "
+              f"({result['confident_correct']} correct), "
+              f"avg {result['avg_ms']:.2f} ms, max {result['max_ms']:.2f} ms")
+        assert result["avg_ms"] < 5
+
+
+# ============================================================
+# vision.read_digits — fallback and self-training
+# ============================================================
+
+class TestReadDigits:
+    @patch("vision.ocr_read")
+    def test_falls_back_to_ocr_then_learns(self, mock_ocr):
+        reader = digits.get_reader("t")
+        seed = 0
+        for text in ("1234/5678", "90/1234", "5678/90"):
+            mock_ocr.return_value = [text]
+            for _ in range(2):      # learned only once a second read agrees
+                seed += 1
+                assert read_digits(_render(text, seed=seed), "0123456789/", font="t",
+                                   learn_pattern=r"\d+/\d+") == [text]
+            assert set(text) <= reader.charset
+        assert os.path.exists(os.path.join(reader.directory, "glyphs.npz"))
+        assert len(os.listdir(os.path.join(reader.directory, "samples"))) == 3
+
+        # Same glyphs again: answered without OCR
+        mock_ocr.reset_mock()
+        assert read_digits(_render("401/42", seed=7), "0123456789/", font="t") == ["401/42"]
+        mock_ocr.assert_not_called()
+
+    @patch("vision.ocr_read")
+    def test_does_not_learn_unexpected_text(self, mock_ocr):
+        mock_ocr.return_value = ["12:34"]
+        for seed in range(2):
+            read_digits(_render("12:34", seed=seed), "0123456789/", font="t",
+                        learn_pattern=r"\d+/\d+")
+        assert digits.get_reader("t").charset == set()
+
+    @patch("vision.ocr_read")
+    def test_repeated_misread_of_unchanged_crop_is_not_learned(self, mock_ocr):
+        """An unchanged HUD gets the same (cached) OCR answer each time —
+        that is not a confirmation."""
+        mock_ocr.return_value = ["147/400"]        # misread of "142/400"
+        crop = _render("142/400", seed=1)
+        for _ in range(3):
+            read_digits(crop.copy(), "0123456789/", font="t", learn_pattern=r"\d+/\d+")
+        assert digits.get_reader("t").charset == set()
+
+    @patch("vision.ocr_read")
+    def test_single_fallback_read_is_not_learned(self, mock_ocr):
+        mock_ocr.return_value = ["142/400"]
+        read_digits(_render("142/400"), "0123456789/", font="t", learn_pattern=r"\d+/\d+")
+        assert digits.get_reader("t").charset == set()
+
+    @patch("vision.ocr_read")
+    def test_low_confidence_falls_back(self, mock_ocr, trained):
+        mock_ocr.return_value = ["7"]
+        digits._readers["t"] = trained
+        with patch("vision.config.DIGIT_MIN_CONFIDENCE", 1.01):
+            assert read_digits(_render("7"), "0123456789", font="t") == ["7"]
+        mock_ocr.assert_called_once()
+
+    @patch("vision.ocr_read")
+    def test_disabled_goes_straight_to_ocr(self, mock_ocr, trained):
+        mock_ocr.return_value = ["7"]
+        digits._readers["t"] = trained
+        with patch("vision.config.DIGIT_READER_ENABLED", False):
+            read_digits(_render("7"), "0123456789", font="t")
+        mock_ocr.assert_called_once()
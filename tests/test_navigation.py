@@ -3,64 +3,55 @@
 All ADB and vision calls are mocked — no emulator needed.
 """
 
+import os
+
 import numpy as np
 from unittest.mock import patch, MagicMock, call
 
 from config import Screen
-from navigation import check_screen, navigate, _verify_screen, _recover_to_known_screen
+from navigation import (check_screen, navigate, _verify_screen, _recover_to_known_screen,
+                        _try_clear_map_popup)
+
+ELEMENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "elements")
 
 
 # ============================================================
 # check_screen
 # ============================================================
 
+def _noise_screen(seed=0):
+    """Full-size background with enough texture that no template matches."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    screen = rng.integers(0, 256, (1920, 1080, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(screen, (7, 7), 0)
+
+
+def _element(name):
+    import cv2
+    return cv2.imread(os.path.join(ELEMENTS_DIR, f"{name}.png"))
+
+
 class TestCheckScreen:
     @patch("navigation.adb_tap")
-    @patch("navigation.get_template")
     @patch("navigation.load_screenshot")
-    def test_returns_best_match(self, mock_screenshot, mock_template, mock_tap):
-        """Should return the screen name with the highest confidence above 0.8."""
-        screen = np.zeros((1920, 1080, 3), dtype=np.uint8)
+    def test_returns_best_match(self, mock_screenshot, mock_tap):
+        """Should return the screen whose marker is actually on screen."""
+        screen = _noise_screen()
+        aq = _element(Screen.ALLIANCE_QUEST)
+        h, w = aq.shape[:2]
+        screen[381:381 + h, 0:w] = aq
         mock_screenshot.return_value = screen
 
-        # Return different templates for different names
-        import cv2
-        templates = {}
-        for name in [Screen.MAP, Screen.BATTLE_LIST, Screen.ALLIANCE_QUEST, Screen.TROOP_DETAIL,
-                      Screen.TERRITORY, Screen.WAR, Screen.PROFILE, Screen.ALLIANCE]:
-            templates[f"elements/{name}.png"] = np.zeros((10, 10, 3), dtype=np.uint8)
-        templates["elements/attention.png"] = np.zeros((10, 10, 3), dtype=np.uint8)
-        mock_template.side_effect = lambda path: templates.get(path)
-
-        # Mock matchTemplate to return high score for war_screen, low for others
-        original_match = cv2.matchTemplate
-
-        def fake_match(img, tpl, method):
-            result = np.zeros((img.shape[0] - tpl.shape[0] + 1,
-                               img.shape[1] - tpl.shape[1] + 1), dtype=np.float32)
-            return result
-
-        with patch("navigation.cv2.matchTemplate", side_effect=fake_match):
-            with patch("navigation.cv2.minMaxLoc") as mock_minmax:
-                # attention template: low
-                # screen templates: return different scores
-                # We need to control the sequence of minMaxLoc calls:
-                # 1st call: attention template → low
-                # Then for each screen template in order
-                mock_minmax.side_effect = [
-                    (0, 0.1, (0, 0), (0, 0)),  # attention
-                    (0, 0.5, (0, 0), (0, 0)),  # map_screen
-                    (0, 0.3, (0, 0), (0, 0)),  # bl_screen
-                    (0, 0.85, (0, 0), (0, 0)), # aq_screen ← winner
-                    (0, 0.2, (0, 0), (0, 0)),  # td_screen
-                    (0, 0.1, (0, 0), (0, 0)),  # territory_screen
-                    (0, 0.4, (0, 0), (0, 0)),  # war_screen
-                    (0, 0.1, (0, 0), (0, 0)),  # profile_screen
-                    (0, 0.1, (0, 0), (0, 0)),  # alliance_screen
-                ]
-                result = check_screen("dev1")
+        with patch("navigation.stats") as mock_stats:
+            result = check_screen("dev1")
 
         assert result == Screen.ALLIANCE_QUEST
+        name, cx, cy, conf = mock_stats.record_template_hit.call_args[0][1:]
+        assert name == f"{Screen.ALLIANCE_QUEST}.png"
+        assert (cx, cy) == (w // 2, 381 + h // 2)
+        assert conf > 0.99
+        mock_tap.assert_not_called()
 
     @patch("navigation.get_template")
     @patch("navigation.load_screenshot")
@@ -68,22 +59,65 @@ class TestCheckScreen:
         mock_screenshot.return_value = None
         assert check_screen("dev1") == Screen.UNKNOWN
 
+    @patch("navigation._save_debug_screenshot")
     @patch("navigation.adb_tap")
-    @patch("navigation.get_template")
     @patch("navigation.load_screenshot")
-    def test_all_below_threshold_returns_unknown(self, mock_screenshot, mock_template, mock_tap):
-        screen = np.zeros((1920, 1080, 3), dtype=np.uint8)
+    def test_all_below_threshold_returns_unknown(self, mock_screenshot, mock_tap, mock_save):
+        mock_screenshot.return_value = _noise_screen()
+        assert check_screen("dev1") == Screen.UNKNOWN
+        mock_tap.assert_not_called()
+        mock_save.assert_called_once()
+
+    @patch("navigation.adb_tap")
+    @patch("navigation.load_screenshot")
+    def test_attention_popup_means_logged_out(self, mock_screenshot, mock_tap):
+        screen = _noise_screen()
+        att = _element("attention")
+        h, w = att.shape[:2]
+        screen[800:800 + h, 100:100 + w] = att
         mock_screenshot.return_value = screen
-        mock_template.return_value = np.zeros((10, 10, 3), dtype=np.uint8)
+        assert check_screen("dev1") == Screen.LOGGED_OUT
 
-        import cv2
-        with patch("navigation.cv2.matchTemplate") as mock_match:
-            result_arr = np.zeros((1911, 1071), dtype=np.float32)
-            mock_match.return_value = result_arr
-            with patch("navigation.cv2.minMaxLoc", return_value=(0, 0.3, (0, 0), (0, 0))):
-                result = check_screen("dev1")
+    @patch("navigation._save_debug_screenshot")
+    @patch("navigation.timed_wait")
+    @patch("navigation.adb_tap")
+    @patch("navigation.load_screenshot")
+    def test_close_x_dismissed_off_map(self, mock_screenshot, mock_tap, mock_wait, mock_save):
+        screen = _noise_screen()
+        x = _element("close_x")
+        h, w = x.shape[:2]
+        screen[100:100 + h, 900:900 + w] = x
+        mock_screenshot.side_effect = [screen, _noise_screen(1)]
+        check_screen("dev1")
+        mock_tap.assert_called_once_with("dev1", 900 + w // 2, 100 + h // 2)
+        assert mock_wait.call_args[0][2:] == (1.5, "soft_popup_dismiss")
 
-        assert result == Screen.UNKNOWN
+    @patch("navigation._save_debug_screenshot")
+    @patch("navigation.timed_wait")
+    @patch("navigation.adb_tap")
+    @patch("navigation.load_screenshot")
+    def test_quit_dialog_dismissed_with_own_wait_label(self, mock_screenshot, mock_tap, mock_wait, mock_save):
+        screen = _noise_screen()
+        cancel = _element("cancel")
+        h, w = cancel.shape[:2]
+        screen[900:900 + h, 400:400 + w] = cancel
+        mock_screenshot.side_effect = [screen, _noise_screen(1)]
+        check_screen("dev1")
+        mock_tap.assert_called_once_with("dev1", 400 + w // 2, 900 + h // 2)
+        assert mock_wait.call_args_list[0][0][2:] == (1.5, "critical_popup_dismiss")
+
+    @patch("navigation.timed_wait")
+    @patch("navigation.adb_tap")
+    @patch("navigation.load_screenshot")
+    def test_map_popup_dismissed_with_own_wait_label(self, mock_screenshot, mock_tap, mock_wait):
+        screen = _noise_screen()
+        x = _element("close_x")
+        h, w = x.shape[:2]
+        screen[100:100 + h, 900:900 + w] = x
+        mock_screenshot.return_value = screen
+        assert _try_clear_map_popup("dev1") is True
+        mock_wait.assert_called_once()
+        assert mock_wait.call_args[0][2:] == (1.0, "map_popup_dismiss")
 
 
 # ============================================================
@@ -0,0 +1,103 @@
+"""Tests for the out-of-process OCR worker pool (ocr_pool.py).
+
+Workers are real spawned subprocesses; the reader factories below stand in
+for EasyOCR and must live at module level so the workers can import them.
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import vision
+from ocr_pool import OcrPool
+
+
+class _SumReader:
+    """readtext() answers with the crop's pixel sum — proves the bytes arrived."""
+
+    def readtext(self, image, allowlist=None, detail=0):
+        if allowlist == "boom":
+            raise ValueError("bad crop")
+        if allowlist == "grow":
+            self.hog = bytearray(300 * 1024 * 1024)
+            self.hog[::4096] = b"x" * len(self.hog[::4096])
+        text = str(int(image.astype(np.int64).sum()))
+        if detail == 0:
+            return [text]
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], text, 0.99)]
+
+
+def sum_reader():
+    return _SumReader()
+
+
+@pytest.fixture
+def pool():
+    p = OcrPool(2, max_worker_mb=200, reader_factory=sum_reader)
+    yield p
+    p.close()
+
+
+class TestOcrPool:
+    def test_reads_through_shared_memory(self, pool):
+        img = np.full((40, 120), 3, dtype=np.uint8)
+        assert pool.read(img) == [str(40 * 120 * 3)]
+        assert pool.read(img, detail=1)[0][1:] == (str(40 * 120 * 3), 0.99)
+
+    def test_buffer_grows_for_large_crop(self, pool):
+        img = np.ones((1200, 1080, 3), dtype=np.uint8)
+        assert pool.read(img) == [str(img.size)]
+        assert pool.read(np.ones((2, 2), np.uint8)) == ["4"]
+
+    def test_reader_error_raises_and_keeps_worker(self, pool):
+        pids = {w["pid"] for w in pool.status()}
+        with pytest.raises(RuntimeError, match="bad crop"):
+            pool.read(np.zeros((5, 5), np.uint8), allowlist="boom")
+        assert {w["pid"] for w in pool.status()} == pids
+        assert pool.read(np.ones((5, 5), np.uint8)) == ["25"]
+
+    def test_worker_over_memory_ceiling_is_restarted(self, pool):
+        before = {w["pid"] for w in pool.status()}
+        assert pool.read(np.ones((3, 3), np.uint8), allowlist="grow") == ["9"]
+        status = pool.status()
+        assert sum(w["restarts"] for w in status) == 1
+        assert {w["pid"] for w in status} != before
+        # The replacement serves requests normally
+        for _ in range(3):
+            assert pool.read(np.ones((3, 3), np.uint8)) == ["9"]
+
+    def test_dead_worker_is_replaced(self):
+        p = OcrPool(1, max_worker_mb=500, reader_factory=sum_reader)
+        try:
+            p.read(np.ones((2, 2), np.uint8))
+            p._workers[0].process.kill()
+            p._workers[0].process.join()
+            with pytest.raises(RuntimeError, match="OCR worker failed"):
+                p.read(np.ones((2, 2), np.uint8))
+            assert p.status()[0]["restarts"] == 1
+            assert p.read(np.ones((2, 2), np.uint8)) == ["4"]
+        finally:
+            p.close()
+
+    def test_closed_pool_refuses_requests(self):
+        p = OcrPool(1, max_worker_mb=500, reader_factory=sum_reader)
+        p.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            p.read(np.ones((2, 2), np.uint8))
+
+
+class TestOcrReadWithPool:
+    def test_ocr_read_is_a_pool_client(self):
+        test_pool = OcrPool(1, max_worker_mb=500, reader_factory=sum_reader)
+        try:
+            with patch("vision._USE_APPLE_VISION", False), \
+                 patch("vision._get_ocr_pool", return_value=test_pool), \
+                 patch("vision._get_ocr_reader") as in_process:
+                assert vision.ocr_read(np.ones((4, 4), np.uint8), device="dev1") == ["16"]
+            in_process.assert_not_called()
+        finally:
+            test_pool.close()
+
+    def test_pool_disabled_by_default(self):
+        assert vision._get_ocr_pool() is None
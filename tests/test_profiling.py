@@ -0,0 +1,145 @@
+"""Tests for opt-in hot-path profiling (profiling.py)."""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+import profiling
+from profiling import span
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    profiling.reset()
+    profiling.set_enabled(True)
+    with patch("profiling.time.perf_counter", fake):
+        yield fake
+    profiling.set_enabled(False)
+    profiling.reset()
+
+
+@span("capture")
+def _capture(device, clock, spend):
+    clock.now += spend
+
+
+@span("match", detail="image_name")
+def _match(screen, image_name, clock=None, spend=0.0, device=None):
+    clock.now += spend
+    _capture(device, clock, 0.03)
+
+
+class TestRecording:
+    def test_disabled_records_nothing(self):
+        profiling.reset()
+        _capture("dev1", FakeClock(), 0.1)
+        with profiling.action("dev1", "rally"):
+            pass
+        assert profiling.breakdown() == []
+        assert profiling.chrome_trace()["traceEvents"] == []
+
+    def test_self_time_breakdown_adds_up(self, clock):
+        with profiling.action("dev1", "rally"):
+            clock.now += 0.01                      # action's own work
+            _match(None, "join.png", clock=clock, spend=0.02)
+            _capture("dev1", clock, 0.05)
+        [row] = profiling.breakdown()
+        assert row["action"] == "rally" and row["count"] == 1
+        assert row["total_s"] == pytest.approx(0.11)
+        spans = {s["name"]: s for s in row["spans"]}
+        assert spans["capture"]["self_s"] == pytest.approx(0.08)
+        assert spans["capture"]["count"] == 2
+        assert spans["match"]["self_s"] == pytest.approx(0.02)
+        assert spans["other"]["self_s"] == pytest.approx(0.01)
+        assert sum(s["pct"] for s in row["spans"]) == pytest.approx(100, abs=0.5)
+
+    def test_device_from_argument_or_enclosing_frame(self, clock):
+        with profiling.action("dev2", "heal"):
+            _match(None, "heal.png", clock=clock)           # no device -> dev2
+        _match(None, "x.png", clock=clock, device="dev3")   # outside any action
+        rows = {(r["device"], r["action"]) for r in profiling.breakdown()}
+        assert rows == {("dev2", "heal"), ("dev3", profiling.NO_ACTION)}
+
+    def test_per_thread_stacks(self, clock):
+        import threading
+        t = threading.Thread(target=_capture, args=("dev4", clock, 0.0))
+        with profiling.action("dev1", "rally"):
+            t.start()
+            t.join()
+        assert {(r["device"], r["action"]) for r in profiling.breakdown()} == {
+            ("dev1", "rally"), ("dev4", profiling.NO_ACTION)}
+
+
+class TestExports:
+    def test_chrome_trace(self, clock):
+        with profiling.action("dev1", "rally"):
+            _match(None, "join.png", clock=clock, spend=0.02)
+        trace = profiling.chrome_trace()
+        events = trace["traceEvents"]
+        assert events[0] == {"name": "process_name", "ph": "M", "pid": 1,
+                             "args": {"name": "dev1"}}
+        spans = {e["name"]: e for e in events if e["ph"] == "X"}
+        assert set(spans) == {"rally", "match", "capture"}
+        assert spans["match"]["args"] == {"action": "rally", "detail": "join.png"}
+        assert spans["match"]["dur"] == pytest.approx(50000)
+        assert spans["rally"]["cat"] == "action"
+        assert profiling.chrome_trace(device="other")["traceEvents"] == []
+
+    def test_collapsed_stacks(self, clock):
+        with profiling.action("dev1", "rally"):
+            _match(None, "join.png", clock=clock, spend=0.02)
+        lines = profiling.collapsed_stacks().splitlines()
+        assert lines == ["dev1;rally;match 20000", "dev1;rally;match;capture 30000"]
+
+
+class TestIntegration:
+    def test_timed_action_tags_hot_path_spans(self, clock, mock_device):
+        from botlog import StatsTracker, timed_action
+        from vision import timed_wait
+
+        @timed_action("open_menu")
+        def open_menu(device):
+            return timed_wait(device, lambda: True, 1.0, "menu_open")
+
+        with patch("botlog.stats", StatsTracker()), \
+                patch("vision.stats", StatsTracker()), patch("budgets.stats", StatsTracker()):
+            assert open_menu(mock_device)
+        [row] = profiling.breakdown(device=mock_device)
+        assert row["action"] == "open_menu"
+        assert "timed_wait" in [s["name"] for s in row["spans"]]
+        events = profiling.chrome_trace()["traceEvents"]
+        assert any(e["name"] == "timed_wait" and e["args"]["detail"] == "menu_open"
+                   for e in events)
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_disabled_overhead_near_zero(self):
+        profiling.set_enabled(False)
+
+        def raw(device, x):
+            return x
+
+        wrapped = span("raw")(raw)
+        n = 200_000
+        t0 = time.perf_counter()
+        for i in range(n):
+            raw("dev1", i)
+        raw_ns = (time.perf_counter() - t0) * 1e9 / n
+        t0 = time.perf_counter()
+        for i in range(n):
+            wrapped("dev1", i)
+        wrapped_ns = (time.perf_counter() - t0) * 1e9 / n
+
+        print(f"\nspan wrapper, profiling disabled: {wrapped_ns - raw_ns:.0f} ns/call overhead")
+        assert wrapped_ns - raw_ns < 1000
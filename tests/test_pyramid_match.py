@@ -0,0 +1,263 @@
+"""Tests for coarse-to-fine pyramid template matching
+(screen_classifier.PyramidTemplate, used by vision.find_image /
+find_all_matches / tap_image).
+
+Frames are real screenshots from debug/failures when any are present, plus
+synthetic frames (blurred noise with elements/ templates pasted in) so the
+suite runs without an emulator.
+"""
+
+import os
+import random
+import time
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+
+from screen_classifier import PyramidTemplate, tune_min_scale
+import vision
+from vision import find_image, find_all_matches
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ELEMENTS_DIR = os.path.join(ROOT, "elements")
+FAILURES_DIR = os.path.join(ROOT, "debug", "failures")
+
+
+def _templates():
+    out = {}
+    for dirpath, _, files in os.walk(ELEMENTS_DIR):
+        for f in sorted(files):
+            if f.endswith(".png"):
+                img = cv2.imread(os.path.join(dirpath, f))
+                if img is not None and img.shape[0] < 1920 and img.shape[1] < 1080:
+                    out[os.path.relpath(os.path.join(dirpath, f), ELEMENTS_DIR)] = img
+    return out
+
+
+TEMPLATES = _templates()
+PYRAMID_NAMES = [n for n, t in TEMPLATES.items() if PyramidTemplate(t).scale < 1.0]
+
+
+def _background(seed=0):
+    rng = np.random.default_rng(seed)
+    screen = rng.integers(0, 256, (1920, 1080, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(screen, (7, 7), 0)
+
+
+def _paste(screen, tpl, x, y):
+    h, w = tpl.shape[:2]
+    screen[y:y + h, x:x + w] = tpl
+    return screen
+
+
+def _frame_with(name, seed):
+    tpl = TEMPLATES[name]
+    rng = random.Random(seed)
+    x = rng.randint(0, 1080 - tpl.shape[1])
+    y = rng.randint(0, 1920 - tpl.shape[0])
+    return _paste(_background(seed), tpl, x, y), (x, y)
+
+
+def _collage(seed, skip=None, extra=None):
+    """Noise with about half of the templates (and ``extra``) pasted at random."""
+    rng = random.Random(seed)
+    screen = _background(seed)
+    for name in sorted(TEMPLATES):
+        tpl = TEMPLATES[name]
+        if name == skip or rng.random() < 0.5:
+            continue
+        _paste(screen, tpl, rng.randint(0, 1080 - tpl.shape[1]), rng.randint(0, 1920 - tpl.shape[0]))
+    if extra is not None:
+        _paste(screen, extra, rng.randint(0, 1080 - extra.shape[1]),
+               rng.randint(0, 1920 - extra.shape[0]))
+    return screen
+
+
+def _full_search(screen, tpl):
+    result = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
+    _, val, _, loc = cv2.minMaxLoc(result)
+    return val, loc
+
+
+def _saved_screens():
+    if not os.path.isdir(FAILURES_DIR):
+        return []
+    files = sorted(f for f in os.listdir(FAILURES_DIR) if f.endswith(".png"))[:20]
+    screens = [cv2.imread(os.path.join(FAILURES_DIR, f)) for f in files]
+    return [s for s in screens if s is not None and s.shape[:2] == (1920, 1080)]
+
+
+# ============================================================
+# Accuracy
+# ============================================================
+
+class TestPyramidTemplate:
+    def test_most_templates_use_a_coarse_level(self):
+        assert len(PYRAMID_NAMES) >= len(TEMPLATES) // 2
+
+    @pytest.mark.parametrize("name", PYRAMID_NAMES)
+    def test_finds_pasted_template(self, name):
+        screen, (x, y) = _frame_with(name, seed=len(name))
+        val, loc = PyramidTemplate(TEMPLATES[name]).match(screen, 0.8)
+        assert loc == (x, y)
+        assert val > 0.99
+
+    def test_absent_template_scores_low(self):
+        name = PYRAMID_NAMES[0]
+        val, _ = PyramidTemplate(TEMPLATES[name]).match(_background(1), 0.8)
+        assert val < 0.8
+
+    def test_region_limits_search(self):
+        name = PYRAMID_NAMES[0]
+        tpl = TEMPLATES[name]
+        screen = _paste(_background(2), tpl, 20, 20)
+        val, loc = PyramidTemplate(tpl).match(screen, 0.8, region=(0, 960, 1080, 1920))
+        assert val < 0.8
+        val, loc = PyramidTemplate(tpl).match(screen, 0.8, region=(0, 0, 540, 960))
+        assert loc == (20, 20)
+
+    def test_find_all_equals_full_threshold(self):
+        name = PYRAMID_NAMES[0]
+        tpl = TEMPLATES[name]
+        screen = _background(3)
+        for x, y in ((10, 10), (500, 700), (10, 1500)):
+            _paste(screen, tpl, x, y)
+        result = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
+        ys, xs = np.where(result >= 0.8)
+        legacy = sorted(zip(xs.tolist(), ys.tolist()), key=lambda p: (p[1], p[0]))
+        assert PyramidTemplate(tpl).find_all(screen, 0.8) == legacy
+
+    def test_min_scale_override_pins_level(self):
+        tpl = TEMPLATES[PYRAMID_NAMES[0]]
+        assert PyramidTemplate(tpl, min_scale=1.0).scale == 1.0
+        assert PyramidTemplate(tpl, min_scale=0.5).scale in (0.5, 1.0)
+
+    def test_tune_min_scale(self):
+        name = PYRAMID_NAMES[0]
+        screens = [_frame_with(name, seed)[0] for seed in range(3)] + [_background(9)]
+        scale = tune_min_scale(TEMPLATES[name], screens)
+        assert scale in (0.25, 0.5, 1.0)
+        pt = PyramidTemplate(TEMPLATES[name], min_scale=scale)
+        for screen in screens[:3]:
+            assert pt.match(screen, 0.8)[1] == _full_search(screen, TEMPLATES[name])[1]
+
+
+class TestVisionIntegration:
+    @patch("vision.get_template")
+    def test_pyramid_off_by_default(self, mock_get):
+        name = PYRAMID_NAMES[0]
+        tpl = TEMPLATES[name]
+        mock_get.return_value = tpl
+        screen = _paste(_background(4), tpl, 300, 1200)
+        with patch("vision.PyramidTemplate.match") as pyramid:
+            max_val, loc, h, w = find_image(screen, name)
+        pyramid.assert_not_called()
+        assert loc == (300, 1200)
+
+    @patch("vision.config.PYRAMID_MATCHING", True)
+    @patch("vision.get_template")
+    def test_find_image_uses_pyramid_result(self, mock_get):
+        name = PYRAMID_NAMES[0]
+        tpl = TEMPLATES[name]
+        mock_get.return_value = tpl
+        screen = _paste(_background(4), tpl, 300, 1200)
+        with patch("vision.cv2.matchTemplate", wraps=cv2.matchTemplate) as spy:
+            max_val, loc, h, w = find_image(screen, name)
+        assert loc == (300, 1200)
+        assert max_val > 0.99
+        # No full-resolution full-screen match was run
+        assert all(call[0][0].shape[:2] != (1920, 1080) for call in spy.call_args_list)
+
+    @patch("vision.config.PYRAMID_MATCHING", True)
+    @patch("vision.get_template")
+    def test_tuned_templates_match_at_full_resolution(self, mock_get):
+        for name, scale in vision.PYRAMID_MIN_SCALE.items():
+            tpl = TEMPLATES[name]
+            mock_get.return_value = tpl
+            screen = _paste(_background(6), tpl, 500, 700)
+            with patch("vision.PyramidTemplate.match") as pyramid:
+                max_val, loc, h, w = find_image(screen, name)
+            if scale == 1.0:
+                pyramid.assert_not_called()
+                assert loc == (500, 700)
+
+    @patch("vision.get_template")
+    def test_find_all_matches_through_pyramid(self, mock_get):
+        name = PYRAMID_NAMES[0]
+        tpl = TEMPLATES[name]
+        mock_get.return_value = tpl
+        screen = _background(5)
+        _paste(screen, tpl, 50, 100)
+        _paste(screen, tpl, 600, 1400)
+        legacy = find_all_matches(screen, name)
+        with patch("vision.config.PYRAMID_MATCHING", True):
+            assert find_all_matches(screen, name) == legacy
+        assert len(legacy) == 2
+
+
+# ============================================================
+# Benchmark — elements/ templates, full search vs pyramid
+# ============================================================
+
+def _compare_with_full_search():
+    """Full search vs pyramid over saved (else synthetic) screens.
+
+    Returns (source, screens, full_ms, fast_ms, agree, total).
+    """
+    screens = _saved_screens()
+    source = f"{len(screens)} debug/failures screenshots"
+    if not screens:
+        screens = [_frame_with(name, seed=i)[0]
+                   for i, name in enumerate(PYRAMID_NAMES[:2])]
+        source = f"{len(screens)} synthetic frames"
+    names = PYRAMID_NAMES[::max(1, len(PYRAMID_NAMES) // 12)]
+    pyramids = {n: PyramidTemplate(TEMPLATES[n]) for n in names}
+
+    t0 = time.perf_counter()
+    full = {(i, n): _full_search(s, TEMPLATES[n])
+            for i, s in enumerate(screens) for n in names}
+    full_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    fast = {(i, n): pyramids[n].match(s, 0.8)
+            for i, s in enumerate(screens) for n in names}
+    fast_ms = (time.perf_counter() - t0) * 1000
+
+    agree = sum((full[k][0] > 0.8) == (fast[k][0] > 0.8) and
+                (full[k][0] <= 0.8 or full[k][1] == fast[k][1]) for k in full)
+    return source, screens, full_ms, fast_ms, agree, len(full)
+
+
+class TestAgreement:
+    def test_agrees_with_full_search(self):
+        _, _, _, _, agree, total = _compare_with_full_search()
+        # Real screenshots may hold near-threshold look-alikes; a disagreement
+        # there means the template needs a PYRAMID_MIN_SCALE entry.
+        assert agree >= (0.95 if _saved_screens() else 1.0) * total
+
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_faster_than_full_search(self):
+        source, screens, full_ms, fast_ms, agree, total = _compare_with_full_search()
+        print(f"\nfind_image over {total // len(screens)} templates x {source}: "
+              f"full {full_ms / len(screens):.0f} ms/frame, "
+              f"pyramid {fast_ms / len(screens):.0f} ms/frame "
+              f"({full_ms / fast_ms:.1f}x), agreement {agree}/{total}")
+        assert fast_ms * 3 < full_ms
+
+    def test_min_scale_table(self):
+        """Small templates whose tuned scale is finer than the automatic one
+        must be pinned in vision.PYRAMID_MIN_SCALE.  Frames are saved
+        screenshots, else every template pasted at random onto noise."""
+        names = [n for n in PYRAMID_NAMES if min(TEMPLATES[n].shape[:2]) <= 60]
+        saved = _saved_screens()
+        for name in names:
+            tpl = TEMPLATES[name]
+            screens = saved or [_collage(200 + i, skip=name, extra=tpl if i % 2 else None)
+                                for i in range(20)]
+            tuned = tune_min_scale(tpl, screens)
+            if tuned > PyramidTemplate(tpl).scale:
+                assert vision.PYRAMID_MIN_SCALE.get(name, 0) >= tuned, name
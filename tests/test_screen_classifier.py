@@ -0,0 +1,260 @@
+"""Tests for the batched screen classifier (screen_classifier.py).
+
+Frames are synthetic: a blurred-noise background with real elements/
+templates pasted in, so scores are comparable to live screenshots without
+needing an emulator.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import config
+import navigation
+from config import Screen
+from navigation import SCREEN_TEMPLATES, SCREEN_REGIONS
+from screen_classifier import ScreenClassifier
+
+ELEMENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "elements")
+FAILURES_DIR = os.path.join(os.path.dirname(ELEMENTS_DIR), "debug", "failures")
+
+# Where each screen marker sits on a real 1080x1920 screenshot (top-left).
+PLACEMENTS = {
+    Screen.MAP:            (760, 1820),
+    Screen.BATTLE_LIST:    (163, 732),
+    Screen.ALLIANCE_QUEST: (0, 381),
+    Screen.TROOP_DETAIL:   (0, 1760),
+    Screen.TERRITORY:      (40, 40),
+    Screen.WAR:            (82, 20),
+    Screen.PROFILE:        (40, 1000),
+    Screen.ALLIANCE:       (37, 1144),
+    Screen.KINGDOM:        (5, 1840),
+}
+POPUPS = [("elements/attention.png", 0.8), ("elements/cancel.png", 0.8),
+          ("elements/close_x.png", 0.85)]
+
+
+def _load(path):
+    return cv2.imread(os.path.join(os.path.dirname(ELEMENTS_DIR), path))
+
+
+def _entries():
+    entries = [(path, _load(path), None, thr, "popup") for path, thr in POPUPS]
+    for name in SCREEN_TEMPLATES:
+        entries.append((name, _load(f"elements/{name}.png"),
+                        SCREEN_REGIONS.get(name), 0.8, "screen"))
+    return entries
+
+
+def _background(seed=0):
+    rng = np.random.default_rng(seed)
+    screen = rng.integers(0, 256, (1920, 1080, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(screen, (7, 7), 0)
+
+
+def _paste(screen, tpl, x, y):
+    h, w = tpl.shape[:2]
+    h, w = min(h, screen.shape[0] - y), min(w, screen.shape[1] - x)
+    screen[y:y + h, x:x + w] = tpl[:h, :w]
+    return screen
+
+
+def _frame_for(name, seed=0):
+    x, y = PLACEMENTS[name]
+    return _paste(_background(seed), _load(f"elements/{name}.png"), x, y)
+
+
+def _legacy_scores(frame, entries):
+    """The pre-classifier check_screen loop: one full match per template."""
+    scores = {}
+    for name, tpl, region, _, _ in entries:
+        if region:
+            rx1, ry1, rx2, ry2 = region
+            area = frame[ry1:ry2, rx1:rx2]
+        else:
+            area = frame
+        result = cv2.matchTemplate(area, tpl, cv2.TM_CCOEFF_NORMED)
+        scores[name] = cv2.minMaxLoc(result)[1]
+    return scores
+
+
+def _best_match(area, tpl):
+    result = cv2.matchTemplate(area, tpl, cv2.TM_CCOEFF_NORMED)
+    _, val, _, loc = cv2.minMaxLoc(result)
+    return val, loc
+
+
+def _legacy_check_screen(frames):
+    """The pre-classifier check_screen decision, minus logging and taps.
+    ``frames`` yields the first screenshot, then one per popup dismiss."""
+    screen = next(frames)
+    if _best_match(screen, _load("elements/attention.png"))[0] > 0.8:
+        return Screen.LOGGED_OUT
+    if _best_match(screen, _load("elements/cancel.png"))[0] > 0.8:
+        screen = next(frames)
+
+    best_name, best_val = None, 0.0
+    for name, val in _legacy_scores(screen, _entries()[len(POPUPS):]).items():
+        if val > best_val:
+            best_name, best_val = name, val
+    identified = best_name if best_val > 0.8 else None
+
+    if identified != Screen.MAP and _best_match(screen, _load("elements/close_x.png"))[0] > 0.85:
+        screen = next(frames)
+        for name, val in _legacy_scores(screen, _entries()[len(POPUPS):]).items():
+            if val > 0.8:
+                return name
+    return identified or Screen.UNKNOWN
+
+
+def _saved_screens():
+    if not os.path.isdir(FAILURES_DIR):
+        return []
+    files = sorted(f for f in os.listdir(FAILURES_DIR) if f.endswith(".png"))[:20]
+    screens = [cv2.imread(os.path.join(FAILURES_DIR, f)) for f in files]
+    return [s for s in screens if s is not None and s.shape[:2] == (1920, 1080)]
+
+
+def _popup_cases():
+    """(label, frames) pairs covering every branch of check_screen."""
+    war_x = _paste(_frame_for(Screen.WAR), _load("elements/close_x.png"), 900, 300)
+    map_x = _paste(_frame_for(Screen.MAP), _load("elements/close_x.png"), 900, 300)
+    quit_dialog = _paste(_background(1), _load("elements/cancel.png"), 400, 900)
+    logged_out = _paste(_frame_for(Screen.MAP), _load("elements/attention.png"), 340, 900)
+    return [
+        ("blank", [_background()]),
+        ("soft_popup", [war_x, _frame_for(Screen.ALLIANCE)]),
+        ("soft_popup_on_map", [map_x]),
+        ("soft_popup_unknown_after", [war_x, _background(2)]),
+        ("critical_popup", [quit_dialog, _frame_for(Screen.KINGDOM)]),
+        ("logged_out", [logged_out]),
+    ] + [(name, [_frame_for(name)]) for name in PLACEMENTS]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return ScreenClassifier(_entries())
+
+
+# ============================================================
+# Accuracy
+# ============================================================
+
+class TestClassify:
+    @pytest.mark.parametrize("name", list(PLACEMENTS))
+    def test_identifies_each_screen(self, classifier, name):
+        result = classifier.classify(_frame_for(name))
+        best, val = result.best(SCREEN_TEMPLATES, refined_only=True)
+        assert best == name
+        assert val > 0.95
+
+    def test_blank_frame_identifies_nothing(self, classifier):
+        result = classifier.classify(_background())
+        best, val = result.best(SCREEN_TEMPLATES, refined_only=True)
+        assert best is None or val < 0.8
+
+    def test_refined_score_matches_full_search(self, classifier):
+        """Refined scores must equal the full-resolution full-frame match."""
+        frame = _frame_for(Screen.WAR)
+        _paste(frame, _load("elements/close_x.png"), 900, 100)
+        result = classifier.classify(frame)
+        legacy = _legacy_scores(frame, _entries())
+        for name in (Screen.WAR, "elements/close_x.png"):
+            assert name in result.refined
+            assert result.score(name) == pytest.approx(legacy[name], abs=1e-4)
+
+    def test_popup_center_is_full_frame(self, classifier):
+        tpl = _load("elements/close_x.png")
+        h, w = tpl.shape[:2]
+        frame = _paste(_background(), tpl, 900, 100)
+        result = classifier.classify(frame, names=["elements/close_x.png"])
+        assert result.center("elements/close_x.png") == (900 + w // 2, 100 + h // 2)
+
+    def test_failed_refine_keeps_score_unrefined(self, classifier, monkeypatch):
+        """A popup whose full-resolution pass finds no window must not count as refined."""
+        from screen_classifier import _Entry
+        frame = _paste(_background(), _load("elements/close_x.png"), 900, 100)
+        monkeypatch.setattr(_Entry, "refine", lambda self, *a, **kw: (-1.0, (0, 0)))
+        result = classifier.classify(frame, names=["elements/close_x.png"])
+        assert "elements/close_x.png" not in result.refined
+        assert result.score("elements/close_x.png") > 0.5   # coarse score kept
+
+    def test_names_restricts_work(self, classifier):
+        result = classifier.classify(_frame_for(Screen.MAP), names=[Screen.MAP])
+        assert set(result.scores) == {Screen.MAP}
+        assert not result.fell_back
+
+    def test_pyramid_miss_falls_back_to_full_search(self, classifier, monkeypatch):
+        """A screen the fine pass can't confirm is still found by the full search."""
+        from screen_classifier import _Entry
+        monkeypatch.setattr(_Entry, "refine", lambda self, *a, **kw: (-1.0, (0, 0)))
+        result = classifier.classify(_frame_for(Screen.WAR))
+        assert result.fell_back
+        assert result.best(SCREEN_TEMPLATES, refined_only=True)[0] == Screen.WAR
+
+
+# ============================================================
+# check_screen vs the pre-classifier per-template loop
+# ============================================================
+
+@pytest.fixture(params=[False, True], ids=["full_search", "pyramid"])
+def check_screen_frames(request, monkeypatch):
+    """Drive navigation.check_screen from a frame list with both
+    PYRAMID_CHECK_SCREEN settings; taps and waits are no-ops."""
+    monkeypatch.setattr(config, "PYRAMID_CHECK_SCREEN", request.param)
+    monkeypatch.setattr(config, "SCREEN_MATCH_THRESHOLD", 0.8)
+    monkeypatch.setattr(config, "running_tasks", {})
+    monkeypatch.setattr(navigation, "adb_tap", lambda *a: None)
+    monkeypatch.setattr(navigation, "_wait_popup_gone", lambda *a: None)
+    monkeypatch.setattr(navigation, "_save_debug_screenshot", lambda *a: None)
+    monkeypatch.setattr(navigation.stats, "record_template_hit", lambda *a: None)
+
+    def run(frames):
+        rest = iter(frames[1:])
+        monkeypatch.setattr(navigation, "load_screenshot", lambda device: next(rest, None))
+        return navigation.check_screen("dev1", frames[0])
+    return run
+
+
+class TestCheckScreenMatchesLegacy:
+    @pytest.mark.parametrize("label,frames", _popup_cases(), ids=lambda c: c if isinstance(c, str) else "")
+    def test_synthetic_frames(self, check_screen_frames, label, frames):
+        assert check_screen_frames(frames) == _legacy_check_screen(iter(frames))
+
+    def test_saved_screenshots(self, check_screen_frames):
+        """Real screenshots from debug/failures, each standing in for its
+        own post-dismiss frame."""
+        screens = _saved_screens()
+        if not screens:
+            pytest.skip("no 1080x1920 screenshots in debug/failures")
+        for i, screen in enumerate(screens):
+            frames = [screen, screen]
+            assert check_screen_frames(frames) == _legacy_check_screen(iter(frames)), i
+
+
+# ============================================================
+# Benchmark — classifier vs per-template full matching
+# ============================================================
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_faster_than_legacy_loop(self, classifier):
+        entries = _entries()
+        frames = [_frame_for(name, seed=i) for i, name in enumerate(PLACEMENTS)]
+
+        t0 = time.perf_counter()
+        for frame in frames:
+            _legacy_scores(frame, entries)
+        legacy_ms = (time.perf_counter() - t0) * 1000 / len(frames)
+
+        t0 = time.perf_counter()
+        for frame in frames:
+            classifier.classify(frame)
+        batched_ms = (time.perf_counter() - t0) * 1000 / len(frames)
+
+        print(f"\ncheck_screen matching: legacy {legacy_ms:.1f} ms/frame, "
+              f"classifier {batched_ms:.1f} ms/frame ({legacy_ms / batched_ms:.1f}x)")
+        assert batched_ms * 3 < legacy_ms
@@ -0,0 +1,104 @@
+"""Tests for state_store.py — versioned dashboard state and its publish hooks."""
+
+import threading
+import time
+
+import config
+import state_store
+from state_store import StateStore
+
+
+class TestStateStore:
+    def test_set_bumps_version(self):
+        s = StateStore()
+        assert s.set(("devices", "d1", "status"), "Idle") is True
+        assert s.version == 1
+        assert s.get(("devices", "d1", "status")) == "Idle"
+
+    def test_equal_value_is_noop(self):
+        s = StateStore()
+        s.set(("tunnel",), "connected")
+        assert s.set(("tunnel",), "connected") is False
+        assert s.version == 1
+
+    def test_changes_since_nests_paths(self):
+        s = StateStore()
+        s.set(("devices", "d1", "status"), "Idle")
+        s.set(("tasks", "d1_auto_quest"), True)
+        version, changes = s.changes_since(0)
+        assert version == 2
+        assert changes == {"devices": {"d1": {"status": "Idle"}},
+                           "tasks": {"d1_auto_quest": True}}
+
+    def test_changes_since_only_newer(self):
+        s = StateStore()
+        s.set(("devices", "d1", "status"), "Idle")
+        v1 = s.version
+        s.set(("devices", "d1", "status"), "Questing...")
+        s.set(("devices", "d2", "status"), "Idle")
+        _, changes = s.changes_since(v1)
+        assert changes == {"devices": {"d1": {"status": "Questing..."},
+                                       "d2": {"status": "Idle"}}}
+        assert s.changes_since(s.version)[1] == {}
+
+    def test_delete_reported_as_none(self):
+        s = StateStore()
+        s.set(("tasks", "d1_auto_quest"), True)
+        v1 = s.version
+        assert s.delete(("tasks", "d1_auto_quest")) is True
+        assert s.delete(("tasks", "d1_auto_quest")) is False
+        assert s.changes_since(v1)[1] == {"tasks": {"d1_auto_quest": None}}
+
+    def test_include_filter(self):
+        s = StateStore()
+        s.set(("devices", "d1", "status"), "Idle")
+        s.set(("devices", "d2", "status"), "Idle")
+        _, changes = s.changes_since(0, include=lambda p: p[1] == "d2")
+        assert changes == {"devices": {"d2": {"status": "Idle"}}}
+
+    def test_wait_wakes_on_change(self):
+        s = StateStore()
+        threading.Timer(0.05, s.set, args=(("tunnel",), "connected")).start()
+        t0 = time.monotonic()
+        assert s.wait(0, timeout=5) == 1
+        assert time.monotonic() - t0 < 2
+
+    def test_wait_times_out(self):
+        s = StateStore()
+        assert s.wait(0, timeout=0.05) == 0
+
+
+class TestPublishHooks:
+    def test_device_status(self):
+        config.set_device_status("d1", "Rallying Titan...")
+        assert state_store.store.get(("devices", "d1", "status")) == "Rallying Titan..."
+        config.clear_device_status("d1")
+        assert state_store.store.get(("devices", "d1", "status")) == "Idle"
+
+    def test_quest_tracking(self):
+        from actions.quests import _record_rally_started, reset_quest_tracking
+        from config import QuestType
+        _record_rally_started("d1", QuestType.TITAN)
+        quests = state_store.store.get(("devices", "d1", "quests"))
+        assert quests and quests[0]["pending"] == 1
+        reset_quest_tracking("d1")
+        assert state_store.store.get(("devices", "d1", "quests")) == []
+
+    def test_launch_task_publishes_and_removes(self):
+        from runners import launch_task
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            release.wait(2)
+
+        launch_task("d1", "auto_quest", work, threading.Event())
+        try:
+            assert started.wait(2)
+            assert state_store.store.get(("tasks", "d1_auto_quest")) is True
+            release.set()
+            config.running_tasks["d1_auto_quest"]["thread"].join(2)
+            assert state_store.store.get(("tasks", "d1_auto_quest")) is None
+        finally:
+            release.set()
+            config.running_tasks.pop("d1_auto_quest", None)
@@ -0,0 +1,115 @@
+"""Tests for the persistent stats history store (stats_history.py)."""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+import stats_history
+from botlog import StatsTracker
+from stats_history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = HistoryStore(str(tmp_path / "history.db"))
+    yield s
+    s.close()
+
+
+class TestWriter:
+    def test_rows_reach_disk_after_flush(self, store):
+        for ms in range(1, 101):
+            store.record("adb", "dev1", "screenshot", ms / 1000)
+        assert store.flush()
+        assert store.latency("adb", "screenshot")["dev1"]["count"] == 100
+
+    def test_no_database_until_first_row(self, store):
+        assert store.latency("adb", "screenshot") == {}
+        assert store.summary("action") == []
+        assert store.recent_transitions() == {}
+
+    def test_full_queue_drops_instead_of_blocking(self, store, monkeypatch):
+        monkeypatch.setattr(store, "_ensure_writer", lambda: None)
+        monkeypatch.setattr(store, "_queue", stats_history.queue.Queue(maxsize=2))
+        for _ in range(5):
+            store.record("adb", "dev1", "tap", 0.01)
+        assert store.dropped == 3
+
+    def test_prunes_rows_past_retention(self, store):
+        old = time.time() - (stats_history.RETENTION_DAYS + 1) * 86400
+        with patch("stats_history.time.time", return_value=old):
+            store.record("adb", "dev1", "screenshot", 0.5)
+            store.flush()
+        store.close()  # next batch starts a new writer, which prunes first
+        store.record("adb", "dev1", "screenshot", 0.2)
+        store.flush()
+        rows = store._query("SELECT value FROM events", ())
+        assert rows == [(0.2,)]
+
+
+class TestQueries:
+    def test_p95_per_device(self, store):
+        for ms in range(1, 101):
+            store.record("adb", "dev1", "screenshot", ms / 1000)
+            store.record("adb", "dev2", "screenshot", ms / 100)
+        store.record("adb", "dev1", "tap", 9.0)
+        store.flush()
+        result = store.latency("adb", "screenshot")
+        assert result["dev1"] == {"count": 100, "ok_count": 100, "avg": pytest.approx(0.05, abs=0.001),
+                                  "p95": 0.096, "max": 0.1}
+        assert result["dev2"]["p95"] == 0.96
+        assert list(store.latency("adb", "screenshot", device="dev2")) == ["dev2"]
+
+    def test_window_excludes_old_rows(self, store):
+        with patch("stats_history.time.time", return_value=time.time() - 8 * 86400):
+            store.record("adb", "dev1", "screenshot", 5.0)
+            store.flush()
+        store.record("adb", "dev1", "screenshot", 0.1)
+        store.flush()
+        assert store.latency("adb", "screenshot", days=7)["dev1"]["max"] == 0.1
+        assert store.latency("adb", "screenshot", days=30)["dev1"]["max"] == 5.0
+
+    def test_summary_busiest_first(self, store):
+        store.record("action", "dev1", "rally", 5.0, True)
+        store.record("action", "dev1", "heal", 2.0, False, "no button")
+        store.record("action", "dev1", "heal", 1.0, True)
+        store.flush()
+        rows = store.summary("action")
+        assert [r["label"] for r in rows] == ["heal", "rally"]
+        assert rows[0]["ok_count"] == 1
+
+
+class TestStatsTrackerIntegration:
+    def test_recorders_append_rows(self, store):
+        tracker = StatsTracker(history=store)
+        tracker.record_action("dev1", "rally", False, 3.0, "timeout")
+        tracker.record_adb_timing("dev1", "screenshot", 0.4)
+        tracker.record_template_hit("dev1", "join.png", 100, 200, 0.93)
+        tracker.record_template_miss("dev1", "join.png", 0.41)
+        tracker.record_transition_time("dev1", "map_open", 0.8, 2.0, True)
+        store.flush()
+        rows = store._query("SELECT kind, label, value, ok, detail FROM events ORDER BY rowid", ())
+        assert rows == [
+            ("action", "rally", 3.0, 0, "timeout"),
+            ("adb", "screenshot", 0.4, 1, None),
+            ("template_hit", "join.png", 0.93, 1, "100,200"),
+            ("template_miss", "join.png", 0.41, 0, None),
+            ("transition", "map_open", 0.8, 1, "2.0"),
+        ]
+
+    def test_new_session_seeds_transitions_from_history(self, store, tmp_path):
+        first = StatsTracker(history=store)
+        for i in range(25):
+            first.record_transition_time("dev1", "map_open", 0.5 + i / 100, 2.0, i % 5 != 0)
+        store.flush()
+
+        with patch("botlog.STATS_DIR", str(tmp_path / "no_sessions")):
+            second = StatsTracker(history=store)
+        entry = second._data["dev1"]["transition_times"]["map_open"]
+        # last 20 of 25: i = 5..24, of which 10, 15, 20 missed
+        assert entry["count"] == 20
+        assert entry["met_count"] == 16
+        assert entry["budgeted_s"] == 2.0
+        assert entry["samples"][0] == 0.56 and entry["samples"][-1] == 0.74
+        assert second.get_adaptive_budget("dev1", "map_open", 2.0) < 2.0
@@ -1,13 +1,16 @@
 """Tests for territory grid analysis and auto-occupy (territory.py).
 
 Covers: _classify_square_team, _get_border_color, _has_flag,
-_is_adjacent_to_my_territory, _get_square_center, attack_territory,
-auto_occupy_loop, diagnose_grid, set_territory_config.
+_is_adjacent_to_my_territory, _get_square_center, analyze_grid,
+TerritoryState / update_territory_state,
+attack_territory, auto_occupy_loop, diagnose_grid, set_territory_config.
 
 Focus on the red team vs yellow enemy color pair (current game config).
 All ADB and vision calls are mocked — no emulator needed.
 """
 
+import time
+
 import numpy as np
 import pytest
 from unittest.mock import patch, MagicMock, call
@@ -22,6 +25,9 @@ from territory import (
     _classify_square_team, _get_border_color, _has_flag,
     _is_adjacent_to_my_territory, _get_square_center,
     attack_territory, auto_occupy_loop, diagnose_grid,
+    analyze_grid, TEAM_THRONE,
+    TerritoryState, update_territory_state, get_territory_changes,
+    get_territory_state, clear_territory_state,
 )
 
 
@@ -42,7 +48,9 @@ def reset_territory_state():
     config.AUTO_HEAL_ENABLED = False
     config.MIN_TROOPS_AVAILABLE = 0
     config.auto_occupy_running = False
+    clear_territory_state()
     yield
+    clear_territory_state()
     config.MY_TEAM_COLOR = orig_team
     config.ENEMY_TEAMS = orig_enemies
     config.MANUAL_ATTACK_SQUARES.clear()
@@ -51,6 +59,13 @@ def reset_territory_state():
     config.auto_occupy_running = False
 
 
+@pytest.fixture(autouse=True)
+def no_transition_waits():
+    """Skip screen-transition waits — they would poll a real device."""
+    with patch("territory.timed_wait", return_value=True) as mock_wait:
+        yield mock_wait
+
+
 # ============================================================
 # Helper — build a fake territory screenshot
 # ============================================================
@@ -1154,3 +1169,229 @@ class TestDiagnoseGrid:
         # mock_device is "127.0.0.1:9999" → "127_0_0_1_9999"
         assert ":" not in saved_path
         assert "127_0_0_1_9999" in saved_path
+
+
+# ============================================================
+# analyze_grid — vectorized engine vs per-square helpers
+# ============================================================
+
+def _random_territory_image(seed, flag_rate=0.1, noise=30):
+    """Noisy grid of random team colors with some flags and a noisy row 0."""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (1920, 1080, 3), dtype=np.uint8)
+    palette = list(BORDER_COLORS.values())
+    for row in range(GRID_HEIGHT):
+        for col in range(GRID_WIDTH):
+            x = int(GRID_OFFSET_X + col * SQUARE_SIZE)
+            y = int(GRID_OFFSET_Y + row * SQUARE_SIZE)
+            bgr = np.array(palette[rng.integers(len(palette))]) + rng.normal(0, noise, 3)
+            image[y:y + 42, x:x + 42] = np.clip(bgr, 0, 255)
+            if rng.random() < flag_rate:
+                image[y + 10:y + 15, x + 10:x + 15] = (90, 95, 248)
+    return image
+
+
+def _per_square(image, device=None):
+    """The original Python-loop path: {(row, col): (team, flag, adjacent)}."""
+    out = {}
+    for row in range(GRID_HEIGHT):
+        for col in range(GRID_WIDTH):
+            if (row, col) in THRONE_SQUARES:
+                continue
+            team = _classify_square_team(_get_border_color(image, row, col), device=device)
+            out[(row, col)] = (team, _has_flag(image, row, col),
+                               _is_adjacent_to_my_territory(image, row, col, device=device))
+    return out
+
+
+class TestAnalyzeGrid:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_matches_per_square_path(self, seed):
+        config.ENEMY_TEAMS = ["yellow", "green", "blue"]
+        image = _random_territory_image(seed)
+        grid = analyze_grid(image)
+        for (row, col), (team, flag, adjacent) in _per_square(image).items():
+            assert grid.team(row, col) == team, (row, col)
+            assert bool(grid.flags[row, col]) == flag, (row, col)
+            assert bool(grid.adjacent[row, col]) == adjacent, (row, col)
+
+    def test_matches_per_square_path_for_device_team(self, mock_device):
+        config.set_device_overrides(mock_device, {"my_team": "yellow"})
+        try:
+            image = _random_territory_image(5)
+            grid = analyze_grid(image, device=mock_device)
+            for (row, col), (team, flag, adjacent) in _per_square(image, mock_device).items():
+                assert grid.team(row, col) == team
+                assert bool(grid.adjacent[row, col]) == adjacent
+        finally:
+            config.clear_device_overrides()
+
+    def test_throne_squares_marked(self):
+        grid = analyze_grid(_make_territory_image())
+        for row, col in THRONE_SQUARES:
+            assert grid.team_idx[row, col] == TEAM_THRONE
+            assert grid.team(row, col) == "throne"
+            assert not grid.mine[row, col]
+
+    def test_targets_are_unflagged_adjacent_enemies(self):
+        image = _make_territory_image({
+            (5, 5): BORDER_COLORS["red"],
+            (5, 6): BORDER_COLORS["yellow"],
+            (4, 5): BORDER_COLORS["yellow"],
+            (5, 9): BORDER_COLORS["yellow"],
+        })
+        x = int(GRID_OFFSET_X + 5 * SQUARE_SIZE)
+        y = int(GRID_OFFSET_Y + 4 * SQUARE_SIZE)
+        image[y + 10:y + 15, x + 10:x + 15] = (90, 95, 248)
+        grid = analyze_grid(image)
+        assert grid.squares(grid.enemy) == [(4, 5), (5, 6), (5, 9)]
+        assert grid.squares(grid.enemy_adjacent()) == [(4, 5), (5, 6)]
+        assert grid.targets() == [(5, 6)]
+
+
+def _paint_square(image, row, col, bgr):
+    x = int(GRID_OFFSET_X + col * SQUARE_SIZE)
+    y = int(GRID_OFFSET_Y + row * SQUARE_SIZE)
+    image[y:y + 42, x:x + 42] = bgr
+
+
+def _plant_flag(image, row, col):
+    x = int(GRID_OFFSET_X + col * SQUARE_SIZE)
+    y = int(GRID_OFFSET_Y + row * SQUARE_SIZE)
+    image[y + 20:y + 25, x + 20:x + 25] = (90, 95, 248)
+
+
+class TestTerritoryState:
+    def _base(self):
+        return _make_territory_image({
+            (5, 5): BORDER_COLORS["red"],
+            (5, 6): BORDER_COLORS["yellow"],
+            (8, 8): BORDER_COLORS["yellow"],
+        })
+
+    def test_first_scan_is_baseline_without_events(self, mock_device):
+        grid, events = update_territory_state(mock_device, self._base())
+        assert events == []
+        assert grid.team(5, 6) == "yellow"
+        assert get_territory_state(mock_device).grid is grid
+
+    def test_unchanged_frame_reclassifies_nothing(self, mock_device):
+        image = self._base()
+        update_territory_state(mock_device, image)
+        with patch("territory.classify_grid_colors") as mock_classify:
+            _, events = update_territory_state(mock_device, image.copy())
+        assert events == []
+        mock_classify.assert_not_called()
+        assert get_territory_state(mock_device).last_reclassified == 0
+
+    def test_capture_and_loss_events(self, mock_device):
+        image = self._base()
+        update_territory_state(mock_device, image)
+        _paint_square(image, 5, 6, BORDER_COLORS["red"])
+        _paint_square(image, 5, 5, BORDER_COLORS["yellow"])
+        grid, events = update_territory_state(mock_device, image)
+        kinds = {(e["row"], e["col"]): (e["event"], e["prev_team"], e["team"]) for e in events}
+        assert kinds == {(5, 6): ("captured", "yellow", "red"),
+                         (5, 5): ("lost", "red", "yellow")}
+        assert get_territory_state(mock_device).last_reclassified == 2
+        assert grid.team(5, 6) == "red"
+
+    def test_flag_planted_mid_square(self, mock_device):
+        image = self._base()
+        update_territory_state(mock_device, image)
+        _plant_flag(image, 8, 8)
+        grid, events = update_territory_state(mock_device, image)
+        assert [(e["event"], e["row"], e["col"]) for e in events] == [("flag_planted", 8, 8)]
+        assert grid.flags[8, 8]
+        assert get_territory_state(mock_device).changed_at[8, 8] > 0
+
+    def test_unknown_flicker_does_not_emit_events(self, mock_device):
+        image = self._base()
+        update_territory_state(mock_device, image)
+        _paint_square(image, 5, 6, (255, 255, 255))      # obscured
+        _, events = update_territory_state(mock_device, image)
+        assert events == []
+        _paint_square(image, 5, 6, BORDER_COLORS["yellow"])
+        _, events = update_territory_state(mock_device, image)
+        assert events == []
+
+    def test_incremental_matches_full_analysis(self):
+        config.ENEMY_TEAMS = ["yellow", "green", "blue"]
+        state = TerritoryState(None)
+        image = _random_territory_image(0)
+        state.update(image)
+        rng = np.random.default_rng(9)
+        for row, col in rng.integers(0, GRID_WIDTH, (12, 2)):
+            _paint_square(image, row, col, BORDER_COLORS["red"])
+            if row % 2:
+                _plant_flag(image, row, col)
+        state.update(image)
+        full = analyze_grid(image)
+        assert np.array_equal(state.grid.team_idx, full.team_idx)
+        assert np.array_equal(state.grid.flags, full.flags)
+        assert np.array_equal(state.grid.adjacent, full.adjacent)
+
+    def test_team_change_forces_full_rescan(self, mock_device):
+        image = self._base()
+        update_territory_state(mock_device, image)
+        config.set_device_overrides(mock_device, {"my_team": "yellow"})
+        try:
+            grid, events = update_territory_state(mock_device, image)
+        finally:
+            config.clear_device_overrides()
+        assert events == []
+        assert grid.my_team == "yellow"
+
+    def test_change_log_cursor(self, mock_device, mock_device_b):
+        for device in (mock_device, mock_device_b):
+            image = self._base()
+            update_territory_state(device, image)
+            _plant_flag(image, 8, 8)
+            update_territory_state(device, image)
+        events, seq = get_territory_changes()
+        assert [e["device"] for e in events] == [mock_device, mock_device_b]
+        assert seq == events[-1]["seq"]
+        assert get_territory_changes(since=seq)[0] == []
+        only_b, _ = get_territory_changes(device=mock_device_b)
+        assert len(only_b) == 1
+
+
+@pytest.mark.benchmark
+class TestAnalyzeGridBenchmark:
+    def test_faster_than_per_square_path(self):
+        config.ENEMY_TEAMS = ["yellow", "green", "blue"]
+        images = [_random_territory_image(seed) for seed in range(3)]
+
+        t0 = time.perf_counter()
+        for image in images:
+            _per_square(image)
+        loop_ms = (time.perf_counter() - t0) * 1000 / len(images)
+
+        t0 = time.perf_counter()
+        for image in images:
+            analyze_grid(image)
+        vec_ms = (time.perf_counter() - t0) * 1000 / len(images)
+
+        print(f"\nterritory grid: per-square {loop_ms:.1f} ms/frame, "
+              f"analyze_grid {vec_ms:.1f} ms/frame ({loop_ms / vec_ms:.1f}x)")
+        assert vec_ms * 3 < loop_ms
+
+    def test_incremental_update_cheaper_than_full(self):
+        config.ENEMY_TEAMS = ["yellow", "green", "blue"]
+        image = _random_territory_image(0)
+        state = TerritoryState(None)
+        state.update(image)
+        _plant_flag(image, 3, 3)
+
+        t0 = time.perf_counter()
+        for _ in range(10):
+            analyze_grid(image)
+        full_ms = (time.perf_counter() - t0) * 100
+
+        t0 = time.perf_counter()
+        for _ in range(10):
+            state.update(image)
+        inc_ms = (time.perf_counter() - t0) * 100
+
+        print(f"\nterritory map: full {full_ms:.2f} ms, incremental {inc_ms:.2f} ms")
+        assert inc_ms < full_ms
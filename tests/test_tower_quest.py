@@ -12,6 +12,20 @@ from actions.quests import (
 from troops import TroopAction, TroopStatus, DeviceTroopSnapshot
 
 
+@pytest.fixture(autouse=True)
+def transition_waits():
+    """Transition waits end at once; add a label to ``.failing`` to make
+    that wait time out instead."""
+    failing = set()
+
+    def fake_wait(device, condition, budget_s, label, stop_check=None):
+        return label not in failing
+
+    with patch("actions.quests.timed_wait", side_effect=fake_wait) as mock_wait:
+        mock_wait.failing = failing
+        yield mock_wait
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -70,33 +84,39 @@ class TestIsTroopDefending:
 # ---------------------------------------------------------------------------
 
 class TestNavigateToTower:
-    def test_success_uses_friend_tab_and_marker(self, mock_device):
-        screen = MagicMock()
+    def test_success_uses_friend_tab_and_marker(self, mock_device, transition_waits):
         with patch("actions.quests.check_screen", return_value=Screen.MAP), \
              patch("actions.quests.tap_image", return_value=True), \
-             patch("actions.quests.logged_tap") as mock_tap, \
-             patch("actions.quests.load_screenshot", return_value=screen), \
-             patch("actions.quests.find_image", return_value=(0.9, (100, 100), 50, 50)) as mock_find, \
-             patch("actions.quests.time.sleep"):
+             patch("actions.quests.logged_tap") as mock_tap:
             assert _navigate_to_tower(mock_device) is True
             # Should tap Friend tab at (540, 330)
             mock_tap.assert_any_call(mock_device, 540, 330, "tower_target_friend_tab")
-            # Should look for friend_marker.png
-            mock_find.assert_called_with(screen, "friend_marker.png", threshold=0.7)
-
-    def test_no_friend_marker(self, mock_device):
-        t = [0.0]
-        def fake_time():
-            t[0] += 0.5
-            return t[0]
+            # Should wait for friend_marker.png
+            labels = [c.args[3] for c in transition_waits.call_args_list]
+            assert "tower_friend_marker" in labels
+
+    def test_friend_marker_condition(self, mock_device):
+        """The marker wait is met by a frame showing friend_marker.png."""
+        import numpy as np
+        from vision import get_template
+        marker = get_template("elements/friend_marker.png")
+        if marker is None:
+            pytest.skip("friend_marker.png not in elements/")
+        from actions._helpers import _shows
+        frame = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        assert not _shows("friend_marker.png").predicate(frame)
+        h, w = marker.shape[:2]
+        frame[400:400 + h, 300:300 + w] = marker
+        assert _shows("friend_marker.png").predicate(frame)
+
+    def test_no_friend_marker(self, mock_device, transition_waits):
+        transition_waits.failing.add("tower_friend_marker")
         with patch("actions.quests.check_screen", return_value=Screen.MAP), \
              patch("actions.quests.tap_image", return_value=True), \
-             patch("actions.quests.logged_tap"), \
-             patch("actions.quests.load_screenshot", return_value=MagicMock()), \
-             patch("actions.quests.find_image", return_value=None), \
-             patch("actions.quests.time.sleep"), \
-             patch("actions.quests.time.time", side_effect=fake_time):
+             patch("actions.quests.logged_tap") as mock_tap:
             assert _navigate_to_tower(mock_device) is False
+            labels = [c.args[2] for c in mock_tap.call_args_list]
+            assert "tower_target_select" not in labels
 
     def test_target_menu_not_found(self, mock_device):
         with patch("actions.quests.check_screen", return_value=Screen.MAP), \
@@ -35,6 +35,11 @@ def _make_screen_with_yellow_at(y_positions):
     return screen
 
 
+def _serve(screen):
+    """load_screenshot stand-in that crops ``screen`` when regions are asked for."""
+    return lambda device, regions=None: screen if regions is None else regions.crop(screen)
+
+
 class TestTroopsAvail:
     """Test troop counting with mocked screenshots."""
 
@@ -51,7 +56,7 @@ class TestTroopsAvail:
     def test_troop_count_patterns(self, mock_screenshot, mock_template,
                                   yellow_positions, expected):
         screen = _make_screen_with_yellow_at(yellow_positions)
-        mock_screenshot.return_value = screen
+        mock_screenshot.side_effect = _serve(screen)
         assert troops_avail("dev1") == expected
 
     @patch("troops.get_template", return_value=None)
@@ -70,7 +75,7 @@ class TestTroopsAvailOffset:
         config.DEVICE_TOTAL_TROOPS["dev1"] = 4
         # Pattern 1 (raw=1) means 4 slots occupied; offset=1 → adjusted = max(0, 1-1) = 0
         screen = _make_screen_with_yellow_at([720, 880, 1040, 1200])
-        mock_screenshot.return_value = screen
+        mock_screenshot.side_effect = _serve(screen)
         assert troops_avail("dev1") == 0
         config.DEVICE_TOTAL_TROOPS.pop("dev1", None)
 
@@ -80,7 +85,7 @@ class TestTroopsAvailOffset:
         config.DEVICE_TOTAL_TROOPS["dev1"] = 4
         # Pattern 2 (raw=2): offset=1 → adjusted = max(0, 2-1) = 1
         screen = _make_screen_with_yellow_at([800, 960, 1110])
-        mock_screenshot.return_value = screen
+        mock_screenshot.side_effect = _serve(screen)
         assert troops_avail("dev1") == 1
         config.DEVICE_TOTAL_TROOPS.pop("dev1", None)
 
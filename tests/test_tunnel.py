@@ -1,8 +1,11 @@
 """Tests for tunnel.py — local HTTP forwarding and tunnel lifecycle."""
 
+import asyncio
 import base64
+import http.server
 import json
 import threading
+import time
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -278,3 +281,207 @@ class TestStopTunnel:
         stop_tunnel()
         assert tunnel._stop_event.is_set()
         assert tunnel_status() == "disabled"
+
+
+# ---------------------------------------------------------------------------
+# Binary frame protocol
+# ---------------------------------------------------------------------------
+
+class TestFrames:
+    def test_round_trip(self):
+        frame = tunnel.encode_frame(tunnel.FRAME_RESPONSE, "req-1",
+                                    {"status": 200, "headers": {"A": "b"}}, b"\x00\xff" * 10)
+        assert tunnel.decode_frame(frame) == (
+            tunnel.FRAME_RESPONSE, "req-1", {"status": 200, "headers": {"A": "b"}},
+            b"\x00\xff" * 10)
+
+    def test_body_is_raw_not_base64(self):
+        body = bytes(range(256)) * 100
+        frame = tunnel.encode_frame(tunnel.FRAME_STREAM_CHUNK, "s", None, body)
+        assert len(frame) < len(body) + 16
+
+    def test_deflated_body_inflates(self):
+        import zlib
+        frame = tunnel.encode_frame(tunnel.FRAME_RESPONSE, "r", {},
+                                    zlib.compress(b"x" * 5000), tunnel.FLAG_DEFLATE)
+        assert tunnel.decode_frame(frame)[3] == b"x" * 5000
+
+    def test_truncated_and_unknown_version_rejected(self):
+        frame = tunnel.encode_frame(tunnel.FRAME_RESPONSE, "r", {"status": 200})
+        with pytest.raises(ValueError):
+            tunnel.decode_frame(frame[:10])
+        with pytest.raises(ValueError, match="version"):
+            tunnel.decode_frame(b"\x09" + frame[1:])
+
+    def test_legacy_json_request_parsed(self):
+        raw = json.dumps({"id": "r9", "method": "POST", "path": "/p", "headers": {},
+                          "body_b64": base64.b64encode(b"a=1").decode()})
+        ftype, req_id, meta, body = tunnel._parse_relay_message(raw)
+        assert (ftype, req_id, body) == (tunnel.FRAME_REQUEST, "r9", b"a=1")
+        assert meta["path"] == "/p"
+        assert tunnel._parse_relay_message('{"cancel_stream": "s1"}')[:2] == \
+            (tunnel.FRAME_CANCEL, "s1")
+
+    def test_legacy_message_shapes(self):
+        assert tunnel._legacy_message(tunnel.FRAME_STREAM_END, "s", None, b"") == \
+            {"id": "s", "stream": "end"}
+        chunk = tunnel._legacy_message(tunnel.FRAME_STREAM_CHUNK, "s", None, b"hi")
+        assert chunk == {"id": "s", "stream": "chunk", "body_b64": "aGk="}
+
+
+# ---------------------------------------------------------------------------
+# Request lanes
+# ---------------------------------------------------------------------------
+
+class _EchoHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server(monkeypatch):
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tunnel, "LOCAL_PORT", srv.server_address[1])
+    yield srv
+    srv.shutdown()
+
+
+class TestForwardToDashboard:
+    def test_forwards_to_werkzeug_server(self, monkeypatch):
+        """The dashboard's real server (werkzeug make_server, as in main.py)."""
+        from flask import Flask, request
+        from werkzeug.serving import make_server
+        app = Flask("dashboard")
+        app.add_url_rule("/x", "x", lambda: "ok")
+        app.add_url_rule("/post", "post", lambda: request.get_data(), methods=["POST"])
+        srv = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        monkeypatch.setattr(tunnel, "LOCAL_PORT", srv.server_port)
+        try:
+            for _ in range(3):
+                msg = _forward_to_local({"id": "r", "method": "GET", "path": "/x",
+                                         "headers": {}})
+                assert msg["status"] == 200
+                assert base64.b64decode(msg["body_b64"]) == b"ok"
+            status, _, body = tunnel._forward_raw({"method": "POST", "path": "/post",
+                                                   "headers": {}}, b"a=1")
+            assert (status, body) == (200, b"a=1")
+        finally:
+            srv.shutdown()
+
+
+class TestLanes:
+    def test_full_lane_rejects_and_counts(self):
+        lane = tunnel._Lane("t", workers=1, max_queue=1)
+        gate = threading.Event()
+
+        async def main():
+            first = lane.submit(gate.wait)
+            second = lane.submit(lambda: "queued")
+            assert lane.submit(lambda: "x") is None
+            gate.set()
+            return await first, await second
+
+        assert asyncio.run(main()) == (True, "queued")
+        status = lane.status()
+        assert status["rejected"] == 1
+        assert status["completed"] == 2
+        assert status["queued"] == status["active"] == 0
+        assert status["wait_ms_p95"] >= 0
+
+    def test_busy_streams_do_not_block_api(self, local_server):
+        """Every stream worker busy: API requests still complete, streams get 503."""
+        sent = []
+        ws = MagicMock()
+
+        async def send(data):
+            sent.append(json.loads(data))
+        ws.send = send
+        gate = threading.Event()
+
+        async def main():
+            blockers = [tunnel._lanes["stream"].submit(gate.wait)
+                        for _ in range(tunnel.STREAM_LANE_WORKERS)]
+            try:
+                await tunnel._handle_request(ws, False, "s1", {"path": "/api/stream"}, b"")
+                await asyncio.wait_for(
+                    tunnel._handle_request(ws, False, "a1", {"path": "/api/status"}, b""),
+                    timeout=5)
+            finally:
+                gate.set()
+                await asyncio.gather(*blockers)
+
+        asyncio.run(main())
+        by_id = {m["id"]: m for m in sent}
+        assert by_id["s1"]["status"] == 503
+        assert by_id["a1"]["status"] == 200
+        detail = tunnel_status(detail=True)
+        assert detail["status"] == "disabled"
+        assert detail["lanes"]["stream"]["rejected"] >= 1
+        assert detail["lanes"]["api"]["completed"] >= 1
+
+    def test_event_feeds_do_not_use_up_the_stream_lane(self, monkeypatch):
+        """More open SSE feeds than stream workers: all served, MJPEG still served."""
+        release = threading.Event()
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+                if self.path.startswith("/api/events"):
+                    release.wait(5)       # held open like a dashboard tab
+
+            def log_message(self, *args):
+                pass
+
+        srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        monkeypatch.setattr(tunnel, "LOCAL_PORT", srv.server_address[1])
+        sent = []
+        ws = MagicMock()
+
+        async def send(data):
+            sent.append(json.loads(data))
+        ws.send = send
+        feeds = tunnel.STREAM_LANE_WORKERS + 4
+
+        async def main():
+            tasks = [asyncio.create_task(tunnel._handle_request(
+                ws, False, f"e{i}", {"path": "/api/events"}, b""))
+                for i in range(feeds)]
+            try:
+                for _ in range(100):      # every feed has started streaming
+                    if sum(m.get("stream") == "start" for m in sent) >= feeds:
+                        break
+                    await asyncio.sleep(0.05)
+                await asyncio.wait_for(
+                    tunnel._handle_request(ws, False, "s1", {"path": "/api/stream"}, b""),
+                    timeout=5)
+            finally:
+                release.set()
+                await asyncio.gather(*tasks)
+
+        try:
+            asyncio.run(main())
+        finally:
+            srv.shutdown()
+        assert all(m.get("status") != 503 for m in sent)
+        started = {m["id"] for m in sent if m.get("stream") == "start"}
+        assert started == {f"e{i}" for i in range(feeds)} | {"s1"}
+
+    def test_routes_event_feeds_to_their_own_lane(self):
+        assert tunnel._streaming_lane("/api/events?since=3") == "events"
+        assert tunnel._streaming_lane("/d/abc/api/events") == "events"
+        assert tunnel._streaming_lane("/api/stream?fps=5") == "stream"
+        assert tunnel._streaming_lane("/api/status") is None
@@ -0,0 +1,358 @@
+"""Loopback harness: relay server + tunnel client + a stand-in dashboard,
+all in-process on ephemeral ports.
+
+Exercises the full browser -> relay -> tunnel -> local HTTP path in both
+wire protocols (binary frames and legacy JSON/base64) and prints
+throughput and per-request latency for each.  Requires aiohttp (relay).
+"""
+
+import asyncio
+import http.client
+import http.server
+import os
+import statistics
+import threading
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+try:
+    from aiohttp import web
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+import tunnel
+
+pytestmark = pytest.mark.skipif(not HAS_AIOHTTP, reason="aiohttp not installed")
+
+SECRET = "loopback-secret"
+PAYLOAD = os.urandom(256 * 1024)           # screenshot-sized body
+STREAM_PARTS = [os.urandom(20_000) for _ in range(5)]
+JSON_BODY = b'{"devices": [' + b",".join(b'{"id": "127.0.0.1:%d"}' % i for i in range(2000)) + b"]}"
+
+
+STYLE_CSS = b"body { color: #e0e0f0; }\n" * 200
+
+
+class _Dashboard(http.server.BaseHTTPRequestHandler):
+    static_hits = 0
+
+    def do_GET(self):
+        if self.path.startswith("/static/"):
+            _Dashboard.static_hits += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/css; charset=utf-8")
+            self.send_header("Content-Length", str(len(STYLE_CSS)))
+            self.send_header("ETag", '"flask-etag"')
+            self.end_headers()
+            self.wfile.write(STYLE_CSS)
+            return
+        if self.path.startswith("/api/stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for part in STREAM_PARTS:
+                self.wfile.write(part)
+                self.wfile.flush()
+                time.sleep(0.01)
+            return
+        body, ctype = (JSON_BODY, "application/json") if self.path == "/api/big" \
+            else (PAYLOAD, "image/jpeg")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[::-1])
+
+    def log_message(self, *args):
+        pass
+
+
+class Loopback:
+    """Relay + tunnel on one background event loop, dashboard on a thread."""
+
+    _count = 0
+
+    def __init__(self):
+        from relay import relay_server
+        Loopback._count += 1
+        self.relay = relay_server
+        self.bot = f"loopbot{Loopback._count}"
+        self.dashboard = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Dashboard)
+        threading.Thread(target=self.dashboard.serve_forever, daemon=True).start()
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.port = self._call(self._start_relay())
+        self._tunnel_task = None
+
+    def _call(self, coro, timeout=10):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def _start_relay(self):
+        self.runner = web.AppRunner(self.relay.create_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return self.runner.addresses[0][1]
+
+    def connect(self):
+        self.relay._bots.pop(self.bot, None)
+
+        async def start():
+            self._tunnel_task = asyncio.ensure_future(tunnel._run_tunnel(
+                f"ws://127.0.0.1:{self.port}/ws/tunnel", SECRET, self.bot))
+        self._call(start())
+        deadline = time.monotonic() + 10
+        while self.bot not in self.relay._bots:
+            assert time.monotonic() < deadline, "tunnel did not connect"
+            time.sleep(0.01)
+
+    @property
+    def binary(self):
+        return self.bot in self.relay._binary_bots
+
+    def request(self, method, path, body=None, headers=None):
+        """Browser request through the relay; returns (status, body).
+        Response headers are left in ``last_headers``."""
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            conn.request(method, f"/{self.bot}{path}", body=body, headers=headers or {})
+            resp = conn.getresponse()
+            self.last_headers = resp.headers
+            return resp.status, resp.read()
+        finally:
+            conn.close()
+
+    def reconnect(self, version):
+        """Drop the tunnel and reconnect it reporting ``version``."""
+        async def drop():
+            await self.relay._bots[self.bot].close()
+            self._tunnel_task.cancel()
+            await asyncio.gather(self._tunnel_task, return_exceptions=True)
+        self._call(drop())
+        with patch("botlog.BOT_VERSION", version):
+            self.connect()
+
+    def close(self):
+        async def stop():
+            ws = self.relay._bots.get(self.bot)
+            if ws is not None:
+                await ws.close()
+            if self._tunnel_task:
+                self._tunnel_task.cancel()
+                await asyncio.gather(self._tunnel_task, return_exceptions=True)
+            await self.runner.cleanup()
+        self._call(stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.dashboard.shutdown()
+
+
+@pytest.fixture
+def loopback(monkeypatch):
+    """Factory: loopback(binary_tunnel=True, binary_relay=True) -> connected Loopback."""
+    from relay import relay_server
+    monkeypatch.setattr(relay_server, "SHARED_SECRET", SECRET)
+    monkeypatch.setattr(tunnel, "RECONNECT_BASE", 1)
+    tunnel._stop_event.clear()
+    started = []
+
+    def make(binary_tunnel=True, binary_relay=True):
+        monkeypatch.setattr(tunnel, "BINARY_FRAMES", binary_tunnel)
+        monkeypatch.setattr(relay_server, "TUNNEL_PROTOCOLS",
+                            (relay_server.BINARY_SUBPROTOCOL,) if binary_relay else ())
+        lb = Loopback()
+        started.append(lb)
+        monkeypatch.setattr(tunnel, "LOCAL_PORT", lb.dashboard.server_address[1])
+        lb.connect()
+        return lb
+
+    yield make
+    for lb in started:
+        lb.close()
+
+
+def _measure(lb, n=30):
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(n):
+        start = time.perf_counter()
+        status, body = lb.request("GET", "/shot.jpg")
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert status == 200 and body == PAYLOAD
+    elapsed = time.perf_counter() - t0
+    return n * len(PAYLOAD) / elapsed / 1e6, statistics.median(latencies)
+
+
+# ============================================================
+# Frame codec — tunnel and relay copies must agree
+# ============================================================
+
+class TestFrameCompat:
+    def test_tunnel_frames_decode_on_relay(self):
+        from relay import relay_server
+        frame = tunnel.encode_frame(tunnel.FRAME_RESPONSE, "abc",
+                                    {"status": 200, "headers": {}}, PAYLOAD)
+        assert relay_server.decode_frame(frame) == (
+            relay_server.FRAME_RESPONSE, "abc", {"status": 200, "headers": {}}, PAYLOAD)
+
+    def test_relay_frames_decode_on_tunnel(self):
+        from relay import relay_server
+        frame = relay_server.encode_frame(relay_server.FRAME_REQUEST, "r1",
+                                          {"method": "POST", "path": "/x"}, b"a=1")
+        assert tunnel.decode_frame(frame) == (
+            tunnel.FRAME_REQUEST, "r1", {"method": "POST", "path": "/x"}, b"a=1")
+
+    def test_constants_match(self):
+        from relay import relay_server
+        for name in ("BINARY_SUBPROTOCOL", "FRAME_VERSION", "FRAME_REQUEST",
+                     "FRAME_RESPONSE", "FRAME_STREAM_START", "FRAME_STREAM_CHUNK",
+                     "FRAME_STREAM_END", "FRAME_CANCEL", "FLAG_DEFLATE"):
+            assert getattr(tunnel, name) == getattr(relay_server, name), name
+
+
+# ============================================================
+# Protocol negotiation
+# ============================================================
+
+class TestNegotiation:
+    def test_binary_when_both_sides_support_it(self, loopback):
+        lb = loopback()
+        assert lb.binary
+        assert lb.request("GET", "/shot.jpg") == (200, PAYLOAD)
+
+    def test_json_fallback_for_old_relay(self, loopback):
+        lb = loopback(binary_relay=False)
+        assert not lb.binary
+        assert lb.request("GET", "/shot.jpg") == (200, PAYLOAD)
+
+    def test_old_relay_gets_permessage_deflate(self, loopback):
+        lb = loopback(binary_relay=False)
+        deadline = time.monotonic() + 10
+        while not getattr(lb.relay._bots.get(lb.bot), "compress", False):
+            assert time.monotonic() < deadline, "tunnel did not reconnect with deflate"
+            time.sleep(0.01)
+        assert lb.request("GET", "/shot.jpg") == (200, PAYLOAD)
+
+    def test_binary_relay_skips_permessage_deflate(self, loopback):
+        lb = loopback()
+        assert not lb.relay._bots[lb.bot].compress
+
+    def test_json_for_old_tunnel(self, loopback):
+        lb = loopback(binary_tunnel=False)
+        assert not lb.binary
+        assert lb.request("GET", "/shot.jpg") == (200, PAYLOAD)
+
+
+# ============================================================
+# Request / stream round trips in both protocols
+# ============================================================
+
+@pytest.mark.parametrize("binary", [True, False], ids=["binary", "json"])
+class TestRoundTrip:
+    def test_post_body_arrives_raw(self, loopback, binary):
+        lb = loopback(binary_tunnel=binary)
+        body = bytes(range(256)) * 64
+        assert lb.request("POST", "/echo", body) == (200, body[::-1])
+
+    def test_stream_chunks_arrive_in_order(self, loopback, binary):
+        lb = loopback(binary_tunnel=binary)
+        status, body = lb.request("GET", "/api/stream")
+        assert status == 200
+        assert body == b"".join(STREAM_PARTS)
+
+    def test_text_body_round_trips(self, loopback, binary):
+        lb = loopback(binary_tunnel=binary)
+        assert lb.request("GET", "/api/big") == (200, JSON_BODY)
+
+    def test_dashboard_down_returns_502(self, loopback, binary, monkeypatch):
+        lb = loopback(binary_tunnel=binary)
+        monkeypatch.setattr(tunnel, "LOCAL_PORT", 1)
+        status, body = lb.request("GET", "/shot.jpg")
+        assert status == 502
+        assert b"unreachable" in body
+
+
+# ============================================================
+# Benchmark — JSON/base64 vs binary frames
+# ============================================================
+
+@pytest.mark.benchmark
+class TestBenchmark:
+    def test_throughput_and_latency(self, loopback):
+        results = {}
+        for binary in (False, True):
+            lb = loopback(binary_tunnel=binary)
+            assert lb.binary == binary
+            _measure(lb, n=3)  # warm up
+            results[binary] = _measure(lb)
+        (json_mbps, json_ms), (bin_mbps, bin_ms) = results[False], results[True]
+        print(f"\ntunnel loopback, {len(PAYLOAD) // 1024} KB bodies: "
+              f"JSON {json_mbps:.1f} MB/s, {json_ms:.1f} ms median; "
+              f"binary {bin_mbps:.1f} MB/s, {bin_ms:.1f} ms median "
+              f"({bin_mbps / json_mbps:.1f}x)")
+
+
+# ============================================================
+# Relay static cache + compression
+# ============================================================
+
+class TestRelayStaticCache:
+    def test_second_load_served_without_tunnel(self, loopback):
+        lb = loopback()
+        before = _Dashboard.static_hits
+        assert lb.request("GET", "/static/style.css?v=62") == (200, STYLE_CSS)
+        etag = lb.last_headers["ETag"]
+        assert etag != '"flask-etag"'
+        assert lb.request("GET", "/static/style.css?v=62") == (200, STYLE_CSS)
+        assert _Dashboard.static_hits == before + 1
+        # Conditional revalidation answered by the relay
+        status, body = lb.request("GET", "/static/style.css?v=62",
+                                  headers={"If-None-Match": etag})
+        assert (status, body) == (304, b"")
+        assert _Dashboard.static_hits == before + 1
+
+    def test_first_load_ignores_browser_validators(self, loopback):
+        lb = loopback()
+        status, body = lb.request("GET", "/static/a.css",
+                                  headers={"If-None-Match": '"flask-etag"'})
+        assert (status, body) == (200, STYLE_CSS)
+
+    def test_gzip_for_text_when_accepted(self, loopback):
+        import gzip
+        lb = loopback()
+        for _ in range(2):  # miss, then hit
+            status, body = lb.request("GET", "/static/b.css",
+                                      headers={"Accept-Encoding": "gzip"})
+            assert lb.last_headers["Content-Encoding"] == "gzip"
+            assert gzip.decompress(body) == STYLE_CSS
+            assert len(body) < len(STYLE_CSS) // 4
+
+    def test_dynamic_json_compressed_not_cached(self, loopback):
+        import gzip
+        lb = loopback()
+        status, body = lb.request("GET", "/api/big", headers={"Accept-Encoding": "gzip"})
+        assert status == 200
+        assert gzip.decompress(body) == JSON_BODY
+        assert "ETag" not in lb.last_headers
+
+    def test_version_change_invalidates(self, loopback):
+        lb = loopback()
+        before = _Dashboard.static_hits
+        lb.request("GET", "/static/c.css")
+        lb.request("GET", "/static/c.css")
+        assert _Dashboard.static_hits == before + 1
+        lb.reconnect("9.9.9")
+        lb.request("GET", "/static/c.css")
+        assert _Dashboard.static_hits == before + 2
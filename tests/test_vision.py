@@ -2,15 +2,18 @@
 
 import subprocess
 import threading
+import time
 from unittest.mock import patch, MagicMock, call
 import numpy as np
 import cv2
+import pytest
 
+import budgets
 from vision import (
     get_last_best, find_image, find_all_matches, read_number, read_text,
     read_ap, get_template, load_screenshot, adb_tap, adb_swipe, adb_keyevent,
     tap_image, wait_for_image_and_tap, save_failure_screenshot, _thread_local,
-    _template_cache,
+    _template_cache, ocr_read, timed_wait, on_frame, on_settled,
 )
 
 
@@ -210,6 +213,88 @@ class TestLoadScreenshot:
         assert result is None
 
 
+# ============================================================
+# Frame cache — shared screenshot per tick
+# ============================================================
+
+class TestFrameCache:
+    def _png(self, value=0):
+        _, buf = cv2.imencode(".png", np.full((20, 20, 3), value, dtype=np.uint8))
+        return MagicMock(returncode=0, stdout=buf.tobytes())
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_reuses_fresh_frame(self, mock_run, mock_stats):
+        mock_run.return_value = self._png()
+        first = load_screenshot("dev1")
+        second = load_screenshot("dev1")
+        assert second is first
+        assert mock_run.call_count == 1
+        hits = [c[1]["hit"] for c in mock_stats.record_frame_cache.call_args_list]
+        assert hits == [False, True]
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_expired_frame_recaptured(self, mock_run, mock_stats):
+        import vision
+        mock_run.return_value = self._png()
+        load_screenshot("dev1")
+        # Age the cached entry past FRAME_CACHE_MAX_AGE_S
+        ts, img = vision._frame_cache["dev1"]
+        vision._frame_cache["dev1"] = (ts - 10, img)
+        load_screenshot("dev1")
+        assert mock_run.call_count == 2
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_tap_invalidates(self, mock_run, mock_stats):
+        mock_run.return_value = self._png()
+        load_screenshot("dev1")
+        adb_tap("dev1", 10, 10)
+        load_screenshot("dev1")
+        screenshot_calls = [c for c in mock_run.call_args_list if "screencap" in c[0][0]]
+        assert len(screenshot_calls) == 2
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_per_device(self, mock_run, mock_stats):
+        mock_run.return_value = self._png()
+        load_screenshot("dev1")
+        load_screenshot("dev2")
+        assert mock_run.call_count == 2
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_disabled_with_zero_age(self, mock_run, mock_stats):
+        mock_run.return_value = self._png()
+        with patch("vision.config.FRAME_CACHE_MAX_AGE_S", 0):
+            load_screenshot("dev1")
+            load_screenshot("dev1")
+        assert mock_run.call_count == 2
+        mock_stats.record_frame_cache.assert_not_called()
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_failed_capture_not_cached(self, mock_run, mock_stats):
+        mock_run.return_value = MagicMock(returncode=1, stdout=b"")
+        assert load_screenshot("dev1") is None
+        mock_run.return_value = self._png()
+        assert load_screenshot("dev1") is not None
+
+    @patch("vision.stats")
+    @patch("vision.subprocess.run")
+    def test_observer_capture_keeps_out_of_bot_stats(self, mock_run, mock_stats):
+        import vision
+        mock_run.return_value = self._png()
+        assert vision.capture_for_observer("dev1") is not None
+        assert "dev1" not in vision._frame_cache
+        mock_stats.record_frame_cache.assert_not_called()
+        labels = [c[0][1] for c in mock_stats.record_adb_timing.call_args_list]
+        assert labels == ["stream_screenshot"]
+        load_screenshot("dev1")
+        assert mock_stats.record_adb_timing.call_args[0][1] == "screenshot"
+
+
 # ============================================================
 # read_text — OCR pipeline
 # ============================================================
@@ -256,16 +341,150 @@ class TestReadText:
         assert result == "Blurry"
 
 
+# ============================================================
+# ocr_read — cache and cross-device batching
+# ============================================================
+
+class _FakeReader:
+    """Stands in for easyocr.Reader: 'recognizes' a crop as its mean value."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []          # ("single" | "batch", n_images)
+        self.lock = threading.Lock()
+
+    def _text(self, image):
+        return str(int(image.mean()))
+
+    def readtext(self, image, allowlist=None, detail=1):
+        with self.lock:
+            self.calls.append(("single", 1))
+        time.sleep(self.delay)
+        return [self._text(image)] if detail == 0 else [(None, self._text(image), 0.9)]
+
+    def readtext_batched(self, images, allowlist=None, detail=1):
+        with self.lock:
+            self.calls.append(("batch", len(images)))
+        time.sleep(self.delay)
+        return [[self._text(i)] if detail == 0 else [(None, self._text(i), 0.9)]
+                for i in images]
+
+
+def _crop(value, shape=(40, 120)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+class TestOcrService:
+    def setup_method(self):
+        self._patches = [patch("vision._USE_APPLE_VISION", False)]
+        for p in self._patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self._patches:
+            p.stop()
+
+    def test_unchanged_crop_served_from_cache(self):
+        reader = _FakeReader()
+        with patch("vision._get_ocr_reader", return_value=reader), \
+             patch("vision.stats") as mock_stats:
+            assert ocr_read(_crop(100), device="dev1") == ["100"]
+            assert ocr_read(_crop(100), device="dev1") == ["100"]
+        assert reader.calls == [("single", 1)]
+        hits = [c.kwargs.get("cache_hit", False) for c in mock_stats.record_ocr.call_args_list]
+        assert hits == [False, True]
+
+    def test_changed_glyph_misses_cache(self):
+        reader = _FakeReader()
+        a = _crop(0)
+        b = a.copy()
+        cv2.putText(b, "7", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, 255, 2)
+        with patch("vision._get_ocr_reader", return_value=reader):
+            ocr_read(a)
+            ocr_read(b)
+        assert len(reader.calls) == 2
+
+    def test_allowlist_and_detail_are_part_of_key(self):
+        reader = _FakeReader()
+        with patch("vision._get_ocr_reader", return_value=reader):
+            ocr_read(_crop(50))
+            ocr_read(_crop(50), allowlist="0123456789")
+            assert ocr_read(_crop(50), detail=1) == [(None, "50", 0.9)]
+        assert len(reader.calls) == 3
+
+    def test_cache_disabled(self):
+        reader = _FakeReader()
+        with patch("vision._get_ocr_reader", return_value=reader), \
+             patch("vision.config.OCR_CACHE_SIZE", 0):
+            ocr_read(_crop(10))
+            ocr_read(_crop(10))
+        assert len(reader.calls) == 2
+
+    def test_lru_eviction(self):
+        reader = _FakeReader()
+        with patch("vision._get_ocr_reader", return_value=reader), \
+             patch("vision.config.OCR_CACHE_SIZE", 2):
+            for v in (10, 60, 110):
+                ocr_read(_crop(v))
+            ocr_read(_crop(10))      # evicted -> re-recognized
+            ocr_read(_crop(110))     # still cached
+        assert len(reader.calls) == 4
+
+    def test_concurrent_requests_are_batched(self):
+        reader = _FakeReader(delay=0.3)
+        results = {}
+
+        def worker(name, value):
+            results[name] = ocr_read(_crop(value * 40), device=name)
+
+        with patch("vision._get_ocr_reader", return_value=reader), \
+             patch("vision.stats") as mock_stats:
+            first = threading.Thread(target=worker, args=("dev0", 1))
+            first.start()
+            time.sleep(0.1)     # dev0 is now inside readtext
+            others = [threading.Thread(target=worker, args=(f"dev{i}", i + 1))
+                      for i in range(1, 4)]
+            for t in others:
+                t.start()
+            for t in [first] + others:
+                t.join(timeout=5)
+
+        assert results == {f"dev{i}": [str((i + 1) * 40)] for i in range(4)}
+        assert reader.calls == [("single", 1), ("batch", 3)]
+        batch_sizes = sorted(c.kwargs["batch_size"] for c in mock_stats.record_ocr.call_args_list)
+        assert batch_sizes == [1, 3, 3, 3]
+        waits = [c.kwargs["wait_s"] for c in mock_stats.record_ocr.call_args_list
+                 if c.kwargs["batch_size"] == 3]
+        assert min(waits) > 0.1
+
+    def test_reader_error_propagates(self):
+        reader = MagicMock()
+        reader.readtext.side_effect = RuntimeError("boom")
+        with patch("vision._get_ocr_reader", return_value=reader):
+            with pytest.raises(RuntimeError):
+                ocr_read(_crop(5))
+        # Failed read is not cached
+        reader.readtext.side_effect = None
+        reader.readtext.return_value = ["5"]
+        with patch("vision._get_ocr_reader", return_value=reader):
+            assert ocr_read(_crop(5)) == ["5"]
+
+
 # ============================================================
 # read_ap — AP reading with retries
 # ============================================================
 
+def _serve(screen):
+    """load_screenshot stand-in that crops ``screen`` when regions are asked for."""
+    return lambda device, regions=None: screen if regions is None else regions.crop(screen)
+
+
 class TestReadAP:
     @patch("vision.time.sleep")
     @patch("vision.ocr_read")
     @patch("vision.load_screenshot")
     def test_success_first_try(self, mock_screenshot, mock_ocr_read, mock_sleep):
-        mock_screenshot.return_value = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        mock_screenshot.side_effect = _serve(np.zeros((1920, 1080, 3), dtype=np.uint8))
         mock_ocr_read.return_value = ["101/400"]
 
         result = read_ap("dev1", retries=3)
@@ -275,7 +494,7 @@ class TestReadAP:
     @patch("vision.ocr_read")
     @patch("vision.load_screenshot")
     def test_success_on_retry(self, mock_screenshot, mock_ocr_read, mock_sleep):
-        mock_screenshot.return_value = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        mock_screenshot.side_effect = _serve(np.zeros((1920, 1080, 3), dtype=np.uint8))
         # First attempt: timer text, second: AP value
         mock_ocr_read.side_effect = [["03:45"], ["200/400"]]
 
@@ -286,7 +505,7 @@ class TestReadAP:
     @patch("vision.ocr_read")
     @patch("vision.load_screenshot")
     def test_all_retries_fail(self, mock_screenshot, mock_ocr_read, mock_sleep):
-        mock_screenshot.return_value = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        mock_screenshot.side_effect = _serve(np.zeros((1920, 1080, 3), dtype=np.uint8))
         mock_ocr_read.return_value = ["garbage"]
 
         result = read_ap("dev1", retries=2)
@@ -532,3 +751,167 @@ class TestSaveFailureScreenshot:
         mock_load.return_value = None
         result = save_failure_screenshot("dev1", "no_screen")
         assert result is None
+
+
+# ============================================================
+# timed_wait — event-driven waits
+# ============================================================
+
+class TestTimedWait:
+    @pytest.fixture
+    def tracker(self):
+        from botlog import StatsTracker
+        tracker = StatsTracker()
+        tracker._data.clear()
+        with patch("vision.stats", tracker), patch("budgets.stats", tracker):
+            yield tracker
+
+    def test_returns_early_and_records(self, tracker, mock_device):
+        calls = iter([False, False, True])
+        assert timed_wait(mock_device, lambda: next(calls), 2, "open") is True
+        entry = tracker._data[mock_device]["transition_times"]["open"]
+        assert entry["met_count"] == 1 and entry["samples"][0] < 1.0
+        assert entry["saved_s"] > 1.0
+
+    def test_stop_check_aborts(self, tracker, mock_device):
+        start = time.time()
+        assert timed_wait(mock_device, lambda: False, 2, "x", stop_check=lambda: True) is False
+        assert time.time() - start < 0.5
+
+    @patch("vision.load_screenshot")
+    def test_frame_condition_skips_repeated_frames(self, mock_screenshot, tracker, mock_device):
+        frame = np.zeros((64, 64, 3), np.uint8)
+        mock_screenshot.side_effect = lambda device: frame.copy()
+        seen = []
+        assert timed_wait(mock_device, on_frame(lambda s: seen.append(s) or False),
+                          0.5, "settle") is False
+        assert mock_screenshot.call_count > 1
+        assert len(seen) == 1
+
+    @patch("vision.load_screenshot")
+    def test_frame_condition_sees_new_frames(self, mock_screenshot, tracker, mock_device):
+        frames = iter([np.zeros((64, 64, 3), np.uint8)] * 2 + [np.full((64, 64, 3), 9, np.uint8)] * 9)
+        mock_screenshot.side_effect = lambda device: next(frames)
+        assert timed_wait(mock_device, on_frame(lambda s: s[0, 0, 0] == 9), 2, "open") is True
+
+    def test_driven_by_capture_stream(self, tracker, mock_device):
+        import capture
+        import config
+        frames = [np.full((32, 32, 3), v, np.uint8) for v in (0, 0, 0, 200)]
+        capture.register_fake_device(mock_device, capture.FakeDevice(frames, fps=50, loop=False))
+        try:
+            with patch.object(config, "CAPTURE_BACKEND", "stream"), \
+                 patch("vision.load_screenshot") as mock_screenshot:
+                assert timed_wait(mock_device, on_frame(lambda s: s[0, 0, 0] == 200),
+                                  2, "open") is True
+            mock_screenshot.assert_not_called()
+        finally:
+            capture.unregister_fake_device(mock_device)
+
+    @patch("vision.load_screenshot")
+    def test_frame_condition_sees_single_pixel_change(self, mock_screenshot, tracker, mock_device):
+        changed = np.zeros((64, 64, 3), np.uint8)
+        changed[1, 1] = 255    # off any sampling grid
+        frames = iter([np.zeros((64, 64, 3), np.uint8)] + [changed] * 20)
+        mock_screenshot.side_effect = lambda device: next(frames)
+        assert timed_wait(mock_device, on_frame(lambda s: s[1, 1, 0] == 255), 2, "open") is True
+
+    def test_stop_check_honoured_on_static_stream(self, tracker, mock_device):
+        import capture
+        import config
+        # One frame a second: without the capped stream wait, stop_check
+        # would only be seen when the next frame arrives.
+        frames = [np.zeros((32, 32, 3), np.uint8)]
+        capture.register_fake_device(mock_device, capture.FakeDevice(frames, fps=1))
+        stop_at = time.time() + 0.2
+        try:
+            with patch.object(config, "CAPTURE_BACKEND", "stream"):
+                start = time.time()
+                assert timed_wait(mock_device, on_frame(lambda s: False), 5, "static",
+                                  stop_check=lambda: time.time() >= stop_at) is False
+                assert time.time() - start < 0.6
+        finally:
+            capture.unregister_fake_device(mock_device)
+        assert "static" not in tracker._data.get(mock_device, {}).get("transition_times", {})
+
+    @patch("vision.load_screenshot")
+    def test_settled_once_screen_stops_moving(self, mock_screenshot, tracker, mock_device):
+        frames = iter([np.full((64, 64, 3), v, np.uint8) for v in (0, 60, 120)]
+                      + [np.full((64, 64, 3), 180, np.uint8) for _ in range(20)])
+        mock_screenshot.side_effect = lambda device: next(frames)
+        assert timed_wait(mock_device, on_settled(), 2, "scroll") is True
+        assert mock_screenshot.call_count == 5
+        entry = tracker._data[mock_device]["transition_times"]["scroll"]
+        assert entry["met_count"] == 1
+
+    @patch("vision.load_screenshot")
+    def test_settled_ignores_a_reused_cached_frame(self, mock_screenshot, tracker, mock_device):
+        frame = np.zeros((64, 64, 3), np.uint8)
+        mock_screenshot.return_value = frame     # the frame cache handing back one array
+        assert timed_wait(mock_device, on_settled(), 0.4, "settle") is False
+
+    @patch("vision.load_screenshot")
+    def test_settled_waits_for_the_tap_to_show(self, mock_screenshot, tracker, mock_device):
+        import vision
+        before = np.zeros((64, 64, 3), np.uint8)
+        vision._note_frame(mock_device, time.time(), before)
+        vision.invalidate_frame_cache(mock_device)     # the tap
+        frames = iter([before.copy() for _ in range(3)]
+                      + [np.full((64, 64, 3), 200, np.uint8) for _ in range(20)])
+        mock_screenshot.side_effect = lambda device: next(frames)
+        assert timed_wait(mock_device, on_settled(mock_device), 2, "open") is True
+        assert mock_screenshot.call_count == 5   # 3 unchanged, then changed + still
+
+    def test_settled_after_back_to_back_taps_in_stream_mode(self, tracker, mock_device):
+        import capture
+        import config
+        import vision
+        before = np.zeros((32, 32, 3), np.uint8)
+        capture.register_fake_device(mock_device, capture.FakeDevice([before], fps=50))
+        try:
+            with patch.object(config, "CAPTURE_BACKEND", "stream"):
+                assert timed_wait(mock_device, on_frame(lambda s: True), 1, "seen") is True
+                vision.invalidate_frame_cache(mock_device)     # tap 1
+                vision.invalidate_frame_cache(mock_device)     # tap 2, no frame between
+        finally:
+            capture.unregister_fake_device(mock_device)
+        # Nothing shows the screen between the taps, so `before` is no
+        # reference: two identical frames before tap 2 lands aren't "settled".
+        cond = on_settled(mock_device)
+        unchanged = np.full((32, 32, 3), 90, np.uint8)
+        assert cond.predicate(unchanged) is False
+        assert cond.predicate(unchanged.copy()) is False
+        moved = np.full((32, 32, 3), 200, np.uint8)
+        assert cond.predicate(moved) is False
+        assert cond.predicate(moved.copy()) is True
+
+    def test_settled_reference_recorded_without_frame_cache(self, tracker, mock_device):
+        import vision
+        before = np.zeros((64, 64, 3), np.uint8)
+        with patch("vision.config.FRAME_CACHE_MAX_AGE_S", 0), \
+             patch("vision._capture_screenshot", return_value=before):
+            load_screenshot(mock_device)
+        assert vision._last_frame[mock_device][1] is before
+        vision.invalidate_frame_cache(mock_device)
+        cond = on_settled(mock_device)
+        assert cond.predicate(before.copy()) is False
+        assert cond.predicate(before.copy()) is False   # tap not shown yet
+
+    @patch("vision.config.BUDGET_MODE", "adaptive")
+    @patch("vision.load_screenshot")
+    def test_settle_wait_learns_shorter_budget(self, mock_screenshot, tracker, mock_device):
+        # e.g. mithril_tunnel_open: 2s hard-coded, the panel settles in ~0.3s
+        still = np.zeros((64, 64, 3), np.uint8)
+        mock_screenshot.side_effect = lambda device: still.copy()
+        for _ in range(10):
+            assert timed_wait(mock_device, on_settled(), 2, "tunnel_open") is True
+        assert budgets.budget_for(mock_device, "tunnel_open", 2) < 1.0
+
+    @patch("vision.config.BUDGET_MODE", "adaptive")
+    def test_adaptive_budget_shortens_sleep(self, tracker, mock_device):
+        for _ in range(10):
+            tracker.record_transition_time(mock_device, "anim", 0.05, 1.0, True)
+        start = time.time()
+        assert timed_wait(mock_device, lambda: False, 1.0, "anim") is False
+        assert time.time() - start < 0.6   # floor: 40% of the 1s budget
+        assert tracker._data[mock_device]["transition_times"]["anim"]["saved_s"] > 0.5
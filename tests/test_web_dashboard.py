@@ -60,22 +60,22 @@ def clean_running_tasks():
 # ---------------------------------------------------------------------------
 
 class TestIndexRoute:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_index_returns_200(self, mock_instances, mock_devs, client):
         resp = client.get("/")
         assert resp.status_code == 200
         assert b"9Bot" in resp.data
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_index_no_devices(self, mock_instances, mock_devs, client):
         resp = client.get("/")
         assert resp.status_code == 200
         assert b"No devices found" in resp.data
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_index_shows_device_name(self, mock_instances, mock_devs, client):
         resp = client.get("/")
         assert b"MuMu" in resp.data
@@ -88,15 +88,15 @@ class TestTasksRoute:
 
 
 class TestSettingsRoute:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_settings_page_returns_200(self, mock_instances, mock_devs, client):
         resp = client.get("/settings")
         assert resp.status_code == 200
         assert b"Settings" in resp.data
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard._save_settings")
     @patch("web.dashboard._apply_settings")
     def test_save_settings_post(self, mock_apply, mock_save, mock_inst,
@@ -111,8 +111,8 @@ class TestSettingsRoute:
         mock_apply.assert_called_once()
         mock_save.assert_called_once()
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard._save_settings")
     @patch("web.dashboard._apply_settings")
     def test_save_settings_validates(self, mock_apply, mock_save, mock_inst,
@@ -127,6 +127,22 @@ class TestSettingsRoute:
         # validate_settings should have clamped min_troops to default
         assert saved["min_troops"] in (0, 5)  # either default or max
 
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
+    @patch("web.dashboard._save_settings")
+    @patch("web.dashboard._apply_settings")
+    def test_save_pyramid_toggles(self, mock_apply, mock_save, mock_inst,
+                                  mock_devs, client):
+        client.post("/settings", data={"pyramid_check_screen": "on",
+                                       "pyramid_matching": "on", "mode": "bl"})
+        saved = mock_save.call_args[0][0]
+        assert saved["pyramid_check_screen"] is True
+        assert saved["pyramid_matching"] is True
+        client.post("/settings", data={"mode": "bl"})
+        saved = mock_save.call_args[0][0]
+        assert saved["pyramid_check_screen"] is False
+        assert saved["pyramid_matching"] is False
+
 
 class TestLogsRoute:
     def test_logs_page_returns_200(self, client):
@@ -139,8 +155,8 @@ class TestLogsRoute:
 # ---------------------------------------------------------------------------
 
 class TestApiStatus:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     @patch("web.dashboard.get_troop_status", return_value=None)
     @patch("web.dashboard.get_quest_tracking_state", return_value=[])
     def test_returns_json(self, mock_quest, mock_troop, mock_inst, mock_devs, client):
@@ -152,8 +168,8 @@ class TestApiStatus:
         assert len(data["devices"]) == 1
         assert data["devices"][0]["id"] == "127.0.0.1:9999"
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard.get_troop_status", return_value=None)
     @patch("web.dashboard.get_quest_tracking_state", return_value=[])
     def test_shows_active_tasks(self, mock_quest, mock_troop, mock_inst,
@@ -173,33 +189,185 @@ class TestApiStatus:
             ev.set()
             t.join(timeout=1)
 
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_includes_stream_status(self, mock_inst, mock_devs, client):
+        with patch("web.dashboard.stream_status",
+                   return_value=[{"device": "dev1", "subscribers": 2, "encode_ms": 3.1}]):
+            data = json.loads(client.get("/api/status").data)
+        assert data["streams"][0]["subscribers"] == 2
+
+
+def _read_event(resp):
+    """First SSE event of a streamed response, parsed as (id, payload)."""
+    chunk = next(resp.response)
+    chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    return int(fields["id"]), json.loads(fields["data"])
+
+
+class TestApiEvents:
+    """Server-Sent Events push of status changes."""
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("web.dashboard.tunnel_status", return_value="connected")
+    def test_first_event_is_full_state(self, _ts, _inst, _devs, client):
+        config.set_device_status("127.0.0.1:9999", "Questing...")
+        resp = client.get("/api/events", buffered=False)
+        try:
+            assert resp.mimetype == "text/event-stream"
+            assert resp.headers["Cache-Control"] == "no-cache"
+            version, data = _read_event(resp)
+        finally:
+            resp.close()
+        assert data["full"] is True and data["version"] == version
+        dev = data["changes"]["devices"]["127.0.0.1:9999"]
+        assert dev["status"] == "Questing..."
+        assert dev["name"] == "MuMu"
+        assert data["changes"]["tunnel"] == "connected"
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_resume_sends_only_changes(self, _inst, _devs, client):
+        resp = client.get("/api/events", buffered=False)
+        version, _ = _read_event(resp)
+        resp.close()
+        config.set_device_status("127.0.0.1:9999", "Rallying Titan...")
+        resp = client.get("/api/events", buffered=False,
+                          headers={"Last-Event-ID": str(version)})
+        try:
+            _, data = _read_event(resp)
+        finally:
+            resp.close()
+        assert data["full"] is False
+        assert data["changes"] == {
+            "devices": {"127.0.0.1:9999": {"status": "Rallying Titan..."}}}
+
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_unknown_last_event_id_resyncs(self, _inst, _devs, client):
+        resp = client.get("/api/events", buffered=False,
+                          headers={"Last-Event-ID": "999999"})
+        try:
+            _, data = _read_event(resp)
+        finally:
+            resp.close()
+        assert data["full"] is True
+
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_dead_task_removed(self, _inst, _devs, client):
+        import state_store
+        t = threading.Thread(target=lambda: None)
+        t.start()
+        t.join()
+        config.running_tasks["127.0.0.1:9999_auto_quest"] = {"thread": t, "stop_event": threading.Event()}
+        state_store.publish(("tasks", "127.0.0.1:9999_auto_quest"), True)
+        resp = client.get("/api/events", buffered=False)
+        try:
+            _, data = _read_event(resp)
+        finally:
+            resp.close()
+        assert data["changes"]["tasks"]["127.0.0.1:9999_auto_quest"] is None
+
+
+class TestSseReconcile:
+    """State without change hooks is reconciled once, not once per stream."""
+
+    @patch("web.dashboard.SSE_RECONCILE_S", 60)
+    def test_stream_only_reads_the_store(self):
+        import state_store
+        from web.dashboard import _sse_stream
+        calls = []
+        stream = _sse_stream(0, reconcile=lambda: calls.append(1))
+        try:
+            next(stream)
+            state_store.publish(("tunnel",), "reconnecting")
+            next(stream)
+        finally:
+            stream.close()
+        assert calls == [1]   # on connect only — no run per wake-up
+
+    @patch("web.dashboard.SSE_RECONCILE_S", 0.05)
+    def test_one_ticker_for_all_clients(self):
+        from web.dashboard import _Reconciler
+        calls = []
+        reconciler = _Reconciler()
+        reconciler.attach(lambda: calls.append(1))
+        reconciler.attach(lambda: calls.append(1))
+        thread = reconciler._thread
+        assert len(calls) == 2
+        reconciler.detach()
+        reconciler.detach()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+        assert reconciler._thread is None
+
+
+class TestApiStream:
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_fixed_quality_stream(self, _inst, _devs, client):
+        with patch("web.dashboard.get_broadcaster") as gb:
+            gb.return_value.frames_for.return_value = iter([b"part"])
+            resp = client.get("/api/stream?device=127.0.0.1:9999&fps=5&quality=40")
+        assert resp.data == b"part"
+        gb.assert_called_once_with("127.0.0.1:9999", 40)
+        gb.return_value.frames_for.assert_called_once_with(5)
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_adaptive_tiles_stream(self, _inst, _devs, client):
+        with patch("web.dashboard.get_broadcaster") as gb:
+            gb.return_value.adaptive_frames.return_value = iter([b"tile"])
+            resp = client.get("/api/stream?device=127.0.0.1:9999&tiles=1&kbps=150")
+        assert resp.data == b"tile"
+        gb.assert_called_once_with("127.0.0.1:9999", None)
+        gb.return_value.adaptive_frames.assert_called_once_with(5, 150, tiles=True)
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_bad_numbers_fall_back_to_defaults(self, _inst, _devs, client):
+        from web.dashboard import ADAPTIVE_KBPS
+        with patch("web.dashboard.get_broadcaster") as gb:
+            gb.return_value.frames_for.return_value = iter([b"part"])
+            gb.return_value.adaptive_frames.return_value = iter([b"tile"])
+            resp = client.get("/api/stream?device=127.0.0.1:9999&fps=abc&quality=hi")
+            assert resp.status_code == 200
+            resp = client.get("/api/stream?device=127.0.0.1:9999&adaptive=1&kbps=fast&fps=99")
+            assert resp.status_code == 200
+        gb.assert_any_call("127.0.0.1:9999", 30)
+        gb.return_value.frames_for.assert_called_once_with(5)
+        gb.return_value.adaptive_frames.assert_called_once_with(10, ADAPTIVE_KBPS, tiles=False)
+
 
 class TestApiStatusTunnel:
     """Tunnel status field in /api/status response."""
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard.tunnel_status", return_value="connected")
     def test_tunnel_connected(self, mock_ts, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
         assert data["tunnel"] == "connected"
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard.tunnel_status", return_value="connecting")
     def test_tunnel_connecting(self, mock_ts, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
         assert data["tunnel"] == "connecting"
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard.tunnel_status", return_value="disconnected")
     def test_tunnel_disconnected(self, mock_ts, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
         assert data["tunnel"] == "disconnected"
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard.tunnel_status", return_value="disabled")
     def test_tunnel_disabled(self, mock_ts, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
@@ -216,8 +384,8 @@ class TestApiLogs:
 
 class TestApiRefreshDevices:
     @patch("web.dashboard.auto_connect_emulators")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_refresh_redirects_to_index(self, mock_inst, mock_devs, mock_connect, client):
         resp = client.post("/api/devices/refresh")
         assert resp.status_code == 302
@@ -229,8 +397,8 @@ class TestApiRefreshDevices:
 # ---------------------------------------------------------------------------
 
 class TestStartTask:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_start_oneshot_task(self, mock_inst, mock_devs, client):
         with patch.dict(TASK_FUNCTIONS, {"Heal All": MagicMock()}):
             resp = client.post("/tasks/start", data={
@@ -242,8 +410,8 @@ class TestStartTask:
         # Task should have been launched
         assert any("once:Heal All" in k for k in config.running_tasks)
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_start_auto_mode(self, mock_inst, mock_devs, client):
         # Mock the runner to avoid actually running tasks
         mock_runner = MagicMock()
@@ -256,8 +424,8 @@ class TestStartTask:
         assert resp.status_code == 302
         assert "127.0.0.1:9999_auto_titan" in config.running_tasks
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_start_no_device_redirects(self, mock_inst, mock_devs, client):
         resp = client.post("/tasks/start", data={
             "device": "",
@@ -267,8 +435,8 @@ class TestStartTask:
         assert resp.status_code == 302
         assert len(config.running_tasks) == 0
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_start_auto_skips_if_already_running(self, mock_inst, mock_devs, client):
         # Pre-populate a running task
         ev = threading.Event()
@@ -327,15 +495,26 @@ class TestStopMode:
 class TestStopAll:
     def test_stop_all(self, client):
         ev = threading.Event()
-        t = threading.Thread(target=lambda: ev.wait(), daemon=True)
+
+        def task():
+            try:
+                ev.wait()
+            except SystemExit:    # force_stop_all kills the thread
+                pass
+
+        t = threading.Thread(target=task, daemon=True)
         t.start()
         config.running_tasks["dev_task"] = {"thread": t, "stop_event": ev}
         config.DEVICE_STATUS["dev"] = "Running..."
-        resp = client.post("/tasks/stop-all")
-        assert resp.status_code == 302
-        assert ev.is_set()
-        assert len(config.DEVICE_STATUS) == 0
-        t.join(timeout=1)
+        try:
+            resp = client.post("/tasks/stop-all")
+            assert resp.status_code == 302
+            assert ev.is_set()
+            assert len(config.DEVICE_STATUS) == 0
+        finally:
+            ev.set()
+            t.join(timeout=1)
+        assert not t.is_alive()
 
 
 # ---------------------------------------------------------------------------
@@ -462,8 +641,8 @@ class TestEnsureFirewallOpen:
 # ---------------------------------------------------------------------------
 
 class TestAutoModeExclusivity:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_auto_gold_stops_auto_quest(self, mock_inst, mock_devs, client):
         """Starting auto_gold should stop conflicting auto_quest."""
         ev_quest = threading.Event()
@@ -544,6 +723,27 @@ class TestTerritoryGridApi:
         assert len(config.MANUAL_IGNORE_SQUARES) == 0
 
 
+class TestTerritoryChangesApi:
+    def test_returns_changes_since_cursor(self, client):
+        events = [{"seq": 3, "event": "captured", "row": 1, "col": 2,
+                   "team": "red", "prev_team": "yellow", "ts": 1.0, "device": "dev1"}]
+        with patch("web.dashboard.get_territory_changes",
+                   return_value=(events, 3)) as mock_changes:
+            resp = client.get("/api/territory/changes?since=2&device=dev1")
+        assert resp.status_code == 200
+        data = json.loads(resp.data)
+        assert data["seq"] == 3
+        assert data["changes"] == events
+        mock_changes.assert_called_once_with(since=2, device="dev1")
+
+    def test_bad_cursor_defaults_to_zero(self, client):
+        with patch("web.dashboard.get_territory_changes",
+                   return_value=([], 0)) as mock_changes:
+            resp = client.get("/api/territory/changes?since=abc")
+        assert resp.status_code == 200
+        mock_changes.assert_called_once_with(since=0, device=None)
+
+
 # ---------------------------------------------------------------------------
 # Bug report endpoint tests
 # ---------------------------------------------------------------------------
@@ -563,13 +763,67 @@ class TestBugReportApi:
 # ---------------------------------------------------------------------------
 
 class TestDebugPage:
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
     def test_debug_page_returns_200(self, mock_inst, mock_devs, client):
         resp = client.get("/debug")
         assert resp.status_code == 200
         assert b"debug" in resp.data.lower()
 
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_debug_page_lists_wait_budgets(self, mock_inst, mock_devs, client):
+        import budgets
+        budgets.record_use("127.0.0.1:9999", "mithril_tunnel_open", 2.0, 2.0)
+        resp = client.get("/debug")
+        assert b"Wait Budgets" in resp.data
+        assert b"mithril_tunnel_open" in resp.data
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_debug_page_shows_screenshot_latency(self, mock_inst, mock_devs, client):
+        from botlog import history
+        history.record("adb", "127.0.0.1:6543", "screenshot", 0.25)
+        history.flush()
+        resp = client.get("/debug")
+        assert b"Screenshot Latency" in resp.data
+        assert b"6543</span>" in resp.data
+        assert b"1x, avg 250ms, p95 250ms, max 250ms" in resp.data
+
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_debug_page_shows_tunnel_lanes(self, mock_inst, mock_devs, client):
+        import tunnel
+        with patch.object(tunnel, "_status", "connected"):
+            resp = client.get("/debug")
+        assert b"Tunnel (connected)" in resp.data
+        assert b"stream &middot; 0/" in resp.data
+
+    def test_tunnel_api_reports_lanes(self, client):
+        data = client.get("/api/tunnel").get_json()
+        assert set(data["lanes"]) == {"api", "stream", "events"}
+        assert "wait_ms_p95" in data["lanes"]["api"]
+
+
+class TestStatsHistoryApi:
+    def test_latency_per_device(self, client):
+        from botlog import history
+        history.record("adb", "127.0.0.1:7777", "screenshot", 0.4)
+        history.flush()
+        data = client.get("/api/stats/history?kind=adb&label=screenshot&days=7").get_json()
+        assert data["stats"]["127.0.0.1:7777"]["p95"] == 0.4
+
+    def test_summary_without_label(self, client):
+        from botlog import history
+        history.record("action", "127.0.0.1:7777", "heal_all", 3.0)
+        history.flush()
+        data = client.get("/api/stats/history?kind=action").get_json()
+        assert any(r["label"] == "heal_all" for r in data["stats"])
+
+    def test_bad_number(self, client):
+        assert client.get("/api/stats/history?days=abc").status_code == 400
+
 
 # ---------------------------------------------------------------------------
 # startup.py tests
@@ -633,6 +887,57 @@ class TestCreateBugReportZip:
             assert "OS:" in info
 
 
+class TestProfileExports:
+    @pytest.fixture
+    def recorded(self):
+        import profiling
+        profiling.reset()
+        profiling.set_enabled(True)
+
+        @profiling.span("load_screenshot")
+        def grab(device):
+            return None
+
+        with profiling.action("127.0.0.1:9999", "rally_titan"):
+            grab("127.0.0.1:9999")
+        yield profiling
+        profiling.set_enabled(False)
+        profiling.reset()
+
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={})
+    def test_debug_page_shows_breakdown(self, mock_inst, mock_devs, client, recorded):
+        resp = client.get("/debug")
+        assert b"Profile" in resp.data
+        assert b"rally_titan" in resp.data
+        assert b"/api/profile/trace" in resp.data
+
+    def test_trace_download(self, client, recorded):
+        resp = client.get("/api/profile/trace")
+        assert "attachment" in resp.headers["Content-Disposition"]
+        names = [e["name"] for e in json.loads(resp.data)["traceEvents"]]
+        assert "rally_titan" in names and "load_screenshot" in names
+
+    def test_stacks_download(self, client, recorded):
+        resp = client.get("/api/profile/stacks")
+        assert resp.data.startswith(b"127.0.0.1:9999;rally_titan")
+
+    def test_clear(self, client, recorded):
+        resp = client.post("/api/profile/clear")
+        assert resp.status_code == 302
+        assert recorded.breakdown() == []
+
+    @patch("devices.get_devices", return_value=[])
+    def test_bug_report_includes_profile(self, mock_devs, recorded):
+        import zipfile
+        import io
+        from startup import create_bug_report_zip
+        zip_bytes, _ = create_bug_report_zip(clear_debug=False)
+        with zipfile.ZipFile(io.BytesIO(zip_bytes), "r") as zf:
+            assert {"profile/trace.json", "profile/stacks.txt"} <= set(zf.namelist())
+            assert "rally_titan" in zf.read("profile/stacks.txt").decode()
+
+
 class TestCreateBugReportZipClearDebug:
     """Test clear_debug parameter on create_bug_report_zip."""
 
@@ -774,16 +1079,16 @@ class TestUploadLogsApi:
 class TestApiStatusUpload:
     """Upload status field in /api/status response."""
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard._upload_status", return_value={"enabled": True})
     def test_upload_status_included(self, mock_us, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
         assert "upload" in data
         assert data["upload"]["enabled"] is True
 
-    @patch("web.dashboard.get_devices", return_value=[])
-    @patch("web.dashboard.get_emulator_instances", return_value={})
+    @patch("devices.get_devices", return_value=[])
+    @patch("devices.get_emulator_instances", return_value={})
     @patch("web.dashboard._upload_status", return_value={"enabled": False})
     def test_upload_disabled(self, mock_us, mock_inst, mock_devs, client):
         data = json.loads(client.get("/api/status").data)
@@ -824,8 +1129,8 @@ class TestDeviceScopedRoutes:
         return device_hash(device_id), generate_device_token(device_id)
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_index_valid_token(self, _inst, _devs, _key, client):
         dhash, token = self._get_hash_and_token(self.DEVICE)
         resp = client.get(f"/d/{dhash}?token={token}")
@@ -833,31 +1138,31 @@ class TestDeviceScopedRoutes:
         assert b"MuMu" in resp.data
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_index_invalid_token(self, _inst, _devs, _key, client):
         dhash, _ = self._get_hash_and_token(self.DEVICE)
         resp = client.get(f"/d/{dhash}?token=0000000000000000")
         assert resp.status_code == 403
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_index_missing_token(self, _inst, _devs, _key, client):
         dhash, _ = self._get_hash_and_token(self.DEVICE)
         resp = client.get(f"/d/{dhash}")
         assert resp.status_code == 403
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_index_unknown_hash(self, _inst, _devs, _key, client):
         resp = client.get("/d/deadbeef?token=0000000000000000")
         assert resp.status_code == 404
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_index_hides_settings_nav(self, _inst, _devs, _key, client):
         """Friend view should not show Settings or Restart."""
         dhash, token = self._get_hash_and_token(self.DEVICE)
@@ -866,8 +1171,22 @@ class TestDeviceScopedRoutes:
         assert b"Restart" not in resp.data
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    def test_device_events_scoped(self, _inst, _devs, _key, client):
+        config.set_device_status(self.DEVICE, "Idle")
+        config.set_device_status("127.0.0.1:8888", "Questing...")
+        dhash, token = self._get_hash_and_token(self.DEVICE)
+        resp = client.get(f"/d/{dhash}/api/events?token={token}", buffered=False)
+        try:
+            _, data = _read_event(resp)
+        finally:
+            resp.close()
+        assert list(data["changes"]["devices"]) == [self.DEVICE]
+
+    @patch("license.get_license_key", return_value="test-key-xyz")
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_api_status_valid(self, _inst, _devs, _key, client):
         dhash, token = self._get_hash_and_token(self.DEVICE)
         resp = client.get(f"/d/{dhash}/api/status?token={token}")
@@ -879,8 +1198,8 @@ class TestDeviceScopedRoutes:
         assert data["devices"][0]["id"] == self.DEVICE
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_stop_all(self, _inst, _devs, _key, client):
         dhash, token = self._get_hash_and_token(self.DEVICE)
         resp = client.post(f"/d/{dhash}/tasks/stop-all?token={token}")
@@ -888,8 +1207,8 @@ class TestDeviceScopedRoutes:
         assert resp.status_code in (200, 302)
 
     @patch("license.get_license_key", return_value="test-key-xyz")
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_owner_index_has_share_button(self, _inst, _devs, _key, client):
         """Owner view should show Share button on device cards."""
         resp = client.get("/")
@@ -899,15 +1218,15 @@ class TestDeviceScopedRoutes:
 class TestDeviceSettingsRoutes:
     """Device-specific settings pages."""
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_settings_page_200(self, _inst, _devs, client):
         resp = client.get("/settings/device/127.0.0.1:9999")
         assert resp.status_code == 200
         assert b"Override" in resp.data
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_settings_save(self, _inst, _devs, client):
         resp = client.post("/settings/device/127.0.0.1:9999", data={
             "override_auto_heal": "on",
@@ -917,14 +1236,14 @@ class TestDeviceSettingsRoutes:
         })
         assert resp.status_code == 302  # redirect back
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_device_settings_reset(self, _inst, _devs, client):
         resp = client.post("/settings/device/127.0.0.1:9999/reset")
         assert resp.status_code == 302
 
-    @patch("web.dashboard.get_devices", return_value=["127.0.0.1:9999"])
-    @patch("web.dashboard.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
+    @patch("devices.get_devices", return_value=["127.0.0.1:9999"])
+    @patch("devices.get_emulator_instances", return_value={"127.0.0.1:9999": "MuMu"})
     def test_global_settings_has_device_tabs(self, _inst, _devs, client):
         """Global settings page should show device tabs."""
         resp = client.get("/settings")
@@ -0,0 +1,179 @@
+"""Tests for web/streaming.py — shared MJPEG broadcaster."""
+
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+import vision
+from web import streaming
+from web.streaming import (StreamBroadcaster, RateController, get_broadcaster,
+                           stream_status, LEVELS, START_LEVEL, UPGRADE_AFTER)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    streaming._broadcasters.clear()
+    yield
+    streaming._broadcasters.clear()
+
+
+def _frame(value=100):
+    return np.full((64, 36, 3), value, dtype=np.uint8)
+
+
+def _wait_for(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestFanOut:
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_subscribers_share_one_capture_and_encode(self, mock_load):
+        b = StreamBroadcaster("dev1", 30)
+        gens = [b.frames_for(10) for _ in range(3)]
+        with patch("web.streaming.cv2.imencode", wraps=streaming.cv2.imencode) as enc:
+            parts = [next(g) for g in gens]
+            assert b.subscriber_count == 3
+            assert parts[0].startswith(b"--frame\r\nContent-Type: image/jpeg\r\n")
+            # One encode per distinct frame, however many viewers
+            assert enc.call_count == b.frames == 1
+        for g in gens:
+            g.close()
+        assert _wait_for(lambda: not b.status()["active"])
+        assert b.frames < 5
+
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_stops_capturing_after_last_unsubscribe(self, mock_load):
+        b = StreamBroadcaster("dev1", 30)
+        g = b.frames_for(10)
+        next(g)
+        g.close()
+        assert b.subscriber_count == 0
+        assert _wait_for(lambda: not b.status()["active"])
+        calls = mock_load.call_count
+        time.sleep(0.25)
+        assert mock_load.call_count == calls
+
+    @patch("vision.capture_for_observer")
+    def test_reuses_fresh_bot_frame(self, mock_load):
+        with vision._frame_cache_lock:
+            vision._frame_cache["dev1"] = (time.time() + 60, _frame(7))
+        try:
+            b = StreamBroadcaster("dev1", 30)
+            g = b.frames_for(5)
+            next(g)
+            g.close()
+            mock_load.assert_not_called()
+            assert b.status()["reused_frames"] >= 1
+        finally:
+            vision._frame_cache.pop("dev1", None)
+
+    @patch("vision.capture_for_observer", return_value=None)
+    def test_no_frame_no_part(self, mock_load):
+        b = StreamBroadcaster("dev1", 30)
+        sub_id = b.subscribe(10)
+        assert _wait_for(lambda: mock_load.call_count >= 2)
+        assert b.status()["frames"] == 0
+        b.unsubscribe(sub_id)
+        assert _wait_for(lambda: not b.status()["active"])
+
+
+class TestUnchangedFrames:
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_identical_captures_skipped(self, mock_load):
+        b = StreamBroadcaster("dev1", 30)
+        sub_id = b.subscribe(10)
+        assert _wait_for(lambda: mock_load.call_count >= 3)
+        b.unsubscribe(sub_id)
+        assert b.frames == 1
+        assert b.status()["skipped_frames"] >= 2
+
+    @patch("web.streaming.IDLE_WAIT_S", 0.05)
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_static_screen_resends_keepalive(self, _):
+        b = StreamBroadcaster("dev1", 30)
+        g = b.frames_for(10)
+        first, second = next(g), next(g)
+        g.close()
+        assert first == second
+        assert b.frames == 1
+
+
+class TestRateController:
+    def test_steps_down_when_over_budget(self):
+        ctl = RateController(fps=5, kbps=100)
+        ctl.sent(60 * 1024, 0.001)   # 300 KB/s needed
+        assert ctl.level == START_LEVEL + 1
+
+    def test_steps_up_after_sustained_headroom(self):
+        ctl = RateController(fps=5, kbps=1000)
+        for _ in range(UPGRADE_AFTER):
+            ctl.sent(10 * 1024, 0.001)
+        assert ctl.level == START_LEVEL - 1
+
+    def test_blocked_writes_cap_rate(self):
+        ctl = RateController(fps=5, kbps=1000)
+        ctl.sent(20 * 1024, 0.5)      # client drained 40 KB/s
+        assert ctl.rate == pytest.approx(0.8 * 40 * 1024)
+        assert ctl.level > START_LEVEL
+
+    def test_gap_keeps_lowest_rung_under_budget(self):
+        ctl = RateController(fps=10, kbps=20)
+        ctl.level = len(LEVELS) - 1
+        ctl.sent(10 * 1024, 0.001)
+        assert ctl.level == len(LEVELS) - 1
+        assert ctl.min_gap == pytest.approx(0.5)   # 10 KB frames at 20 KB/s
+
+
+class TestAdaptive:
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_downscales_and_shares_encodes(self, _):
+        b = StreamBroadcaster("dev1", None)
+        gens = [b.adaptive_frames(5) for _ in range(2)]
+        with patch("web.streaming.cv2.imencode", wraps=streaming.cv2.imencode) as enc:
+            parts = [next(g) for g in gens]
+            assert parts[0] == parts[1]
+            assert enc.call_count == 1
+        jpeg = parts[0].split(b"\r\n\r\n", 1)[1][:-2]
+        img = streaming.cv2.imdecode(np.frombuffer(jpeg, np.uint8), streaming.cv2.IMREAD_COLOR)
+        scale = LEVELS[START_LEVEL][0]
+        assert img.shape[:2] == (int(64 * scale), int(36 * scale))
+        assert b.status()["viewers"][0]["scale"] == scale
+        for g in gens:
+            g.close()
+
+    def test_tiles_send_only_changed_tile(self):
+        b = StreamBroadcaster("dev1", None)
+        frame = np.zeros((160, 80, 3), np.uint8)
+        part, prev = b._tile_parts(1, frame, 0, None)
+        assert part.count(b"X-Tile: 0,0,80,160,80,160") == 1
+        changed = frame.copy()
+        changed[0:5, 0:5] = 255
+        part, _ = b._tile_parts(2, changed, 0, prev)
+        assert part.count(b"--frame") == 1
+        assert b"X-Tile: 0,0,20,20,80,160" in part
+
+
+class TestRegistry:
+    def test_same_device_and_quality_share_broadcaster(self):
+        assert get_broadcaster("dev1", 30) is get_broadcaster("dev1", 30)
+        assert get_broadcaster("dev1", 30) is not get_broadcaster("dev1", 60)
+
+    @patch("vision.capture_for_observer", return_value=_frame())
+    def test_status_reports_subscribers_and_encode_time(self, _):
+        g = get_broadcaster("dev1", 30).frames_for(4)
+        next(g)
+        status = stream_status()
+        assert len(status) == 1
+        assert status[0]["device"] == "dev1"
+        assert status[0]["subscribers"] == 1
+        assert status[0]["fps"] == 4
+        assert status[0]["encode_ms"] >= 0
+        g.close()
+        assert _wait_for(lambda: stream_status() == [])
@@ -9,9 +9,11 @@ from enum import Enum
 from typing import Optional, List, Dict, Tuple
 
 import config
-from vision import (load_screenshot, tap_image, adb_tap, logged_tap,
-                    get_template, save_failure_screenshot, timed_wait)
-from navigation import navigate
+import state_store
+from vision import (load_screenshot, Regions, tap_image, adb_tap, logged_tap,
+                    get_template, save_failure_screenshot, timed_wait,
+                    on_frame, on_settled)
+from navigation import navigate, check_screen, SCREEN_REGIONS
 from config import Screen
 from botlog import get_logger, timed_action
 
@@ -154,6 +156,10 @@ _troop_status: Dict[str, DeviceTroopSnapshot] = {}
 def _store_snapshot(device: str, snapshot: DeviceTroopSnapshot):
     with _troop_status_lock:
         _troop_status[device] = snapshot
+    state_store.publish(("devices", device, "troops"),
+                        [{"action": t.action.value, "time_left": t.time_left}
+                         for t in snapshot.troops])
+    state_store.publish(("devices", device, "snapshot_at"), snapshot.read_at)
 
 
 def _get_snapshot(device: str) -> Optional[DeviceTroopSnapshot]:
@@ -181,29 +187,56 @@ _SLOT_PATTERNS = {
     4: {"match": [960], "no_match": [640, 800, 1110, 1270]},
 }
 
+# Crops read instead of full frames (load_screenshot regions=...):
+#   slots — the _TROOP_X pixel column covering every slot Y above
+#   panel — the troop card column (x=10-180, all card positions); holds
+#           the slot column too
+#   map   — where the map_screen marker sits (same box as check_screen)
+_SLOTS_TOP = 640
+_PANEL_TOP = 560
+_PANEL_LEFT = 10
+_SLOTS_ROI = Regions(slots=(_TROOP_X, _SLOTS_TOP, _TROOP_X + 1, 1271),
+                     map=SCREEN_REGIONS[Screen.MAP])
+_PANEL_ROI = Regions(panel=(_PANEL_LEFT, _PANEL_TOP, 180, 1351),
+                     map=SCREEN_REGIONS[Screen.MAP])
+
+
+def _map_screen_score(map_crop):
+    """Best map_screen.png match in the map-marker crop, or None if the
+    template is missing (callers then skip the check)."""
+    map_tpl = get_template("elements/map_screen.png")
+    if map_tpl is None:
+        return None
+    result = cv2.matchTemplate(map_crop, map_tpl, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, _ = cv2.minMaxLoc(result)
+    return max_val
+
+
+def _yellow_checker(column, top):
+    """is_yellow(y) over a crop of the _TROOP_X pixel column starting at y=top."""
+    def is_yellow(y):
+        pixel = column[y - top, 0].astype(np.int16)
+        return np.all(np.abs(pixel - _TROOP_COLOR) < _TROOP_TOLERANCE)
+    return is_yellow
+
 def troops_avail(device):
     """Check how many troops are available (0-5) by checking pixel colors.
     Only valid on map_screen — verifies using the screenshot before reading pixels."""
     log = get_logger("troops", device)
-    screen = load_screenshot(device)
+    crops = load_screenshot(device, regions=_SLOTS_ROI)
 
-    if screen is None:
+    if crops is None:
         log.warning("Failed to load screenshot for troops check")
         return 0
 
-    # Verify we're on map_screen using the same screenshot (no extra ADB call).
+    # Verify we're on map_screen using the same capture (no extra ADB call).
     # Troop pixel positions only make sense on the map screen.
-    map_tpl = get_template("elements/map_screen.png")
-    if map_tpl is not None:
-        result = cv2.matchTemplate(screen, map_tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(result)
-        if max_val < 0.8:
-            log.warning("troops_avail called but not on map_screen (best: %.0f%%) — returning 0", max_val * 100)
-            return 0
+    max_val = _map_screen_score(crops["map"])
+    if max_val is not None and max_val < 0.8:
+        log.warning("troops_avail called but not on map_screen (best: %.0f%%) — returning 0", max_val * 100)
+        return 0
 
-    def is_yellow(y):
-        pixel = screen[y, _TROOP_X].astype(np.int16)
-        return np.all(np.abs(pixel - _TROOP_COLOR) < _TROOP_TOLERANCE)
+    is_yellow = _yellow_checker(crops["slots"], _SLOTS_TOP)
 
     # Pixel patterns are calibrated for 5-troop accounts.
     # For accounts with fewer total troops, adjust the detected count.
@@ -243,13 +276,14 @@ def heal_all(device):
             break
         healed_any = True
         log.debug("Starting heal sequence...")
-        timed_wait(device, lambda: False, 1, "heal_dialog_open")
+        timed_wait(device, on_settled(device), 1, "heal_dialog_open")
         logged_tap(device, 700, 1460, "heal_all_btn")
-        timed_wait(device, lambda: False, 1, "heal_confirm_ready")
+        timed_wait(device, on_settled(device), 1, "heal_confirm_ready")
         logged_tap(device, 542, 1425, "heal_confirm")
-        timed_wait(device, lambda: False, 1, "heal_result_show")
+        timed_wait(device, on_settled(device), 1, "heal_result_show")
         logged_tap(device, 1000, 200, "heal_close")
-        timed_wait(device, lambda: False, 2, "heal_close_settle")
+        timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP),
+                   2, "heal_close_settle")
     else:
         log.warning("Heal loop hit safety cap (%d iterations) — possible stuck UI", config.MAX_HEAL_ITERATIONS)
         save_failure_screenshot(device, "heal_stuck_ui")
@@ -368,34 +402,33 @@ def _match_status_icon(card_img: np.ndarray) -> Tuple[Optional[TroopAction], flo
 def read_panel_statuses(device, screen=None) -> Optional[DeviceTroopSnapshot]:
     """Read troop statuses from the map screen panel via icon template matching.
 
-    Takes a screenshot (or reuses `screen`), detects how many troops are deployed,
-    then matches each deployed card's TR icon against known status templates.
+    Captures just the card panel (or crops it from `screen`), detects how many
+    troops are deployed, then matches each deployed card's TR icon against known status templates.
     Stores and returns a DeviceTroopSnapshot.
     """
     log = get_logger("troops", device)
 
     if screen is None:
-        screen = load_screenshot(device)
-    if screen is None:
+        crops = load_screenshot(device, regions=_PANEL_ROI)
+    else:
+        crops = _PANEL_ROI.crop(screen)
+    if crops is None:
         log.warning("read_panel_statuses: no screenshot")
         return None
 
     # Verify map_screen
-    map_tpl = get_template("elements/map_screen.png")
-    if map_tpl is not None:
-        result = cv2.matchTemplate(screen, map_tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(result)
-        if max_val < 0.8:
-            log.warning("read_panel_statuses: not on map_screen (%.0f%%)", max_val * 100)
-            return None
+    max_val = _map_screen_score(crops["map"])
+    if max_val is not None and max_val < 0.8:
+        log.warning("read_panel_statuses: not on map_screen (%.0f%%)", max_val * 100)
+        return None
 
-    # Determine available/deployed count using pixel check on this screenshot
+    # Determine available/deployed count using pixel check on this capture
     total = config.DEVICE_TOTAL_TROOPS.get(device, 5)
     offset = 5 - total
 
-    def is_yellow(y):
-        pixel = screen[y, _TROOP_X].astype(np.int16)
-        return np.all(np.abs(pixel - _TROOP_COLOR) < _TROOP_TOLERANCE)
+    panel = crops["panel"]
+    column = _TROOP_X - _PANEL_LEFT
+    is_yellow = _yellow_checker(panel[:, column:column + 1], _PANEL_TOP)
 
     avail_raw = None
     for count, pattern in _SLOT_PATTERNS.items():
@@ -437,8 +470,8 @@ def read_panel_statuses(device, screen=None) -> Optional[DeviceTroopSnapshot]:
     for mid_y in card_midpoints:
         card_top = mid_y - _CARD_HEIGHT // 2
         card_bottom = card_top + _CARD_HEIGHT
-        # Crop the card from the screenshot (x=10 to x=180)
-        card_img = screen[card_top:card_bottom, 10:180]
+        # The card spans the whole panel crop (x=10 to x=180)
+        card_img = panel[card_top - _PANEL_TOP:card_bottom - _PANEL_TOP]
 
         action, score = _match_status_icon(card_img)
         if action is not None:
@@ -3,7 +3,8 @@
 
 Connects to a relay server and forwards proxied HTTP requests to the local
 Flask dashboard at localhost:8080.  Runs in a daemon thread with its own
-asyncio event loop.
+asyncio event loop.  Bodies travel as raw bytes in binary frames when the
+relay supports it, else as base64 in JSON (see "Wire protocol" below).
 
 Public API
 ----------
@@ -11,16 +12,29 @@ start_tunnel(relay_url, relay_secret, bot_name)
     Start the tunnel in a background daemon thread.
 stop_tunnel()
     Signal the tunnel to disconnect and stop.
-tunnel_status() -> str
-    Return "connected", "connecting", "disconnected", or "disabled".
+tunnel_status(detail=False) -> str | dict
+    Return "connected", "connecting", "disconnected", or "disabled"; with
+    ``detail`` a dict that adds per-lane queue/latency metrics (shown on
+    the dashboard's debug page and at /api/tunnel).
+
+Requests are forwarded on two lanes: "api" (short requests, a bounded
+worker pool with a queue) and "stream" (MJPEG, one long-lived connection
+each, capped so streams can't take every worker).  Each request opens its
+own connection to the dashboard: werkzeug closes every connection after
+one response, so there is nothing to keep alive.
 """
 
 import asyncio
 import base64
+import collections
 import http.client
 import json
 import logging
+import struct
 import threading
+import time
+import urllib.parse
+import zlib
 from concurrent.futures import ThreadPoolExecutor
 
 _log = logging.getLogger("tunnel")
@@ -39,75 +53,263 @@ _streams_lock = threading.Lock()
 
 RECONNECT_BASE = 5            # initial backoff seconds
 RECONNECT_MAX = 60            # cap
-LOCAL_URL = "http://127.0.0.1:8080"
-EXECUTOR_WORKERS = 4
+LOCAL_HOST = "127.0.0.1"
+LOCAL_PORT = 8080
+API_LANE_WORKERS = 8          # concurrent short requests to the dashboard
+API_LANE_QUEUE = 64           # short requests allowed to wait for a worker
+STREAM_LANE_WORKERS = 8       # concurrent MJPEG streams; more are refused with 503
+EVENT_LANE_WORKERS = 32       # concurrent SSE status feeds (one per remote tab); more get 503
+LANE_SAMPLES = 200            # recent requests kept for latency metrics
 LOCAL_TIMEOUT = 25            # per-request timeout for local forwarding
 STREAM_TIMEOUT = 300          # long timeout for streaming connections
 STREAM_CHUNK_SIZE = 65536     # 64KB chunks for streaming
+BINARY_FRAMES = True          # offer the binary protocol to the relay
+DEFLATE_MIN_BYTES = 1024      # deflate text bodies at least this large (binary frames)
 
 # ---------------------------------------------------------------------------
-# Local HTTP forwarding (runs in thread pool)
+# Wire protocol
 # ---------------------------------------------------------------------------
+# The tunnel offers BINARY_SUBPROTOCOL in the WebSocket handshake.  A relay
+# that accepts it exchanges binary frames; one that doesn't (older relays)
+# gets the original JSON messages with base64 bodies.
+#
+# Binary frame (network byte order):
+#   version u8 | type u8 | flags u8 | id_len u8 | meta_len u32
+#   | request id (utf-8) | meta (JSON, may be empty) | body (raw bytes)
+#
+# WebSocket permessage-deflate is off when binary frames are offered — it
+# spent most of the request time recompressing JPEGs.  Text bodies are
+# deflated per frame instead (FLAG_DEFLATE).  If the relay turns the
+# subprotocol down, the tunnel reconnects straight away with
+# permessage-deflate on, so JSON/base64 traffic to older relays stays
+# compressed.
+#
+# Keep in sync with relay/relay_server.py, which is deployed standalone.
+
+BINARY_SUBPROTOCOL = "9bot-tunnel.v1"
+FRAME_VERSION = 1
+FRAME_REQUEST = 1             # relay -> bot: meta {method, path, headers}
+FRAME_RESPONSE = 2            # bot -> relay: meta {status, headers}
+FRAME_STREAM_START = 3        # bot -> relay: meta {status, headers}
+FRAME_STREAM_CHUNK = 4        # bot -> relay: body only
+FRAME_STREAM_END = 5          # bot -> relay
+FRAME_CANCEL = 6              # relay -> bot: stop the stream with this id
+FLAG_DEFLATE = 0x01           # body is zlib-compressed
+_FRAME_HEADER = struct.Struct("!BBBBI")
+
+# Legacy JSON "stream" field for each streaming frame type
+_LEGACY_STREAM = {FRAME_STREAM_START: "start", FRAME_STREAM_CHUNK: "chunk",
+                  FRAME_STREAM_END: "end"}
+
+
+def encode_frame(ftype: int, req_id: str, meta: dict | None = None,
+                 body: bytes = b"", flags: int = 0) -> bytes:
+    """Pack one binary protocol frame."""
+    rid = req_id.encode()
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode() if meta else b""
+    header = _FRAME_HEADER.pack(FRAME_VERSION, ftype, flags, len(rid), len(meta_bytes))
+    return b"".join((header, rid, meta_bytes, body))
+
+
+def decode_frame(data: bytes) -> tuple[int, str, dict, bytes]:
+    """Unpack a binary frame into (type, request id, meta, body).
+
+    Inflates FLAG_DEFLATE bodies.  Raises ValueError on a truncated or
+    corrupt frame or an unknown version.
+    """
+    if len(data) < _FRAME_HEADER.size:
+        raise ValueError("truncated frame")
+    version, ftype, flags, id_len, meta_len = _FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    pos = _FRAME_HEADER.size
+    if len(data) < pos + id_len + meta_len:
+        raise ValueError("truncated frame")
+    view = memoryview(data)
+    req_id = bytes(view[pos:pos + id_len]).decode()
+    pos += id_len
+    meta = json.loads(bytes(view[pos:pos + meta_len])) if meta_len else {}
+    pos += meta_len
+    if flags & FLAG_DEFLATE:
+        try:
+            return ftype, req_id, meta, zlib.decompress(view[pos:])
+        except zlib.error as e:
+            raise ValueError(f"corrupt body: {e}") from None
+    return ftype, req_id, meta, bytes(view[pos:])
+
+
+def _legacy_message(ftype: int, req_id: str, meta: dict | None, body: bytes) -> dict:
+    """The JSON message an older relay expects for a bot -> relay frame."""
+    msg = {"id": req_id, **(meta or {})}
+    if ftype in _LEGACY_STREAM:
+        msg["stream"] = _LEGACY_STREAM[ftype]
+    if ftype in (FRAME_RESPONSE, FRAME_STREAM_CHUNK):
+        msg["body_b64"] = base64.b64encode(body).decode("ascii")
+    return msg
+
+
+def _compressible(meta: dict | None) -> bool:
+    headers = (meta or {}).get("headers", {})
+    ctype = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+    return ctype.startswith("text/") or "json" in ctype or "javascript" in ctype
+
+
+async def _send(ws, binary: bool, ftype: int, req_id: str,
+                meta: dict | None = None, body: bytes = b"") -> None:
+    if binary:
+        flags = 0
+        if ftype == FRAME_RESPONSE and len(body) >= DEFLATE_MIN_BYTES and _compressible(meta):
+            body, flags = zlib.compress(body, 6), FLAG_DEFLATE
+        await ws.send(encode_frame(ftype, req_id, meta, body, flags))
+    else:
+        await ws.send(json.dumps(_legacy_message(ftype, req_id, meta, body)))
+
+
+def _parse_relay_message(raw) -> tuple[int, str, dict, bytes]:
+    """Normalize a relay message (binary frame or legacy JSON) to
+    (type, request id, meta, body).  Raises ValueError if malformed."""
+    if isinstance(raw, bytes):
+        return decode_frame(raw)
+    try:
+        msg = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e)) from None
+    if "cancel_stream" in msg:
+        return FRAME_CANCEL, msg["cancel_stream"], {}, b""
+    body_b64 = msg.pop("body_b64", "")
+    body = base64.b64decode(body_b64) if body_b64 else b""
+    return FRAME_REQUEST, msg.pop("id"), msg, body
 
-def _forward_to_local(msg: dict) -> dict:
-    """Forward a proxied request to the local Flask dashboard.
+# ---------------------------------------------------------------------------
+# Request lanes
+# ---------------------------------------------------------------------------
 
-    Uses http.client directly (instead of urllib.request) so that redirects
-    are returned as-is — the relay server rewrites Location headers and the
-    browser follows the redirect itself.
-    """
-    path = msg.get("path", "/")
-    method = msg.get("method", "GET")
-    headers = msg.get("headers", {})
-    body_b64 = msg.get("body_b64", "")
-    body = base64.b64decode(body_b64) if body_b64 else None
+class _Lane:
+    """Bounded worker pool for one class of proxied request, with metrics."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix=f"tunnel-{name}")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_ms: collections.deque = collections.deque(maxlen=LANE_SAMPLES)
+        self._run_ms: collections.deque = collections.deque(maxlen=LANE_SAMPLES)
+
+    def submit(self, fn, *args) -> asyncio.Future | None:
+        """Run ``fn(*args)`` on this lane; None if the lane is full."""
+        with self._lock:
+            if self.queued + self.active >= self.workers + self.max_queue:
+                self.rejected += 1
+                return None
+            self.queued += 1
+        enqueued = time.monotonic()
+
+        def run():
+            started = time.monotonic()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self._wait_ms.append((started - enqueued) * 1000)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self._run_ms.append((time.monotonic() - started) * 1000)
+
+        return asyncio.get_event_loop().run_in_executor(self._executor, run)
+
+    def status(self) -> dict:
+        with self._lock:
+            waits = sorted(self._wait_ms)
+            runs = list(self._run_ms)
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                "wait_ms_p95": round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+                "run_ms_avg": round(sum(runs) / len(runs), 1) if runs else 0.0,
+            }
+
+
+_lanes = {
+    "api": _Lane("api", API_LANE_WORKERS, API_LANE_QUEUE),
+    "stream": _Lane("stream", STREAM_LANE_WORKERS, 0),
+    # SSE feeds hold a worker for as long as the tab is open but are mostly
+    # idle — kept apart so open dashboards can't starve the MJPEG streams
+    "events": _Lane("events", EVENT_LANE_WORKERS, 0),
+}
+
+# ---------------------------------------------------------------------------
+# Local HTTP forwarding (runs on a lane)
+# ---------------------------------------------------------------------------
+
+def _local_headers(headers: dict) -> dict:
+    """Drop headers that shouldn't be forwarded to the local dashboard."""
+    return {k: v for k, v in headers.items()
+            if k.lower() not in ("host", "transfer-encoding", "connection")}
 
-    # Filter headers that shouldn't be forwarded
-    fwd_headers = {}
-    for k, v in headers.items():
-        if k.lower() in ("host", "transfer-encoding", "connection"):
-            continue
-        fwd_headers[k] = v
 
+def _forward_raw(meta: dict, body: bytes | None) -> tuple[int, dict, bytes]:
+    """Forward a proxied request to the local Flask dashboard.
+
+    Returns (status, headers, body).  Uses http.client directly (instead of
+    urllib.request) so that redirects are returned as-is — the relay server
+    rewrites Location headers and the browser follows the redirect itself.
+    """
+    conn = None
     try:
-        conn = http.client.HTTPConnection("127.0.0.1", 8080,
+        conn = http.client.HTTPConnection(LOCAL_HOST, LOCAL_PORT,
                                           timeout=LOCAL_TIMEOUT)
-        conn.request(method, path, body=body, headers=fwd_headers)
+        conn.request(meta.get("method", "GET"), meta.get("path", "/"), body=body or None,
+                     headers=_local_headers(meta.get("headers", {})))
         resp = conn.getresponse()
         resp_body = resp.read()
         resp_headers = {k: v for k, v in resp.getheaders()
                         if k.lower() not in ("transfer-encoding", "connection")}
-        return {
-            "id": msg["id"],
-            "status": resp.status,
-            "headers": resp_headers,
-            "body_b64": base64.b64encode(resp_body).decode("ascii"),
-        }
+        return resp.status, resp_headers, resp_body
     except Exception as e:
         _log.debug("Local forward failed: %s", e)
-        return {
-            "id": msg["id"],
-            "status": 502,
-            "headers": {"Content-Type": "text/plain"},
-            "body_b64": base64.b64encode(
-                f"Local dashboard unreachable: {e}".encode()
-            ).decode("ascii"),
-        }
+        return (502, {"Content-Type": "text/plain"},
+                f"Local dashboard unreachable: {e}".encode())
     finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _forward_to_local(msg: dict) -> dict:
+    """Forward a legacy JSON request message; returns the JSON response message."""
+    body_b64 = msg.get("body_b64", "")
+    status, headers, body = _forward_raw(msg, base64.b64decode(body_b64) if body_b64 else None)
+    return _legacy_message(FRAME_RESPONSE, msg["id"],
+                           {"status": status, "headers": headers}, body)
 
 # ---------------------------------------------------------------------------
 # Streaming support (MJPEG etc.)
 # ---------------------------------------------------------------------------
 
-def _is_streaming_path(path: str) -> bool:
-    """Check if a request path targets a streaming endpoint."""
+def _streaming_lane(path: str) -> str | None:
+    """Lane for a streaming endpoint ("stream" or "events"), None otherwise."""
     # Strip query string for matching
     clean = path.split("?")[0]
-    return clean.endswith("/api/stream")
+    if clean.endswith("/api/stream"):
+        return "stream"
+    if clean.endswith("/api/events"):
+        return "events"
+    return None
 
 
 def _cancel_stream(req_id: str) -> None:
@@ -125,9 +327,9 @@ def _cancel_stream(req_id: str) -> None:
         _log.debug("Cancelled stream %s", req_id)
 
 
-async def _handle_streaming_request(ws, msg: dict) -> None:
+async def _handle_streaming_request(ws, binary: bool, req_id: str, meta: dict,
+                                    lane: str = "stream") -> None:
     """Handle a streaming request by forwarding chunks via WebSocket."""
-    req_id = msg["id"]
     cancel = threading.Event()
     queue: asyncio.Queue = asyncio.Queue()
     loop = asyncio.get_event_loop()
@@ -135,36 +337,27 @@ async def _handle_streaming_request(ws, msg: dict) -> None:
     def _blocking_stream():
         conn = None
         try:
-            path = msg.get("path", "/")
-            method = msg.get("method", "GET")
-            headers = {k: v for k, v in msg.get("headers", {}).items()
-                       if k.lower() not in ("host", "transfer-encoding", "connection")}
-
-            conn = http.client.HTTPConnection("127.0.0.1", 8080,
+            conn = http.client.HTTPConnection(LOCAL_HOST, LOCAL_PORT,
                                                timeout=STREAM_TIMEOUT)
             with _streams_lock:
                 _active_streams[req_id] = (cancel, conn)
 
-            conn.request(method, path, headers=headers)
+            conn.request(meta.get("method", "GET"), meta.get("path", "/"),
+                         headers=_local_headers(meta.get("headers", {})))
             resp = conn.getresponse()
             resp_headers = {k: v for k, v in resp.getheaders()
                            if k.lower() not in ("transfer-encoding", "connection")}
 
-            # Send stream_start
-            loop.call_soon_threadsafe(queue.put_nowait, {
-                "id": req_id, "stream": "start",
-                "status": resp.status, "headers": resp_headers,
-            })
+            loop.call_soon_threadsafe(queue.put_nowait, (
+                FRAME_STREAM_START, {"status": resp.status, "headers": resp_headers}, b""))
 
             # Read and forward chunks
             while not cancel.is_set():
-                chunk = resp.read(STREAM_CHUNK_SIZE)
+                chunk = resp.read1(STREAM_CHUNK_SIZE)
                 if not chunk:
                     break
-                loop.call_soon_threadsafe(queue.put_nowait, {
-                    "id": req_id, "stream": "chunk",
-                    "body_b64": base64.b64encode(chunk).decode("ascii"),
-                })
+                loop.call_soon_threadsafe(queue.put_nowait,
+                                          (FRAME_STREAM_CHUNK, None, chunk))
         except Exception as e:
             if not cancel.is_set():
                 _log.debug("Stream read error for %s: %s", req_id, e)
@@ -176,20 +369,21 @@ async def _handle_streaming_request(ws, msg: dict) -> None:
                     conn.close()
                 except Exception:
                     pass
-            loop.call_soon_threadsafe(queue.put_nowait, {
-                "id": req_id, "stream": "end",
-            })
+            loop.call_soon_threadsafe(queue.put_nowait, (FRAME_STREAM_END, None, b""))
 
-    thread = threading.Thread(target=_blocking_stream, daemon=True,
-                               name=f"stream-{req_id[:8]}")
-    thread.start()
+    if _lanes[lane].submit(_blocking_stream) is None:
+        _log.debug("%s lane full, refusing %s", lane.capitalize(), req_id)
+        await _send(ws, binary, FRAME_RESPONSE, req_id,
+                    {"status": 503, "headers": {"Content-Type": "text/plain"}},
+                    b"Too many streams")
+        return
 
-    # Forward queued messages via WebSocket
+    # Forward queued frames via WebSocket
     try:
         while True:
-            chunk_msg = await queue.get()
-            await ws.send(json.dumps(chunk_msg))
-            if chunk_msg.get("stream") == "end":
+            ftype, frame_meta, body = await queue.get()
+            await _send(ws, binary, ftype, req_id, frame_meta, body)
+            if ftype == FRAME_STREAM_END:
                 break
     except Exception:
         _cancel_stream(req_id)
@@ -199,18 +393,24 @@ async def _handle_streaming_request(ws, msg: dict) -> None:
 # Async tunnel loop
 # ---------------------------------------------------------------------------
 
-async def _handle_request(ws, msg: dict, executor: ThreadPoolExecutor) -> None:
+async def _handle_request(ws, binary: bool, req_id: str, meta: dict,
+                          body: bytes) -> None:
     """Process one proxied request and send the response back."""
-    path = msg.get("path", "/")
-    if _is_streaming_path(path):
-        await _handle_streaming_request(ws, msg)
+    lane = _streaming_lane(meta.get("path", "/"))
+    if lane is not None:
+        await _handle_streaming_request(ws, binary, req_id, meta, lane)
         return
-    loop = asyncio.get_event_loop()
     try:
-        response = await loop.run_in_executor(executor, _forward_to_local, msg)
-        await ws.send(json.dumps(response))
+        future = _lanes["api"].submit(_forward_raw, meta, body)
+        if future is None:
+            status, headers, resp_body = (503, {"Content-Type": "text/plain"},
+                                          b"Tunnel busy")
+        else:
+            status, headers, resp_body = await future
+        await _send(ws, binary, FRAME_RESPONSE, req_id,
+                    {"status": status, "headers": headers}, resp_body)
     except Exception as e:
-        _log.debug("Failed to handle request %s: %s", msg.get("id", "?"), e)
+        _log.debug("Failed to handle request %s: %s", req_id, e)
 
 
 async def _run_tunnel(relay_url: str, relay_secret: str, bot_name: str) -> None:
@@ -223,12 +423,19 @@ async def _run_tunnel(relay_url: str, relay_secret: str, bot_name: str) -> None:
             _status = "disabled"
         return
 
-    executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
     backoff = RECONNECT_BASE
 
-    ws_url = f"{relay_url}?bot={bot_name}"
+    try:
+        from botlog import BOT_VERSION
+    except ImportError:
+        BOT_VERSION = ""
+    # The relay caches static assets per bot version
+    ws_url = f"{relay_url}?bot={bot_name}&version={urllib.parse.quote(BOT_VERSION)}"
 
+    legacy_relay = False      # relay refused binary frames: reconnect with deflate
     while not _stop_event.is_set():
+        offer_binary = BINARY_FRAMES and not legacy_relay
+        legacy_relay = False
         with _status_lock:
             _status = "connecting"
         try:
@@ -239,25 +446,37 @@ async def _run_tunnel(relay_url: str, relay_secret: str, bot_name: str) -> None:
                 ping_timeout=10,
                 close_timeout=5,
                 additional_headers={"Authorization": f"Bearer {relay_secret}"},
+                subprotocols=[BINARY_SUBPROTOCOL] if offer_binary else None,
+                compression=None if offer_binary else "deflate",
             ) as ws:
+                binary = ws.subprotocol == BINARY_SUBPROTOCOL
+                if offer_binary and not binary:
+                    _log.info("Relay does not support binary frames — "
+                              "reconnecting with permessage-deflate")
+                    legacy_relay = True
+                    continue
                 with _status_lock:
                     _status = "connected"
-                _log.info("Tunnel connected to relay (bot=%s)", bot_name)
+                _log.info("Tunnel connected to relay (bot=%s, %s frames)",
+                          bot_name, "binary" if binary else "JSON")
                 backoff = RECONNECT_BASE  # reset on success
 
                 async for raw_msg in ws:
                     if _stop_event.is_set():
                         break
                     try:
-                        msg = json.loads(raw_msg)
-                    except json.JSONDecodeError:
+                        ftype, req_id, meta, body = _parse_relay_message(raw_msg)
+                    except (ValueError, KeyError):
                         _log.warning("Malformed message from relay, skipping")
                         continue
                     # Handle stream cancellation from relay
-                    if "cancel_stream" in msg:
-                        _cancel_stream(msg["cancel_stream"])
+                    if ftype == FRAME_CANCEL:
+                        _cancel_stream(req_id)
+                        continue
+                    if ftype != FRAME_REQUEST:
                         continue
-                    asyncio.ensure_future(_handle_request(ws, msg, executor))
+                    asyncio.ensure_future(
+                        _handle_request(ws, binary, req_id, meta, body))
 
         except Exception as e:
             _log.warning("Tunnel disconnected: %s — reconnecting in %ds", e, backoff)
@@ -274,7 +493,6 @@ async def _run_tunnel(relay_url: str, relay_secret: str, bot_name: str) -> None:
 
     with _status_lock:
         _status = "disabled"
-    executor.shutdown(wait=False)
 
 # ---------------------------------------------------------------------------
 # Public API
@@ -311,7 +529,12 @@ def stop_tunnel() -> None:
     _log.info("Tunnel stop requested")
 
 
-def tunnel_status() -> str:
-    """Return current tunnel status string."""
+def tunnel_status(detail: bool = False) -> str | dict:
+    """Return current tunnel status string, or with ``detail`` a dict of
+    status and per-lane metrics."""
     with _status_lock:
-        return _status
+        status = _status
+    if not detail:
+        return status
+    return {"status": status,
+            "lanes": {name: lane.status() for name, lane in _lanes.items()}}
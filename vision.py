@@ -1,18 +1,30 @@
 import subprocess
 import cv2
+import hashlib
 import time
 import random
 import os
 import re
 import platform
+import zlib
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
 
 import threading
 
 import config
+import capture
+import adb_client
+import adb_shell
+import budgets
+import digits
+import ocr_pool
+from screen_classifier import PyramidTemplate
 from config import adb_path, BUTTONS, ADB_COMMAND_TIMEOUT
 from botlog import get_logger, stats
+from profiling import span
 
 # Thread-local storage for find_image best score (avoids race between device threads)
 _thread_local = threading.local()
@@ -60,32 +72,48 @@ def _get_ocr_reader():
     if _ocr_reader is None:
         with _ocr_lock:
             if _ocr_reader is None:
-                # Cap oneDNN/MKLDNN primitive cache BEFORE importing torch.
-                # Default is 1024 entries — each unique input shape compiles a
-                # new kernel (~MB each). EasyOCR feeds variable-size crops, so
-                # the cache fills with stale kernels and bloats to multi-GB.
-                import os as _os
-                _os.environ.setdefault("ONEDNN_PRIMITIVE_CACHE_CAPACITY", "8")
-                # Legacy name (PyTorch < 1.8)
-                _os.environ.setdefault("LRU_CACHE_CAPACITY", "8")
-
-                import warnings
-                warnings.filterwarnings("ignore", message=".*pin_memory.*")
-                warnings.filterwarnings("ignore", message=".*GPU.*")
-                import torch
-                import easyocr
-
-                # Limit PyTorch intra-op parallelism. Multiple device threads
-                # already provide inter-op parallelism; letting each also spawn
-                # N_cores intra-op threads causes oversubscription and bloat.
-                torch.set_num_threads(2)
-
                 _log = get_logger("vision")
                 _log.info("Initializing EasyOCR (first run may download models)...")
-                _ocr_reader = easyocr.Reader(['en'], gpu=False, verbose=False)
+                _ocr_reader = ocr_pool.create_easyocr_reader()
                 _log.info("EasyOCR ready (MKLDNN cache cap=8, threads=2).")
     return _ocr_reader
 
+# --- BACKEND: EasyOCR worker pool (optional) ---
+# With OCR_WORKERS > 0 the reader lives in ocr_pool subprocesses instead of
+# this process: ocr_read() becomes a client call, the in-process reader is
+# never loaded, and workers over OCR_WORKER_MAX_MB are recycled.
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def _get_ocr_pool():
+    """Return the OCR worker pool, (re)starting it to match config, or None."""
+    global _ocr_pool
+    if _USE_APPLE_VISION or config.OCR_WORKERS <= 0:
+        return None
+    with _ocr_pool_lock:
+        pool = _ocr_pool
+        if pool is None or pool.size != config.OCR_WORKERS \
+                or pool.max_worker_mb != config.OCR_WORKER_MAX_MB:
+            if pool is not None:
+                pool.close()
+            pool = _ocr_pool = ocr_pool.OcrPool(config.OCR_WORKERS, config.OCR_WORKER_MAX_MB)
+        return pool
+
+
+def stop_ocr_pool():
+    """Stop the OCR worker processes (no-op if the pool is not running)."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.close()
+            _ocr_pool = None
+
+
+def get_ocr_pool_status():
+    """Per-worker status list from the running pool ([] if none)."""
+    with _ocr_pool_lock:
+        return _ocr_pool.status() if _ocr_pool is not None else []
+
 # --- BACKEND: Apple Vision (macOS) ---
 
 def _apple_vision_ocr(image, allowlist=None):
@@ -149,13 +177,142 @@ def warmup_ocr():
         cv2.putText(dummy, "init", (2, 8), cv2.FONT_HERSHEY_SIMPLEX, 0.3, 255, 1)
         _apple_vision_ocr(dummy)
         _log.info("Apple Vision OCR ready.")
+    elif _get_ocr_pool() is not None:
+        _log.info("EasyOCR runs in %d worker process(es); workers load it themselves.",
+                  config.OCR_WORKERS)
     else:
         _log.info("Warming up EasyOCR engine in background...")
         _get_ocr_reader()
         _log.info("EasyOCR ready.")
 
 
-def ocr_read(image, allowlist=None, detail=0):
+# --- OCR service: result cache + cross-device batching ---
+# ocr_read() first looks the crop up in an LRU cache keyed by a coarse hash
+# of the preprocessed image (so an unchanged AP bar, timer or quest panel is
+# not re-recognized).  On a miss, EasyOCR requests are queued: whichever
+# thread gets _ocr_infer_lock drains the queue and recognizes every pending
+# crop, batching crops of the same shape/allowlist into one
+# readtext_batched() call.  Other threads just wait for their result.
+
+_ocr_cache = OrderedDict()   # key -> results
+_ocr_cache_lock = threading.Lock()
+_ocr_pending = []            # [_OcrRequest] not yet picked up by an inference
+_ocr_pending_lock = threading.Lock()
+
+
+class _OcrRequest:
+    __slots__ = ("image", "allowlist", "detail", "queued_at", "done",
+                 "result", "error", "wait_s", "batch_size")
+
+    def __init__(self, image, allowlist, detail):
+        self.image = image
+        self.allowlist = allowlist
+        self.detail = detail
+        self.queued_at = time.monotonic()
+        self.done = False
+        self.result = None
+        self.error = None
+        self.wait_s = 0.0
+        self.batch_size = 1
+
+
+def _ocr_cache_key(image, allowlist, detail):
+    """Perceptual key for a preprocessed crop.
+
+    The crop is area-downscaled 2x and quantized to 16 gray levels before
+    hashing, so pixel-level noise maps to the same key while any glyph
+    change (a different digit) does not.
+    """
+    small = image
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    h, w = small.shape[:2]
+    if h >= 4 and w >= 4:
+        small = cv2.resize(small, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+    digest = hashlib.blake2b((small >> 4).tobytes(), digest_size=16)
+    digest.update(f"{image.shape}|{allowlist}|{detail}".encode())
+    return digest.hexdigest()
+
+
+def _ocr_cache_get(key):
+    with _ocr_cache_lock:
+        result = _ocr_cache.get(key)
+        if result is not None:
+            _ocr_cache.move_to_end(key)
+        return result
+
+
+def _ocr_cache_put(key, result):
+    if config.OCR_CACHE_SIZE <= 0:
+        return
+    with _ocr_cache_lock:
+        _ocr_cache[key] = result
+        _ocr_cache.move_to_end(key)
+        while len(_ocr_cache) > config.OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+
+def clear_ocr_cache():
+    """Drop all cached OCR results."""
+    with _ocr_cache_lock:
+        _ocr_cache.clear()
+
+
+def _run_ocr_batch(requests):
+    """Recognize a drained queue of requests with the EasyOCR reader.
+
+    Requests sharing (shape, allowlist, detail) go through one
+    readtext_batched() call; the rest run individually.  Caller holds
+    _ocr_infer_lock.
+    """
+    reader = _get_ocr_reader()
+    groups = {}
+    for req in requests:
+        groups.setdefault((req.image.shape, req.allowlist, req.detail), []).append(req)
+    started = time.monotonic()
+    for (_, allowlist, detail), group in groups.items():
+        try:
+            if len(group) > 1 and hasattr(reader, "readtext_batched"):
+                results = reader.readtext_batched([r.image for r in group],
+                                                  allowlist=allowlist, detail=detail)
+            else:
+                results = [reader.readtext(r.image, allowlist=allowlist, detail=detail)
+                           for r in group]
+            for req, result in zip(group, results):
+                req.result = result
+        except Exception as e:
+            for req in group:
+                req.error = e
+        for req in group:
+            req.wait_s = started - req.queued_at
+            req.batch_size = len(group)
+            req.done = True
+
+
+def _easyocr_read(image, allowlist, detail):
+    """Queue one crop for EasyOCR and wait for it. Returns the finished request."""
+    req = _OcrRequest(image, allowlist, detail)
+    with _ocr_pending_lock:
+        _ocr_pending.append(req)
+    while True:
+        # Serialize inference to prevent concurrent MKL thread-local state
+        # accumulation across device threads (PyTorch issue #64412).
+        with _ocr_infer_lock:
+            if req.done:
+                break  # recognized by another thread's batch
+            with _ocr_pending_lock:
+                batch = list(_ocr_pending)
+                _ocr_pending.clear()
+            _run_ocr_batch(batch)
+            if req.done:
+                break
+    if req.error is not None:
+        raise req.error
+    return req
+
+
+@span("ocr_read")
+def ocr_read(image, allowlist=None, detail=0, device=None):
     """Unified OCR interface — works on both macOS (Apple Vision) and Windows (EasyOCR).
 
     Args:
@@ -163,33 +320,76 @@ def ocr_read(image, allowlist=None, detail=0):
         allowlist: Optional string of allowed characters (e.g. "0123456789/").
         detail: 0 = return list of text strings only.
                 1 = return list of (bbox, text, confidence) tuples (EasyOCR format).
+        device: Optional device ID — OCR queue/cache stats are recorded for it.
 
     Returns:
         detail=0: List of recognized text strings.
         detail=1: List of (bbox, text, confidence) tuples.
 
+    Results are cached by crop content (see _ocr_cache_key), and concurrent
+    EasyOCR calls from several devices are batched.
     When modifying this function, ensure BOTH backends produce compatible output.
     """
+    key = _ocr_cache_key(image, allowlist, detail) if config.OCR_CACHE_SIZE > 0 else None
+    if key is not None:
+        cached = _ocr_cache_get(key)
+        if cached is not None:
+            if device:
+                stats.record_ocr(device, cache_hit=True)
+            return list(cached)
+
+    wait_s, batch_size = 0.0, 1
+    pool = _get_ocr_pool()
     if _USE_APPLE_VISION:
         # --- BACKEND: Apple Vision (macOS) ---
         results = _apple_vision_ocr(image, allowlist=allowlist)
         if detail == 0:
-            return [text for text, conf in results]
+            result = [text for text, conf in results]
         else:
             # Return EasyOCR-compatible format: (bbox, text, confidence)
             # bbox is set to None since Apple Vision uses different coordinate systems
             # and no caller currently uses bbox from detail=1 results.
-            return [(None, text, conf) for text, conf in results]
+            result = [(None, text, conf) for text, conf in results]
+    elif pool is not None:
+        # --- BACKEND: EasyOCR worker pool ---
+        result = pool.read(image, allowlist, 0 if detail == 0 else 1)
     else:
         # --- BACKEND: EasyOCR (Windows) ---
-        # Serialize inference to prevent concurrent MKL thread-local state
-        # accumulation across device threads (PyTorch issue #64412).
-        reader = _get_ocr_reader()
-        with _ocr_infer_lock:
-            if detail == 0:
-                return reader.readtext(image, allowlist=allowlist, detail=0)
-            else:
-                return reader.readtext(image, allowlist=allowlist, detail=1)
+        req = _easyocr_read(image, allowlist, 0 if detail == 0 else 1)
+        result, wait_s, batch_size = req.result, req.wait_s, req.batch_size
+
+    if key is not None:
+        _ocr_cache_put(key, list(result))
+    if device:
+        stats.record_ocr(device, wait_s=wait_s, batch_size=batch_size)
+    return result
+
+
+def read_digits(image, allowlist, device=None, font="hud", learn_pattern=None):
+    """Read numeric HUD text, trying the glyph-template reader (digits.py) first.
+
+    Same return shape as ocr_read(detail=0).  The digit reader does not take
+    _ocr_infer_lock and runs in a few ms; when it is unsure (no glyphs learned
+    yet, or worst glyph below DIGIT_MIN_CONFIDENCE) this falls back to
+    ocr_read().  Fallback text that fully matches ``learn_pattern`` is fed back
+    to the reader once fallback reads of two different crops (different OCR
+    cache keys, so a cached answer can't confirm itself) agree, so the glyph
+    library for ``font`` builds itself from confirmed live crops.
+    """
+    reader = digits.get_reader(font) if config.DIGIT_READER_ENABLED else None
+    if reader is not None:
+        text, conf = reader.read(image, allowlist)
+        if text is not None and conf >= config.DIGIT_MIN_CONFIDENCE:
+            get_logger("vision", device).debug("Digits [%s]: '%s' (%.2f)", font, text, conf)
+            return [text]
+
+    results = ocr_read(image, allowlist=allowlist, detail=0, device=device)
+    raw = " ".join(results).strip()
+    if reader is not None and learn_pattern and re.fullmatch(learn_pattern, raw):
+        if reader.learn_confirmed(image, raw, key=_ocr_cache_key(image, allowlist, 0)):
+            reader.save()
+            reader.save_sample(image, raw)
+    return results
 
 # ============================================================
 # CLICK TRAIL (debug tap logging)
@@ -319,45 +519,423 @@ def get_template(image_path):
 # SCREENSHOT HELPERS
 # ============================================================
 
-def load_screenshot(device):
-    """Take a screenshot and return the image directly in memory (no disk I/O)."""
+# ============================================================
+# FRAME CACHE
+# ============================================================
+#
+# One decision step typically calls check_screen, troops_avail,
+# read_panel_statuses and tap_image back-to-back, each of which used to
+# pull its own screenshot.  Frames are cached per device for
+# FRAME_CACHE_MAX_AGE_S so those readers share one decoded image.
+# Any input sent to the device (tap/swipe/keyevent) invalidates the
+# cache, so a read after an input always sees a new frame.
+#
+# Cached arrays are shared between callers — never draw on them in place
+# (copy first, as _save_click_trail does).
+
+_frame_cache = {}     # {device: (capture_start_time, image)}
+_frame_gen = {}       # {device: int} — bumped on every invalidation
+_last_input = {}      # {device: time of last tap/swipe/keyevent}
+_last_frame = {}      # {device: (capture_start_time, image)} — newest frame seen, any source
+_pre_input_frame = {} # {device: image or None} — screen just before the latest input
+_frame_cache_lock = threading.Lock()
+_capture_label = threading.local()   # .name: adb timing label for this thread's captures
+
+
+def invalidate_frame_cache(device):
+    """Drop the cached frame for a device (call after any input)."""
+    with _frame_cache_lock:
+        _frame_cache.pop(device, None)
+        # The newest frame shows the screen before this input only if it was
+        # taken after the previous one; otherwise we don't know (None).
+        seen = _last_frame.get(device)
+        fresh = seen is not None and seen[0] >= _last_input.get(device, 0.0)
+        _pre_input_frame[device] = seen[1] if fresh else None
+        _frame_gen[device] = _frame_gen.get(device, 0) + 1
+        _last_input[device] = time.time()
+
+
+def clear_frame_cache():
+    """Drop all cached frames (tests, device refresh)."""
+    with _frame_cache_lock:
+        _frame_cache.clear()
+        _frame_gen.clear()
+        _last_input.clear()
+        _last_frame.clear()
+        _pre_input_frame.clear()
+
+
+def _note_frame(device, captured_at, image):
+    """Remember the newest full frame seen for a device (see on_settled)."""
+    with _frame_cache_lock:
+        seen = _last_frame.get(device)
+        if seen is None or captured_at >= seen[0]:
+            _last_frame[device] = (captured_at, image)
+
+
+def _load_streamed_raw(device):
+    """Return (rgba_frame, pixel_format) of the freshest frame from the
+    device's capture stream, or None.
+
+    None if the stream isn't available or has no frame newer than
+    CAPTURE_MAX_AGE_S — the caller then falls back to a one-shot screencap.
+    Frames grabbed before the last input to the device are never returned.
+    """
+    session = capture.get_session(device)
+    if session is None:
+        return None
+    with _frame_cache_lock:
+        newer_than = _last_input.get(device, 0.0)
+    frame, fmt = session.get_raw(max_age_s=config.CAPTURE_MAX_AGE_S, newer_than=newer_than)
+    if frame is None:
+        return None
+    return frame, fmt
+
+
+def _load_streamed_screenshot(device):
+    """Return the freshest frame from the device's capture stream as BGR,
+    or None (see _load_streamed_raw)."""
+    t0 = time.time()
+    raw = _load_streamed_raw(device)
+    if raw is None:
+        return None
+    image = capture.raw_to_bgr(*raw)
+    stats.record_adb_timing(device, _screenshot_label(), time.time() - t0)
+    return image
+
+
+@span("load_screenshot")
+def load_screenshot(device, regions=None):
+    """Take a screenshot and return the image directly in memory (no disk I/O).
+
+    Returns the cached frame if one was captured within FRAME_CACHE_MAX_AGE_S
+    and no input has been sent since.  The returned array may be shared with
+    other readers — copy it before drawing on it.
+
+    With ``regions`` (a Regions, or a {name: (x1, y1, x2, y2)} dict) only
+    those crops are returned, as {name: image} — see _load_regions.
+    """
+    if regions is not None:
+        return _load_regions(device, regions)
+    max_age = config.FRAME_CACHE_MAX_AGE_S
+    now = time.time()
+    if max_age <= 0:
+        image = _capture_screenshot(device)
+        if image is not None:
+            _note_frame(device, now, image)
+        return image
+
+    with _frame_cache_lock:
+        cached = _frame_cache.get(device)
+        gen = _frame_gen.get(device, 0)
+    if cached is not None and now - cached[0] <= max_age:
+        stats.record_frame_cache(device, hit=True)
+        return cached[1]
+
+    stats.record_frame_cache(device, hit=False)
+    image = _capture_screenshot(device)
+    if image is not None:
+        _note_frame(device, now, image)
+        with _frame_cache_lock:
+            # Skip the store if an input arrived while we were capturing —
+            # the frame may predate it.
+            if _frame_gen.get(device, 0) == gen:
+                _frame_cache[device] = (now, image)
+    return image
+
+
+# ============================================================
+# REGION-OF-INTEREST CAPTURE
+# ============================================================
+#
+# Pixel checks (troop slots, AP counter, mine icons) only look at a few
+# small boxes.  load_screenshot(device, regions=...) returns just those
+# crops, taken from whichever source is cheapest:
+#   - a fresh cached full frame: the crops are views, no copy at all
+#   - the capture stream / raw screencap: only the crops are colour-converted
+#   - otherwise (PNG): the full frame is decoded once, cached, and cropped
+# Declare the boxes once at module level with Regions and reuse them.
+
+class Regions:
+    """Named screen boxes, (x1, y1, x2, y2) each, read in one capture.
+
+        _AP_ROI = Regions(ap=(600, 1850, 1080, 1920))
+        crops = load_screenshot(device, regions=_AP_ROI)   # {"ap": image} or None
+    """
+
+    __slots__ = ("boxes",)
+
+    def __init__(self, **boxes):
+        self.boxes = boxes
+
+    def crop(self, screen):
+        """Return {name: view of screen} — no copies."""
+        return {name: screen[max(0, y1):y2, max(0, x1):x2]
+                for name, (x1, y1, x2, y2) in self.boxes.items()}
+
+    def crop_raw(self, frame, fmt):
+        """Return {name: BGR crop} from a raw (h, w, 4) frame, converting
+        only the crops.  None if any box lies outside the frame."""
+        crops = {}
+        for name, box in self.boxes.items():
+            crop = capture.crop_raw_to_bgr(frame, fmt, box)
+            if crop is None:
+                return None
+            crops[name] = crop
+        return crops
+
+    def __repr__(self):
+        return f"Regions({self.boxes!r})"
+
+
+def _load_regions(device, regions):
+    """Crops for load_screenshot(device, regions=...), or None if no frame."""
+    if not isinstance(regions, Regions):
+        regions = Regions(**regions)
+    max_age = config.FRAME_CACHE_MAX_AGE_S
+    if max_age > 0:
+        cached = peek_frame(device, max_age)
+        if cached is not None:
+            stats.record_frame_cache(device, hit=True)
+            return regions.crop(cached)
+
+    crops = None
+    t0 = time.time()
+    if config.CAPTURE_BACKEND == "stream":
+        raw = _load_streamed_raw(device)
+        if raw is not None:
+            crops = regions.crop_raw(*raw)
+            if crops is not None:
+                stats.record_adb_timing(device, _screenshot_label(), time.time() - t0)
+    elif config.CAPTURE_BACKEND == "raw" and _one_shot_mode(device) == "raw":
+        crops = _capture_raw(device, regions)
+        if crops is None and _one_shot_mode(device) == "raw":
+            return None   # capture failed — don't retry as PNG
+    if crops is not None:
+        if max_age > 0:
+            stats.record_frame_cache(device, hit=False)
+        return crops
+
+    screen = load_screenshot(device)
+    return None if screen is None else regions.crop(screen)
+
+
+def peek_frame(device, max_age):
+    """Return the device's cached frame if it is at most ``max_age`` seconds old,
+    else None.  Never captures — for observers (the dashboard stream) that
+    want to piggyback on the bot's own screenshots."""
+    with _frame_cache_lock:
+        cached = _frame_cache.get(device)
+    if cached is not None and time.time() - cached[0] <= max_age:
+        return cached[1]
+    return None
+
+
+def capture_for_observer(device, label="stream_screenshot"):
+    """Capture a fresh frame for an observer (the dashboard stream).
+
+    Unlike load_screenshot this neither reads nor fills the frame cache
+    and records no cache hit/miss; the capture's adb timing is recorded
+    under ``label`` instead of "screenshot", so viewers don't skew the
+    bot's own screenshot latency and frame-cache stats.
+    """
+    _capture_label.name = label
+    try:
+        return _capture_screenshot(device)
+    finally:
+        del _capture_label.name
+
+
+def _screenshot_label():
+    return getattr(_capture_label, "name", "screenshot")
+
+
+def _capture_screenshot(device):
+    """Capture a fresh frame, bypassing the frame cache.
+
+    With capture_backend == "stream" the frame comes from the device's
+    persistent capture session (see capture.py); otherwise, or if the
+    stream has nothing usable, a one-shot screencap is run — raw or PNG,
+    per ``_one_shot_mode``.
+    """
+    if config.CAPTURE_BACKEND == "stream":
+        image = _load_streamed_screenshot(device)
+        if image is not None:
+            return image
+    if config.CAPTURE_BACKEND == "raw":
+        mode = _one_shot_mode(device)
+        if mode is None:
+            return _benchmark_capture(device)
+        if mode == "raw":
+            image = _capture_raw(device)
+            if image is not None or _capture_modes.get(device) == "raw":
+                return image
+    return _capture_png(device)
+
+
+def _exec_screencap(device, args):
+    """Run ``screencap`` with ``args``; returns (stdout, elapsed seconds).
+
+    On failure stdout is None — the failure is already logged and recorded
+    as a failed "screenshot" timing (or capture_for_observer's label).
+    """
     log = get_logger("vision", device)
     t0 = time.time()
     try:
-        result = subprocess.run(
-            [adb_path, "-s", device, "exec-out", "screencap", "-p"],
-            capture_output=True, timeout=ADB_COMMAND_TIMEOUT
-        )
-    except subprocess.TimeoutExpired:
+        if config.ADB_BACKEND == "socket":
+            returncode = 0
+            data = adb_client.exec_out(device, " ".join(["screencap"] + args),
+                                       timeout=ADB_COMMAND_TIMEOUT)
+        else:
+            result = subprocess.run(
+                [adb_path, "-s", device, "exec-out", "screencap"] + args,
+                capture_output=True, timeout=ADB_COMMAND_TIMEOUT
+            )
+            returncode, data = result.returncode, result.stdout
+    except (subprocess.TimeoutExpired, TimeoutError):
         log.warning("Screenshot timed out after %ds (ADB hung?)", ADB_COMMAND_TIMEOUT)
-        stats.record_adb_timing(device, "screenshot", float(ADB_COMMAND_TIMEOUT), success=False)
-        return None
+        stats.record_adb_timing(device, _screenshot_label(), float(ADB_COMMAND_TIMEOUT), success=False)
+        return None, 0.0
+    except adb_client.AdbError as e:
+        log.warning("Screenshot failed: %s", e)
+        stats.record_adb_timing(device, _screenshot_label(), time.time() - t0, success=False)
+        return None, 0.0
     elapsed = time.time() - t0
-    if result.returncode != 0 or not result.stdout:
-        log.warning("Screenshot failed (returncode=%d, %.2fs)", result.returncode, elapsed)
-        stats.record_adb_timing(device, "screenshot", elapsed, success=False)
+    if returncode != 0 or not data:
+        log.warning("Screenshot failed (returncode=%d, %.2fs)", returncode, elapsed)
+        stats.record_adb_timing(device, _screenshot_label(), elapsed, success=False)
+        return None, elapsed
+    return data, elapsed
+
+
+def _finish_capture(device, image, elapsed):
+    """Record a successful capture's timing (and warn if ADB is slow)."""
+    stats.record_adb_timing(device, _screenshot_label(), elapsed)
+    if elapsed > 3.0:
+        get_logger("vision", device).warning(
+            "Screenshot slow: %.2fs (ADB may be degrading)", elapsed)
+    return image
+
+
+def _capture_png(device):
+    """One-shot ``screencap -p`` — the device PNG-encodes, we imdecode."""
+    png, elapsed = _exec_screencap(device, ["-p"])
+    if png is None:
         return None
-    img_array = np.frombuffer(result.stdout, dtype=np.uint8)
+    img_array = np.frombuffer(png, dtype=np.uint8)
     image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
     if image is None:
-        log.warning("Failed to decode screenshot (%.2fs)", elapsed)
-        stats.record_adb_timing(device, "screenshot", elapsed, success=False)
+        get_logger("vision", device).warning(
+            "Failed to decode screenshot (%.2fs)", elapsed)
+        stats.record_adb_timing(device, _screenshot_label(), elapsed, success=False)
         return image
-    stats.record_adb_timing(device, "screenshot", elapsed)
-    if elapsed > 3.0:
-        log.warning("Screenshot slow: %.2fs (ADB may be degrading)", elapsed)
+    return _finish_capture(device, image, elapsed)
+
+
+# ============================================================
+# RAW ONE-SHOT CAPTURE (capture_backend == "raw")
+# ============================================================
+#
+# ``screencap`` without ``-p`` skips the PNG encode on the device and the
+# imdecode here: the header + RGBA bytes are viewed in place and only the
+# colour conversion copies (capture.raw_view).  The trade-off
+# is ~4x more bytes over ADB, which can lose on a slow link, so the first
+# capture on each device times both modes and keeps the faster one.
+# A raw header we can't parse pins the device to PNG for the session.
+
+CAPTURE_BENCHMARK_ROUNDS = 3
+
+_capture_modes = {}   # {device: "raw" | "png"} — decided by _benchmark_capture
+_capture_modes_lock = threading.Lock()
+
+
+def _one_shot_mode(device):
+    with _capture_modes_lock:
+        return _capture_modes.get(device)
+
+
+def _set_one_shot_mode(device, mode):
+    with _capture_modes_lock:
+        _capture_modes[device] = mode
+
+
+def clear_capture_modes():
+    """Forget the benchmarked capture mode of every device (re-benchmark)."""
+    with _capture_modes_lock:
+        _capture_modes.clear()
+
+
+def get_capture_modes():
+    """Return {device: "raw" | "png"} for devices benchmarked so far."""
+    with _capture_modes_lock:
+        return dict(_capture_modes)
+
+
+def _capture_raw(device, regions=None):
+    """One-shot raw ``screencap``.  Returns the BGR frame, or with
+    ``regions`` (a Regions) the {name: crop} dict, converting only the
+    crops.  Falls back to PNG for good if the header is unexpected."""
+    data, elapsed = _exec_screencap(device, [])
+    if data is None:
+        return None
+    view = capture.raw_view(data)
+    if view is None:
+        get_logger("vision", device).warning(
+            "Unexpected raw screencap output (%d bytes) — using PNG capture", len(data))
+        _set_one_shot_mode(device, "png")
+        return None
+    if regions is not None:
+        result = regions.crop_raw(*view)
+        if result is None:
+            return None
+    else:
+        result = capture.raw_to_bgr(*view)
+    return _finish_capture(device, result, elapsed)
+
+
+def _benchmark_capture(device):
+    """Time raw vs PNG capture a few times, remember the faster mode for
+    ``device`` and return the last frame captured."""
+    log = get_logger("vision", device)
+    raw_times, png_times = [], []
+    image = None
+    for _ in range(CAPTURE_BENCHMARK_ROUNDS):
+        t0 = time.perf_counter()
+        raw = _capture_raw(device)
+        if raw is None:
+            if _one_shot_mode(device) == "png":
+                return _capture_png(device)
+            return None   # capture failed outright — benchmark again next time
+        raw_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        png = _capture_png(device)
+        if png is not None:
+            png_times.append(time.perf_counter() - t0)
+        image = raw
+    raw_ms = sorted(raw_times)[len(raw_times) // 2] * 1000
+    if png_times:
+        png_ms = sorted(png_times)[len(png_times) // 2] * 1000
+        mode = "raw" if raw_ms <= png_ms else "png"
+        log.info("Capture benchmark: raw %.0fms, png %.0fms -> %s", raw_ms, png_ms, mode)
+    else:
+        mode = "raw"
+        log.info("Capture benchmark: raw %.0fms, png failed -> raw", raw_ms)
+    _set_one_shot_mode(device, mode)
     return image
 
 # ============================================================
 # OCR (Optical Character Recognition)
 # ============================================================
 
-def read_text(screen, region=None, allowlist=None, device=None):
+def read_text(screen, region=None, allowlist=None, device=None, font=None,
+              learn_pattern=None):
     """Read text from a screenshot using OCR.
     screen: CV2 image (BGR).
     region: optional (x1, y1, x2, y2) to read only a portion of the screen.
     allowlist: optional string of allowed characters (e.g. '0123456789' for numbers only).
     device: optional device ID for logging context.
+    font: optional digit-reader font — numeric text is read with read_digits()
+          (see there for learn_pattern) instead of going straight to OCR.
     Returns the recognized text string (stripped of leading/trailing whitespace).
     """
     if screen is None:
@@ -372,8 +950,12 @@ def read_text(screen, region=None, allowlist=None, device=None):
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
 
+    if font:
+        return " ".join(read_digits(gray, allowlist, device=device, font=font,
+                                    learn_pattern=learn_pattern)).strip()
+
     # Uses ocr_read() which dispatches to Apple Vision (macOS) or EasyOCR (Windows)
-    results = ocr_read(gray, allowlist=allowlist, detail=1)
+    results = ocr_read(gray, allowlist=allowlist, detail=1, device=device)
     # Extract text and confidence from detail=1 results: (bbox, text, confidence)
     texts = [entry[1] for entry in results]
     if results:
@@ -390,9 +972,10 @@ def read_text(screen, region=None, allowlist=None, device=None):
     return " ".join(texts).strip()
 
 
-def read_number(screen, region=None):
+def read_number(screen, region=None, device=None):
     """Read a number from the screen. Returns the integer value, or None if no number found."""
-    raw = read_text(screen, region=region, allowlist="0123456789,.")
+    raw = read_text(screen, region=region, allowlist="0123456789,.", device=device,
+                    font="number", learn_pattern=r"\d+([,.]\d{3})*")
     # Strip commas, periods, and spaces used as thousands separators
     cleaned = raw.replace(",", "").replace(".", "").replace(" ", "")
     if cleaned.isdigit():
@@ -409,11 +992,12 @@ def read_text_from_device(device, region=None, allowlist=None):
 def read_number_from_device(device, region=None):
     """Convenience: take a screenshot from a device and read a number from it."""
     screen = load_screenshot(device)
-    return read_number(screen, region=region)
+    return read_number(screen, region=region, device=device)
 
 
 # Region where AP is displayed (bottom-right, under SEARCH button)
 _AP_REGION = (600, 1850, 1080, 1920)
+_AP_ROI = Regions(ap=_AP_REGION)
 
 def read_ap(device, retries=5):
     """Read current AP from the bottom-right of the screen.
@@ -424,20 +1008,18 @@ def read_ap(device, retries=5):
     """
     log = get_logger("vision", device)
     for attempt in range(retries):
-        screen = load_screenshot(device)
-        if screen is None:
+        crops = load_screenshot(device, regions=_AP_ROI)
+        if crops is None:
             time.sleep(1)
             continue
 
-        # Crop, grayscale, upscale, then threshold to isolate white text
-        x1, y1, x2, y2 = _AP_REGION
-        img = screen[y1:y2, x1:x2]
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Grayscale, upscale, then threshold to isolate white text
+        gray = cv2.cvtColor(crops["ap"], cv2.COLOR_BGR2GRAY)
         gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
         _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
 
-        # Uses ocr_read() which dispatches to Apple Vision (macOS) or EasyOCR (Windows)
-        results = ocr_read(thresh, allowlist="0123456789/", detail=0)
+        results = read_digits(thresh, "0123456789/", device=device, font="hud_ap",
+                              learn_pattern=r"\d+/\d+")
         raw = " ".join(results).strip()
 
         match = re.search(r"(\d+)/(\d+)", raw)
@@ -463,6 +1045,61 @@ def get_last_best():
     """Get the best match score from the last find_image call on this thread."""
     return getattr(_thread_local, 'last_best', 0.0)
 
+# --- Pyramid matching ---
+# Searches over at least PYRAMID_MIN_AREA pixels go through a coarse-to-fine
+# pyramid (screen_classifier.PyramidTemplate): the template is matched at
+# 1/4 or 1/2 scale, then only the top candidate windows are matched at full
+# resolution.  Small regions are cheaper to match directly.
+
+PYRAMID_MIN_AREA = 200_000       # px — smaller searches skip the pyramid
+
+# Per-template coarsest pyramid scale, overriding the automatic choice.
+# Templates not listed take their coarse scale from the size +
+# _detail_kept() heuristic in PyramidTemplate.  Entries come from
+# screen_classifier.tune_min_scale() over the benchmark frames in
+# tests/test_pyramid_match.py (every elements/ template pasted onto noise,
+# TestBenchmark.test_min_scale_table checks them): these tiny status icons
+# mislocate at 1/2 scale next to look-alike templates, so they are always
+# matched at full resolution.  Re-run that test with --benchmark on
+# debug/failures screenshots before enabling the "pyramid_matching"
+# setting (config.PYRAMID_MATCHING) on a new game version.
+PYRAMID_MIN_SCALE = {
+    "stationed.png": 1.0,
+    "statuses/stationing.png": 1.0,
+}
+
+_pyramid_templates = {}          # image_name -> PyramidTemplate
+
+
+def _get_pyramid_template(image_name, button):
+    pt = _pyramid_templates.get(image_name)
+    if pt is None or pt.template is not button:
+        pt = PyramidTemplate(button, PYRAMID_MIN_SCALE.get(image_name))
+        _pyramid_templates[image_name] = pt
+    return pt
+
+
+def _use_pyramid(screen, pt, region):
+    if not config.PYRAMID_MATCHING or pt.scale == 1.0:
+        return False
+    if region:
+        x1, y1, x2, y2 = region
+        return (x2 - x1) * (y2 - y1) >= PYRAMID_MIN_AREA
+    return screen.shape[0] * screen.shape[1] >= PYRAMID_MIN_AREA
+
+
+def _search(screen, image_name, button, region, threshold):
+    """Best (max_val, full_screen_loc) of ``button`` in ``region`` (or full screen)."""
+    pt = _get_pyramid_template(image_name, button)
+    if _use_pyramid(screen, pt, region):
+        return pt.match(screen, threshold, region)
+    if region:
+        return _match_in_region(screen, button, region)
+    result = cv2.matchTemplate(screen, button, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
 def _match_in_region(screen, button, region):
     """Run matchTemplate on a cropped region, return (max_val, full_screen_loc)."""
     x1, y1, x2, y2 = region
@@ -475,6 +1112,7 @@ def _match_in_region(screen, button, region):
     return max_val, (max_loc[0] + x1, max_loc[1] + y1)
 
 
+@span("find_image", detail="image_name")
 def find_image(screen, image_name, threshold=0.8, region=None, device=None):
     """Find an image template on screen.
     Returns (max_val, max_loc, h, w) on match, or None on failure.
@@ -496,7 +1134,7 @@ def find_image(screen, image_name, threshold=0.8, region=None, device=None):
 
     if region:
         # Fast path: search in cropped region first
-        max_val, loc = _match_in_region(screen, button, region)
+        max_val, loc = _search(screen, image_name, button, region, threshold)
         _thread_local.last_best = max_val
         if max_val > threshold:
             if device:
@@ -510,8 +1148,7 @@ def find_image(screen, image_name, threshold=0.8, region=None, device=None):
             return None
 
         # Fallback: search full screen in case the element moved outside the region
-        result = cv2.matchTemplate(screen, button, cv2.TM_CCOEFF_NORMED)
-        _, max_val_full, _, max_loc_full = cv2.minMaxLoc(result)
+        max_val_full, max_loc_full = _search(screen, image_name, button, None, threshold)
         _thread_local.last_best = max(max_val, max_val_full)
         if max_val_full > threshold:
             log.warning("REGION MISS for %s — found via full-screen fallback at (%d, %d). "
@@ -523,8 +1160,7 @@ def find_image(screen, image_name, threshold=0.8, region=None, device=None):
             return max_val_full, max_loc_full, h, w
         return None
 
-    result = cv2.matchTemplate(screen, button, cv2.TM_CCOEFF_NORMED)
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+    max_val, max_loc = _search(screen, image_name, button, None, threshold)
     _thread_local.last_best = max_val
 
     if max_val > threshold:
@@ -540,9 +1176,13 @@ def find_all_matches(screen, image_name, threshold=0.8, min_distance=50, device=
     if screen is None or template is None:
         return []
 
-    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-    loc = np.where(result >= threshold)
-    points = list(zip(*loc[::-1]))  # (x, y) pairs
+    pt = _get_pyramid_template(image_name, template)
+    if _use_pyramid(screen, pt, None):
+        points = pt.find_all(screen, threshold)
+    else:
+        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+        loc = np.where(result >= threshold)
+        points = list(zip(*loc[::-1]))  # (x, y) pairs
 
     if not points:
         return []
@@ -564,49 +1204,113 @@ def find_all_matches(screen, image_name, threshold=0.8, min_distance=50, device=
 # INPUT FUNCTIONS
 # ============================================================
 
-def adb_tap(device, x, y):
-    """Send a tap command via ADB."""
+def _adb_input_oneshot(device, script):
+    """Run ``script`` with a fresh ``adb shell`` (process or socket)."""
+    if config.ADB_BACKEND == "socket":
+        adb_client.shell(device, script, timeout=ADB_COMMAND_TIMEOUT)
+        return
+    subprocess.run([adb_path, "-s", device, "shell", *script.split()],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=ADB_COMMAND_TIMEOUT)
+
+
+def _adb_input(device, name, script, timeout=ADB_COMMAND_TIMEOUT):
+    """Run an input script through the persistent shell (or one-shot adb).
+
+    Records timing under ``name`` and invalidates the frame cache.
+    Never raises: timeouts are logged and recorded as failures.
+    """
     t0 = time.time()
     try:
-        subprocess.run([adb_path, "-s", device, "shell", "input", "tap", str(x), str(y)],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=ADB_COMMAND_TIMEOUT)
-    except subprocess.TimeoutExpired:
-        get_logger("vision", device).warning("adb_tap timed out after %ds (ADB hung?)", ADB_COMMAND_TIMEOUT)
-        stats.record_adb_timing(device, "tap", float(ADB_COMMAND_TIMEOUT), success=False)
+        shell = adb_shell.get_shell(device) if config.ADB_PERSISTENT_SHELL else None
+        if shell is not None:
+            try:
+                shell.run(script, timeout=timeout)
+            except adb_shell.ShellError as e:
+                get_logger("vision", device).debug("Persistent shell failed (%s), using one-shot adb", e)
+                adb_shell.close_shell(device, backoff=True)
+                _adb_input_oneshot(device, script)
+        else:
+            _adb_input_oneshot(device, script)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        get_logger("vision", device).warning("adb_%s timed out after %ds (ADB hung?)", name, timeout)
+        stats.record_adb_timing(device, name, float(timeout), success=False)
+        return
+    except adb_client.AdbError as e:
+        get_logger("vision", device).warning("adb_%s failed: %s", name, e)
+        stats.record_adb_timing(device, name, time.time() - t0, success=False)
         return
+    finally:
+        invalidate_frame_cache(device)
     elapsed = time.time() - t0
-    stats.record_adb_timing(device, "tap", elapsed)
+    stats.record_adb_timing(device, name, elapsed)
     if elapsed > 3.0:
-        get_logger("vision", device).warning("adb_tap slow: %.2fs", elapsed)
+        get_logger("vision", device).warning("adb_%s slow: %.2fs", name, elapsed)
+
+
+@span("adb_tap")
+def adb_tap(device, x, y):
+    """Send a tap command via ADB."""
+    _adb_input(device, "tap", f"input tap {x} {y}")
 
 def adb_swipe(device, x1, y1, x2, y2, duration_ms=300):
     """Send a swipe command via ADB."""
-    t0 = time.time()
-    try:
-        subprocess.run([adb_path, "-s", device, "shell", "input", "swipe",
-                        str(x1), str(y1), str(x2), str(y2), str(duration_ms)],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=ADB_COMMAND_TIMEOUT)
-    except subprocess.TimeoutExpired:
-        get_logger("vision", device).warning("adb_swipe timed out after %ds (ADB hung?)", ADB_COMMAND_TIMEOUT)
-        stats.record_adb_timing(device, "swipe", float(ADB_COMMAND_TIMEOUT), success=False)
-        return
-    elapsed = time.time() - t0
-    stats.record_adb_timing(device, "swipe", elapsed)
-    if elapsed > 3.0:
-        get_logger("vision", device).warning("adb_swipe slow: %.2fs", elapsed)
+    _adb_input(device, "swipe", f"input swipe {x1} {y1} {x2} {y2} {duration_ms}")
 
 def adb_keyevent(device, keycode):
     """Send a key event via ADB (e.g. KEYCODE_BACK=4, KEYCODE_HOME=3)."""
-    t0 = time.time()
-    try:
-        subprocess.run([adb_path, "-s", device, "shell", "input", "keyevent", str(keycode)],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=ADB_COMMAND_TIMEOUT)
-    except subprocess.TimeoutExpired:
-        get_logger("vision", device).warning("adb_keyevent timed out after %ds", ADB_COMMAND_TIMEOUT)
-        stats.record_adb_timing(device, "keyevent", float(ADB_COMMAND_TIMEOUT), success=False)
+    _adb_input(device, "keyevent", f"input keyevent {keycode}")
+
+
+def _input_script(commands, interval_s):
+    """Join ("tap", x, y) / ("swipe", x1, y1, x2, y2[, ms]) / ("keyevent", code)
+    tuples into one shell line, with ``sleep`` between them."""
+    parts = []
+    for cmd in commands:
+        if parts and interval_s > 0:
+            parts.append(f"sleep {interval_s:g}")
+        parts.append("input " + " ".join(str(a) for a in cmd))
+    return " ; ".join(parts)
+
+
+def adb_input_batch(device, commands, interval_s=0):
+    """Send a sequence of input commands in one round-trip and wait for it.
+
+    commands: list of ("tap", x, y), ("swipe", x1, y1, x2, y2[, ms]) or
+              ("keyevent", code) tuples, run in order on the device with
+              ``interval_s`` seconds between them.
+    Timing is recorded as "input_batch".
+    """
+    if not commands:
         return
-    elapsed = time.time() - t0
-    stats.record_adb_timing(device, "keyevent", elapsed)
+    timeout = ADB_COMMAND_TIMEOUT + interval_s * len(commands)
+    _adb_input(device, "input_batch", _input_script(commands, interval_s), timeout=timeout)
+
+
+def adb_input_async(device, commands, interval_s=0):
+    """Queue input commands on the persistent shell without waiting.
+
+    Returns a concurrent.futures.Future that resolves when the device has
+    run them (timing is recorded as "input_batch" then).  Commands queued
+    by later calls run after these.  Without a persistent shell the batch
+    runs synchronously and an already-finished Future is returned.
+    """
+    shell = adb_shell.get_shell(device) if config.ADB_PERSISTENT_SHELL else None
+    if shell is None:
+        adb_input_batch(device, commands, interval_s)
+        done = Future()
+        done.set_result(0)
+        return done
+
+    t0 = time.time()
+
+    def _finished(future):
+        invalidate_frame_cache(device)
+        ok = future.exception() is None
+        stats.record_adb_timing(device, "input_batch", time.time() - t0, success=ok)
+
+    future = shell.submit(_input_script(commands, interval_s))
+    future.add_done_callback(_finished)
+    return future
 
 def tap(button_name, device):
     """Tap a button by its name from the BUTTONS dictionary"""
@@ -779,28 +1483,189 @@ def wait_for_image_and_tap(image_name, device, timeout=5, threshold=0.8):
     log.debug("Timed out waiting for %s after %ds", image_name, timeout)
     return False
 
+# ============================================================
+# EVENT-DRIVEN WAITS
+# ============================================================
+#
+# Most wait conditions look at the screen (check_screen -> load_screenshot),
+# so re-running them every 150ms meant a capture per poll.  timed_wait now
+# evaluates the condition once per *new frame* instead:
+#   - with the capture stream (capture_backend == "stream") it blocks on the
+#     stream until a frame newer than the last one (and the last input)
+#     arrives — no polling, no extra captures.  Each block is capped at
+#     WAIT_POLL_INTERVAL_S so stop_check is still honoured on a static screen;
+#   - otherwise it takes one frame every WAIT_POLL_INTERVAL_S.
+# Conditions wrapped in on_frame() receive that frame and are skipped when
+# it is identical to the previous one; plain zero-argument conditions still
+# work and see the same frame through load_screenshot.
+# Waits with no template to look for (scrolls, animations, panels opening)
+# use on_settled(): met once the screen stops changing.  A ``lambda: False``
+# condition is never met, so its budget can't be learned — avoid it.
+#
+# Budgets come from budgets.py: by default each label's budget adapts to
+# what the device has actually needed (p95 of successful waits), and the
+# time saved vs the hard-coded budget is recorded per label.
+
+WAIT_POLL_INTERVAL_S = 0.15
+SETTLE_MAX_DIFF = 2.0       # mean pixel difference (0-255) below which two frames are alike
+
+
+class FrameCondition:
+    """Wait condition evaluated on a frame: ``predicate(screen) -> bool``.
+
+    ``repeats``: also call the predicate on frames identical to the last one.
+    """
+
+    __slots__ = ("predicate", "repeats")
+
+    def __init__(self, predicate, repeats=False):
+        self.predicate = predicate
+        self.repeats = repeats
+
+
+def on_frame(predicate):
+    """Wrap ``predicate(screen)`` for timed_wait, e.g.
+    ``timed_wait(device, on_frame(lambda s: check_screen(device, s) == Screen.MAP), 2, "x")``.
+    """
+    return FrameCondition(predicate)
+
+
+def _frames_alike(a, b):
+    """True if two frames differ by less than SETTLE_MAX_DIFF on average
+    (every 4th pixel; a blinking icon or ticking timer doesn't count)."""
+    if a.shape != b.shape:
+        return False
+    return float(cv2.absdiff(a[::4, ::4], b[::4, ::4]).mean()) < SETTLE_MAX_DIFF
+
+
+def on_settled(device=None):
+    """Frame condition for timed_wait: the screen has stopped changing
+    (two consecutive frames alike) — for scrolls, animations and panels
+    with no template to wait for.
+
+    With ``device``, the screen must first move away from how it looked
+    just before the device's latest input, so a wait right after a tap
+    doesn't end before the tap has shown.  If no frame was seen between
+    that input and the one before it (back-to-back taps), the first frame
+    of the wait is the baseline instead: a change must be seen before the
+    screen can count as settled.  Leave ``device`` out when the motion is
+    already under way (after a swipe, during an animation).
+    """
+    with _frame_cache_lock:
+        since = _pre_input_frame.get(device) if device is not None else None
+    state = {"prev": None, "moved": device is None, "since": since}
+
+    def settled(screen):
+        prev = state["prev"]
+        if screen is prev:          # the same cached frame again
+            return False
+        state["prev"] = screen
+        if not state["moved"]:
+            if state["since"] is None:
+                state["since"] = screen
+            else:
+                state["moved"] = not _frames_alike(screen, state["since"])
+            return False
+        return prev is not None and _frames_alike(screen, prev)
+
+    return FrameCondition(settled, repeats=True)
+
+
+def _drop_cached_frame(device):
+    """Forget the cached frame (not an input — nothing else is reset)."""
+    with _frame_cache_lock:
+        _frame_cache.pop(device, None)
+
+
+def _frame_digest(screen):
+    """Fingerprint of a whole frame (shape + CRC of every pixel) to spot repeats."""
+    return screen.shape, zlib.crc32(np.ascontiguousarray(screen).data)
+
+
+def _wait_ticks(device, deadline, want_frame, stop_check=None):
+    """Yield once per new frame until ``deadline`` (or ``stop_check()``).
+
+    Yields the BGR frame if ``want_frame``, else None (the condition loads
+    its own).  Stream frames grabbed before the last input are skipped; if
+    the stream dies mid-wait this falls back to polling.
+    """
+    session = capture.get_session(device) if config.CAPTURE_BACKEND == "stream" else None
+    last_ts = 0.0
+    first = True
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        if session is not None:
+            with _frame_cache_lock:
+                newer_than = max(last_ts, _last_input.get(device, 0.0))
+            ts, frame = session.wait_for_frame(
+                newer_than=newer_than, timeout=min(WAIT_POLL_INTERVAL_S, remaining))
+            if frame is not None:
+                last_ts = ts
+                _drop_cached_frame(device)
+                if not want_frame:
+                    yield None
+                    continue
+                image = capture.raw_to_bgr(frame, session.pixel_format)
+                _note_frame(device, ts, image)
+                yield image
+                continue
+            if session.alive:
+                if stop_check and stop_check():
+                    return
+                continue   # no new frame yet
+            session = None
+        if not first:
+            time.sleep(min(WAIT_POLL_INTERVAL_S, remaining))
+            if time.time() >= deadline:
+                return
+        first = False
+        yield load_screenshot(device) if want_frame else None
+
+
+@span("timed_wait", detail="label")
 def timed_wait(device, condition_fn, budget_s, label, stop_check=None):
-    """Poll condition_fn every ~150ms; return as soon as it's True.
+    """Wait up to budget_s for condition_fn; return as soon as it's True.
 
-    If condition_fn is never True within budget_s, sleeps the full budget
-    (same as time.sleep).  If condition_fn becomes True early, exits
-    immediately — saving the remaining wait time.
+    condition_fn is evaluated once per new frame (see EVENT-DRIVEN WAITS):
+    either a zero-argument callable() -> bool, on_frame(predicate) or
+    on_settled().  If it is never True, waits the whole budget (same as
+    time.sleep).  The budget is budgets.budget_for's: learned per device
+    and label from the waits whose condition was met.
 
-    condition_fn: callable() -> bool  (called repeatedly until True or budget expires)
     stop_check: optional callable() -> bool; if True, abort immediately.
     Returns True if condition was met within budget, False otherwise.
     """
+    effective_s = budgets.budget_for(device, label, budget_s)
+    is_frame = isinstance(condition_fn, FrameCondition)
     start = time.time()
-    while time.time() - start < budget_s:
+    last_digest = None
+    for screen in _wait_ticks(device, start + effective_s, want_frame=is_frame,
+                              stop_check=stop_check):
         if stop_check and stop_check():
             return False
-        if condition_fn():
+        if is_frame:
+            if screen is None:
+                continue
+            if not condition_fn.repeats:
+                digest = _frame_digest(screen)
+                if digest == last_digest:
+                    continue
+                last_digest = digest
+            met = condition_fn.predicate(screen)
+        else:
+            met = condition_fn()
+        if met:
             actual = time.time() - start
             stats.record_transition_time(device, label, actual, budget_s, True)
+            budgets.record_use(device, label, actual, budget_s)
             return True
-        time.sleep(0.15)
+    if stop_check and stop_check():
+        return False
     # Condition never met within effective budget
-    stats.record_transition_time(device, label, budget_s, budget_s, False)
+    stats.record_transition_time(device, label, effective_s, budget_s, False)
+    budgets.record_use(device, label, effective_s, budget_s)
     return False
 
 
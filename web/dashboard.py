@@ -24,9 +24,12 @@ from flask import Flask, render_template, request, redirect, url_for, jsonify, a
 # ---------------------------------------------------------------------------
 # 9Bot imports (same as main.py)
 # ---------------------------------------------------------------------------
+import budgets
 import config
+import profiling
+import state_store
 from config import (running_tasks, QuestType, RallyType)
-from devices import get_devices, get_emulator_instances, auto_connect_emulators
+from devices import device_cache, auto_connect_emulators
 from navigation import check_screen
 from vision import load_screenshot
 from troops import troops_avail, heal_all, get_troop_status
@@ -38,14 +41,16 @@ from actions import (attack, phantom_clash_attack, reinforce_throne, target,
                      mine_mithril,
                      gather_gold,
                      get_quest_tracking_state, get_quest_last_checked, occupy_tower)
-from territory import attack_territory, diagnose_grid, scan_test_squares
-from botlog import get_logger
+from territory import (attack_territory, diagnose_grid, scan_test_squares,
+                       get_territory_changes)
+from botlog import get_logger, history
+from web.streaming import get_broadcaster, stream_status, ADAPTIVE_KBPS
 
 try:
     from tunnel import tunnel_status
 except ImportError:
-    def tunnel_status():
-        return "disabled"
+    def tunnel_status(detail=False):
+        return {"status": "disabled", "lanes": {}} if detail else "disabled"
 
 try:
     from startup import upload_status as _upload_status
@@ -166,6 +171,118 @@ def cleanup_dead_tasks():
         thread = info.get("thread")
         if thread and not thread.is_alive():
             del running_tasks[key]
+            state_store.remove(("tasks", key))
+
+
+# ---------------------------------------------------------------------------
+# Status push (Server-Sent Events)
+# ---------------------------------------------------------------------------
+
+SSE_HEARTBEAT_S = 5  # idle comment line; keeps the relay's 10s chunk timeout happy
+SSE_RECONCILE_S = 1  # how often state with no change hook is re-published
+
+
+class _Reconciler:
+    """Runs ``reconcile()`` every SSE_RECONCILE_S on one daemon thread while
+    any SSE client is connected — once for all clients, not once per stream.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = 0
+        self._reconcile = None
+        self._thread = None
+
+    def attach(self, reconcile):
+        """Register a client; the store is reconciled once for it right away."""
+        with self._lock:
+            self._clients += 1
+            self._reconcile = reconcile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name="sse-reconcile")
+                self._thread.start()
+        reconcile()
+
+    def detach(self):
+        with self._lock:
+            self._clients -= 1
+
+    def _loop(self):
+        while True:
+            time.sleep(SSE_RECONCILE_S)
+            with self._lock:
+                if self._clients <= 0:
+                    self._thread = None
+                    return
+                reconcile = self._reconcile
+            try:
+                reconcile()
+            except Exception as e:
+                _log.warning("SSE state reconcile failed: %s", e)
+
+
+_reconciler = _Reconciler()
+
+
+def _sse_event(version, full, changes):
+    payload = {"version": version, "full": full,
+               "server_time": time.time(), "changes": changes}
+    return f"id: {version}\nevent: state\ndata: {json.dumps(payload)}\n\n"
+
+
+def _sse_stream(since, include=None, reconcile=None):
+    """Generator of SSE chunks: one ``state`` event per batch of store changes.
+
+    ``since`` is the last version the client saw (0 = send everything, marked
+    ``full``).  ``reconcile()`` publishes state that has no change hook; it
+    runs once when the client connects, then on the shared _reconciler
+    ticker — the stream itself only reads the store.  A ``: ping`` comment
+    goes out when nothing changed for SSE_HEARTBEAT_S.
+    """
+    try:
+        if reconcile is not None:
+            _reconciler.attach(reconcile)
+        if since > state_store.current_version():
+            since = 0  # client saw a previous process — resync
+        full = since == 0
+        while True:
+            version, changes = state_store.changes_since(since, include)
+            if changes or full:
+                yield _sse_event(version, full, changes)
+                full = False
+            else:
+                yield ": ping\n\n"
+            since = version
+            state_store.wait_for_change(since, SSE_HEARTBEAT_S)
+    finally:
+        if reconcile is not None:
+            _reconciler.detach()
+
+
+def _int_arg(name, default, lo, hi):
+    """Integer query parameter clamped to [lo, hi]; ``default`` if missing
+    or not a number."""
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = int(default)
+    return max(lo, min(hi, value))
+
+
+def _last_event_id():
+    raw = request.headers.get("Last-Event-ID") or request.args.get("since", "0")
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return 0
+
+
+def _sse_response(stream):
+    from flask import Response
+    return Response(stream, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache",
+                             "X-Accel-Buffering": "no"})
 
 
 # ---------------------------------------------------------------------------
@@ -375,6 +492,12 @@ def create_app():
                                devices=device_info,
                                tasks=active_tasks,
                                debug_actions=ONESHOT_DEBUG,
+                               budget_rows=budgets.report()[:15],
+                               budget_mode=config.BUDGET_MODE,
+                               screenshot_latency=history.latency("adb", "screenshot"),
+                               profile_rows=profiling.breakdown()[:10],
+                               profiling_enabled=profiling.is_enabled(),
+                               tunnel=tunnel_status(detail=True),
                                log_lines=lines)
 
     @app.route("/logs")
@@ -393,17 +516,9 @@ def create_app():
 
     # --- API routes ---
 
-    # Cache device list to avoid spamming ADB on every poll
-    _device_cache = {"devices": [], "instances": {}, "ts": 0}
-    _DEVICE_CACHE_TTL = 15  # seconds
-
+    # Shared device list (devices.device_cache) — no ADB call per poll
     def _cached_devices():
-        now = time.time()
-        if now - _device_cache["ts"] > _DEVICE_CACHE_TTL:
-            _device_cache["devices"] = get_devices()
-            _device_cache["instances"] = get_emulator_instances()
-            _device_cache["ts"] = now
-        return _device_cache["devices"], _device_cache["instances"]
+        return device_cache.get()
 
     @app.route("/api/status")
     def api_status():
@@ -454,12 +569,39 @@ def create_app():
                     active.append(key)
         return jsonify({"devices": device_info, "tasks": active,
                         "tunnel": tunnel_status(),
-                        "upload": _upload_status()})
+                        "upload": _upload_status(),
+                        "streams": stream_status()})
+
+    def _reconcile_state():
+        """Publish state the bot has no change hook for: device names,
+        mithril deadlines, live tasks, tunnel and upload status."""
+        cleanup_dead_tasks()
+        devs, instances = _cached_devices()
+        for d in devs:
+            state_store.publish(("devices", d, "name"), instances.get(d, d))
+            state_store.publish(("devices", d, "status"),
+                                config.DEVICE_STATUS.get(d, "Idle"))
+            anchor = (config.MITHRIL_DEPLOY_TIME.get(d)
+                      or config.LAST_MITHRIL_TIME.get(d))
+            next_at = None
+            if anchor:
+                next_at = anchor + config.get_device_config(d, "mithril_interval") * 60
+            state_store.publish(("devices", d, "mithril_next_at"), next_at)
+        for key, info in list(running_tasks.items()):
+            if isinstance(info, dict) and info.get("thread") and info["thread"].is_alive():
+                state_store.publish(("tasks", key), True)
+        state_store.publish(("tunnel",), tunnel_status())
+        state_store.publish(("upload",), _upload_status())
+
+    @app.route("/api/events")
+    def api_events():
+        """Server-Sent Events push of /api/status changes (see state_store)."""
+        return _sse_response(_sse_stream(_last_event_id(), reconcile=_reconcile_state))
 
     @app.route("/api/devices/refresh", methods=["POST"])
     def api_refresh_devices():
         auto_connect_emulators()
-        _device_cache["ts"] = 0  # bust cache
+        device_cache.invalidate()
         return redirect(url_for("index"))
 
     @app.route("/tasks/start", methods=["POST"])
@@ -572,18 +714,22 @@ def create_app():
         for key in ["auto_heal", "auto_restore_ap", "ap_use_free", "ap_use_potions",
                      "ap_allow_large_potions", "ap_use_gems", "verbose_logging",
                      "eg_rally_own", "titan_rally_own", "web_dashboard", "gather_enabled",
-                     "tower_quest_enabled", "remote_access", "auto_upload_logs"]:
+                     "tower_quest_enabled", "remote_access", "auto_upload_logs",
+                     "adb_persistent_shell", "profiling", "pyramid_check_screen",
+                     "pyramid_matching"]:
             settings[key] = key in request.form
 
         for key in ["ap_gem_limit", "min_troops", "variation", "titan_interval",
                      "groot_interval", "reinforce_interval", "pass_interval",
                      "mithril_interval", "gather_mine_level", "gather_max_troops",
-                     "upload_interval_hours"]:
+                     "upload_interval_hours", "frame_cache_ms", "ocr_workers",
+                     "ocr_worker_max_mb"]:
             val = request.form.get(key, "")
             if val.isdigit():
                 settings[key] = int(val)
 
-        for key in ["pass_mode", "my_team", "mode"]:
+        for key in ["pass_mode", "my_team", "mode", "capture_backend", "adb_backend",
+                    "budget_mode"]:
             val = request.form.get(key)
             if val is not None:
                 settings[key] = val
@@ -741,6 +887,30 @@ def create_app():
             download_name=filename,
         )
 
+    @app.route("/api/profile/trace")
+    def api_profile_trace():
+        """Chrome trace-event JSON of recorded spans (?device=<id> for one device)."""
+        from flask import send_file
+        import io
+        trace = profiling.chrome_trace(request.args.get("device") or None)
+        return send_file(io.BytesIO(json.dumps(trace).encode()),
+                         mimetype="application/json", as_attachment=True,
+                         download_name="9bot_trace.json")
+
+    @app.route("/api/profile/stacks")
+    def api_profile_stacks():
+        """Collapsed stacks for flamegraph.pl / speedscope (?device=<id>)."""
+        from flask import send_file
+        import io
+        text = profiling.collapsed_stacks(request.args.get("device") or None)
+        return send_file(io.BytesIO(text.encode()), mimetype="text/plain",
+                         as_attachment=True, download_name="9bot_stacks.txt")
+
+    @app.route("/api/profile/clear", methods=["POST"])
+    def api_profile_clear():
+        profiling.reset()
+        return redirect(url_for("debug_page"))
+
     @app.route("/api/upload-logs", methods=["POST"])
     def api_upload_logs():
         """Manually upload a bug report to the relay server."""
@@ -771,6 +941,32 @@ def create_app():
         threading.Thread(target=_do_quit, daemon=True).start()
         return jsonify({"ok": True, "message": "Shutting down..."})
 
+    @app.route("/api/tunnel")
+    def api_tunnel():
+        """Tunnel status with per-lane queue/latency metrics."""
+        return jsonify(tunnel_status(detail=True))
+
+    @app.route("/api/stats/history")
+    def api_stats_history():
+        """Stats history percentiles: ?kind=adb&label=screenshot&days=7&pct=95&device=<id>.
+
+        With a label: {device: stats}; without: per-(device, label) rows.
+        """
+        kind = request.args.get("kind", "adb")
+        label = request.args.get("label") or None
+        device = request.args.get("device") or None
+        try:
+            days = max(0.01, min(float(request.args.get("days", "7")), 365.0))
+            pct = max(1, min(int(request.args.get("pct", "95")), 100))
+        except ValueError:
+            return jsonify({"error": "days and pct must be numbers"}), 400
+        if label:
+            result = history.latency(kind, label, pct=pct, days=days, device=device)
+        else:
+            result = history.summary(kind, days=days, device=device, pct=pct)
+        return jsonify({"kind": kind, "label": label, "days": days, "pct": pct,
+                        "stats": result})
+
     @app.route("/api/logs")
     def api_logs():
         log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
@@ -805,6 +1001,17 @@ def create_app():
         config.MANUAL_IGNORE_SQUARES = {tuple(s) for s in data.get("ignore", [])}
         return jsonify({"ok": True})
 
+    @app.route("/api/territory/changes")
+    def api_territory_changes():
+        """Territory change log since a cursor: ?since=<seq>&device=<id>."""
+        try:
+            since = int(request.args.get("since", "0"))
+        except ValueError:
+            since = 0
+        device = request.args.get("device") or None
+        changes, seq = get_territory_changes(since=since, device=device)
+        return jsonify({"changes": changes, "seq": seq})
+
     # --- QR code generator ---
 
     @app.route("/api/screenshot")
@@ -833,6 +1040,24 @@ def create_app():
                          as_attachment=as_attachment,
                          download_name=f"screenshot_{device.replace(':', '_')}.png")
 
+    def _stream_response(device):
+        """MJPEG response fed by the device's shared broadcaster.
+
+        ``adaptive=1`` scales resolution/quality to the client's throughput
+        and a ``kbps`` budget; ``tiles=1`` additionally sends only changed
+        tiles (for the canvas viewer).
+        """
+        from flask import Response
+        fps = _int_arg("fps", 5, 1, 10)
+        tiles = bool(request.args.get("tiles"))
+        if tiles or request.args.get("adaptive"):
+            kbps = _int_arg("kbps", ADAPTIVE_KBPS, 20, 5000)
+            frames = get_broadcaster(device, None).adaptive_frames(fps, kbps, tiles=tiles)
+        else:
+            quality = _int_arg("quality", 30, 10, 95)
+            frames = get_broadcaster(device, quality).frames_for(fps)
+        return Response(frames, mimetype="multipart/x-mixed-replace; boundary=frame")
+
     @app.route("/api/stream")
     def api_stream():
         """MJPEG stream from a device. Query params: device, fps (1-10), quality (10-95)."""
@@ -842,27 +1067,7 @@ def create_app():
         known = set(_cached_devices()[0])
         if device not in known:
             return "Unknown device", 404
-        import cv2
-        from flask import Response
-        fps = max(1, min(10, int(request.args.get("fps", "5"))))
-        quality = max(10, min(95, int(request.args.get("quality", "30"))))
-        interval = 1.0 / fps
-
-        def generate():
-            while True:
-                screen = load_screenshot(device)
-                if screen is not None:
-                    _, buf = cv2.imencode(".jpg", screen,
-                                          [cv2.IMWRITE_JPEG_QUALITY, quality])
-                    frame = buf.tobytes()
-                    yield (b"--frame\r\n"
-                           b"Content-Type: image/jpeg\r\n"
-                           b"Content-Length: " + str(len(frame)).encode() + b"\r\n"
-                           b"\r\n" + frame + b"\r\n")
-                time.sleep(interval)
-
-        return Response(generate(),
-                        mimetype="multipart/x-mixed-replace; boundary=frame")
+        return _stream_response(device)
 
     @app.route("/api/qr")
     def api_qr():
@@ -1029,6 +1234,18 @@ def create_app():
                         "tunnel": tunnel_status(),
                         "upload": _upload_status()})
 
+    @app.route("/d/<dhash>/api/events")
+    @require_device_token
+    def device_api_events(dhash, device=None, token=None, readonly=False):
+        """Server-Sent Events push for one device only."""
+        def include(path):
+            if path[0] == "devices":
+                return path[1] == device
+            if path[0] == "tasks":
+                return path[1].startswith(device + "_")
+            return path[0] in ("tunnel", "upload")
+        return _sse_response(_sse_stream(_last_event_id(), include, _reconcile_state))
+
     @app.route("/d/<dhash>/tasks/start", methods=["POST"])
     @require_device_token
     @require_full_access
@@ -1154,26 +1371,6 @@ def create_app():
     @require_device_token
     def device_stream(dhash, device=None, token=None, readonly=False):
         """MJPEG stream for this device (friend view)."""
-        import cv2
-        from flask import Response
-        fps = max(1, min(10, int(request.args.get("fps", "5"))))
-        quality = max(10, min(95, int(request.args.get("quality", "30"))))
-        interval = 1.0 / fps
-
-        def generate():
-            while True:
-                screen = load_screenshot(device)
-                if screen is not None:
-                    _, buf = cv2.imencode(".jpg", screen,
-                                          [cv2.IMWRITE_JPEG_QUALITY, quality])
-                    frame = buf.tobytes()
-                    yield (b"--frame\r\n"
-                           b"Content-Type: image/jpeg\r\n"
-                           b"Content-Length: " + str(len(frame)).encode() + b"\r\n"
-                           b"\r\n" + frame + b"\r\n")
-                time.sleep(interval)
-
-        return Response(generate(),
-                        mimetype="multipart/x-mixed-replace; boundary=frame")
+        return _stream_response(device)
 
     return app
@@ -0,0 +1,406 @@
+"""9Bot Stream Broadcaster — shared MJPEG fan-out for the dashboard's screen streams.
+
+One ``StreamBroadcaster`` per (device, JPEG quality) captures and encodes a
+frame once per interval and hands the same multipart chunk to every
+subscriber — local browser tabs and tunnel viewers alike — so N viewers
+cost one screencap + one ``cv2.imencode`` per frame instead of N.
+
+Frames come from the bot's own frame cache when it holds one young enough
+(``vision.peek_frame``), so a device the bot is actively driving is
+streamed without any extra capture.  Otherwise the broadcaster captures
+through ``vision.capture_for_observer``, which leaves the frame cache alone
+and records its adb timings as "stream_screenshot", so viewers don't show
+up in the bot's screenshot stats.  The capture thread runs only while
+someone is subscribed and exits when the last subscriber disconnects.
+A captured frame whose content hash matches the previous one is dropped,
+so a static screen costs no encodes and no bandwidth (subscribers get the
+last frame again every IDLE_WAIT_S as a keepalive).
+
+Adaptive streams (``quality=None``) are for remote viewers: each
+subscriber has a ``RateController`` that picks a (scale, JPEG quality)
+rung from ``LEVELS`` and a frame gap so the stream stays under a byte
+budget and under what the client actually drains (tunnel backpressure
+shows up as slow writes).  Encodes are cached per rung, so viewers on the
+same rung still share them.  ``tiles=True`` sends only the grid tiles
+that changed, each as its own part with an ``X-Tile`` header.
+
+Key exports:
+    get_broadcaster(device, quality) — shared broadcaster (created on demand)
+    stream_status()                  — subscriber/encode stats for /api/status
+"""
+
+import itertools
+import threading
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from botlog import get_logger
+
+MAX_FPS = 10
+IDLE_WAIT_S = 5.0        # subscriber wakes this often even without new frames
+BOUNDARY = b"frame"
+
+# Adaptive streaming
+LEVELS = ((1.0, 60), (0.75, 50), (0.5, 45), (0.5, 30), (0.375, 25), (0.25, 20))
+START_LEVEL = 2
+ADAPTIVE_KBPS = 200          # default byte budget for adaptive streams (KB/s)
+BLOCKED_WRITE_S = 0.02       # a write slower than this means the client is the bottleneck
+UPGRADE_MARGIN = 1.6         # step up a rung only with this much budget to spare...
+UPGRADE_AFTER = 10           # ...for this many frames in a row
+TILE_GRID = (4, 8)           # columns, rows
+TILE_FULL_RATIO = 0.5        # more tiles than this changed -> send the whole frame
+
+
+def mjpeg_part(jpeg, headers=b""):
+    """Wrap JPEG bytes as one multipart/x-mixed-replace part."""
+    return (b"--" + BOUNDARY + b"\r\n"
+            b"Content-Type: image/jpeg\r\n" + headers +
+            b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n"
+            b"\r\n" + jpeg + b"\r\n")
+
+
+def tile_part(jpeg, x, y, w, h, size):
+    """Multipart part carrying one tile at (x, y, w, h) of a ``size`` frame."""
+    header = "X-Tile: %d,%d,%d,%d,%d,%d\r\n" % (x, y, w, h, size[0], size[1])
+    return mjpeg_part(jpeg, header.encode())
+
+
+def _digest(screen):
+    return screen.shape, zlib.crc32(np.ascontiguousarray(screen).data)
+
+
+def _encode(img, quality):
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes() if ok else None
+
+
+class RateController:
+    """Chooses the ``LEVELS`` rung and frame gap for one adaptive subscriber.
+
+    Feed it every chunk sent with ``sent(nbytes, seconds)``, where seconds
+    is how long the consumer took to write it.  The allowed rate is the
+    byte budget, or 80% of the measured throughput when writes block.
+    """
+
+    def __init__(self, fps, kbps=ADAPTIVE_KBPS):
+        self.fps = max(1, min(MAX_FPS, fps))
+        self.budget = kbps * 1024
+        self.level = START_LEVEL
+        self.frame_bytes = None      # moving average at the current rung
+        self.throughput = None       # bytes/s, from writes that blocked
+        self._good = 0
+        self.bytes_sent = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self):
+        if self.throughput is None:
+            return self.budget
+        return min(self.budget, 0.8 * self.throughput)
+
+    @property
+    def min_gap(self):
+        gap = 1.0 / self.fps
+        if self.frame_bytes:
+            gap = max(gap, self.frame_bytes / self.rate)
+        return gap
+
+    def _set_level(self, level):
+        self.level = level
+        self.frame_bytes = None
+        self._good = 0
+
+    def sent(self, nbytes, seconds):
+        self.bytes_sent += nbytes
+        self.frame_bytes = (nbytes if self.frame_bytes is None
+                            else 0.7 * self.frame_bytes + 0.3 * nbytes)
+        if seconds >= BLOCKED_WRITE_S:
+            tp = nbytes / seconds
+            self.throughput = tp if self.throughput is None else 0.7 * self.throughput + 0.3 * tp
+        elif self.throughput is not None:
+            # Writes no longer block — let the estimate recover
+            self.throughput *= 1.1
+            if self.throughput > 2 * self.budget:
+                self.throughput = None
+        need = self.frame_bytes * self.fps
+        if need > self.rate and self.level < len(LEVELS) - 1:
+            self._set_level(self.level + 1)
+        elif need * UPGRADE_MARGIN < self.rate and self.level > 0:
+            self._good += 1
+            if self._good >= UPGRADE_AFTER:
+                self._set_level(self.level - 1)
+        else:
+            self._good = 0
+
+    def status(self):
+        elapsed = max(1e-6, time.monotonic() - self.started)
+        scale, quality = LEVELS[self.level]
+        return {"scale": scale, "quality": quality,
+                "kbps": round(self.bytes_sent / 1024 / elapsed, 1),
+                "budget_kbps": round(self.budget / 1024)}
+
+
+class StreamBroadcaster:
+    """Captures/encodes one device's frames for all of its stream subscribers.
+
+    ``quality=None`` makes an adaptive broadcaster: frames are kept raw and
+    encoded per ``LEVELS`` rung on demand (see ``adaptive_frames``).
+    """
+
+    def __init__(self, device, quality):
+        self.device = device
+        self.quality = quality
+        self._log = get_logger("web", device)
+        self._cond = threading.Condition()
+        self._subscribers = {}        # id -> fps
+        self._controllers = {}        # id -> RateController (adaptive subscribers)
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._part = None             # latest multipart chunk (fixed quality)
+        self._frame = None            # latest raw frame
+        self._digest = None
+        self._seq = 0
+        self._encode_lock = threading.Lock()
+        self._encoded = {}            # level -> (seq, part)
+        self._scaled = {}             # level -> (seq, image)
+        self.frames = 0
+        self.reused = 0               # frames taken from the bot's frame cache
+        self.skipped = 0              # captures identical to the previous frame
+        self.encode_ms = 0.0          # moving average
+        self.last_frame_at = None
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return len(self._subscribers)
+
+    def _interval(self):
+        return 1.0 / max(self._subscribers.values())
+
+    # -- capture thread --
+
+    def _grab(self, max_age):
+        from vision import peek_frame, capture_for_observer
+        screen = peek_frame(self.device, max_age)
+        if screen is not None:
+            self.reused += 1
+            return screen
+        return capture_for_observer(self.device)
+
+    def _timed_encode(self, img, quality):
+        t0 = time.perf_counter()
+        jpeg = _encode(img, quality)
+        ms = (time.perf_counter() - t0) * 1000
+        self.encode_ms = ms if self.encode_ms == 0.0 else 0.8 * self.encode_ms + 0.2 * ms
+        return jpeg
+
+    def _publish(self, screen):
+        digest = _digest(screen)
+        if digest == self._digest:
+            self.skipped += 1
+            return
+        part = None
+        if self.quality is not None:
+            jpeg = self._timed_encode(screen, self.quality)
+            if jpeg is None:
+                return
+            part = mjpeg_part(jpeg)
+        with self._cond:
+            self._digest = digest
+            self._frame = screen
+            self._part = part
+            self._seq += 1
+            self.frames += 1
+            self.last_frame_at = time.time()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    self._thread = None
+                    self._log.debug("Stream broadcaster idle (q=%s)", self.quality)
+                    return
+                interval = self._interval()
+            started = time.monotonic()
+            try:
+                screen = self._grab(interval)
+                if screen is not None:
+                    self._publish(screen)
+            except Exception as e:
+                self._log.warning("Stream capture failed: %s", e)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    # -- per-rung encodes (adaptive) --
+
+    def _scaled_frame(self, seq, frame, level):
+        with self._encode_lock:
+            cached = self._scaled.get(level)
+            if cached and cached[0] == seq:
+                return cached[1]
+            scale = LEVELS[level][0]
+            img = frame if scale == 1.0 else cv2.resize(
+                frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self._scaled[level] = (seq, img)
+            return img
+
+    def _level_part(self, seq, frame, level):
+        """Full-frame part for ``level``, encoded once per frame per rung."""
+        img = self._scaled_frame(seq, frame, level)
+        with self._encode_lock:
+            cached = self._encoded.get(level)
+            if cached and cached[0] == seq:
+                return cached[1]
+            jpeg = self._timed_encode(img, LEVELS[level][1])
+            part = mjpeg_part(jpeg) if jpeg is not None else None
+            self._encoded[level] = (seq, part)
+            return part
+
+    def _tile_parts(self, seq, frame, level, prev):
+        """Parts for the tiles that differ from ``prev`` (the image this
+        subscriber last received), or one whole-frame tile."""
+        img = self._scaled_frame(seq, frame, level)
+        h, w = img.shape[:2]
+        size = (w, h)
+        if prev is None or prev.shape != img.shape:
+            jpeg = self._timed_encode(img, LEVELS[level][1])
+            return (tile_part(jpeg, 0, 0, w, h, size) if jpeg else b""), img
+        cols, rows = TILE_GRID
+        tw, th = -(-w // cols), -(-h // rows)
+        changed = []
+        for ty in range(0, h, th):
+            for tx in range(0, w, tw):
+                if not np.array_equal(img[ty:ty + th, tx:tx + tw], prev[ty:ty + th, tx:tx + tw]):
+                    changed.append((tx, ty))
+        if len(changed) > TILE_FULL_RATIO * cols * rows:
+            return self._tile_parts(seq, frame, level, None)
+        out = []
+        for tx, ty in changed:
+            tile = img[ty:ty + th, tx:tx + tw]
+            jpeg = self._timed_encode(tile, LEVELS[level][1])
+            if jpeg:
+                out.append(tile_part(jpeg, tx, ty, tile.shape[1], tile.shape[0], size))
+        return b"".join(out), img
+
+    # -- subscribers --
+
+    def subscribe(self, fps):
+        """Register a subscriber at ``fps``; returns its id. Starts capture if idle."""
+        with self._cond:
+            sub_id = next(self._ids)
+            self._subscribers[sub_id] = max(1, min(MAX_FPS, fps))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True,
+                    name=f"stream-{self.device}-q{self.quality}")
+                self._thread.start()
+        return sub_id
+
+    def unsubscribe(self, sub_id):
+        with self._cond:
+            self._subscribers.pop(sub_id, None)
+            self._controllers.pop(sub_id, None)
+
+    def frames_for(self, fps):
+        """Generator of multipart chunks for one subscriber.
+
+        Yields each new frame, but no faster than ``fps``.  Closing the
+        generator (client disconnect) unsubscribes.
+        """
+        sub_id = self.subscribe(fps)
+        min_gap = 1.0 / max(1, min(MAX_FPS, fps))
+        last_seq, last_sent = 0, 0.0
+        try:
+            while True:
+                wait = last_sent + min_gap - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq, timeout=IDLE_WAIT_S)
+                    if self._part is None:
+                        continue
+                    # Unchanged screen: resend the last frame as a keepalive
+                    part, last_seq = self._part, self._seq
+                last_sent = time.monotonic()
+                yield part
+        finally:
+            self.unsubscribe(sub_id)
+
+    def adaptive_frames(self, fps, kbps=ADAPTIVE_KBPS, tiles=False):
+        """Generator of chunks for one adaptive subscriber (``quality=None``).
+
+        Scale, JPEG quality and frame gap follow the subscriber's
+        ``RateController``; with ``tiles`` only changed tiles are sent.
+        """
+        ctl = RateController(fps, kbps)
+        sub_id = self.subscribe(fps)
+        with self._cond:
+            self._controllers[sub_id] = ctl
+        last_seq, last_sent, prev = 0, 0.0, None
+        try:
+            while True:
+                wait = last_sent + ctl.min_gap - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq, timeout=IDLE_WAIT_S)
+                    seq, frame = self._seq, self._frame
+                if frame is None:
+                    continue
+                level = ctl.level
+                if tiles:
+                    if seq == last_seq and prev is not None:
+                        # Keepalive: an empty tile
+                        h, w = prev.shape[:2]
+                        chunk = tile_part(b"", 0, 0, 0, 0, (w, h))
+                    else:
+                        chunk, prev = self._tile_parts(seq, frame, level, prev)
+                else:
+                    chunk = self._level_part(seq, frame, level)
+                last_seq = seq
+                if not chunk:
+                    continue
+                last_sent = time.monotonic()
+                yield chunk
+                ctl.sent(len(chunk), time.monotonic() - last_sent)
+        finally:
+            self.unsubscribe(sub_id)
+
+    def status(self):
+        with self._cond:
+            return {
+                "device": self.device,
+                "quality": self.quality,
+                "subscribers": len(self._subscribers),
+                "fps": max(self._subscribers.values()) if self._subscribers else 0,
+                "frames": self.frames,
+                "reused_frames": self.reused,
+                "skipped_frames": self.skipped,
+                "encode_ms": round(self.encode_ms, 1),
+                "active": self._thread is not None,
+                "viewers": [c.status() for c in self._controllers.values()],
+            }
+
+
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+
+def get_broadcaster(device, quality):
+    """Shared broadcaster for ``device`` at JPEG ``quality``."""
+    key = (device, quality)
+    with _broadcasters_lock:
+        b = _broadcasters.get(key)
+        if b is None:
+            b = _broadcasters[key] = StreamBroadcaster(device, quality)
+        return b
+
+
+def stream_status():
+    """Status of every broadcaster that has subscribers or is still running."""
+    with _broadcasters_lock:
+        items = list(_broadcasters.values())
+    return [s for s in (b.status() for b in items) if s["subscribers"] or s["active"]]